@@ -0,0 +1,117 @@
+// Host build of the robot's UART side (uart_robot/baud_link.c and
+// camera_frame.c) as a shared library, loaded with ctypes by
+// host/bench_baud.py to play the robot against lib/uart_baud.py.
+//
+// One static robot: robot_feed() takes received bytes like the RX_DONE
+// handler in main.c, robot_poll() is the main loop tick. Frames are written
+// and the baud rate is changed through the two callbacks given to
+// robot_init().
+//
+//   gcc -std=c99 -Wall -Wextra -O2 -shared -fPIC -Iuart_robot -o baud_link_host.so
+//       host/baud_link_host.c uart_robot/baud_link.c uart_robot/camera_frame.c
+
+#include <stdint.h>
+#include <string.h>
+
+#include "baud_link.h"
+#include "camera_frame.h"
+
+typedef void (*robot_write_t)(uint8_t const * p_data, uint32_t length);
+typedef void (*robot_baud_t)(uint32_t baud);
+
+static robot_write_t          write_cb;
+static robot_baud_t           baud_cb;
+static camera_frame_decoder_t decoder;
+static baud_link_t            link;
+static uint32_t               rates[4];
+static uint8_t                tx_seq;
+static uint32_t               now;
+static uint32_t               data_frames;
+static uint32_t               data_bytes;
+static uint8_t                control[BAUD_LINK_CONTROL_SIZE];
+static uint8_t                control_length;  // 0 = none pending
+
+static void send(uint8_t const * p_payload, uint8_t length, void * p_context)
+{
+    (void)p_context;
+    uint8_t frame[CAMERA_FRAME_MAX_SIZE];
+    size_t size = camera_frame_encode(frame, tx_seq++, p_payload, length);
+    write_cb(frame, (uint32_t)size);
+}
+
+static void set_baud(uint32_t baud, void * p_context)
+{
+    (void)p_context;
+    baud_cb(baud);
+    decoder.used = 0;  // a partial frame from the old rate
+}
+
+static void frame_received(uint8_t seq, uint8_t const * p_payload, uint8_t length, void * p_context)
+{
+    (void)seq;
+    (void)p_context;
+    if (baud_link_is_control(p_payload, length))
+    {
+        // Handled after the feed, like the main loop does on the robot (a
+        // baud switch must not reset the decoder while it is decoding)
+        memcpy(control, p_payload, length);
+        control_length = length;
+        return;
+    }
+    data_frames++;
+    data_bytes += length;
+}
+
+void robot_init(uint32_t const * p_rates, uint32_t count, robot_write_t write, robot_baud_t baud, uint32_t now_ms)
+{
+    count = count > 4 ? 4 : count;
+    for (uint32_t i = 0; i < count; i++)
+    {
+        rates[i] = p_rates[i];
+    }
+    write_cb = write;
+    baud_cb = baud;
+    now = now_ms;
+    tx_seq = 0;
+    data_frames = 0;
+    data_bytes = 0;
+    control_length = 0;
+    camera_frame_decoder_init(&decoder);
+    baud_link_init(&link, rates, (uint8_t)count, send, set_baud, NULL, now_ms);
+}
+
+void robot_feed(uint8_t const * p_data, uint32_t length, uint32_t now_ms)
+{
+    now = now_ms;
+    camera_frame_feed(&decoder, p_data, length, frame_received, NULL);
+    if (control_length)
+    {
+        uint8_t length = control_length;
+        control_length = 0;
+        baud_link_on_control(&link, control, length, now_ms);
+    }
+}
+
+void robot_poll(uint32_t now_ms)
+{
+    now = now_ms;
+    baud_link_poll(&link, decoder.frames, decoder.crc_errors + decoder.length_errors, now_ms);
+}
+
+uint32_t robot_baud(void)
+{
+    return baud_link_baud(&link);
+}
+
+// state, upgrades, fallbacks, failures, data frames, data bytes, crc errors, length errors
+void robot_stats(uint32_t * p_out)
+{
+    p_out[0] = link.state;
+    p_out[1] = link.upgrades;
+    p_out[2] = link.fallbacks;
+    p_out[3] = link.failures;
+    p_out[4] = data_frames;
+    p_out[5] = data_bytes;
+    p_out[6] = decoder.crc_errors;
+    p_out[7] = decoder.length_errors;
+}
@@ -0,0 +1,153 @@
+# Round-trip, C agreement and throughput of the multi-obstacle batch packet.
+#
+# - round trip: decode(encode(obstacles)) == obstacles for random batches
+#   and edge values (lib/obstacle_batch.py)
+# - the C decoder (uart_robot/obstacle_batch.c, built with gcc) returns the
+#   same obstacles, and rejects the same malformed payloads
+# - size against a fixed 10 bytes per obstacle, and time on the wire at
+#   115200 baud including the frame overhead of lib/uart_frame.py
+# - encode/decode throughput of the codec and the C decoder
+#
+#   python3 host/bench_batch.py --batches 20000
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import replay
+
+sys.path.insert(0, replay.LIB_DIR)
+import obstacle_batch  # noqa: E402
+from obstacle_batch import BatchEncoder, MAX_OBSTACLES, decode, encode  # noqa: E402
+from uart_frame import CRC_SIZE, HEADER  # noqa: E402
+
+ROBOT_DIR = os.path.join(replay.REPO_DIR, 'uart_robot')
+DRIVER = os.path.join(replay.HOST_DIR, 'obstacle_batch_host.c')
+FIXED_SIZE = 10  # '<HhHhH' per obstacle
+
+
+def random_batch(rng):
+    # A scene: a few tracks with recent IDs, mostly at similar depths
+    n = rng.randrange(MAX_OBSTACLES + 1)
+    first_id = rng.randrange(1, 120)
+    depth = rng.randrange(200, 1800)
+    obstacles = []
+    for i in range(n):
+        d = depth + rng.randrange(-150, 150) if rng.random() < 0.8 else rng.randrange(100, 2000)
+        w = rng.randrange(20, 400)
+        obstacles.append((first_id + rng.randrange(8), rng.randrange(-800, 800), w, d, w * w // 60))
+    # Primary first, the others left to right (what the camera sends)
+    return obstacles[:1] + sorted(obstacles[1:], key=lambda ob: ob[1])
+
+
+EDGES = [
+    [],
+    [(0, 0, 0, 0, 0)],
+    [(65535, -32768, 65535, 32767, 65535), (0, 32767, 0, -32768, 0)],
+    [(1, -32768, 1, -32768, 1)] * MAX_OBSTACLES,
+]
+
+
+def malformed(rng, payload):
+    kind = rng.randrange(4)
+    data = bytearray(payload)
+    if kind == 0 and data:
+        del data[rng.randrange(len(data)):]
+    elif kind == 1:
+        data.append(rng.randrange(256))
+    elif kind == 2 and len(data) > 2:
+        data[rng.randrange(2, len(data))] |= 0x80
+    else:
+        data = bytearray([obstacle_batch.VERSION, rng.randrange(256)]) + bytes(rng.randrange(256) for _ in range(8))
+    return bytes(data)
+
+
+def build(out_dir):
+    exe = os.path.join(out_dir, 'obstacle_batch_host')
+    subprocess.run(['gcc', '-std=c99', '-Wall', '-Wextra', '-Werror', '-O2', '-I' + ROBOT_DIR, DRIVER,
+                    os.path.join(ROBOT_DIR, 'obstacle_batch.c'), '-o', exe], check=True)
+    return exe
+
+
+def run_c(exe, payloads):
+    text = ''.join(p.hex() + '\n' for p in payloads)
+    out = subprocess.run([exe], input=text.encode(), stdout=subprocess.PIPE, check=True).stdout.decode()
+    results = []
+    for line in out.split('\n')[:len(payloads)]:
+        if line.startswith('error'):
+            results.append(None)
+        else:
+            results.append([tuple(int(v) for v in ob.split()) for ob in line.split(';')] if line else [])
+    return results
+
+
+def python_or_none(payload):
+    try:
+        return decode(payload)
+    except ValueError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and time the multi-obstacle batch codec.")
+    parser.add_argument('--batches', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    batches = EDGES + [random_batch(rng) for _ in range(args.batches)]
+    payloads = [encode(b) for b in batches]
+    bad = sum(1 for b, p in zip(batches, payloads) if decode(p) != b)
+    print("round trip: %d batches, %d mismatches" % (len(batches), bad))
+
+    broken = [malformed(rng, p) for p in payloads[:2000]]
+    with tempfile.TemporaryDirectory() as tmp:
+        exe = build(tmp)
+        c_valid = run_c(exe, payloads)
+        c_broken = run_c(exe, broken)
+        c_bad = sum(1 for b, c in zip(batches, c_valid) if c != b)
+        py_broken = [python_or_none(p) for p in broken]
+        disagree = sum(1 for a, b in zip(py_broken, c_broken) if a != b)
+        print("C decoder: %d mismatches on valid payloads, %d/%d malformed payloads decoded differently "
+              "(%d rejected)" % (c_bad, disagree, len(broken), sum(1 for c in c_broken if c is None)))
+        bad += c_bad + disagree
+
+        sample = max(payloads, key=len)
+        out = subprocess.run([exe, '1000000'], input=(sample.hex() + '\n').encode(), stdout=subprocess.PIPE,
+                             check=True).stdout.decode().strip()
+        print("C decoder speed (%d obstacles, host): %s" % (sample[1], out))
+
+    obstacles = sum(len(b) for b in batches)
+    size = sum(len(p) for p in payloads)
+    fixed = sum(2 + FIXED_SIZE * len(b) for b in batches)
+    print("size: %.1f bytes per obstacle (fixed layout %d), %.0f%% of the fixed packets" % (
+        (size - 2 * len(batches)) / max(1, obstacles), FIXED_SIZE, 100.0 * size / fixed))
+    full = [p for b, p in zip(batches, payloads) if len(b) == MAX_OBSTACLES]
+    if full:
+        frame = HEADER + sum(len(p) for p in full) / len(full) + CRC_SIZE
+        print("%d obstacles per frame: %.0f bytes framed, %.2f ms at 115200 baud (10 bits per byte)" % (
+            MAX_OBSTACLES, frame, frame * 10 / 115.2))
+
+    enc = BatchEncoder()
+    t0 = time.perf_counter()
+    for b in batches:
+        enc.begin()
+        for ob in b:
+            enc.add(*ob)
+        enc.end()
+    t_enc = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for p in payloads:
+        decode(p)
+    t_dec = time.perf_counter() - t0
+    print("codec throughput (CPython): encode %.0f batches/s, decode %.0f batches/s" % (
+        len(batches) / t_enc, len(batches) / t_dec))
+    raise SystemExit(1 if bad else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# Baud rate negotiation and effective UART throughput, over a socket pair.
+#
+# The camera end is lib/uart_baud.py and lib/uart_frame.py on the pyb UART
+# shim, bound to one end of a socket pair. The robot end is the nRF code
+# (uart_robot/baud_link.c and camera_frame.c, built as a shared library by
+# gcc, see host/baud_link_host.c) driven by a thread on the other end. A
+# wire model sits in between: every byte takes 10 bit times at the sender's
+# rate, bytes sent at another rate than the receiver's arrive as garbage,
+# and --ber flips bits at the rate under test.
+#
+# For every rate: the time to negotiate it from 115200, then the payload
+# throughput with frames pushed back to back ('<hhh' result, 6-obstacle
+# batch, largest payload). Then the fallback: bit errors at the top rate
+# until both ends have stepped down, and the time to come back up.
+#
+# "of line" is the payload rate over the raw rate (baud / 10 bytes/s). At
+# the higher rates small frames are limited by the host's Python frame loop
+# (CRC and pacing per frame), not by the line.
+#
+#   python3 host/bench_baud.py --seconds 1 --ber 1e-3
+
+import argparse
+import ctypes
+import os
+import random
+import select
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+
+import replay
+
+ROBOT_DIR = os.path.join(replay.REPO_DIR, 'uart_robot')
+DRIVER = os.path.join(replay.HOST_DIR, 'baud_link_host.c')
+STATES = ('idle', 'proposed', 'testing', 'committing', 'up')
+SIZES = (('<hhh result', 6), ('6-obstacle batch', 51), ('max payload', 96))
+
+
+def build(out_dir):
+    lib = os.path.join(out_dir, 'baud_link_host.so')
+    subprocess.run(['gcc', '-std=c99', '-Wall', '-Wextra', '-Werror', '-O2', '-shared', '-fPIC', '-I' + ROBOT_DIR,
+                    DRIVER, os.path.join(ROBOT_DIR, 'baud_link.c'), os.path.join(ROBOT_DIR, 'camera_frame.c'),
+                    '-o', lib], check=True)
+    return ctypes.CDLL(lib)
+
+
+def now_ms():
+    return int(time.perf_counter() * 1000) & 0xFFFFFFFF
+
+
+class Wire:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.ber = {}       # baud -> bit error rate
+        self.free = {}      # sender -> time its line is idle again
+        self.garbled = 0
+        self.flipped = 0
+
+    def carry(self, sender, data, tx_baud, rx_baud):
+        # Block like a UART without a TX buffer, then deliver what the receiver sees
+        now = time.perf_counter()
+        free = max(self.free.get(sender, 0.0), now) + len(data) * 10.0 / tx_baud
+        self.free[sender] = free
+        if free - now > 0.0005:
+            time.sleep(free - now)
+        rng = self.rng
+        if tx_baud != rx_baud:
+            self.garbled += len(data)
+            return bytes(rng.randrange(256) for _ in range(max(1, len(data) * rx_baud // tx_baud)))
+        ber = self.ber.get(tx_baud, 0.0)
+        if not ber:
+            return data
+        p_byte = 1.0 - (1.0 - ber) ** 8
+        out = bytearray(data)
+        for i in range(len(out)):
+            if rng.random() < p_byte:
+                out[i] ^= 1 << rng.randrange(8)
+                self.flipped += 1
+        return bytes(out)
+
+
+class Robot:
+    def __init__(self, lib, fd, wire, rates, camera_uart):
+        self.lib = lib
+        self.fd = fd
+        self.wire = wire
+        self.camera_uart = camera_uart
+        self.baud = rates[0]
+        self.switches = []
+        self.stop = False
+        self._write = ctypes.CFUNCTYPE(None, ctypes.POINTER(ctypes.c_uint8), ctypes.c_uint32)(self._on_write)
+        self._baud = ctypes.CFUNCTYPE(None, ctypes.c_uint32)(self._on_baud)
+        lib.robot_feed.argtypes = [ctypes.c_char_p, ctypes.c_uint32, ctypes.c_uint32]
+        lib.robot_poll.argtypes = [ctypes.c_uint32]
+        lib.robot_baud.restype = ctypes.c_uint32
+        lib.robot_init((ctypes.c_uint32 * len(rates))(*rates), len(rates), self._write, self._baud, now_ms())
+        self._stats = (ctypes.c_uint32 * 8)()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _on_write(self, p_data, length):
+        data = self.wire.carry('robot', ctypes.string_at(p_data, length), self.baud, self.camera_uart.baudrate)
+        os.write(self.fd, data)
+
+    def _on_baud(self, baud):
+        self.baud = baud
+        self.switches.append((time.perf_counter(), baud))
+
+    def _run(self):
+        while not self.stop:
+            if select.select([self.fd], [], [], 0.005)[0]:
+                data = os.read(self.fd, 4096)
+                self.lib.robot_feed(data, len(data), now_ms())
+            self.lib.robot_poll(now_ms())
+
+    def stats(self):
+        self.lib.robot_stats(self._stats)
+        keys = ('state', 'upgrades', 'fallbacks', 'failures', 'frames', 'bytes', 'crc_errors', 'length_errors')
+        return dict(zip(keys, self._stats))
+
+    def close(self):
+        self.stop = True
+        self.thread.join()
+
+
+def open_link(lib, wire, rates):
+    import pyb
+    from uart_baud import BaudFollower
+    from uart_frame import HEADER, FrameWriter, MAX_PAYLOAD
+    cam_sock, robot_sock = socket.socketpair()
+    pyb.UART.ports[4] = cam_sock.fileno()
+    uart = pyb.UART(4, 115200, timeout_char=200)
+    del pyb.UART.ports[4]
+    framer = FrameWriter(uart, None, MAX_PAYLOAD)
+    framer.frame[HEADER:HEADER + MAX_PAYLOAD] = bytes(random.Random(1).randrange(256) for _ in range(MAX_PAYLOAD))
+    follower = BaudFollower(uart, framer)
+    robot = Robot(lib, robot_sock.fileno(), wire, rates, uart)
+    pyb.UART.wire = lambda u, data: wire.carry('camera', data, u.baudrate, robot.baud)
+    return framer, follower, robot, (cam_sock, robot_sock)
+
+
+def push(framer, follower, length, seconds, interval=0.0, until=None):
+    # Camera push loop: a frame, then the follower; returns the frames sent
+    t_end = time.perf_counter() + seconds
+    sent = 0
+    while time.perf_counter() < t_end:
+        framer.send_payload(length)
+        sent += 1
+        follower.service()
+        if until and until():
+            break
+        if interval:
+            time.sleep(interval)
+    return sent
+
+
+def wait_rate(framer, follower, robot, baud, timeout):
+    # Push '<hhh' sized frames at 100 Hz until both ends run at `baud`; returns the time taken or None
+    t0 = time.perf_counter()
+    push(framer, follower, 6, timeout, 0.01,
+         lambda: follower.baud == baud and not follower.pending and robot.baud == baud and
+         (baud == follower.base or robot.stats()['state'] == 4))
+    done = follower.baud == baud and robot.baud == baud
+    return time.perf_counter() - t0 if done else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Negotiate UART rates against the nRF link code and time them.")
+    parser.add_argument('--seconds', type=float, default=1.0, help="push time per rate and payload size")
+    parser.add_argument('--ber', type=float, default=1e-3, help="bit error rate injected at the top rate")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    replay.install_shims()
+    import pyb
+    from uart_baud import RATES, BASE_BAUD
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        lib = build(tmp)
+        print("%-8s %-10s %-18s %9s %10s %9s %6s" % ('baud', 'negotiate', 'payload', 'frames/s', 'payload/s',
+                                                   'of line', 'lost'))
+        for baud in RATES:
+            wire = Wire(args.seed)
+            ladder = (BASE_BAUD, baud) if baud != BASE_BAUD else (BASE_BAUD,)
+            framer, follower, robot, socks = open_link(lib, wire, ladder)
+            took = wait_rate(framer, follower, robot, baud, 5.0)
+            if took is None:
+                print("%-8d negotiation failed: %s" % (baud, follower.summary()))
+                failed = True
+            else:
+                for name, length in SIZES:
+                    time.sleep(0.05)
+                    before = robot.stats()
+                    t0 = time.perf_counter()
+                    sent = push(framer, follower, length, args.seconds)
+                    time.sleep(0.05)  # let the last frames arrive
+                    dt = time.perf_counter() - t0 - 0.05
+                    after = robot.stats()
+                    frames = after['frames'] - before['frames']
+                    payload = after['bytes'] - before['bytes']
+                    print("%-8d %-10s %-18s %9.0f %8.1f kB %8.0f%% %6d" % (
+                        baud, '%.0f ms' % (took * 1000) if baud != BASE_BAUD else '-', name, frames / dt, payload / dt / 1000.0,
+                        100.0 * payload / dt / (baud / 10.0), sent - frames))
+            robot.close()
+            pyb.UART.wire = None
+            for s in socks:
+                s.close()
+
+        # Fallback: bit errors at the top rate
+        wire = Wire(args.seed)
+        framer, follower, robot, socks = open_link(lib, wire, RATES)
+        top, lower = RATES[-1], RATES[-2]
+        took = wait_rate(framer, follower, robot, top, 5.0)
+        print("\nfull ladder: %d baud after %s" % (top, '%.0f ms' % (took * 1000) if took else 'FAILED'))
+        failed |= took is None
+        wire.ber[top] = args.ber
+        t0 = time.perf_counter()
+        push(framer, follower, 6, 10.0, 0.01, lambda: robot.baud != top and follower.baud != top)
+        robot_down = next((t - t0 for t, b in robot.switches if t >= t0 and b != top), None)
+        print("bit error rate %g at %d: robot fell back after %s, camera %s" % (
+            args.ber, top, '%.0f ms' % (robot_down * 1000) if robot_down is not None else 'never',
+            'too' if follower.baud != top else 'STILL AT %d' % follower.baud))
+        took = wait_rate(framer, follower, robot, lower, 10.0)
+        print("stepped down to %d after another %s" % (lower, '%.0f ms' % (took * 1000) if took else 'FAILED'))
+        failed |= robot_down is None or took is None
+        stats = robot.stats()
+        print("robot: state %s, upgrades %d, fallbacks %d, failures %d, crc errors %d" % (
+            STATES[stats['state']], stats['upgrades'], stats['fallbacks'], stats['failures'], stats['crc_errors']))
+        print("camera: " + follower.summary())
+        robot.close()
+        pyb.UART.wire = None
+        for s in socks:
+            s.close()
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+# Boot time to the first valid result and the first streamed frame.
+#
+# Runs a script from the top on the shims with the sensor timing model on
+# (host/shims/sensor.py: one frame per --frame-ms, auto exposure holding for
+# --ae-delay-ms and then settling with a time constant of --ae-tau-ms) and, for ttk8/ttk8.py, the access
+# point model (host/shims/network.py: join --assoc-ms + DHCP --dhcp-ms) with
+# a browser that retries every --retry-ms until the stream is up. The script's
+# setup, then the statements of its main block before the loop (warm-up,
+# wifi_setup), then the loop body as host/bench_gc.py runs it, until the
+# first valid result and the first frame in the browser.
+#
+#   fixed   FAST_BOOT = False: sensor.skip_frames(time=SENSOR_SKIP_MS),
+#           then the join (--skip-ms 2000 for the old scripts' warm-up)
+#   fast    FAST_BOOT = True: the join is started, then frames are taken
+#           until auto exposure has converged (lib/boot_sequence.py), none
+#           counting before BOOT_MIN_MS (--min-ms overrides it)
+#
+# Reported per mode, mean over --runs boots, in ms from the top of the
+# script: detection starting, the first valid result (the first valid
+# packet to the robot), the first frame streamed and the first frame the
+# browser received; and the exposure reached when detection started, in %
+# of the settled one.
+#
+#   python3 host/bench_boot.py obstacle_detection.py
+#   python3 host/bench_boot.py ttk8/ttk8.py --runs 5 --skip-ms 2000
+#   python3 host/bench_boot.py obstacle_detection.py --ae-delay-ms 80 --min-ms 0
+
+import argparse
+import ast
+import os
+import sys
+import time
+
+import replay
+from bench_gc import loop_pass
+from bench_mjpeg import free_port
+from bench_wifi import ReconnectingBrowser
+
+
+def main_block(script, ns):
+    # The statements of the script's main try block before its loop
+    with open(script) as f:
+        tree = ast.parse(f.read(), script)
+    for node in tree.body:
+        if isinstance(node, ast.Try) and any(isinstance(n, ast.While) for n in node.body):
+            body = []
+            for stmt in node.body:
+                if isinstance(stmt, ast.While):
+                    break
+                body.append(stmt)
+            code = compile(ast.Module(body=body, type_ignores=[]), script, 'exec')
+            return lambda: exec(code, ns)
+    raise SystemExit("%s: no main loop found" % script)
+
+
+def boot(script, recording, args, fast):
+    import sensor
+    recording.rewind()
+    start = time.perf_counter()
+    ns = replay.load_script(script, recording)
+    ns['print'] = lambda *a, **k: None
+    ns['FAST_BOOT'] = fast
+    ns['SENSOR_SKIP_MS'] = args.skip_ms
+    if args.min_ms is not None:
+        ns['boot'].min_ms = args.min_ms
+    browser = None
+    if ns.get('WIFI_STREAMING'):
+        ns['WIFI_PORT'] = port = free_port()
+        browser = ReconnectingBrowser(port, args.retry_ms)
+        browser.start()
+        setup = ns['wifi_setup']
+
+        def local_setup(name, key):
+            link = setup(name, key)
+            link.host = '127.0.0.1'
+            return link
+        ns['wifi_setup'] = local_setup
+    main_block(script, ns)()
+    exposure = 100.0 * sensor.get_exposure_us() / sensor.EXPOSURE_US
+    step = loop_pass(script, ns)
+    boot = ns['boot']
+    deadline = start + args.timeout_ms / 1000.0
+    while (boot.pending or (browser is not None and not browser.frames)) and time.perf_counter() < deadline:
+        step()
+    row = {'ready': boot.ready_ms, 'packet': boot.packet_ms, 'stream': boot.frame_ms if boot.stream else None,
+           'browser': (browser.frames[0] - start) * 1000.0 if browser is not None and browser.frames else None,
+           'exposure': exposure, 'frames': boot.warm_frames}
+    if browser is not None:
+        browser.stop = True
+        ns['wifi_stream'].server.close()
+    return row
+
+
+def mean(rows, key):
+    values = [r[key] for r in rows if r[key] is not None and r[key] >= 0]
+    return sum(values) / len(values) if values else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Boot time with a fixed warm-up and with the fast boot sequence.")
+    parser.add_argument('script', help="detection script, e.g. ttk8/ttk8.py")
+    parser.add_argument('--synthetic', type=int, default=60, metavar='N', help="synthetic frames (looped)")
+    parser.add_argument('--frames', help="recording directory instead (looped)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--frame-ms', type=int, default=40, help="sensor frame period")
+    parser.add_argument('--ae-tau-ms', type=int, default=100, help="auto exposure time constant")
+    parser.add_argument('--ae-delay-ms', type=int, default=0, help="auto exposure start delay")
+    parser.add_argument('--min-ms', type=int, help="warm-up floor instead of the script's BOOT_MIN_MS")
+    parser.add_argument('--skip-ms', type=int, default=500, help="fixed warm-up (SENSOR_SKIP_MS)")
+    parser.add_argument('--assoc-ms', type=int, default=800, help="scan, authentication and association")
+    parser.add_argument('--dhcp-ms', type=int, default=1500, help="DHCP lease")
+    parser.add_argument('--retry-ms', type=int, default=100, help="browser reconnect interval")
+    parser.add_argument('--timeout-ms', type=int, default=15000, help="give up on a boot after this long")
+    args = parser.parse_args(argv)
+    if args.frames:
+        args.synthetic = None
+
+    replay.install_shims()
+    import network
+    import sensor
+    network.ap.assoc_ms = args.assoc_ms
+    network.ap.dhcp_ms = args.dhcp_ms
+    sensor.FRAME_MS = args.frame_ms
+    sensor.AE_TAU_MS = args.ae_tau_ms
+    sensor.AE_DELAY_MS = args.ae_delay_ms
+    recording = replay.load_recording(args)
+    recording.loop = True
+    script = os.path.abspath(args.script)
+
+    print("frame %d ms, auto exposure delay %d ms tau %d ms, fixed warm-up %d ms, join %d ms + DHCP %d ms" % (
+        args.frame_ms, args.ae_delay_ms, args.ae_tau_ms, args.skip_ms, args.assoc_ms, args.dhcp_ms))
+    boot(script, recording, args, True)  # imports cached, as for every run after it
+    print("%-6s %9s %9s %9s %9s %9s %12s" % ('mode', 'ready_ms', 'packet_ms', 'stream_ms', 'browser_ms',
+                                             'frames', 'exposure_%'))
+    results = {}
+    for fast in (False, True):
+        rows = [boot(script, recording, args, fast) for _ in range(args.runs)]
+        mode = 'fast' if fast else 'fixed'
+        results[mode] = rows
+        cells = []
+        for key in ('ready', 'packet', 'stream', 'browser', 'frames', 'exposure'):
+            value = mean(rows, key)
+            cells.append('-' if value is None else '%.0f' % value)
+        print("%-6s %9s %9s %9s %9s %9s %12s" % tuple([mode] + cells))
+    failed = [mode for mode, rows in results.items() for r in rows if r['packet'] < 0]
+    for key, name in (('packet', 'first valid packet'), ('browser', 'first frame in the browser')):
+        fixed, fast = mean(results['fixed'], key), mean(results['fast'], key)
+        if fixed is not None and fast is not None:
+            print("%s: fixed %.0f ms, fast %.0f ms (%.0f ms sooner)" % (name, fixed, fast, fixed - fast))
+    if failed:
+        print("FAIL: no valid result within %d ms (%s)" % (args.timeout_ms, ', '.join(sorted(set(failed)))))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
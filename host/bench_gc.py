@@ -0,0 +1,202 @@
+# Heap allocations per frame in a detection script's main loop.
+#
+# CPython frees temporaries by reference counting, so its memory counters do
+# not show what piles up on the camera's MicroPython heap until a collection.
+# Instead each loop pass runs under an opcode tracer that counts, in the
+# script and lib/, the bytecodes that create a heap object on MicroPython:
+#
+#   tuple, list, dict, set, slice   BUILD_* (constant tuples are not built)
+#   str                             f-strings and string joins
+#   *args                           calls with *args / **kwargs
+#   closure                         functions and generators made at run time
+#   float                           results of / and ** (a lower bound: float
+#                                   products are not recognised)
+#   print                           print() calls (also slow on the USB/UART)
+#
+# Calls from there into device modules that return new objects (snapshot(),
+# find_blobs(), read(), ...) are listed apart: those stay on the camera.
+#
+# The loop pass is the body of the script's main loop with the sleeps
+# removed, one per recorded frame, in the --uart mode of obstacle_detection.py
+# (polled: one b'r' request per frame). A second, untraced run wraps each pass
+# in lib/gc_probe.py when the script has GC_PROBE and prints its summary.
+#
+#   python3 host/bench_gc.py obstacle_detection.py --synthetic 100
+#   python3 host/bench_gc.py ttk8/ttk8.py --synthetic 100
+
+import argparse
+import ast
+import dis
+import os
+import sys
+
+import replay
+
+OPS = {
+    'BUILD_TUPLE': 'tuple', 'BUILD_LIST': 'list', 'BUILD_MAP': 'dict', 'BUILD_CONST_KEY_MAP': 'dict',
+    'BUILD_SET': 'set', 'BUILD_SLICE': 'slice', 'BUILD_STRING': 'str', 'FORMAT_VALUE': 'str',
+    'CALL_FUNCTION_EX': '*args', 'MAKE_FUNCTION': 'closure', 'RETURN_GENERATOR': 'closure',
+}
+FLOAT_OPS = set(i for i, (name, _) in enumerate(dis._nb_ops) if name in ('NB_TRUE_DIVIDE', 'NB_POWER',
+                                                                            'NB_INPLACE_TRUE_DIVIDE',
+                                                                            'NB_INPLACE_POWER'))
+OPCODES = dict((dis.opmap[name], kind) for name, kind in OPS.items() if name in dis.opmap)
+BINARY_OP = dis.opmap['BINARY_OP']
+DEVICE_CALLS = ('snapshot', 'find_blobs', 'read', 'mean_pooled', 'bytearray', 'to_jpeg', 'copy',
+                'get_statistics', 'get_histogram')
+
+
+class AllocationCounter:
+    # settrace() hook: counts allocating opcodes per (file, line, kind)
+    def __init__(self, roots, exclude):
+        self.roots = roots
+        self.exclude = exclude
+        self.sites = {}
+        self.device = {}
+        self._ours = {}
+
+    def ours(self, code):
+        name = code.co_filename
+        mine = self._ours.get(name)
+        if mine is None:
+            path = os.path.abspath(name)
+            mine = path.startswith(self.roots) and not path.startswith(self.exclude)
+            self._ours[name] = mine
+        return mine
+
+    def count(self, key, table):
+        table[key] = table.get(key, 0) + 1
+
+    def trace(self, frame, event, arg):
+        if event != 'call':
+            return None
+        if self.ours(frame.f_code):
+            frame.f_trace_opcodes = True
+            return self.local
+        caller = frame.f_back
+        if (frame.f_code.co_name in DEVICE_CALLS and caller is not None and self.ours(caller.f_code)
+                and frame.f_code.co_filename.startswith(replay.SHIM_DIR)):
+            self.count(frame.f_code.co_name, self.device)
+        return None
+
+    def local(self, frame, event, arg):
+        if event != 'opcode':
+            return self.local
+        code = frame.f_code
+        op = code.co_code[frame.f_lasti]
+        kind = OPCODES.get(op)
+        if kind is None and op == BINARY_OP and code.co_code[frame.f_lasti + 1] in FLOAT_OPS:
+            kind = 'float'
+        if kind is not None:
+            self.count((os.path.relpath(code.co_filename, replay.REPO_DIR), frame.f_lineno, kind), self.sites)
+        return self.local
+
+
+def loop_pass(path, ns):
+    # The main loop body as a function: `for _ in range(1)` keeps `continue` valid
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    main = next(n for n in tree.body if replay._is_main_loop(n))
+    loop = next(n for n in ast.walk(main) if isinstance(n, ast.While))
+    once = ast.Call(ast.Name('range', ast.Load()), [ast.Constant(1)], [])
+    body = ast.For(target=ast.Name('_', ast.Store()), iter=once, body=loop.body, orelse=[])
+    fn = ast.FunctionDef(name='_loop_pass', args=ast.arguments(posonlyargs=[], args=[], vararg=None, kwonlyargs=[],
+                                                               kw_defaults=[], kwarg=None, defaults=[]),
+                         body=[body], decorator_list=[], returns=None)
+    ast.copy_location(body, loop)
+    ast.copy_location(fn, loop)
+    module = ast.Module(body=[fn], type_ignores=[])
+    ast.fix_missing_locations(module)
+    exec(compile(module, path, 'exec'), ns)
+    return ns['_loop_pass']
+
+
+def prepare(script, recording, args, probe):
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    for name, value in (('WIFI_STREAMING', False), ('GC_PROBE', probe), ('GC_REPORT_FRAMES', 0)):
+        if name in ns:
+            ns[name] = value
+    if 'UartOutput' in ns and 'output' in ns:
+        ns['uart'].irq(handler=None)  # set up by the default responder, would take the requests
+        ns['output'] = ns['UartOutput'](ns['uart'], ns['core'], args.uart, use_irq=False)
+    if probe and 'GcProbe' in ns:
+        ns['gc_probe'] = ns['GcProbe']()
+    ns['print'] = lambda *a, **k: None
+    return ns, loop_pass(script, ns)
+
+
+def run_pass(ns, step, frames):
+    uart = ns.get('uart')
+    for _ in range(frames):
+        if uart is not None:
+            uart.inject(b'r')
+        step()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count heap allocations per frame in a script's main loop.")
+    parser.add_argument('script', help="device script, e.g. obstacle_detection.py or ttk8/ttk8.py")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=5, help="passes before counting")
+    parser.add_argument('--uart', choices=('polled', 'responder', 'push'), default='polled',
+                        help="obstacle_detection.py reply mode")
+    parser.add_argument('--sites', type=int, default=12, help="allocation sites to list")
+    args = parser.parse_args(argv)
+
+    script = os.path.abspath(args.script)
+    replay.install_shims()
+    import utime
+    utime.sleep_ms = lambda ms: None
+    recording = replay.load_recording(args)
+    frames = len(recording) - args.warmup
+
+    ns, step = prepare(script, recording, args, probe=False)
+    ns['print'] = print_counter = PrintCounter()
+    run_pass(ns, step, args.warmup)
+    counter = AllocationCounter(replay.REPO_DIR + os.sep, replay.HOST_DIR + os.sep)
+    print_counter.calls = 0
+    sys.settrace(counter.trace)
+    try:
+        run_pass(ns, step, frames)
+    finally:
+        sys.settrace(None)
+
+    kinds = {}
+    for (_, _, kind), n in counter.sites.items():
+        kinds[kind] = kinds.get(kind, 0) + n
+    if print_counter.calls:
+        kinds['print'] = print_counter.calls
+    total = sum(kinds.values())
+    mode = ' (%s UART)' % args.uart if 'UartOutput' in ns and 'output' in ns else ''
+    print("%s%s: %d frames" % (os.path.relpath(script, replay.REPO_DIR), mode, frames))
+    print("python allocations per frame: %.2f  %s" % (total / frames, ', '.join(
+        '%s %.2f' % (k, n / frames) for k, n in sorted(kinds.items(), key=lambda kv: -kv[1]))))
+    print("device objects per frame:     %.2f  %s" % (sum(counter.device.values()) / frames, ', '.join(
+        '%s %.2f' % (k, n / frames) for k, n in sorted(counter.device.items(), key=lambda kv: -kv[1]))))
+    sites = sorted(counter.sites.items(), key=lambda kv: -kv[1])[:args.sites]
+    for (path, line, kind), n in sites:
+        print("  %-28s %-7s %6.2f/frame" % ('%s:%d' % (path, line), kind, n / frames))
+
+    ns, step = prepare(script, recording, args, probe=True)
+    probe = ns.get('gc_probe')
+    if probe is not None:
+        run_pass(ns, step, args.warmup)
+        probe.reset()
+        run_pass(ns, step, frames)
+        print(probe.summary())
+
+
+class PrintCounter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+
+
+if __name__ == '__main__':
+    main()
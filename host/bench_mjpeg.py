@@ -0,0 +1,257 @@
+# MJPEG streaming with slow browsers: the old blocking server against lib/mjpeg_server.py.
+#
+# ttk8/ttk8.py runs on the shims with every frame padded to --frame-ms (the
+# camera's detection time). Browsers are threads on local sockets that read
+# the multipart stream at a limited rate (small receive buffers, so a slow
+# reader pushes back within a few frames) and check every JPEG they get.
+#
+#   old   one browser, blocking sendall() from the frame loop (the old
+#         wifi_setup/wifi_stream_frame)
+#   new   MjpegServer with a fast browser, a slow one and one that never
+#         reads after its request (disconnected after --stall-ms)
+#
+# Reports the camera fps, and per browser the frames received, their rate,
+# the frames dropped for it by the server and broken frames.
+#
+#   python3 host/bench_mjpeg.py --synthetic 100 --seconds 5 --slow-kbps 8
+
+import argparse
+import os
+import socket
+import threading
+import time
+
+import replay
+
+RCVBUF = 4096
+
+
+def free_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+class Browser(threading.Thread):
+    def __init__(self, port, name, rate=None, read=True):
+        super().__init__(daemon=True)
+        self.server_port = port
+        self.name = name
+        self.rate = rate    # bytes/s, None = as fast as possible
+        self.read = read
+        self.frames = 0
+        self.broken = 0
+        self.closed = False
+        self.first = self.last = None
+        self.port = None
+        self.dropped = None  # frames the server skipped for this browser
+        self.stop = False
+        self.connected = threading.Event()
+
+    def run(self):
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RCVBUF)
+        sock.connect(('127.0.0.1', self.server_port))
+        self.port = sock.getsockname()[1]
+        sock.sendall(b"GET / HTTP/1.1\r\nHost: camera\r\n\r\n")
+        self.connected.set()
+        sock.settimeout(0.1)
+        buf = b''
+        ready = time.perf_counter()
+        header_done = False
+        while not self.stop:
+            if not self.read:
+                time.sleep(0.05)
+                continue
+            if self.rate:
+                # Token bucket, so the rate can be changed while running
+                ahead = ready - time.perf_counter()
+                if ahead > 0:
+                    time.sleep(ahead)
+            try:
+                data = sock.recv(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                data = b''  # reset, e.g. refused with 503
+            if not data:
+                self.closed = True
+                break
+            if self.rate:
+                ready = max(ready, time.perf_counter() - 0.05) + len(data) / self.rate
+            buf += data
+            if not header_done:
+                end = buf.find(b'\r\n\r\n')
+                if end < 0:
+                    continue
+                header_done = True
+                buf = buf[end + 4:]
+            buf = self._parts(buf)
+        sock.close()
+
+    def _parts(self, buf):
+        # Consume complete "--openmv" parts from buf, return the rest
+        while True:
+            end = buf.find(b'\r\n\r\n')
+            if end < 0:
+                return buf
+            length = None
+            for line in buf[:end].split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            if length is None:
+                self.broken += 1
+                return b''
+            if len(buf) < end + 4 + length:
+                return buf
+            jpeg = buf[end + 4:end + 4 + length]
+            if not (jpeg.startswith(b'\xff\xd8') and jpeg.endswith(b'\xff\xd9')):
+                self.broken += 1
+            self.frames += 1
+            self.last = time.perf_counter()
+            if self.first is None:
+                self.first = self.last
+            buf = buf[end + 4 + length:]
+
+    def fps(self):
+        if self.frames < 2:
+            return 0.0
+        return (self.frames - 1) / (self.last - self.first)
+
+
+class OldStream:
+    # The old single-client server: blocking accept, then blocking sendall per frame
+    def __init__(self, port):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, True)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, RCVBUF)
+        s.bind(('127.0.0.1', port))
+        s.listen(5)
+        self.listener = s
+        self.client = None
+
+    def accept(self):
+        from mjpeg_server import RESPONSE
+        client, addr = self.listener.accept()
+        client.settimeout(5.0)
+        client.recv(1024)
+        client.sendall(RESPONSE)
+        self.client = client
+
+    def poll(self):
+        pass
+
+    def send(self, img):
+        # The old wifi_stream_frame()
+        cframe = img.to_jpeg(quality=35, copy=True)
+        header = (
+            "\r\n--openmv\r\n"
+            "Content-Type: image/jpeg\r\n"
+            "Content-Length:" + str(cframe.size()) + "\r\n\r\n"
+        )
+        self.client.sendall(header.encode())
+        self.client.sendall(cframe)
+
+    def close(self):
+        self.client.close()
+        self.listener.close()
+
+
+def camera_loop(ns, stream, seconds, frame_ms):
+    core = ns['core']
+    core.stream = stream  # the core's stream output
+    frames = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        start = time.perf_counter()
+        core.detect()
+        frames += 1
+        rest = frame_ms / 1000.0 - (time.perf_counter() - start)
+        if rest > 0:
+            time.sleep(rest)
+    return frames / (time.perf_counter() - t0)
+
+
+def run_old(script, recording, args):
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    port = free_port()
+    stream = OldStream(port)
+    browser = Browser(port, 'slow', args.slow_kbps * 1000)
+    browser.start()
+    stream.accept()
+    try:
+        fps = camera_loop(ns, stream, args.seconds, args.frame_ms)
+    except socket.timeout:
+        fps = None  # sendall() gave up, the old script stops here
+    browser.stop = True
+    browser.join()
+    stream.close()
+    return fps, [browser]
+
+
+def run_new(script, recording, args):
+    from mjpeg_server import MjpegServer
+    from stream_stage import StreamStage
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    port = free_port()
+    server = MjpegServer(port, max_clients=3, stall_ms=args.stall_ms).start('127.0.0.1')
+    server._listener.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, RCVBUF)  # inherited by clients
+    browsers = [Browser(port, 'fast'), Browser(port, 'slow', args.slow_kbps * 1000),
+                Browser(port, 'stalled', read=False)]
+    for b in browsers:
+        b.start()
+        b.connected.wait()
+    extra = Browser(port, 'extra')  # over max_clients, refused
+    extra.start()
+    fps = camera_loop(ns, ns['MjpegOutput'](StreamStage(server)), args.seconds, args.frame_ms)  # stream every frame
+    dropped = dict((int(name.rsplit(':', 1)[1]), total) for name, _, _, _, total in server.stats())
+    for b in browsers:
+        b.dropped = dropped.get(b.port)
+    server.close()
+    for b in browsers + [extra]:
+        b.stop = True
+        b.join()
+    return fps, browsers, server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the blocking and the non-blocking MJPEG server.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--frame-ms', type=float, default=40.0, help="camera time per frame")
+    parser.add_argument('--slow-kbps', type=float, default=8.0, help="read rate of the slow browser, kB/s")
+    parser.add_argument('--stall-ms', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, 'ttk8', 'ttk8.py')
+    recording = replay.load_recording(args)
+    recording.loop = True
+    target = 1000.0 / args.frame_ms
+
+    fps, browsers = run_old(script, recording, args)
+    print("old (blocking, one browser): camera %s fps of %.1f" % ('%.1f' % fps if fps else 'STOPPED', target))
+    print("  %-8s %6s %6s %7s %6s" % ('browser', 'frames', 'fps', 'dropped', 'broken'))
+    for b in browsers:
+        print("  %-8s %6d %6.1f %7s %6d" % (b.name, b.frames, b.fps(), '-', b.broken))
+
+    fps, browsers, server = run_new(script, recording, args)
+    print("new (non-blocking, %d browsers): camera %.1f fps of %.1f, %d encoded, %d stalled, %d refused" % (
+        len(browsers), fps, target, server.encoded, server.stalled, server.refused))
+    print("  %-8s %6s %6s %7s %6s" % ('browser', 'frames', 'fps', 'dropped', 'broken'))
+    for b in browsers:
+        print("  %-8s %6d %6.1f %7s %6d %s" % (b.name, b.frames, b.fps(),
+                                              b.dropped if b.dropped is not None else '-', b.broken,
+                                              'disconnected' if b.dropped is None else ''))
+    failed = (fps < 0.8 * target or server.refused != 1 or server.stalled != 1 or
+              any(b.broken for b in browsers) or browsers[0].frames == 0 or browsers[1].frames == 0)
+    raise SystemExit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Benchmark: motion-gated frame skipping on a moving and on a parked scene.
+#
+# Replays frames with the motion gate off and on and reports fps, the skip ratio,
+# the detection time the gate estimates it saved and how often the outputs
+# match. With --synthetic a parked sequence (speed 0) and an empty corridor
+# (parked, no objects: every result is (0, 0, 0)) are run as well.
+#
+# Fails when the gate loses a result: a frame where detecting every frame
+# gives the robot a distance and the gated run gives (0, 0, 0), e.g. a
+# target-less first detection reused while the tracker confirms its target.
+#
+#   python3 host/bench_motion.py --synthetic 200
+#   python3 host/bench_motion.py --frames path/to/recording
+
+import argparse
+import os
+import sys
+
+import replay
+from recording import Recording
+
+
+def compare(script, recording, label, failed):
+    gate = {}
+
+    def off(ns):
+        ns['core'].motion_gate = None
+
+    def on(ns):
+        ns['core'].motion_gate = gate['g'] = ns['motion_gate']
+
+    plain = replay.run(script, recording, setup=off)
+    gated = replay.run(script, recording, setup=on)
+    print("%s:" % label)
+    print("  " + gate['g'].summary())
+    if plain.results and plain.results[0] is not None:
+        # Reused frames do not feed the smoother, so small deviations are expected
+        same = sum(1 for a, b in zip(plain.results, gated.results) if a == b)
+        worst = [max(abs(a[i] - b[i]) for a, b in zip(plain.results, gated.results)) for i in range(3)]
+        lost = sum(1 for a, b in zip(plain.results, gated.results) if a[2] and not b[2])
+        print("  identical output: %d of %d frames, max deviation offset/width/distance %s mm" % (
+            same, len(plain.results), worst))
+        print("  results lost by the gate: %d" % lost)
+        if lost:
+            failed.append("%s: %d frames without the result detecting every frame gives" % (label, lost))
+    print("  fps: every frame %.1f, gated %.1f (x%.2f)" % (plain.fps(), gated.fps(), gated.fps() / plain.fps()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure motion-gated frame skipping.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    failed = []
+    if args.frames:
+        compare(script, Recording.load(args.frames), args.frames, failed)
+    else:
+        compare(script, Recording.synthetic(args.synthetic, seed=args.seed), "moving", failed)
+        compare(script, Recording.synthetic(args.synthetic, seed=args.seed, speed=0), "parked", failed)
+        compare(script, Recording.synthetic(args.synthetic, seed=args.seed, objects=0, speed=0), "empty", failed)
+    for failure in failed:
+        print("FAIL:", failure)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
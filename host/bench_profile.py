@@ -0,0 +1,226 @@
+# Per-stage timings from the built-in stage profiler (lib/stage_profiler.py).
+#
+# Runs a script's main loop body (as host/bench_gc.py does) over a synthetic
+# recording made of scenes, and reads the profiler back the way it is read in
+# production after each scene:
+#
+#   obstacle_detection.py   a b's' request on the UART (polled mode, answered
+#                           by UartOutput.poll_request(); --uart responder:
+#                           UartResponder)
+#   ttk8/ttk8.py            GET /metrics on the stream server, while a browser
+#                           watches the stream (host/shims/network.py link)
+#
+# Scenes: `base` (2 objects), `clutter` (--clutter objects, scene complexity)
+# and `dim` (the base scene at --dim brightness, lighting). The profiler is
+# reset between scenes; the table shows the mean us per frame of every stage
+# and marks the stage that grew most against the base scene, then the cost
+# of the profiler's own marks per frame.
+#
+#   python3 host/bench_profile.py obstacle_detection.py --frames-per-scene 60
+#   python3 host/bench_profile.py ttk8/ttk8.py --frames-per-scene 60
+
+import argparse
+import os
+import re
+import threading
+import time
+import urllib.request
+
+import replay
+from bench_gc import loop_pass
+from bench_mjpeg import Browser, free_port
+
+ROW = re.compile(r'^(\w+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)$')
+SUM = re.compile(r'^openmv_stage_seconds_(sum|count)\{stage="(\w+)"\} ([0-9.]+)$')
+
+
+def scenes(n, clutter, dim, seed):
+    from recording import Recording
+    base = Recording.synthetic(n, seed=seed)
+    busy = Recording.synthetic(n, seed=seed, objects=clutter)
+    scale = bytes(int(v * dim) for v in range(256))
+    dark = [f.translate(scale) for f in base.frames]
+    return (('base', base.frames, base.distances), ('clutter', busy.frames, busy.distances),
+            ('dim', dark, base.distances))
+
+
+def parse_report(text):
+    # UART report -> {stage: mean us}
+    out = {}
+    for line in text.splitlines():
+        m = ROW.match(line.strip())
+        if m:
+            out[m.group(1)] = int(m.group(3))
+    return out
+
+
+def parse_metrics(text):
+    # Prometheus text -> {stage: mean us}
+    sums = {}
+    counts = {}
+    for line in text.splitlines():
+        m = SUM.match(line)
+        if m:
+            (sums if m.group(1) == 'sum' else counts)[m.group(2)] = float(m.group(3))
+    return dict((k, int(sums[k] * 1e6 / counts[k])) for k in counts if counts[k])
+
+
+class Camera:
+    # A script with its main loop body as a function, fed from a frame list
+    def __init__(self, script, args, frames, profile=True):
+        from recording import Recording
+        self.recording = Recording(frames, [0])
+        self.ns = ns = replay.load_script(script, self.recording)
+        ns['print'] = lambda *a, **k: None
+        for name, value in (('GC_PROBE', False), ('PROFILE', profile)):
+            ns[name] = value
+        profiler = ns['profiler'] if profile else None
+        ns['core'].profiler = profiler
+        self.uart = self.output = None
+        if 'UartOutput' in ns and 'output' in ns:
+            self.uart = ns['uart']
+            self.uart.irq(handler=None)
+            ns['output'] = self.output = ns['UartOutput'](self.uart, ns['core'], args.uart, use_irq=False,
+                                                          commands={b's': ns['profiler'].report})
+            if self.output.responder is not None:
+                self.output.responder.idle = lambda ms: None  # the loop's sleep
+        self.link = None
+        self.browser = None
+        if 'WIFI_STREAMING' in ns:
+            ns['WIFI_PORT'] = self.port = free_port()
+            self.link = ns['wifi_setup'](ns['WIFI_NAME'], ns['WIFI_KEY'])
+            self.link.host = '127.0.0.1'
+            ns['wifi_stream'] = self.link
+            ns['core'].stream = ns['MjpegOutput'](self.link, profiler)
+        self.step = loop_pass(script, ns)
+
+    def rewind(self, frames, distances, loop=False):
+        self.recording.frames = frames
+        self.recording.distances = distances
+        self.recording.loop = loop
+        self.recording.rewind()
+        self.ns['tof'].cleared = -1  # the shim numbers ToF measurements by frame
+
+    def play(self, frames, distances):
+        self.rewind(frames, distances)
+        start = time.perf_counter()
+        for _ in frames:
+            if self.uart is not None:
+                self.uart.inject(b'r')
+            self.step()
+            if self.output is not None and self.output.responder is not None:
+                self.output.responder.service()
+        return len(frames) / (time.perf_counter() - start)
+
+    def connect(self, frames, distances):
+        # Wait for the link, then start a browser on the stream
+        self.rewind(frames, distances, loop=True)
+        while not self.ns['wifi_up']:
+            self.step()
+            time.sleep(0.01)
+        self.browser = Browser(self.port, 'browser')
+        self.browser.start()
+        while not self.browser.frames:
+            self.step()
+        self.recording.loop = False
+
+    def read_uart(self):
+        self.uart.tx.clear()
+        self.uart.inject(b's')
+        if self.output.responder is not None:
+            self.output.responder.service()
+        else:
+            self.output.poll_request()
+        text = bytes(self.uart.tx).decode()
+        return text, parse_report(text)
+
+    def read_http(self):
+        box = []
+        url = 'http://127.0.0.1:%d/metrics' % self.port
+        fetch = threading.Thread(target=lambda: box.append(urllib.request.urlopen(url, timeout=5).read()),
+                                 daemon=True)
+        fetch.start()
+        self.recording.loop = True
+        while fetch.is_alive():
+            self.step()  # the server answers from poll() in the frame loop
+        self.recording.loop = False
+        text = box[0].decode()
+        return text, parse_metrics(text)
+
+    def read(self):
+        return self.read_http() if self.link is not None else self.read_uart()
+
+    def close(self):
+        if self.browser is not None:
+            self.browser.stop = True
+        if self.link is not None:
+            self.link.server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage timings from the built-in stage profiler, per scene.")
+    parser.add_argument('script', help="obstacle_detection.py or ttk8/ttk8.py")
+    parser.add_argument('--frames-per-scene', type=int, default=60)
+    parser.add_argument('--clutter', type=int, default=8, help="objects in the cluttered scene")
+    parser.add_argument('--dim', type=float, default=0.45, help="brightness of the dim scene")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--uart', choices=('polled', 'responder'), default='polled')
+    parser.add_argument('--show', action='store_true', help="print the raw report of every scene")
+    args = parser.parse_args(argv)
+
+    script = os.path.abspath(args.script)
+    replay.install_shims()
+    import utime
+    utime.sleep_ms = lambda ms: None
+    plan = scenes(args.frames_per_scene, args.clutter, args.dim, args.seed)
+
+    camera = Camera(script, args, plan[0][1])
+    if camera.link is not None:
+        camera.connect(plan[0][1], plan[0][2])
+    means = []
+    for name, frames, distances in plan:
+        camera.ns['profiler'].reset()
+        fps = camera.play(frames, distances)
+        text, stages = camera.read()
+        means.append((name, fps, stages))
+        if args.show:
+            print('--- %s (%s)' % (name, 'GET /metrics' if camera.link else "b's'"))
+            print(text)
+    camera.close()
+
+    source = 'GET /metrics' if camera.link is not None else "UART b's' (%s)" % args.uart
+    print("%s via %s, %d frames per scene; mean us per frame" % (
+        os.path.relpath(script, replay.REPO_DIR), source, args.frames_per_scene))
+    names = [n for n in camera.ns['profiler'].stages + ('total',) if any(n in s for _, _, s in means)]
+    print("%-10s" % 'stage' + ''.join("%10s" % name for name, _, _ in means))
+    for stage in names:
+        print("%-10s" % stage + ''.join("%10s" % s.get(stage, '-') for _, _, s in means))
+    print("%-10s" % 'fps' + ''.join("%10.1f" % fps for _, fps, _ in means))
+    base = means[0][2]
+    for name, _, stages in means[1:]:
+        growth = dict((k, v - base.get(k, 0)) for k, v in stages.items() if k != 'total')
+        worst = max(growth, key=growth.get)
+        total = stages.get('total', 0) - base.get('total', 0)
+        if growth[worst] > 0:
+            print("%s: %s grew most (%+d us/frame, total %+d)" % (name, worst, growth[worst], total))
+        else:
+            print("%s: no stage grew (total %+d us/frame)" % (name, total))
+
+    # Cost of the marks themselves: begin(), one lap per stage, end()
+    profiler = camera.ns['profiler']
+    laps = len(profiler.stages)
+    runs = 2000
+    start = time.perf_counter()
+    for _ in range(runs):
+        profiler.begin()
+        for stage in range(laps):
+            profiler.lap(stage)
+        profiler.end()
+    cost = (time.perf_counter() - start) * 1e6 / runs
+    frame = means[0][2].get('total', 0)
+    print("profiler cost: %.1f us per frame with %d laps (%.1f %% of the base frame on this host)" % (
+        cost, laps, 100.0 * cost / frame if frame else 0.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# Runtime profiles (lib/vision/profiles.py) switched the way the robot does.
+#
+# Runs obstacle_detection.py's main loop body (as host/bench_gc.py does,
+# with its real loop sleep) in responder mode and talks to it over the UART
+# stand-in: b'0' + index selects a profile, b'?' reads the status back. For
+# every profile in the script's PROFILES:
+#
+#   switch      the status reply to the select byte, and the passes and
+#               time until the status shows it active (the switch runs
+#               between frames, the script is never restarted)
+#   fps         loop fps as measured by the bench and as reported in the
+#               status reply, and the detection time per frame without the
+#               sleep over the compared frames (later passes may find no
+#               fresh ToF sample and skip detection)
+#   accuracy    the same recorded frames in every profile: frames with a
+#               target, and the mean deviation of the mm result from the
+#               first profile (the reference)
+#
+# Then it switches through every profile and back to the first, and checks
+# that the settings scaled with the frame size are restored.
+#
+# Absolute fps are host fps (the shim find_blobs is pure Python); the sleep
+# and the ratio between profiles are what carries over.
+#
+#   python3 host/bench_profiles.py --synthetic 60 --seconds 3
+
+import argparse
+import os
+import struct
+import sys
+import time
+
+import replay
+from bench_gc import loop_pass
+
+
+def command(ns, byte):
+    # Send a request byte and read the '<hhh' status reply: active, requested, fps x 10
+    uart = ns['uart']
+    del uart.tx[:]
+    uart.inject(byte)
+    ns['output'].responder.service()
+    return struct.unpack('<hhh', bytes(uart.tx[:6]))
+
+
+def select(ns, index):
+    return command(ns, bytes((ord('0') + index,)))
+
+
+def prepare(script, recording):
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    ns['print'] = lambda *a, **k: None
+    for name, value in (('PROFILE', False), ('GC_PROBE', False), ('RECORDER', False)):
+        ns[name] = value
+    core = ns['core']
+    core.profiler = None
+    ns['uart'].irq(handler=None)
+    profiles = ns['profiles']
+    ns['output'] = ns['UartOutput'](ns['uart'], core, 'responder', use_irq=False,
+                                    commands=profiles.commands())
+    return ns, loop_pass(script, ns)
+
+
+def pixel_state(core):
+    # Everything set_frame() scales
+    return (core.full_roi, core.focal_px, core.max_pixels, core.tracker and core.tracker.max_jump,
+            core.tracker and core.tracker.max_pixels, core.roi_search and core.roi_search.rois,
+            core.tof_zones and (core.tof_zones.fov_px, core.tof_zones.x0, core.tof_zones.x1))
+
+
+def round_trip(script, recording):
+    # Every profile and back to the first one: the scaled settings must match the start
+    ns, step = prepare(script, recording)
+    core = ns['core']
+    profiles = ns['profiles']
+    before = pixel_state(core)
+    for index in list(range(1, len(profiles.profiles))) + [0]:
+        select(ns, index)
+        step()
+    return pixel_state(core) == before and profiles.switches == len(profiles.profiles)
+
+
+def run_profile(script, recording, args, index):
+    ns, step = prepare(script, recording)
+    core = ns['core']
+    profiles = ns['profiles']
+    row = {'name': profiles.profiles[index].name}
+
+    # Select it like the robot: the reply comes at once, the switch after the frame
+    row['reply'] = select(ns, index)
+    start = time.perf_counter()
+    passes = 0
+    while profiles.index != index:
+        step()
+        passes += 1
+    row['switch_passes'] = passes
+    row['switch_ms'] = (time.perf_counter() - start) * 1000.0
+    row['size'] = '%dx%d' % (ns['sensor'].width(), ns['sensor'].height())
+
+    results = []
+    detect_s = [0.0]
+    detect = core.detect
+
+    def timed_detect():
+        if len(results) == len(recording):
+            return detect()
+        t = time.perf_counter()
+        result = detect()
+        detect_s[0] += time.perf_counter() - t
+        results.append(tuple(result))
+        return result
+    core.detect = timed_detect
+    recording.rewind()
+    frames = 0
+    start = time.perf_counter()
+    while len(results) < len(recording) or time.perf_counter() - start < args.seconds:
+        step()
+        frames += 1
+    elapsed = time.perf_counter() - start
+    row['fps'] = frames / elapsed
+    row['detect_ms'] = detect_s[0] * 1000.0 / len(results)
+    row['status'] = command(ns, b'?')
+    row['results'] = results
+    return row
+
+
+def deviation(results, reference):
+    # Frames with a target in both, mean |delta| of offset and width in mm
+    pairs = [(r, q) for r, q in zip(results, reference) if r[2] and q[2]]
+    if not pairs:
+        return 0, None, None
+    n = len(pairs)
+    return (n, sum(abs(r[0] - q[0]) for r, q in pairs) / n, sum(abs(r[1] - q[1]) for r, q in pairs) / n)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Switch obstacle_detection.py's profiles over the UART.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=3.0, help="run time per profile (fps window)")
+    args = parser.parse_args(argv)
+
+    replay.install_shims()
+    recording = replay.load_recording(args)
+    recording.loop = True
+    script = os.path.join(replay.REPO_DIR, 'obstacle_detection.py')
+    ns = replay.load_script(script, recording)
+    count = len(ns['PROFILES'])
+
+    rows = [run_profile(script, recording, args, i) for i in range(count)]
+    reference = rows[0]['results']
+    print("%-3s %-10s %-8s %-12s %7s %9s %9s %11s %10s %8s %10s %10s" % (
+        '#', 'profile', 'size', 'reply', 'passes', 'switch_ms', 'loop_fps', 'status_fps', 'detect_ms',
+        'targets', 'd_offset', 'd_width'))
+    failed = []
+    for i, row in enumerate(rows):
+        n, d_offset, d_width = deviation(row['results'], reference)
+        active, requested, fps10 = row['status']
+        print("%-3d %-10s %-8s %-12s %7d %9.1f %9.1f %11.1f %10.2f %8d %10s %10s" % (
+            i, row['name'], row['size'], '%d,%d,%d' % row['reply'], row['switch_passes'], row['switch_ms'],
+            row['fps'], fps10 / 10.0, row['detect_ms'], sum(1 for r in row['results'] if r[2]),
+            '-' if d_offset is None else '%.1f' % d_offset, '-' if d_width is None else '%.1f' % d_width))
+        if active != i or requested != i:
+            failed.append("profile %d: status reports %d (requested %d)" % (i, active, requested))
+        if row['switch_passes'] > 1:
+            failed.append("profile %d: switched after %d passes" % (i, row['switch_passes']))
+    print("reply = active, requested, fps x 10 when the select byte arrived; d_offset / d_width = mean "
+          "|mm| deviation from profile 0 on frames where both found a target")
+    same = round_trip(script, recording)
+    print("round trip through every profile and back: pixel settings %s" % ('restored' if same else 'DIFFER'))
+    if not same:
+        failed.append("pixel settings differ after switching back to profile 0")
+    for failure in failed:
+        print("FAIL:", failure)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+# Benchmark: full-frame detection vs the coarse-to-fine pyramid.
+#
+# Replays the same frames through a script with the full-frame search (the
+# detector the scripts use by default) and with lib/vision/pyramid.py at each
+# --factors downscale. The tracker, ROI search and motion gate are off in
+# every run, so each frame runs one detection and the target selection rule
+# is the same. Reports the stage times and fps per run, then per factor:
+# how often the pyramid refined, fell back to the full frame or missed at the
+# coarse level, frames with a target, identical results, and the mean |mm|
+# deviation of the x offset and width from the full-frame result on frames
+# where both found a target.
+#
+# The downscale (draw_image) is counted in `select` on the host; numpy makes
+# it a C loop as on the camera. find_blobs is pure Python in the shim, its
+# time scales with the pixels scanned like the camera's.
+#
+#   python3 host/bench_pyramid.py --synthetic 300
+#   python3 host/bench_pyramid.py --frames path/to/recording --factors 2 4 --margin 8
+
+import argparse
+import os
+
+import replay
+
+
+def deviation(results, reference):
+    # Frames with a target in both, mean |delta| of offset and width in mm
+    pairs = [(r, q) for r, q in zip(results, reference) if r[2] and q[2]]
+    if not pairs:
+        return 0, None, None
+    n = len(pairs)
+    return (n, sum(abs(r[0] - q[0]) for r, q in pairs) / n, sum(abs(r[1] - q[1]) for r, q in pairs) / n)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare full-frame and coarse-to-fine detection.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--factors', type=int, nargs='+', default=[2, 4], help="coarse downscale factors")
+    parser.add_argument('--margin', type=int, default=8, help="refinement margin in full-size pixels")
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    recording = replay.load_recording(args)
+    search = {}
+
+    def setup(factor):
+        def configure(ns):
+            core = ns['core']
+            core.tracker = None
+            core.roi_search = None
+            core.motion_gate = None
+            core.pyramid = search[factor] = (ns['PyramidSearch'](ns['sensor'], factor, args.margin)
+                                             if factor else None)
+        return configure
+
+    full = replay.run(script, recording, setup=setup(0))
+    print(full.format())
+    runs = []
+    for factor in args.factors:
+        report = replay.run(script, recording, setup=setup(factor))
+        runs.append((factor, report))
+        print()
+        print(report.format())
+        print(search[factor].summary())
+
+    print()
+    print("%-10s %9s %10s %8s %10s %10s %10s" % ('search', 'fps', 'find_us', 'targets', 'identical',
+                                                  'd_offset', 'd_width'))
+    reference = full.results
+    for name, report in [('full', full)] + [('1/%d' % f, r) for f, r in runs]:
+        n, d_offset, d_width = deviation(report.results, reference)
+        find_us = sum(report.samples['find_blobs']) / (len(report.samples['find_blobs']) or 1)
+        print("%-10s %9.1f %10.0f %8d %10d %10s %10s" % (
+            name, report.fps(), find_us, sum(1 for r in report.results if r[2]),
+            sum(1 for a, b in zip(report.results, reference) if a == b),
+            '-' if d_offset is None else '%.1f' % d_offset, '-' if d_width is None else '%.1f' % d_width))
+    print("of %d frames; d_offset / d_width = mean |mm| deviation from the full-frame result" % len(reference))
+    for factor, report in runs:
+        print("fps: full frame %.1f, pyramid 1/%d %.1f (x%.2f)" % (
+            full.fps(), factor, report.fps(), report.fps() / full.fps()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# Flight recorder (lib/flight_recorder.py) in obstacle_detection.py's main loop.
+#
+# Runs the main loop body (as host/bench_gc.py does) with RECORDER on into a
+# temporary directory, then reads the logs back with host/flight_log.py:
+#
+#   cost        record() time per frame, and the idle() writes: how many, how
+#               long the longest one took, bytes per frame
+#   allocations heap allocations per frame in the loop, with and without the
+#               recorder (bench_gc's opcode tracer)
+#   round trip  every frame has a record with the result the script returned,
+#               the blobs find_blobs() returned and the distance it used;
+#               every raw frame is the frame before the overlay was drawn,
+#               find_blobs on it with the logged threshold gives the logged
+#               blobs, and the raw frames replay through host/replay.py
+#
+# --max-kb rotates files during the run, --cut cuts the last file short
+# (power loss); both must still parse. With rotation only the recorder's
+# last `files` are kept: the records in them must be the last ones of the
+# run without a gap, and every raw frame flagged in them must be complete.
+#
+#   python3 host/bench_recorder.py --synthetic 200 --frame-every 20
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import replay
+from bench_gc import AllocationCounter, loop_pass
+
+
+def prepare(script, recording, args, folder, on):
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    for name, value in (('PROFILE', False), ('GC_PROBE', False), ('RECORDER', on)):
+        ns[name] = value
+    ns['uart'].irq(handler=None)
+    ns['print'] = lambda *a, **k: None
+    core = ns['core']
+    core.profiler = None
+    ns['output'] = ns['UartOutput'](ns['uart'], core, 'polled', use_irq=False)
+    if on:
+        core.recorder = ns['recorder'] = ns['FlightRecorder'](os.path.join(folder, 'flight'), 320, 240,
+                                                              args.frame_every, max_bytes=args.max_kb * 1024)
+    return ns, loop_pass(script, ns)
+
+
+def run(args, recording, folder):
+    script = os.path.join(replay.REPO_DIR, 'obstacle_detection.py')
+    ns, step = prepare(script, recording, args, folder, True)
+    recorder = ns['recorder']
+    seen = {'results': [], 'blobs': [], 'dist': [], 'frames': []}
+
+    core = ns['core']
+    detect = core.detect
+    find_blobs = core.find_dark_blobs
+    record = recorder.record
+    idle = recorder.idle
+    timing = {'record': 0.0, 'idle': []}
+
+    def find_dark_blobs(img, roi):
+        blobs = find_blobs(img, roi)
+        seen['blobs'][-1] = [(b.x(), b.y(), b.w(), b.h(), b.pixels(), b.cx(), b.cy()) for b in blobs]
+        return blobs
+
+    def detect_obstacles():
+        seen['blobs'].append([])
+        result = detect()
+        seen['results'].append(tuple(result))
+        return result
+
+    def timed_record(img, dist, *rest):
+        seen['frames'].append(bytes(img.bytearray()))
+        seen['dist'].append(dist)
+        start = time.perf_counter()
+        ok = record(img, dist, *rest)
+        timing['record'] += time.perf_counter() - start
+        return ok
+
+    def timed_idle(force=False):
+        start = time.perf_counter()
+        wrote = idle(force)
+        if wrote:
+            timing['idle'].append(time.perf_counter() - start)
+        return wrote
+
+    core.detect = detect_obstacles
+    core.find_dark_blobs = find_dark_blobs
+    recorder.record = timed_record
+    recorder.idle = timed_idle
+    frames = len(recording)
+    for _ in range(frames):
+        ns['uart'].inject(b'r')
+        step()
+    recorder.close()
+    return ns, recorder, seen, timing
+
+
+def allocations(args, recording, folder, on):
+    script = os.path.join(replay.REPO_DIR, 'obstacle_detection.py')
+    ns, step = prepare(script, recording, args, folder, on)
+    for _ in range(5):
+        step()
+    counter = AllocationCounter(replay.REPO_DIR + os.sep, replay.HOST_DIR + os.sep)
+    frames = len(recording) - 5
+    sys.settrace(counter.trace)
+    try:
+        for _ in range(frames):
+            ns['uart'].inject(b'r')
+            step()
+    finally:
+        sys.settrace(None)
+    if on:
+        ns['recorder'].close()
+    return sum(counter.sites.values()) / frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flight recorder cost and log round trip.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--frame-every', type=int, default=20, help="raw frame every N frames (RECORDER_FRAME_EVERY)")
+    parser.add_argument('--max-kb', type=int, default=4096, help="start a new file every N KB")
+    parser.add_argument('--cut', type=int, default=0, metavar='BYTES', help="cut the last file short by N bytes")
+    args = parser.parse_args(argv)
+
+    replay.install_shims()
+    import utime
+    utime.sleep_ms = lambda ms: None
+    import flight_log
+    from flight_recorder import IMAGE_NEXT
+    recording = replay.load_recording(args)
+    folder = tempfile.mkdtemp(prefix='flight')
+    failures = []
+    try:
+        ns, recorder, seen, timing = run(args, recording, folder)
+        n = len(seen['results'])
+        files = sorted(os.path.join(folder, name) for name in os.listdir(folder))
+        size = sum(os.path.getsize(f) for f in files)
+        print("%d frames, %d records, %d dropped, %d raw frames (%d skipped), %d files, %d bytes" % (
+            n, recorder.records, recorder.dropped, recorder.images, recorder.skipped_images, len(files), size))
+        kept = list(flight_log.read_log(files))  # the files the retention left
+        kept_frames = sum(1 for r in kept if isinstance(r, flight_log.Frame))
+        detection_bytes = size - kept_frames * (320 * 240) - len(files) * 5
+        print("log: %.0f bytes per frame without raw frames, %.1f KB per raw frame" % (
+            detection_bytes / max(1, len(kept) - kept_frames),
+            (320 * 240 + (320 * 240 // recorder.chunk + 1) * 15) / 1024.0))
+        idle = timing['idle']
+        print("record(): %.1f us per frame; idle() wrote %d times (log batches and raw frame chunks), "
+              "mean %.0f us, max %.0f us" % (timing['record'] * 1e6 / n, len(idle),
+                                             sum(idle) * 1e6 / max(1, len(idle)), max(idle or [0]) * 1e6))
+        if args.cut:
+            with open(files[-1], 'r+b') as f:
+                f.truncate(max(5, os.path.getsize(files[-1]) - args.cut))
+
+        records = list(flight_log.read_log(files))
+        dets = [r for r in records if isinstance(r, flight_log.Detection)]
+        raw = [r for r in records if isinstance(r, flight_log.Frame)]
+        removed = recorder.index + 1 - len(files)  # files deleted by the `files` retention
+        print("files: %d written, %d kept" % (recorder.index + 1, len(files)))
+        if not args.cut:
+            seqs = [d.seq for d in dets]
+            if not removed and len(dets) != n - recorder.dropped:
+                failures.append("%d records for %d frames" % (len(dets), n))
+            elif removed and not recorder.dropped and (not seqs or seqs != list(range(seqs[0], n + 1))):
+                failures.append("the kept files do not hold the last records without a gap")
+            flagged = sum(1 for d in dets if d.flags & IMAGE_NEXT)
+            if len(raw) != flagged and not recorder.dropped:  # a dropped record may have flagged one
+                failures.append("%d raw frames for %d records flagged with one" % (len(raw), flagged))
+        bad = [d.seq for d in dets if d.result != seen['results'][d.seq - 1]
+               or d.dist != seen['dist'][d.seq - 1]
+               or [tuple(b.values()) for b in d.blobs] != seen['blobs'][d.seq - 1]]
+        if bad:
+            failures.append("%d records differ from the loop (first seq %d)" % (len(bad), bad[0]))
+        bad = [f.seq for f in raw if f.pixels != seen['frames'][f.seq - 1]]
+        if bad:
+            failures.append("%d raw frames differ (first seq %d)" % (len(bad), bad[0]))
+        untouched = sum(1 for f in raw if f.pixels == recording.frames[f.seq - 1])
+        checked, mismatched, _ = flight_log.check(raw, ns['min_pixels'], ns['min_area'])
+        if mismatched:
+            failures.append("find_blobs differs on %d of %d raw frames" % (mismatched, checked))
+        print("round trip: %d records, %d raw frames (%d equal to the recorded input, no overlay), "
+              "find_blobs check %d/%d" % (len(dets), len(raw), untouched, checked - mismatched, checked))
+        print(flight_log.summarize(records))
+        if raw:
+            report = replay.run(os.path.join(replay.REPO_DIR, 'obstacle_detection.py'),
+                                flight_log.recording(files), warmup=0)
+            print("replay of the raw frames: %d frames, %.1f fps on the host" % (
+                len(report.results), report.summary()['fps']))
+
+        print("allocations per frame in the loop: recorder off %.2f, on %.2f" % (
+            allocations(args, recording, folder, False), allocations(args, recording, folder, True)))
+    finally:
+        shutil.rmtree(folder)
+    for failure in failures:
+        print("FAIL:", failure)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
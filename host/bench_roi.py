@@ -0,0 +1,62 @@
+# Benchmark: full-frame detection vs ROI search around the ToF line of sight.
+#
+# Replays the same frames through a script twice, with the ROI search off and on,
+# and reports fps, the fast-path hit rate per ROI level and how often both
+# modes produced the same output. The tracker (which takes precedence over
+# the ROI search) and the motion gate are off in both runs, so every frame
+# runs one detection.
+#
+#   python3 host/bench_roi.py --synthetic 300
+#   python3 host/bench_roi.py --frames path/to/recording --script ttk8/ttk8.py
+
+import argparse
+import os
+
+import replay
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare full-frame and ROI-restricted detection.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    recording = replay.load_recording(args)
+
+    def plain(core):
+        core.tracker = None
+        core.motion_gate = None
+        core.pyramid = None
+
+    def roi_off(ns):
+        plain(ns['core'])
+        ns['core'].roi_search = None
+
+    search = {}
+
+    def roi_on(ns):
+        plain(ns['core'])
+        ns['core'].roi_search = search['roi'] = ns['roi_search']
+
+    full = replay.run(script, recording, setup=roi_off)
+    roi = replay.run(script, recording, setup=roi_on)
+
+    print(full.format())
+    print()
+    print(roi.format())
+    print()
+    print(search['roi'].summary())
+    for level, r in enumerate(search['roi'].rois):
+        print("  level %d roi %s: %d hits" % (level, r, search['roi'].hits[level]))
+    if full.results and full.results[0] is not None:
+        same = sum(1 for a, b in zip(full.results, roi.results) if a == b)
+        print("identical output: %d of %d frames" % (same, len(full.results)))
+    print("fps: full frame %.1f, roi search %.1f (x%.2f)" % (full.fps(), roi.fps(), roi.fps() / full.fps()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Micro-benchmark: list-based moving average vs RingSmoother per-call cost.
+#
+# Runs under CPython, the MicroPython unix port or on the camera (copy it
+# next to lib/smoother.py). The list version is the old
+# average_offset_width_distance_mm buffer; its cost grows with the window,
+# the ring buffer's should stay flat.
+#
+#   python3 host/bench_smoother.py
+#   micropython host/bench_smoother.py
+
+import sys
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(end, start):
+        return end - start
+
+sys.path.append(__file__.rsplit('/', 2)[0] + '/lib' if '/' in __file__ else '../lib')
+from smoother import RingSmoother
+
+CALLS = 5000
+WINDOWS = (5, 10, 20, 50, 100, 200)
+
+
+def list_average(readings, window, x_min, x_max, dist):
+    readings.append((x_min, x_max, dist))
+    if len(readings) == window:
+        x_min = sum(r[0] for r in readings) // window
+        x_max = sum(r[1] for r in readings) // window
+        dist = sum(r[2] for r in readings) // window
+        readings.pop(0)
+    return x_min, x_max, dist
+
+
+def bench_list(window):
+    readings = []
+    t0 = ticks_us()
+    for i in range(CALLS):
+        list_average(readings, window, i & 255, (i & 255) + 40, 500 + (i & 63))
+    return ticks_diff(ticks_us(), t0) * 1000 // CALLS
+
+
+def bench_ring(window):
+    smoother = RingSmoother(window)
+    t0 = ticks_us()
+    for i in range(CALLS):
+        smoother.add(i & 255, (i & 255) + 40, 500 + (i & 63))
+    return ticks_diff(ticks_us(), t0) * 1000 // CALLS
+
+
+def check(window):
+    readings = []
+    smoother = RingSmoother(window)
+    for i in range(3 * window + 7):
+        args = ((i * 37) & 255, ((i * 37) & 255) + 40, 300 + ((i * 11) & 127))
+        if list_average(readings, window, *args) != smoother.add(*args):
+            return False
+    return True
+
+
+print("window  list ns/call  ring ns/call")
+for w in WINDOWS:
+    if not check(w):
+        print("MISMATCH at window", w)
+        sys.exit(1)
+    print("%6d  %12d  %12d" % (w, bench_list(w), bench_ring(w)))
@@ -0,0 +1,129 @@
+# Adaptive stream settings (lib/stream_rate.py) on a link that degrades and recovers.
+#
+# ttk8/ttk8.py streams through lib/mjpeg_server.py to one browser thread
+# (see host/bench_mjpeg.py) whose read rate follows three phases of
+# --phase seconds: --good-kbps, --bad-kbps, --good-kbps again. The same run
+# is made with the quality fixed at STREAM_QUALITY and with the controller.
+#
+# Per phase: the browser's fps, the time each frame took to send (taken by
+# the server to last byte handed to the socket) and the settings at the end
+# of the phase. The stream is responsive when the send time stays near
+# --target-ms in the bad phase.
+#
+# The shim JPEG is a pixel subsample whose size follows the quality like a
+# real encoder's, but it is several times smaller than a real QVGA JPEG.
+# --jpeg-scale repeats its body to get real sizes (frames larger than the
+# socket buffers, as on the camera).
+#
+#   python3 host/bench_stream_rate.py --synthetic 100 --phase 4 --bad-kbps 40
+
+import argparse
+import os
+import socket
+import time
+
+import replay
+from bench_mjpeg import RCVBUF, Browser, free_port
+
+
+def scaled_jpeg(to_jpeg, factor):
+    def padded(self, *args, **kwargs):
+        jpeg = to_jpeg(self, *args, **kwargs)
+        return type(jpeg)(jpeg[:-2] * factor + b'\xff\xd9')
+    return padded
+
+
+def run(script, recording, args, adaptive):
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    from mjpeg_server import MjpegServer
+    from stream_rate import StreamRate
+    from stream_stage import StreamStage
+    quality = ns['STREAM_QUALITY']
+    if adaptive:
+        rate = StreamRate(args.target_ms, quality)
+    else:
+        rate = StreamRate(args.target_ms, quality, qualities=(quality,), scales=(1.0,), max_decimation=1)
+    samples = []
+    sent = rate.sent
+
+    def recorded(client, size, ms, missed=0):
+        samples.append((phase, ms, size))
+        sent(client, size, ms, missed)
+    rate.sent = recorded
+
+    port = free_port()
+    server = MjpegServer(port, rate=rate).start('127.0.0.1')
+    server._listener.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, RCVBUF)
+    browser = Browser(port, 'browser', args.good_kbps * 1000)
+    browser.start()
+    browser.connected.wait()
+    core = ns['core']
+    core.stream = ns['MjpegOutput'](StreamStage(server))  # every frame, the controller decimates
+
+    rows = []
+    for phase, kbps in enumerate((args.good_kbps, args.bad_kbps, args.good_kbps)):
+        browser.rate = kbps * 1000
+        frames0 = browser.frames
+        t0 = time.perf_counter()
+        camera = 0
+        while time.perf_counter() - t0 < args.phase:
+            start = time.perf_counter()
+            core.detect()
+            camera += 1
+            rest = args.frame_ms / 1000.0 - (time.perf_counter() - start)
+            if rest > 0:
+                time.sleep(rest)
+        dt = time.perf_counter() - t0
+        ms = [m for p, m, _ in samples if p == phase]
+        size = [n for p, _, n in samples if p == phase]
+        rows.append((phase, kbps, camera / dt, (browser.frames - frames0) / dt,
+                     replay.percentile(ms, 50), replay.percentile(ms, 90),
+                     sum(size) / len(size) if size else 0, rate.quality, rate.scale, rate.decimation))
+    summary = rate.summary()
+    server.close()
+    browser.stop = True
+    browser.join()
+    return rows, rate, browser, quality, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fixed vs adaptive stream settings on a degrading link.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--phase', type=float, default=4.0, help="seconds per link phase")
+    parser.add_argument('--frame-ms', type=float, default=40.0, help="camera time per frame")
+    parser.add_argument('--good-kbps', type=float, default=400.0, help="browser read rate, kB/s")
+    parser.add_argument('--bad-kbps', type=float, default=40.0)
+    parser.add_argument('--jpeg-scale', type=int, default=8, help="shim JPEG size multiplier")
+    parser.add_argument('--target-ms', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, 'ttk8', 'ttk8.py')
+    replay.install_shims()
+    import image
+    image.Image.to_jpeg = scaled_jpeg(image.Image.to_jpeg, args.jpeg_scale)
+    recording = replay.load_recording(args)
+    recording.loop = True
+    print("%-9s %-5s %7s %7s %8s %8s %8s %8s %7s %5s %5s" % (
+        'mode', 'phase', 'kB/s', 'camera', 'browser', 'p50_ms', 'p90_ms', 'bytes', 'quality', 'scale', 'every'))
+    failed = False
+    for adaptive in (False, True):
+        rows, rate, browser, ns_quality, summary = run(script, recording, args, adaptive)
+        for phase, kbps, camera, fps, p50, p90, size, quality, scale, every in rows:
+            print("%-9s %-5s %7.1f %7.1f %8.1f %8.0f %8.0f %8.0f %7d %5.2f %5d" % (
+                'adaptive' if adaptive else 'fixed', ('good', 'bad', 'good')[phase], kbps, camera, fps,
+                p50, p90, size, quality, scale, every))
+        print("  " + summary + ", %d steps down, %d up, %d broken frames" % (
+            rate.steps_down, rate.steps_up, browser.broken))
+        failed |= browser.broken > 0
+        if adaptive:
+            # Responsive in the bad phase, back to at least the fixed quality afterwards
+            failed |= rows[1][4] > 1.5 * args.target_ms or rows[2][7] < ns_quality
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
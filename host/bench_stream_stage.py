@@ -0,0 +1,101 @@
+# Detection and stream rates with the stream stage (lib/stream_stage.py).
+#
+# ttk8/ttk8.py runs as fast as it can on the shims, with blob detection
+# padded to --work-ms and the JPEG encode padded to --encode-ms for a full
+# QVGA frame (scaled by the pixel count for previews), to model the camera.
+# One browser reads the stream over a local socket (see host/bench_mjpeg.py).
+#
+# For each stream setting: the detection fps, the encoded stream fps and
+# the fps the browser received, against the detection fps without a viewer.
+#
+#   python3 host/bench_stream_stage.py --synthetic 100 --seconds 3 --work-ms 25 --encode-ms 12
+
+import argparse
+import os
+import time
+
+import replay
+from bench_mjpeg import Browser, free_port
+from bench_tof_overlap import pad
+
+SETTINGS = (
+    ('no viewer', None),
+    ('every frame', dict()),
+    ('every 3rd', dict(every=3)),
+    ('budget 25%', dict(budget=0.25)),
+    ('half preview', dict(scale=0.5)),
+    ('budget+preview', dict(budget=0.25, scale=0.5)),
+)
+
+
+def padded_jpeg(to_jpeg, ms):
+    def encode(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        out = to_jpeg(self, *args, **kwargs)
+        rest = ms / 1000.0 * self.width() * self.height() / (320 * 240) - (time.perf_counter() - t0)
+        if rest > 0:
+            time.sleep(rest)
+        return out
+    return encode
+
+
+def run(script, recording, args, setting):
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    from mjpeg_server import MjpegServer
+    from stream_stage import StreamStage
+    core = ns['core']
+    core.motion_gate = None
+    core.ranging = None  # every frame gets a valid distance and a detection
+    core.find_dark_blobs = pad(core.find_dark_blobs, args.work_ms)
+    port = free_port()
+    server = MjpegServer(port).start('127.0.0.1')
+    stream = StreamStage(server, quality=ns['STREAM_QUALITY'], **(setting or {}))
+    browser = None
+    if setting is not None:
+        browser = Browser(port, 'browser')
+        browser.start()
+        browser.connected.wait()
+        while not server.ready():
+            server.poll()
+
+    core.stream = ns['MjpegOutput'](stream)
+    t0 = time.perf_counter()
+    stream.rates()
+    frames0 = browser.frames if browser else 0
+    while time.perf_counter() - t0 < args.seconds:
+        core.detect()
+    detect_fps, stream_fps = stream.rates()
+    received = (browser.frames - frames0) / (time.perf_counter() - t0) if browser else 0.0
+    server.close()
+    if browser:
+        browser.stop = True
+        browser.join()
+    return detect_fps, stream_fps, received, stream.encode_ms
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detection and stream rates with the stream stage settings.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    parser.add_argument('--work-ms', type=float, default=25.0, help="blob detection time per frame")
+    parser.add_argument('--encode-ms', type=float, default=12.0, help="JPEG encode time of a QVGA frame")
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, 'ttk8', 'ttk8.py')
+    replay.install_shims()
+    import image
+    image.Image.to_jpeg = padded_jpeg(image.Image.to_jpeg, args.encode_ms)
+    recording = replay.load_recording(args)
+    recording.loop = True
+    print("%-15s %10s %10s %10s %10s" % ('stream', 'detect_fps', 'stream_fps', 'received', 'encode_ms'))
+    for name, setting in SETTINGS:
+        detect_fps, stream_fps, received, encode_ms = run(script, recording, args, setting)
+        print("%-15s %10.1f %10.1f %10.1f %10.1f" % (name, detect_fps, stream_fps, received, encode_ms))
+
+
+if __name__ == '__main__':
+    main()
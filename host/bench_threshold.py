@@ -0,0 +1,71 @@
+# Benchmark: threshold measured every frame vs the cached threshold engine.
+#
+# Replays the same frames with THRESHOLD_MAX_AGE = 1 (the old behaviour) and
+# with the script's cache settings (and optionally Otsu), and reports fps,
+# cache hit rate, the error of the cached limit against the per-frame limit
+# and how often the outputs match.
+#
+#   python3 host/bench_threshold.py --synthetic 300
+#   python3 host/bench_threshold.py --frames path/to/recording --max-age 20 --bands 8
+
+import argparse
+import os
+
+import replay
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-frame and cached threshold computation.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-age', type=int, help="override THRESHOLD_MAX_AGE")
+    parser.add_argument('--drift', type=int, help="override THRESHOLD_DRIFT")
+    parser.add_argument('--bands', type=int, help="override THRESHOLD_BANDS")
+    parser.add_argument('--otsu', action='store_true', help="use Otsu instead of mean - OFFSET")
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    recording = replay.load_recording(args)
+    engines = {}
+    limits = {'exact': [], 'cached': []}
+
+    def configure(name, **settings):
+        def setup(ns):
+            engine = ns['threshold_engine']
+            for key, value in settings.items():
+                if value is not None:
+                    setattr(engine, key, value)
+            engine.invalidate()
+            engines[name] = engine
+            limit = engine.limit
+
+            def recorded(img, roi):
+                value = limit(img, roi)
+                limits[name].append(value)
+                return value
+            engine.limit = recorded
+        return setup
+
+    exact = replay.run(script, recording, setup=configure('exact', max_age=1, otsu=False))
+    cached = replay.run(script, recording, setup=configure(
+        'cached', max_age=args.max_age, drift=args.drift, bands=args.bands, otsu=args.otsu or None))
+
+    print(exact.format())
+    print()
+    print(cached.format())
+    print()
+    print(engines['cached'].summary())
+    errors = [abs(a - b) for a, b in zip(limits['exact'], limits['cached'])]
+    if errors:
+        print("limit error vs per-frame mean - OFFSET: mean %.2f, max %d grey levels" % (sum(errors) / len(errors), max(errors)))
+    if exact.results and exact.results[0] is not None:
+        same = sum(1 for a, b in zip(exact.results, cached.results) if a == b)
+        print("identical output: %d of %d frames" % (same, len(exact.results)))
+    print("fps: per-frame %.1f, cached %.1f (x%.2f)" % (exact.fps(), cached.fps(), cached.fps() / exact.fps()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Benchmark: serial ToF read vs continuous ranging overlapped with detection.
+#
+# The VL53L1X shim completes a measurement every --ranging-ms of wall time;
+# every frame waits --frame-ms for the sensor and blob detection is padded to
+# --work-ms, to model the camera's speed.
+#
+#   serial      snapshot -> wait for the next measurement -> detect
+#   overlapped  snapshot -> poll -> detect -> poll (lib/tof_ranging.py)
+#
+# Reports the frame time of both orderings and the age of the distance used
+# for each result.
+#
+#   python3 host/bench_tof_overlap.py --synthetic 100 --ranging-ms 50 --frame-ms 15 --work-ms 40
+
+import argparse
+import os
+import time
+
+import replay
+
+
+def pad(fn, ms):
+    # Run fn and sleep for the rest of `ms`
+    def padded(*a):
+        t0 = time.perf_counter()
+        out = fn(*a)
+        rest = ms / 1000.0 - (time.perf_counter() - t0)
+        if rest > 0:
+            time.sleep(rest)
+        return out
+    return padded
+
+
+def run_mode(script, recording, ranging_ms, frame_ms, work_ms, overlapped):
+    ages = []
+
+    def setup(ns):
+        from tof_ranging import ContinuousRanging
+        core = ns['core']
+        core.motion_gate = None
+        ns['tof'].period_ms = ranging_ms
+        ranging = ContinuousRanging(ns['tof'], ns['TOF_MAX_AGE_MS'])
+        core.ranging = ranging if overlapped else None
+        if not overlapped:
+            ns['tof'].read = ranging.read  # the loop stalls until the next measurement
+
+        core.find_dark_blobs = pad(core.find_dark_blobs, work_ms)
+        detect = core.detect
+
+        def exposed():
+            time.sleep(frame_ms / 1000.0)  # frame readout, before snapshot() returns
+            return detect()
+        core.detect = exposed
+
+        measure = core.measure
+
+        def recorded(target, dist):
+            ages.append(ranging.age_ms())
+            return measure(target, dist)
+        core.measure = recorded
+
+    report = replay.run(script, recording, setup=setup)
+    return report, ages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare serial and overlapped ToF ranging in the frame loop.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--ranging-ms', type=int, default=50, help="simulated ToF ranging period")
+    parser.add_argument('--frame-ms', type=float, default=15, help="snapshot time per frame")
+    parser.add_argument('--work-ms', type=float, default=40, help="blob detection time per frame")
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    recording = replay.load_recording(args)
+    rows = []
+    for name, overlapped in (('serial', False), ('overlapped', True)):
+        report, ages = run_mode(script, recording, args.ranging_ms, args.frame_ms, args.work_ms, overlapped)
+        total = report.summary()['stages']['total']
+        tof = report.summary()['stages']['tof']
+        mean_age = sum(ages) / len(ages) if ages else 0.0
+        rows.append(total['mean_us'])
+        print("%-10s: frame %.1f ms (p90 %.1f), tof wait %.1f ms, %.1f fps, %d results, sample age %.1f ms (max %d)" % (
+            name, total['mean_us'] / 1000, total['p90_us'] / 1000, tof['mean_us'] / 1000, report.fps(),
+            len(ages), mean_age, max(ages) if ages else 0))
+    print("latency saved per frame: %.1f ms (%.0f%%)" % ((rows[0] - rows[1]) / 1000,
+                                                         100.0 * (rows[0] - rows[1]) / rows[0] if rows[0] else 0.0))
+
+
+if __name__ == '__main__':
+    main()
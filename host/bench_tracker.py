@@ -0,0 +1,82 @@
+# Benchmark: nearest-to-center selection vs the tracker with hysteresis.
+#
+# Replays frames with TRACKER off and on and counts target switches - frames
+# where the selected target's centroid jumps more than --jump px, i.e. the
+# selection moved to another object - plus the fps of both modes.
+#
+#   python3 host/bench_tracker.py --synthetic 300 --objects 3
+#   python3 host/bench_tracker.py --frames path/to/recording
+
+import argparse
+import os
+
+import replay
+
+
+def count_switches(centers, jump):
+    switches = 0
+    prev = None
+    for c in centers:
+        if c is not None and prev is not None:
+            dx, dy = c[0] - prev[0], c[1] - prev[1]
+            if dx * dx + dy * dy > jump * jump:
+                switches += 1
+        if c is not None:
+            prev = c
+    return switches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count target switches with and without the tracker.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--objects', type=int, default=3, help="objects in the synthetic scene")
+    parser.add_argument('--jump', type=int, default=40, help="centroid jump (px) counted as a switch")
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    if args.frames:
+        recording = replay.load_recording(args)
+    else:
+        from recording import Recording
+        recording = Recording.synthetic(args.synthetic, seed=args.seed, objects=args.objects)
+
+    centers = {'off': [], 'on': []}
+    state = {}
+
+    def recorder(name, fn):
+        def recorded(*a):
+            target = fn(*a)
+            centers[name].append((target.cx(), target.cy()) if target else None)
+            return target
+        return recorded
+
+    def off(ns):
+        core = ns['core']
+        core.tracker = None
+        core.motion_gate = None
+        core.find_target = recorder('off', core.find_target)
+
+    def on(ns):
+        core = ns['core']
+        core.tracker = ns['tracker']
+        core.motion_gate = None
+        state['tracker'] = ns['tracker']
+        ns['tracker'].update = recorder('on', ns['tracker'].update)
+
+    plain = replay.run(script, recording, setup=off)
+    tracked = replay.run(script, recording, setup=on)
+    tracker = state['tracker']
+    print("target switches: nearest-to-center %d, tracker %d (over %d frames)" % (
+        count_switches(centers['off'], args.jump), count_switches(centers['on'], args.jump), len(recording)))
+    print("tracker: %d primary changes, %d track IDs issued" % (tracker.switches, tracker.next_id - 1))
+    print("fps: nearest-to-center %.1f, tracker %.1f" % (plain.fps(), tracked.fps()))
+    print("select stage mean: %.1f us vs %.1f us" % (
+        plain.summary()['stages']['select']['mean_us'], tracked.summary()['stages']['select']['mean_us']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+# Time to resume streaming after the Wi-Fi link drops (lib/wifi_link.py).
+#
+# ttk8/ttk8.py runs on the shims with every frame padded to --frame-ms, and
+# host/shims/network.py models the access point: a join takes --assoc-ms,
+# plus --dhcp-ms without a static IP config. One browser thread reads the
+# stream and reconnects every --retry-ms when it is refused or cut off, as a
+# page reload would. --drops times the access point is switched off for
+# --outage-ms.
+#
+#   old   the script stops on the first socket error. Best case: it is
+#         restarted the moment the access point is back: camera setup
+#         (--init-ms, the sensor warm-up), then wifi_setup()'s blocking join
+#         polled with time.sleep(1), DHCP, listen.
+#   new   the link supervisor rejoins in the background with the cached IP
+#         config and listens again; detection never stops.
+#
+# Reported per drop: time from the access point coming back to the first
+# frame in the browser, and the frames detected during the outage.
+#
+#   python3 host/bench_wifi.py --synthetic 100 --drops 3 --outage-ms 2000
+
+import argparse
+import os
+import threading
+import time
+
+import replay
+from bench_mjpeg import Browser, free_port
+
+
+class ReconnectingBrowser(threading.Thread):
+    # Browser sessions one after another, retrying every retry_ms
+    def __init__(self, port, retry_ms):
+        super().__init__(daemon=True)
+        self.server_port = port
+        self.retry_ms = retry_ms
+        self.frames = []   # perf_counter of every frame received
+        self.sessions = 0
+        self.stop = False
+
+    def run(self):
+        while not self.stop:
+            session = Browser(self.server_port, 'browser')
+            session.stop = False
+            received = [0]
+            parts = session._parts
+
+            def counted(buf):
+                rest = parts(buf)
+                while received[0] < session.frames:
+                    received[0] += 1
+                    self.frames.append(time.perf_counter())
+                return rest
+            session._parts = counted
+            try:
+                self.sessions += 1
+                watch = threading.Thread(target=self._watch, args=(session,), daemon=True)
+                watch.start()
+                session.run()
+            except OSError:
+                pass  # refused: nothing listening
+            time.sleep(self.retry_ms / 1000.0)
+
+    def _watch(self, session):
+        while not session.closed and not self.stop:
+            time.sleep(0.05)
+        session.stop = True
+
+    def first_after(self, t):
+        for f in self.frames:
+            if f >= t:
+                return f
+        return None
+
+
+def detect_until(ns, stream, frame_ms, done, link=False):
+    # Run the camera loop until done() is true; returns the frames detected
+    core = ns['core']
+    core.stream = ns['MjpegOutput'](stream)
+    frames = 0
+    while not done():
+        start = time.perf_counter()
+        core.detect()
+        if link:
+            ns['wifi_service'](stream)
+        frames += 1
+        rest = frame_ms / 1000.0 - (time.perf_counter() - start)
+        if rest > 0:
+            time.sleep(rest)
+    return frames
+
+
+def run_new(script, recording, args, network):
+    recording.rewind()
+    ns = replay.load_script(script, recording)
+    ns['WIFI_PORT'] = port = free_port()
+    ns['print'] = lambda *a, **k: None
+    link = ns['wifi_setup'](ns['WIFI_NAME'], ns['WIFI_KEY'])
+    link.host = '127.0.0.1'
+    browser = ReconnectingBrowser(port, args.retry_ms)
+    browser.start()
+    rows = []
+    detect_until(ns, link, args.frame_ms, lambda: browser.frames, True)
+    boot = link.resume_ms
+    for _ in range(args.drops):
+        detect_until(ns, link, args.frame_ms, lambda: len(browser.frames) >= 10, True)
+        network.drop(args.outage_ms)
+        back = time.perf_counter() + args.outage_ms / 1000.0
+        browser.frames = []
+        detected = detect_until(ns, link, args.frame_ms, lambda: time.perf_counter() >= back, True)
+        detect_until(ns, link, args.frame_ms, lambda: browser.first_after(back) is not None, True)
+        rows.append(((browser.first_after(back) - back) * 1000.0, detected, link.resume_ms, link.stream_ms))
+    browser.stop = True
+    link.server.close()
+    return rows, boot, link
+
+
+def run_old(script, recording, args, network):
+    # Stop at the drop, restart when the access point is back
+    from mjpeg_server import MjpegServer
+    from stream_stage import StreamStage
+    port = free_port()
+    browser = ReconnectingBrowser(port, args.retry_ms)
+    browser.start()
+    rows = []
+    for _ in range(args.drops):
+        network.drop(args.outage_ms)
+        back = time.perf_counter() + args.outage_ms / 1000.0
+        time.sleep(args.outage_ms / 1000.0)
+        browser.frames = []
+        time.sleep(args.init_ms / 1000.0)  # sensor.reset() .. skip_frames(time=500)
+        recording.rewind()
+        ns = replay.load_script(script, recording)
+        wlan = network.WLAN(network.STA_IF)
+        wlan.active(True)
+        wlan.connect(ns['WIFI_NAME'], ns['WIFI_KEY'])
+        while not wlan.isconnected():
+            time.sleep(1)
+        server = MjpegServer(port, max_clients=ns['STREAM_MAX_CLIENTS']).start('127.0.0.1')
+        stage = StreamStage(server, quality=ns['STREAM_QUALITY'])
+        detect_until(ns, stage, args.frame_ms, lambda: browser.first_after(back) is not None)
+        rows.append(((browser.first_after(back) - back) * 1000.0, 0, None, None))
+        server.close()
+    browser.stop = True
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time to resume streaming after a Wi-Fi drop, old and new.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--drops', type=int, default=3)
+    parser.add_argument('--outage-ms', type=int, default=2000)
+    parser.add_argument('--assoc-ms', type=int, default=800, help="scan, authentication and association")
+    parser.add_argument('--dhcp-ms', type=int, default=1500, help="DHCP lease")
+    parser.add_argument('--init-ms', type=int, default=500, help="camera setup on a restart")
+    parser.add_argument('--frame-ms', type=float, default=40.0, help="camera time per frame")
+    parser.add_argument('--retry-ms', type=int, default=200, help="browser reconnect interval")
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, 'ttk8', 'ttk8.py')
+    replay.install_shims()
+    import network
+    network.ap.assoc_ms = args.assoc_ms
+    network.ap.dhcp_ms = args.dhcp_ms
+    recording = replay.load_recording(args)
+    recording.loop = True
+
+    print("access point: join %d ms + DHCP %d ms, outage %d ms, browser retry %d ms" % (
+        args.assoc_ms, args.dhcp_ms, args.outage_ms, args.retry_ms))
+    print("%-5s %4s %12s %14s %10s %10s" % ('mode', 'drop', 'resume_ms', 'outage_frames', 'listen_ms', 'stream_ms'))
+    results = {}
+    for mode in ('old', 'new'):
+        if mode == 'old':
+            rows = run_old(script, recording, args, network)
+        else:
+            rows, boot, link = run_new(script, recording, args, network)
+        for i, (resume, detected, listen, stream) in enumerate(rows):
+            print("%-5s %4d %12.0f %14d %10s %10s" % (mode, i + 1, resume, detected,
+                                                     '-' if listen is None else listen,
+                                                     '-' if stream is None else stream))
+        results[mode] = sum(r[0] for r in rows) / len(rows)
+    print("mean time to resume streaming after the access point is back: old %.0f ms, new %.0f ms" % (
+        results['old'], results['new']))
+    print("new: first join %d ms (DHCP), %d joins; listen/stream_ms count from the loss being noticed" % (
+        boot, link.joins))
+    raise SystemExit(0 if results['new'] < results['old'] else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# Precompile lib/ to .mpy bytecode for the camera, and what it saves.
+#
+# A .py module is lexed, parsed and compiled on the camera at every import:
+# the compiler's parse tree and scopes go on the MicroPython heap next to the
+# frame buffers, and boot waits for it. A .mpy file is bytecode loaded as is.
+# This compiles every module in lib/ (the vision package included) with
+# mpy-cross into --out, mirroring lib/, and reports per module
+#
+#   py / mpy     source and bytecode size in bytes (what the import reads)
+#   compile ms   mpy-cross time on this host, the work the camera skips
+#   heap         the smallest compiler heap (-X heapsize) that compiles it,
+#                bisected: the transient heap a .py import needs on top
+#
+# then the totals over the modules each camera script imports, and the
+# script itself (scripts stay .py, OpenMV runs main.py from source). The heap
+# is measured by a 64-bit host build, where objects and pointers are twice
+# the Nicla's size, so it is an upper bound for the camera. The import time
+# and retained heap on the camera itself are printed by the scripts at start
+# ("imports: ... ms, ... bytes heap"), run them once with lib/ as .py and
+# once with the .mpy files.
+#
+# mpy-cross comes from `pip install mpy-cross==<version>` or a MicroPython
+# build on the PATH; its version must match the firmware's MicroPython (the
+# camera refuses .mpy files of another format). Copy --out to the camera as
+# /lib without the .py files: a .py next to its .mpy is imported first.
+# To freeze the modules into the firmware instead see lib/manifest.py.
+#
+#   python3 host/build_mpy.py
+#   python3 host/build_mpy.py --out /media/NICLA/lib --no-heap
+
+import argparse
+import ast
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(HOST_DIR)
+LIB_DIR = os.path.join(REPO_DIR, 'lib')
+SCRIPTS = ('obstacle_detection.py', os.path.join('ttk8', 'ttk8.py'))
+
+
+def find_mpy_cross():
+    # Command prefix running mpy-cross: the pip package, else the PATH
+    try:
+        import mpy_cross
+    except ImportError:
+        mpy_cross = None
+    if mpy_cross is not None:
+        path = getattr(mpy_cross, 'mpy_cross', None)
+        if path and os.path.exists(path):
+            return [path]
+        return [sys.executable, '-c', 'import sys, mpy_cross; sys.exit(mpy_cross.run(*sys.argv[1:]).wait())']
+    path = shutil.which('mpy-cross')
+    if path:
+        return [path]
+    sys.exit("mpy-cross not found: pip install mpy-cross==<firmware MicroPython version>, "
+             "or put a MicroPython build of mpy-cross on the PATH")
+
+
+def run(command, *args):
+    result = subprocess.run(command + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return result.returncode, (result.stderr or result.stdout).decode(errors='replace').strip()
+
+
+def modules():
+    # lib/ modules by import name, 'vision' for the package's __init__
+    found = {}
+    for folder, dirs, files in os.walk(LIB_DIR):
+        dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+        for name in sorted(files):
+            if not name.endswith('.py') or name == 'manifest.py':
+                continue
+            rel = os.path.relpath(os.path.join(folder, name), LIB_DIR)
+            parts = rel[:-3].split(os.sep)
+            if parts[-1] == '__init__':
+                parts.pop()
+            found['.'.join(parts)] = rel
+    return found
+
+
+def imports(path, known):
+    # lib/ modules a file imports at top level, packages with their __init__
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    found = set()
+    for name in names:
+        parts = name.split('.')
+        for i in range(1, len(parts) + 1):
+            if '.'.join(parts[:i]) in known:
+                found.add('.'.join(parts[:i]))
+    return found
+
+
+def import_set(script, known):
+    # Everything a script loads from lib/, following the modules' own imports
+    pending = imports(script, known)
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name not in seen:
+            seen.add(name)
+            pending |= imports(os.path.join(LIB_DIR, known[name]), known) - seen
+    return sorted(seen)
+
+
+def min_heap(command, src, lo=1024, hi=1 << 16, step=256):
+    # Smallest -X heapsize that compiles src, to `step` bytes
+    while run(command, '-X', 'heapsize=%d' % hi, '-o', os.devnull, src)[0]:
+        lo = hi
+        hi *= 2
+        if hi > 1 << 24:
+            return None
+    while hi - lo > step:
+        mid = (lo + hi) // 2
+        if run(command, '-X', 'heapsize=%d' % mid, '-o', os.devnull, src)[0]:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+
+def measure(command, src, dest, source_name, args):
+    start = time.perf_counter()
+    extra = ['-march=' + args.march] if args.march else []
+    code, err = run(command, *(extra + ['-s', source_name, '-o', dest, src]))
+    ms = (time.perf_counter() - start) * 1e3
+    if code:
+        sys.exit("mpy-cross failed on %s: %s" % (src, err))
+    return {'py': os.path.getsize(src), 'mpy': os.path.getsize(dest), 'ms': ms,
+            'heap': None if args.no_heap else min_heap(command, src)}
+
+
+def row(name, m):
+    heap = '-' if m['heap'] is None else '%d' % m['heap']
+    return "%-26s %7d %7d %6.0f %% %8.1f %9s" % (name, m['py'], m['mpy'], 100.0 * m['mpy'] / m['py'], m['ms'], heap)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile lib/ to .mpy and report sizes and compiler heap.")
+    parser.add_argument('--out', default=os.path.join(REPO_DIR, 'build', 'lib'), help="output directory")
+    parser.add_argument('--march', help="mpy-cross -march (only needed for @native code)")
+    parser.add_argument('--no-heap', action='store_true', help="skip the compiler heap bisection")
+    args = parser.parse_args(argv)
+
+    command = find_mpy_cross()
+    print(run(command, '--version')[1] or "mpy-cross")
+    known = modules()
+    results = {}
+    header = "%-26s %7s %7s %8s %8s %9s" % ('module', 'py', 'mpy', 'ratio', 'ms', 'heap')
+    print(header)
+    for name in sorted(known):
+        rel = known[name]
+        dest = os.path.join(args.out, rel[:-3] + '.mpy')
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        results[name] = m = measure(command, os.path.join(LIB_DIR, rel), dest, rel.replace(os.sep, '/'), args)
+        print(row(name, m))
+
+    print()
+    print("per script: the lib/ modules it imports, and the script itself (.py on the camera)")
+    print(header)
+    with_tmp = os.path.join(args.out, '.script.mpy')
+    for script in SCRIPTS:
+        names = import_set(os.path.join(REPO_DIR, script), known)
+        total = {'py': 0, 'mpy': 0, 'ms': 0.0, 'heap': 0}
+        for name in names:
+            for key in ('py', 'mpy', 'ms'):
+                total[key] += results[name][key]
+            # Modules are compiled one after the other, the largest sets the peak
+            total['heap'] = None if args.no_heap else max(total['heap'], results[name]['heap'])
+        print(row("%s (%d)" % (os.path.basename(script), len(names)), total))
+        own = measure(command, os.path.join(REPO_DIR, script), with_tmp, os.path.basename(script), args)
+        print(row("  script", own))
+        print("  imports: " + ", ".join(names))
+    os.remove(with_tmp)
+    print()
+    print("wrote %d .mpy files to %s" % (len(results), args.out))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,47 @@
+// Host driver for uart_robot/camera_frame.c, used by host/check_frame_decoder.py.
+//
+// Reads a byte stream on stdin, feeds it to the decoder in chunks of
+// argv[1] bytes (like the UARTE DMA buffers) and prints one line per frame,
+// "seq hexpayload", then a "stats ..." line.
+//
+//   gcc -std=c99 -Wall -Wextra -O2 -Iuart_robot host/camera_frame_host.c uart_robot/camera_frame.c
+
+#include <stdio.h>
+#include <stdlib.h>
+
+#include "camera_frame.h"
+
+static void print_frame(uint8_t seq, uint8_t const * p_payload, uint8_t length, void * p_context)
+{
+    (void)p_context;
+    printf("%u ", seq);
+    for (uint8_t i = 0; i < length; i++)
+    {
+        printf("%02x", p_payload[i]);
+    }
+    printf("\n");
+}
+
+int main(int argc, char ** argv)
+{
+    size_t chunk = argc > 1 ? (size_t)atoi(argv[1]) : 12;
+    if (chunk == 0 || chunk > 4096)
+    {
+        fprintf(stderr, "chunk size must be 1..4096\n");
+        return 2;
+    }
+
+    static uint8_t data[4096];
+    camera_frame_decoder_t decoder;
+    camera_frame_decoder_init(&decoder);
+
+    size_t n;
+    while ((n = fread(data, 1, chunk, stdin)) > 0)
+    {
+        camera_frame_feed(&decoder, data, n, print_frame, NULL);
+    }
+    printf("stats frames %u crc_errors %u length_errors %u skipped %u lost %u\n",
+           (unsigned)decoder.frames, (unsigned)decoder.crc_errors, (unsigned)decoder.length_errors,
+           (unsigned)decoder.skipped, (unsigned)decoder.lost);
+    return 0;
+}
@@ -0,0 +1,124 @@
+# Check the framed UART decoder (uart_robot/camera_frame.c) on the host.
+#
+# Builds the C decoder with gcc, encodes a stream of results with
+# lib/uart_frame.py, corrupts some frames (flipped, dropped and inserted
+# bytes, truncated frames, garbage between frames) and checks that the C
+# decoder - fed in DMA sized chunks - and the Python FrameReader return
+# exactly the intact frames, in order. Also reports decoder throughput.
+#
+#   python3 host/check_frame_decoder.py --frames 5000 --corrupt 0.05
+
+import argparse
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import replay
+
+sys.path.insert(0, replay.LIB_DIR)
+from uart_frame import FrameReader, FrameWriter  # noqa: E402
+
+ROBOT_DIR = os.path.join(replay.REPO_DIR, 'uart_robot')
+DRIVER = os.path.join(replay.HOST_DIR, 'camera_frame_host.c')
+
+
+def build(out_dir):
+    exe = os.path.join(out_dir, 'camera_frame_host')
+    cmd = ['gcc', '-std=c99', '-Wall', '-Wextra', '-Werror', '-O2', '-I' + ROBOT_DIR,
+           DRIVER, os.path.join(ROBOT_DIR, 'camera_frame.c'), '-o', exe]
+    subprocess.run(cmd, check=True)
+    return exe
+
+
+def make_stream(n, corrupt, seed):
+    # Returns (stream bytes, expected [(seq, payload)] of the intact frames)
+    rng = random.Random(seed)
+    writer = FrameWriter(None)
+    stream = bytearray()
+    expected = []
+    kinds = {'flip': 0, 'drop': 0, 'insert': 0, 'truncate': 0, 'garbage': 0}
+    for _ in range(n):
+        result = (rng.randrange(-2000, 2000), rng.randrange(0, 2000), rng.randrange(40, 2000))
+        seq = writer.seq
+        frame = bytearray(writer.pack(result))
+        intact = True
+        if rng.random() < corrupt:
+            kind = rng.choice(sorted(kinds))
+            kinds[kind] += 1
+            i = rng.randrange(len(frame))
+            if kind == 'flip':
+                frame[i] ^= 1 << rng.randrange(8)
+                intact = False
+            elif kind == 'drop':
+                del frame[i]
+                intact = False
+            elif kind == 'insert':
+                frame[i:i] = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 4)))
+                intact = i == 0  # in front of the frame it is just garbage
+            elif kind == 'truncate':
+                del frame[i:]
+                intact = False
+            else:
+                stream.extend(bytes(rng.randrange(256) for _ in range(rng.randrange(1, 8))))
+        stream.extend(frame)
+        if intact:
+            expected.append((seq, struct.pack('<hhh', *result)))
+    return bytes(stream), expected, kinds
+
+
+def run_c(exe, stream, chunk):
+    out = subprocess.run([exe, str(chunk)], input=stream, stdout=subprocess.PIPE, check=True).stdout.decode()
+    frames = []
+    stats = ''
+    for line in out.splitlines():
+        if line.startswith('stats'):
+            stats = line
+            continue
+        seq, payload = line.split(' ')
+        frames.append((int(seq), bytes.fromhex(payload)))
+    return frames, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the C frame decoder against corrupted streams.")
+    parser.add_argument('--frames', type=int, default=5000)
+    parser.add_argument('--corrupt', type=float, default=0.05, help="fraction of frames to corrupt")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--chunks', default='1,5,12,64,4096', help="DMA chunk sizes fed to the C decoder")
+    args = parser.parse_args(argv)
+
+    stream, expected, kinds = make_stream(args.frames, args.corrupt, args.seed)
+    print("%d frames, %d bytes, %d intact, corruption %s" % (
+        args.frames, len(stream), len(expected), ', '.join('%s %d' % kv for kv in sorted(kinds.items()))))
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        exe = build(tmp)
+        for chunk in [int(c) for c in args.chunks.split(',')]:
+            frames, stats = run_c(exe, stream, chunk)
+            ok = frames == expected
+            failed |= not ok
+            print("C decoder, chunk %4d: %s (%d frames) - %s" % (chunk, 'ok' if ok else 'MISMATCH', len(frames), stats))
+
+        reader = FrameReader()
+        frames = reader.feed(stream)
+        ok = frames == expected
+        failed |= not ok
+        print("FrameReader:          %s (%d frames) - %s" % ('ok' if ok else 'MISMATCH', len(frames), reader.summary()))
+
+        clean, _, _ = make_stream(100000, 0.0, args.seed)
+        t0 = time.perf_counter()
+        frames, _ = run_c(exe, clean, 4096)
+        dt = time.perf_counter() - t0
+        print("C decoder throughput: %.0f frames/s (incl. process start and printing)" % (len(frames) / dt))
+        t0 = time.perf_counter()
+        n = len(FrameReader().feed(clean[:len(clean) // 10]))
+        print("FrameReader throughput: %.0f frames/s" % (n / (time.perf_counter() - t0)))
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+# Reader for the flight recorder logs written by lib/flight_recorder.py.
+#
+# read_log() is a generator over one or more log files, in order ('-' reads
+# stdin). It reads record by record, so logs of any size can be streamed, and
+# so can a log that is still being copied off the camera. Detection records
+# are yielded as they come. A Frame is yielded once all chunks of a raw frame
+# are in. A cut-off last record (power loss) ends the stream quietly.
+#
+# recording() turns the raw frames and the distance logged with each one into
+# a recording.Recording for the replay tooling: host/replay.py --log and the
+# benches that take a recording. The log format is imported from the device
+# module, so the two cannot drift apart.
+#
+#   python3 host/flight_log.py flight0003.bin            summary
+#   python3 host/flight_log.py flight*.bin --jsonl       one JSON line per record
+#   python3 host/flight_log.py flight*.bin --export DIR  frames + tof.txt + blobs.jsonl
+#   python3 host/flight_log.py flight*.bin --check       find_blobs on the frames vs the log
+#   python3 host/replay.py obstacle_detection.py --log flight0003.bin
+
+import argparse
+import json
+import struct
+import sys
+from collections import namedtuple
+
+import replay
+
+replay.install_shims()
+import flight_recorder as fr  # noqa: E402
+
+TICKS_PERIOD = 1 << 30  # MicroPython ticks_ms() wraps here
+
+Detection = namedtuple('Detection', 'seq ticks_ms dist limit flags result target blobs')
+Frame = namedtuple('Frame', 'seq width height pixels detection')
+
+
+class LogError(ValueError):
+    pass
+
+
+def _read(stream, n):
+    data = stream.read(n)
+    while data and len(data) < n:
+        more = stream.read(n - len(data))
+        if not more:
+            break
+        data += more
+    return data
+
+
+def _records(stream, name):
+    magic = _read(stream, len(fr.MAGIC) + 1)
+    if len(magic) < len(fr.MAGIC) + 1:
+        return
+    if magic[:len(fr.MAGIC)] != fr.MAGIC:
+        raise LogError("%s: not a flight recorder log" % name)
+    if magic[-1] != fr.VERSION:
+        raise LogError("%s: log version %d, this reader knows %d" % (name, magic[-1], fr.VERSION))
+    while True:
+        head = _read(stream, fr.PREFIX_SIZE)
+        if len(head) < fr.PREFIX_SIZE:
+            return
+        kind, length = struct.unpack(fr.PREFIX, head)
+        body = _read(stream, length)
+        if len(body) < length:
+            return  # cut off
+        if kind == fr.TYPE_DETECTION:
+            yield _detection(body)
+        elif kind == fr.TYPE_IMAGE:
+            yield struct.unpack_from(fr.IMAGE, body) + (body[fr.IMAGE_SIZE:],)
+        else:
+            raise LogError("%s: unknown record type 0x%02x" % (name, kind))
+
+
+def _detection(body):
+    (seq, ticks, dist, limit, flags, r0, r1, r2, tid, tx, ty, tw, th,
+     count) = struct.unpack_from(fr.DETECTION, body)
+    blobs = []
+    for i in range(count):
+        x, y, w, h, pixels, cx, cy = struct.unpack_from(fr.BLOB, body, fr.DETECTION_SIZE + i * fr.BLOB_SIZE)
+        blobs.append({'x': x, 'y': y, 'w': w, 'h': h, 'pixels': pixels, 'cx': cx, 'cy': cy})
+    target = None if tid == 0xFF else (tid, tx, ty, tw, th)
+    return Detection(seq, ticks, dist, limit, flags, (r0, r1, r2), target, blobs)
+
+
+def read_log(paths):
+    # Detection records and complete Frames from the files in order; a frame
+    # may continue in the next file (logs written before the recorder kept
+    # frames in one file)
+    pending = {}   # seq -> [pixels, bytes received, width, height]
+    waiting = {}   # seq -> detection whose frame follows
+    for path in paths:
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            for rec in _records(stream, path):
+                if isinstance(rec, Detection):
+                    if rec.flags & fr.IMAGE_NEXT:
+                        waiting[rec.seq] = rec
+                    yield rec
+                    continue
+                seq, width, height, offset, data = rec
+                image = pending.get(seq)
+                if image is None:
+                    if offset:
+                        continue  # its start is in a file not read
+                    image = pending[seq] = [bytearray(width * height), 0, width, height]
+                image[0][offset:offset + len(data)] = data
+                image[1] += len(data)
+                if image[1] >= len(image[0]):
+                    del pending[seq]
+                    yield Frame(seq, width, height, bytes(image[0]), waiting.pop(seq, None))
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+
+def recording(paths, loop=False):
+    # The logged raw frames as a replay recording (frame + logged distance)
+    from recording import Recording
+    frames = []
+    distances = []
+    size = None
+    for rec in read_log(paths):
+        if isinstance(rec, Frame):
+            size = (rec.width, rec.height)
+            frames.append(rec.pixels)
+            distances.append(rec.detection.dist if rec.detection else 0)
+    if not frames:
+        raise LogError("no raw frames in the log (RECORDER_FRAME_EVERY = 0?)")
+    return Recording(frames, distances, size[0], size[1], loop)
+
+
+def _as_json(rec):
+    if isinstance(rec, Frame):
+        return {'frame': rec.seq, 'width': rec.width, 'height': rec.height}
+    out = rec._asdict()
+    out['gated'] = bool(rec.flags & fr.GATED)
+    return out
+
+
+def check(frames, pixels, area):
+    # Run the host find_blobs on every logged frame with the logged threshold
+    import image
+    checked = mismatched = 0
+    first = None
+    for frame in frames:
+        det = frame.detection
+        if det is None or det.flags & (fr.GATED | fr.PARTIAL | fr.TRUNCATED):
+            continue
+        img = image.Image(frame.width, frame.height, frame.pixels)
+        blobs = img.find_blobs([(0, det.limit)], pixels_threshold=pixels, area_threshold=area)
+        got = [(b.x(), b.y(), b.w(), b.h(), b.pixels(), b.cx(), b.cy()) for b in blobs]
+        want = [(b['x'], b['y'], b['w'], b['h'], b['pixels'], b['cx'], b['cy']) for b in det.blobs]
+        checked += 1
+        if got != want:
+            mismatched += 1
+            if first is None:
+                first = frame.seq
+    return checked, mismatched, first
+
+
+def summarize(records):
+    dets = [r for r in records if isinstance(r, Detection)]
+    frames = [r for r in records if isinstance(r, Frame)]
+    if not dets:
+        return "no detection records"
+    lines = []
+    span = steps = gaps = 0
+    sessions = 1
+    for a, b in zip(dets, dets[1:]):
+        if b.seq <= a.seq:
+            sessions += 1  # a new boot
+            continue
+        gaps += b.seq - a.seq - 1
+        steps += b.seq - a.seq
+        span += (b.ticks_ms - a.ticks_ms) % TICKS_PERIOD
+    lines.append("%d records in %d session(s), %d missing (dropped or cut), %.1f s, %.1f fps" % (
+        len(dets), sessions, gaps, span / 1000.0, steps * 1000.0 / span if span else 0.0))
+    gated = sum(1 for d in dets if d.flags & fr.GATED)
+    targets = [d for d in dets if d.target]
+    switches = sum(1 for a, b in zip(targets, targets[1:]) if a.target[0] != b.target[0])
+    lines.append("motion gate reused %d (%.0f %%), target in %d frames, %d target ID changes" % (
+        gated, 100.0 * gated / len(dets), len(targets), switches))
+    dist = sorted(d.dist for d in dets)
+    lines.append("distance mm: min %d, median %d, max %d; zero (stale/invalid) %d" % (
+        dist[0], dist[len(dist) // 2], dist[-1], sum(1 for d in dist if not d)))
+    detected = [d for d in dets if not d.flags & fr.GATED]
+    if detected:
+        counts = [len(d.blobs) for d in detected]
+        limits = sorted(d.limit for d in detected)
+        lines.append("blobs per detection: mean %.1f, max %d, truncated %d; threshold %d..%d" % (
+            sum(counts) / len(counts), max(counts), sum(1 for d in detected if d.flags & fr.TRUNCATED),
+            limits[0], limits[-1]))
+    lines.append("raw frames: %d" % len(frames))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read flight recorder logs (lib/flight_recorder.py).")
+    parser.add_argument('logs', nargs='+', help="log files in order, '-' = stdin")
+    parser.add_argument('--jsonl', action='store_true', help="stream one JSON line per record")
+    parser.add_argument('--export', metavar='DIR', help="write the raw frames as a recording directory")
+    parser.add_argument('--check', action='store_true', help="compare find_blobs on the raw frames with the log")
+    parser.add_argument('--pixels', type=int, default=300, help="pixels_threshold for --check")
+    parser.add_argument('--area', type=int, default=300, help="area_threshold for --check")
+    args = parser.parse_args(argv)
+
+    if args.jsonl:
+        for rec in read_log(args.logs):
+            print(json.dumps(_as_json(rec)))
+        return 0
+    records = list(read_log(args.logs))
+    print(summarize(records))
+    frames = [r for r in records if isinstance(r, Frame)]
+    if args.export and not frames:
+        print("no raw frames to export")
+        return 1
+    if args.export:
+        from recording import Recording
+        Recording([f.pixels for f in frames], [f.detection.dist if f.detection else 0 for f in frames],
+                  frames[0].width, frames[0].height).save(args.export)
+        with open(args.export.rstrip('/') + '/blobs.jsonl', 'w') as f:
+            for frame in frames:
+                f.write(json.dumps(frame.detection.blobs if frame.detection else []) + '\n')
+        print("exported %d frames to %s" % (len(frames), args.export))
+    if args.check:
+        checked, mismatched, first = check(frames, args.pixels, args.area)
+        print("find_blobs check: %d frames, %d mismatched%s" % (
+            checked, mismatched, '' if first is None else ' (first seq %d)' % first))
+        return 1 if mismatched else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
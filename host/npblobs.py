@@ -0,0 +1,218 @@
+# Vectorized NumPy version of OpenMV img.find_blobs() for offline batch processing.
+#
+# Labels a whole stack of grayscale frames, shape (N, H, W), in one call with
+# the same semantics as the shim in host/shims/image.py (and the camera):
+# 4-connected regions per grayscale threshold, pixels_threshold and
+# area_threshold filtering, optional merge=True of overlapping bounding boxes,
+# blobs ordered by their first pixel in scanline order.
+#
+# Run-length labeling: every horizontal run of in-threshold pixels is a node,
+# runs in adjacent rows that share a column are edges, and components are
+# found with vectorized hook-and-compress union-find over all frames at once.
+#
+# Usage (parity check and throughput against the pure-Python shim):
+#   python3 host/npblobs.py --frames path/to/recording [--expect blobs.jsonl]
+#
+# blobs.jsonl holds one line per frame as printed by `print(blobs)` on the
+# camera (OpenMV prints blob lists as JSON).
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from replay import install_shims
+
+install_shims()
+from image import Blob, _merge_blobs  # noqa: E402
+
+BLOB_DTYPE = np.dtype([
+    ('frame', np.int32), ('x', np.int32), ('y', np.int32), ('w', np.int32), ('h', np.int32),
+    ('pixels', np.int64), ('sx', np.int64), ('sy', np.int64), ('code', np.int32),
+])
+
+
+def _runs(mask):
+    # Start/end (inclusive) of every run of True along the last axis.
+    n, h, w = mask.shape
+    padded = np.zeros((n, h, w + 2), dtype=np.int8)
+    padded[:, :, 1:-1] = mask
+    edges = np.diff(padded, axis=2)
+    fs, ys, xa = np.nonzero(edges == 1)
+    _, _, xb = np.nonzero(edges == -1)
+    return fs, ys, xa, xb - 1
+
+
+def _components(fs, ys, xa, xb, h, w):
+    # Union-find over runs. Returns, per run, the index of the first run of its
+    # component; runs come out of np.nonzero in (frame, row, column) order, so
+    # the first run is also the component's first pixel in scanline order.
+    count = len(xa)
+    labels = np.arange(count)
+    if count == 0:
+        return labels
+    row = (fs.astype(np.int64) * h + ys) * (w + 1)
+    end_keys = row + xb
+    start_keys = row + xa
+    above = row - (w + 1)
+    lo = np.searchsorted(end_keys, above + xa, side='left')
+    hi = np.searchsorted(start_keys, above + xb, side='right')
+    hi = np.where(ys == 0, lo, np.maximum(hi, lo))
+    reps = hi - lo
+    a = np.repeat(np.arange(count), reps)
+    b = np.repeat(lo - np.cumsum(np.concatenate(([0], reps[:-1]))), reps) + np.arange(reps.sum())
+    while a.size:
+        la, lb = labels[a], labels[b]
+        differ = la != lb
+        if not differ.any():
+            break
+        a, b, la, lb = a[differ], b[differ], la[differ], lb[differ]
+        np.minimum.at(labels, np.maximum(la, lb), np.minimum(la, lb))
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+    return labels
+
+
+def label_batch(frames, threshold, invert=False, roi=None, pixels_threshold=10, area_threshold=10, code=1):
+    """Blobs of one grayscale threshold over a (N, H, W) uint8 stack.
+
+    Returns a structured array (BLOB_DTYPE) sorted by frame, then scanline
+    order of each blob's first pixel. Merging is not applied here.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 2:
+        frames = frames[None]
+    x0 = y0 = 0
+    if roi is not None:
+        x0, y0, rw, rh = roi
+        x0, y0 = max(0, x0), max(0, y0)
+        frames = frames[:, y0:y0 + rh, x0:x0 + rw]
+    _, h, w = frames.shape
+    lo, hi = sorted(threshold[:2])
+    mask = (frames >= lo) & (frames <= hi)
+    if invert:
+        mask = ~mask
+
+    fs, ys, xa, xb = _runs(mask)
+    labels = _components(fs, ys, xa, xb, h, w)
+    roots, inv = np.unique(labels, return_inverse=True)
+    k = len(roots)
+    n = (xb - xa + 1).astype(np.int64)
+
+    out = np.zeros(k, dtype=BLOB_DTYPE)
+    out['frame'] = fs[roots]
+    minx = np.full(k, w, dtype=np.int64)
+    maxx = np.zeros(k, dtype=np.int64)
+    maxy = np.zeros(k, dtype=np.int64)
+    np.minimum.at(minx, inv, xa)
+    np.maximum.at(maxx, inv, xb)
+    np.maximum.at(maxy, inv, ys)
+    out['x'] = minx + x0
+    out['y'] = ys[roots] + y0
+    out['w'] = maxx - minx + 1
+    out['h'] = maxy - ys[roots] + 1
+    out['pixels'] = np.bincount(inv, weights=n, minlength=k).astype(np.int64)
+    out['sx'] = np.bincount(inv, weights=(xa + xb) * n // 2, minlength=k).astype(np.int64) + x0 * out['pixels']
+    out['sy'] = np.bincount(inv, weights=ys * n, minlength=k).astype(np.int64) + y0 * out['pixels']
+    out['code'] = code
+    keep = (out['pixels'] >= pixels_threshold) & (out['w'] * out['h'] >= area_threshold)
+    return out[keep]
+
+
+def find_blobs_batch(frames, thresholds, invert=False, roi=None, pixels_threshold=10, area_threshold=10,
+                     merge=False, margin=0):
+    """img.find_blobs() for every frame of a (N, H, W) stack.
+
+    Returns one list of Blob objects (same API as on the camera: x(), w(),
+    cx(), pixels(), rect() ...) per frame.
+    """
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim == 2:
+        frames = frames[None]
+    tables = [label_batch(frames, t, invert, roi, pixels_threshold, area_threshold, 1 << i)
+              for i, t in enumerate(thresholds)]
+    table = np.concatenate(tables) if tables else np.zeros(0, dtype=BLOB_DTYPE)
+    # stable sort keeps threshold-by-threshold order inside each frame
+    table = table[np.argsort(table['frame'], kind='stable')]
+    bounds = np.searchsorted(table['frame'], np.arange(len(frames) + 1))
+    rows = table.tolist()
+    out = []
+    for i in range(len(frames)):
+        blobs = [Blob(x, y, w, h, p, sx, sy, code)
+                 for _, x, y, w, h, p, sx, sy, code in rows[bounds[i]:bounds[i + 1]]]
+        if merge:
+            blobs = _merge_blobs(blobs, margin, None)
+        out.append(blobs)
+    return out
+
+
+def _key(blob):
+    if isinstance(blob, dict):
+        return (blob['x'], blob['y'], blob['w'], blob['h'], blob['pixels'], blob['cx'], blob['cy'])
+    return (blob.x(), blob.y(), blob.w(), blob.h(), blob.pixels(), blob.cx(), blob.cy())
+
+
+def main(argv=None):
+    from recording import Recording
+    import image
+
+    parser = argparse.ArgumentParser(description="Check the NumPy find_blobs against the shim and device output.")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--expect', help="device blob lists, one JSON line per frame")
+    parser.add_argument('--threshold', type=int, nargs=2, metavar=('LO', 'HI'),
+                        help="fixed threshold (default: mean - 30 per frame, as the scripts do)")
+    parser.add_argument('--pixels', type=int, default=300, help="pixels_threshold")
+    parser.add_argument('--area', type=int, default=300, help="area_threshold")
+    parser.add_argument('--merge', action='store_true', help="merge=True")
+    args = parser.parse_args(argv)
+
+    rec = Recording.load(args.frames) if args.frames else Recording.synthetic(args.synthetic)
+    stack = np.frombuffer(b''.join(rec.frames), dtype=np.uint8).reshape(len(rec), rec.height, rec.width)
+
+    if args.threshold:
+        groups = {tuple(args.threshold): np.arange(len(rec))}
+    else:
+        limits = np.maximum(0, stack.reshape(len(rec), -1).sum(axis=1) // stack[0].size - 30)
+        groups = dict(((0, int(l)), np.nonzero(limits == l)[0]) for l in np.unique(limits))
+
+    t0 = time.perf_counter()
+    batch = [None] * len(rec)
+    for threshold, idx in groups.items():
+        for i, blobs in zip(idx, find_blobs_batch(stack[idx], [threshold], pixels_threshold=args.pixels,
+                                                  area_threshold=args.area, merge=args.merge)):
+            batch[i] = blobs
+    t_np = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    reference = []
+    for i, threshold in sorted((int(i), t) for t, idx in groups.items() for i in idx):
+        img = image.Image(rec.width, rec.height, rec.frames[i])
+        reference.append(img.find_blobs([threshold], pixels_threshold=args.pixels,
+                                        area_threshold=args.area, merge=args.merge))
+    t_py = time.perf_counter() - t0
+
+    bad = [i for i in range(len(rec)) if [_key(b) for b in batch[i]] != [_key(b) for b in reference[i]]]
+    print("numpy: %d frames in %.3f s (%.0f frames/s)" % (len(rec), t_np, len(rec) / t_np))
+    print("shim:  %d frames in %.3f s (%.0f frames/s)" % (len(rec), t_py, len(rec) / t_py))
+    print("shim mismatches: %d" % len(bad) + ("" if not bad else " (first frame %d)" % bad[0]))
+
+    if args.expect:
+        with open(args.expect) as f:
+            device = [json.loads(line) for line in f if line.strip()]
+        dev_bad = [i for i, blobs in enumerate(device[:len(batch)])
+                   if [_key(b) for b in batch[i]] != [_key(b) for b in blobs]]
+        print("device mismatches: %d of %d" % (len(dev_bad), min(len(device), len(batch))) +
+              ("" if not dev_bad else " (first frame %d)" % dev_bad[0]))
+        bad += dev_bad
+    return 1 if bad else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+// Host driver for uart_robot/obstacle_batch.c, used by host/bench_batch.py.
+//
+// Reads one hex encoded payload per line on stdin and prints the decoded
+// obstacles ("id x width distance area;..." ) or "error N". With a numeric
+// argument it instead decodes the first payload that many times and prints
+// the time per decode.
+//
+//   gcc -std=c99 -Wall -Wextra -O2 -Iuart_robot host/obstacle_batch_host.c uart_robot/obstacle_batch.c
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+
+#include "obstacle_batch.h"
+
+static size_t parse_hex(char const * p_line, uint8_t * p_out, size_t max)
+{
+    size_t n = 0;
+    while (n < max && p_line[0] && p_line[1] && p_line[0] != '\n')
+    {
+        unsigned value;
+        if (sscanf(p_line, "%2x", &value) != 1)
+        {
+            break;
+        }
+        p_out[n++] = (uint8_t)value;
+        p_line += 2;
+    }
+    return n;
+}
+
+int main(int argc, char ** argv)
+{
+    static char line[1024];
+    static uint8_t payload[512];
+    ObstacleBatch batch;
+    long repeat = argc > 1 ? atol(argv[1]) : 0;
+
+    while (fgets(line, sizeof(line), stdin))
+    {
+        size_t n = parse_hex(line, payload, sizeof(payload));
+        if (repeat > 0)
+        {
+            clock_t t0 = clock();
+            volatile int sink = 0;
+            for (long i = 0; i < repeat; i++)
+            {
+                sink += obstacle_batch_decode(payload, n, &batch) + batch.count;
+            }
+            double s = (double)(clock() - t0) / CLOCKS_PER_SEC;
+            printf("%.1f ns per decode\n", 1e9 * s / (double)repeat);
+            return 0;
+        }
+        int err = obstacle_batch_decode(payload, n, &batch);
+        if (err != OBSTACLE_BATCH_OK)
+        {
+            printf("error %d\n", err);
+            continue;
+        }
+        for (uint8_t i = 0; i < batch.count; i++)
+        {
+            Obstacle const * p_ob = &batch.obstacles[i];
+            printf("%s%u %d %u %d %u", i ? ";" : "", p_ob->track_id, p_ob->x_offset_mm, p_ob->width_mm,
+                   p_ob->distance_mm, p_ob->area);
+        }
+        printf("\n");
+    }
+    return 0;
+}
@@ -0,0 +1,182 @@
+# Recorded frames and ToF traces for host-side replay.
+#
+# A recording is a directory of binary PGM (P5) grayscale frames, replayed in
+# file name order, plus an optional tof.txt with one distance in mm per line
+# (line N belongs to frame N). Frames without a ToF line reuse the last one.
+# A line with three values "left,center,right" records per-zone distances for
+# the multi-zone ToF mode (lib/tof_zones.py); distance() is then the center.
+
+import os
+import random
+
+TOF_FILE = 'tof.txt'
+FAR_DISTANCE = 4000  # mm, nothing within range of a ToF zone
+
+
+class EndOfRecording(EOFError):
+    pass
+
+
+def read_pgm(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    fields = []
+    pos = 0
+    while len(fields) < 4:
+        while data[pos:pos + 1].isspace():
+            pos += 1
+        if data[pos:pos + 1] == b'#':
+            pos = data.index(b'\n', pos)
+            continue
+        end = pos
+        while not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[pos:end])
+        pos = end
+    if fields[0] != b'P5' or int(fields[3]) > 255:
+        raise ValueError("%s: only 8-bit binary PGM (P5) is supported" % path)
+    w, h = int(fields[1]), int(fields[2])
+    pixels = data[pos + 1:pos + 1 + w * h]
+    if len(pixels) != w * h:
+        raise ValueError("%s: truncated frame" % path)
+    return pixels, w, h
+
+
+def write_pgm(path, pixels, w, h):
+    with open(path, 'wb') as f:
+        f.write(b'P5\n%d %d\n255\n' % (w, h))
+        f.write(pixels)
+
+
+class Recording:
+    def __init__(self, frames, distances, width=320, height=240, loop=False, zones=None):
+        if not frames:
+            raise ValueError("recording has no frames")
+        self.frames = frames
+        self.zones = zones or None  # per-frame (left, center, right) or None
+        if self.zones and not distances:
+            distances = [z[1] for z in self.zones]
+        self.distances = distances or [0]
+        self.width = width
+        self.height = height
+        self.loop = loop
+        self.index = -1
+
+    def __len__(self):
+        return len(self.frames)
+
+    def rewind(self):
+        self.index = -1
+
+    def next_frame(self):
+        self.index += 1
+        if self.index >= len(self.frames):
+            if not self.loop:
+                raise EndOfRecording("end of recording after %d frames" % len(self.frames))
+            self.index = 0
+        return self.frames[self.index], self.width, self.height
+
+    def distance(self):
+        i = max(0, self.index)
+        return self.distances[min(i, len(self.distances) - 1)]
+
+    def zone_distance(self, zone):
+        if not self.zones:
+            return self.distance()
+        i = max(0, self.index)
+        return self.zones[min(i, len(self.zones) - 1)][zone]
+
+    @classmethod
+    def load(cls, path, loop=False):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith('.pgm'))
+        frames = []
+        width = height = None
+        for name in names:
+            pixels, w, h = read_pgm(os.path.join(path, name))
+            if width is None:
+                width, height = w, h
+            elif (w, h) != (width, height):
+                raise ValueError("%s: frame size %dx%d differs from %dx%d" % (name, w, h, width, height))
+            frames.append(pixels)
+        distances = []
+        zones = []
+        tof_path = os.path.join(path, TOF_FILE)
+        if os.path.exists(tof_path):
+            with open(tof_path) as f:
+                for line in f:
+                    if not line.strip() or line.startswith('#'):
+                        continue
+                    values = [int(v) for v in line.split(',')]
+                    if len(values) == 3:
+                        zones.append(tuple(values))
+                        distances.append(values[1])
+                    else:
+                        distances.append(values[-1])
+        return cls(frames, distances, width, height, loop, zones if len(zones) == len(distances) else None)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for i, pixels in enumerate(self.frames):
+            write_pgm(os.path.join(path, '%06d.pgm' % i), pixels, self.width, self.height)
+        with open(os.path.join(path, TOF_FILE), 'w') as f:
+            if self.zones:
+                for z in self.zones:
+                    f.write('%d,%d,%d\n' % z)
+            else:
+                for d in self.distances:
+                    f.write('%d\n' % d)
+
+    @classmethod
+    def synthetic(cls, n, width=320, height=240, seed=1, objects=2, speed=1, loop=False, zone_spans=None):
+        # Bright noisy background with dark rectangles drifting across the view.
+        # Good enough to exercise every stage when no recording is at hand.
+        # speed=0 keeps the objects still (a parked robot); the noise pattern
+        # still shifts every frame like sensor noise.
+        # zone_spans = image x ranges [(x0, x1), ...] of the ToF zones: every
+        # object then gets its own distance and each zone records the nearest
+        # object overlapping it (FAR_DISTANCE when it only sees background).
+        rng = random.Random(seed)
+        noise = bytes(rng.randrange(150, 190) for _ in range(width * height + width))
+        boxes = []
+        for _ in range(objects):
+            w = rng.randrange(width // 8, width // 3)
+            h = rng.randrange(height // 6, height // 2)
+            boxes.append([rng.randrange(0, width - w), rng.randrange(0, height - h), w, h,
+                          speed * rng.choice((-3, -2, 2, 3)), speed * rng.choice((-1, 1)), rng.randrange(20, 80)])
+        zrng = random.Random(seed + 1)  # separate stream, frames stay the same with and without zones
+        depths = [zrng.randrange(300, 1500) for _ in boxes]
+        frames = []
+        distances = []
+        zones = []
+        for i in range(n):
+            off = (i * 7) % width
+            buf = bytearray(noise[off:off + width * height])
+            if zone_spans:
+                seen = []
+                for x0, x1 in zone_spans:
+                    d = FAR_DISTANCE
+                    for b, depth in zip(boxes, depths):
+                        if b[0] < x1 and b[0] + b[2] > x0:
+                            d = min(d, depth)
+                    seen.append(d)
+                zones.append(tuple(seen))
+                for k in range(len(depths)):
+                    depths[k] = max(100, depths[k] + speed * zrng.randrange(-10, 11))
+            for b in boxes:
+                x, y, w, h, dx, dy, shade = b
+                row = bytes([shade]) * w
+                for yy in range(y, y + h):
+                    buf[yy * width + x:yy * width + x + w] = row
+                b[0] += dx
+                b[1] += dy
+                if b[0] < 0 or b[0] + w > width:
+                    b[4] = -dx
+                    b[0] += 2 * b[4]
+                if b[1] < 0 or b[1] + h > height:
+                    b[5] = -dy
+                    b[1] += 2 * b[5]
+            frames.append(bytes(buf))
+            distances.append(300 + int(200 * speed * ((i % 100) / 100.0)) + rng.randrange(-5, 6))
+        if zone_spans:
+            distances = [z[len(z) // 2] for z in zones]
+        return cls(frames, distances, width, height, loop, zones or None)
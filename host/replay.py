@@ -0,0 +1,246 @@
+# Replay recorded frames through a detection script on the host and time every stage.
+#
+# The script is loaded unmodified against the shims in host/shims: all module
+# level setup and function definitions run, only the top-level main loop is
+# skipped. The harness then calls the script's detection (core.detect(), see
+# lib/vision/core.py) once per recorded frame and times each stage of the
+# pipeline:
+#
+#   snapshot -> tof -> statistics -> find_blobs -> select -> draw -> smooth
+#
+# "select" is everything inside detect() that is not one of the
+# other stages (threshold limit and its cache check, blob filtering and
+# target selection).
+#
+# Usage:
+#   python3 host/replay.py obstacle_detection.py --frames recordings/hallway
+#   python3 host/replay.py ttk8/ttk8.py --synthetic 300
+#   python3 host/replay.py obstacle_detection.py --log flight0000.bin  (raw frames of a flight log)
+
+import argparse
+import ast
+import json
+import os
+import sys
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(HOST_DIR)
+SHIM_DIR = os.path.join(HOST_DIR, 'shims')
+LIB_DIR = os.path.join(REPO_DIR, 'lib')
+
+STAGES = ('snapshot', 'tof', 'statistics', 'find_blobs', 'select', 'draw', 'smooth')
+DRAW_CALLS = ('draw_cross', 'draw_rectangle', 'draw_string', 'draw_line', 'draw_circle')
+
+
+def install_shims():
+    # Put the device module shims and lib/ (what /flash/lib holds on the camera)
+    # first on the path and swap in the MicroPython flavoured time module
+    # (a superset of CPython's)
+    for path in (LIB_DIR, SHIM_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import utime
+    sys.modules['time'] = utime
+
+
+def _is_main_loop(node):
+    if isinstance(node, ast.While):
+        return True
+    if isinstance(node, ast.Try):
+        return any(isinstance(n, ast.While) for n in ast.walk(node))
+    return False
+
+
+def load_script(path, source=None):
+    """Run a device script's setup and definitions, skipping its main loop.
+
+    Returns the script's global namespace.
+    """
+    install_shims()
+    import hostio
+    if source is not None:
+        hostio.attach(source)
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    tree.body = [n for n in tree.body if not _is_main_loop(n)]
+    ns = {'__name__': '__replay__', '__file__': path}
+    exec(compile(tree, path, 'exec'), ns)
+    return ns
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class StageTimer:
+    # Accumulates nanoseconds per stage for the current frame, then stores
+    # the per-frame totals in microseconds.
+
+    def __init__(self, names):
+        import time
+        self._clock = time.perf_counter_ns
+        self.names = names
+        self.samples = dict((n, []) for n in names)
+        self.current = dict((n, 0) for n in names)
+
+    def wrap(self, name, fn):
+        clock = self._clock
+        current = self.current
+
+        def timed(*args, **kwargs):
+            t0 = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                current[name] += clock() - t0
+        return timed
+
+    def begin_frame(self):
+        for n in self.names:
+            self.current[n] = 0
+
+    def end_frame(self, keep=True):
+        if keep:
+            for n in self.names:
+                self.samples[n].append(self.current[n] / 1000.0)
+
+
+class Report:
+    def __init__(self, script, samples, results):
+        self.script = script
+        self.samples = samples    # stage name -> per-frame microseconds
+        self.results = results    # detect() return value per frame (lists as tuples)
+
+    @property
+    def frames(self):
+        return len(self.samples['total'])
+
+    def fps(self):
+        total = sum(self.samples['total'])
+        return self.frames * 1e6 / total if total else 0.0
+
+    def summary(self):
+        out = {'script': self.script, 'frames': self.frames, 'fps': round(self.fps(), 2), 'stages': {}}
+        for name, values in self.samples.items():
+            n = len(values) or 1
+            out['stages'][name] = {
+                'mean_us': round(sum(values) / n, 1),
+                'p50_us': round(percentile(values, 50), 1),
+                'p90_us': round(percentile(values, 90), 1),
+                'p99_us': round(percentile(values, 99), 1),
+                'max_us': round(max(values) if values else 0.0, 1),
+            }
+        return out
+
+    def format(self):
+        s = self.summary()
+        lines = ['%s: %d frames, %.1f fps' % (s['script'], s['frames'], s['fps']),
+                 '%-12s %10s %10s %10s %10s %10s' % ('stage', 'mean_us', 'p50_us', 'p90_us', 'p99_us', 'max_us')]
+        for name, st in s['stages'].items():
+            lines.append('%-12s %10.1f %10.1f %10.1f %10.1f %10.1f' % (
+                name, st['mean_us'], st['p50_us'], st['p90_us'], st['p99_us'], st['max_us']))
+        return '\n'.join(lines)
+
+
+class _Patches:
+    def __init__(self):
+        self._saved = []
+
+    def set(self, obj, attr, value):
+        had = attr in vars(obj) if hasattr(obj, '__dict__') else False
+        self._saved.append((obj, attr, had, getattr(obj, attr, None)))
+        setattr(obj, attr, value)
+
+    def restore(self):
+        while self._saved:
+            obj, attr, had, value = self._saved.pop()
+            if had:
+                setattr(obj, attr, value)
+            else:
+                delattr(obj, attr)
+
+
+def run(script, recording, warmup=5, frames=None, entry=None, setup=None):
+    """Replay `recording` through `script` and return a Report.
+
+    `setup(ns)` is called with the script namespace before the first frame,
+    for benchmarks that want to switch a mode or inject a component. `entry`
+    names a script function to call per frame instead of core.detect().
+    """
+    recording.rewind()
+    ns = load_script(script, recording)
+    if setup is not None:
+        setup(ns)
+    import image
+    import sensor
+
+    timer = StageTimer(STAGES + ('total',))
+    patches = _Patches()
+    try:
+        patches.set(sensor, 'snapshot', timer.wrap('snapshot', sensor.snapshot))
+        if 'tof' in ns:
+            patches.set(ns['tof'], 'read', timer.wrap('tof', ns['tof'].read))
+        patches.set(image.Image, 'get_statistics', timer.wrap('statistics', image.Image.get_statistics))
+        patches.set(image.Image, 'get_histogram', timer.wrap('statistics', image.Image.get_histogram))
+        patches.set(image.Image, 'find_blobs', timer.wrap('find_blobs', image.Image.find_blobs))
+        for name in DRAW_CALLS:
+            patches.set(image.Image, name, timer.wrap('draw', getattr(image.Image, name)))
+        core = ns.get('core')
+        if core is not None:
+            patches.set(core, 'measure', timer.wrap('smooth', core.measure))
+
+        detect = ns[entry] if entry else core.detect
+        clock = timer._clock
+        results = []
+        limit = len(recording) if frames is None else min(frames, len(recording))
+        for i in range(limit):
+            timer.begin_frame()
+            t0 = clock()
+            result = detect()
+            timer.current['total'] = clock() - t0
+            staged = sum(timer.current[n] for n in STAGES if n != 'select')
+            timer.current['select'] = max(0, timer.current['total'] - staged)
+            keep = i >= warmup
+            timer.end_frame(keep)
+            if keep:
+                # Scripts fill one preallocated result list every frame, keep a copy
+                results.append(tuple(result) if isinstance(result, list) else result)
+    finally:
+        patches.restore()
+    return Report(os.path.relpath(script, REPO_DIR), timer.samples, results)
+
+
+def load_recording(args):
+    from recording import Recording
+    if getattr(args, 'log', None):
+        import flight_log
+        return flight_log.recording(args.log)
+    if args.frames:
+        return Recording.load(args.frames)
+    return Recording.synthetic(args.synthetic, seed=args.seed, speed=getattr(args, 'speed', 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded frames through a detection script and time every stage.")
+    parser.add_argument('script', help="device script, e.g. obstacle_detection.py or ttk8/ttk8.py")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    src.add_argument('--log', nargs='+', metavar='LOG', help="raw frames of flight recorder logs (host/flight_log.py)")
+    parser.add_argument('--seed', type=int, default=1, help="seed for --synthetic")
+    parser.add_argument('--warmup', type=int, default=5, help="frames to run before measuring")
+    parser.add_argument('--json', action='store_true', help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    report = run(os.path.abspath(args.script), load_recording(args), warmup=args.warmup)
+    print(json.dumps(report.summary(), indent=2) if args.json else report.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+# Shared state between the host shims and the replay harness.
+#
+# The harness attaches a frame/ToF source here; sensor.snapshot() and
+# VL53L1X.read() both read from it so frame N is always paired with the
+# distance that was recorded together with frame N.
+
+source = None
+
+
+def attach(src):
+    global source
+    source = src
+
+
+def require():
+    if source is None:
+        raise RuntimeError("no recording attached, call hostio.attach() first")
+    return source
@@ -0,0 +1,466 @@
+# Host stand-in for the OpenMV image module (grayscale images only).
+#
+# Implements the parts of the Image API the scripts use: get_statistics,
+# find_blobs, the draw_* calls and to_jpeg. find_blobs follows OpenMV:
+# 4-connected regions per threshold, pixels_threshold / area_threshold
+# filtering and optional merging of overlapping bounding boxes.
+#
+# When numpy is installed it is used for the histogram and pooling, which are
+# C loops on the camera; everything else is plain Python.
+
+import re
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EDGE_CANNY = 0
+EDGE_SIMPLE = 1
+
+# draw_image() scaling hints
+AREA = 1 << 0
+BILINEAR = 1 << 1
+BICUBIC = 1 << 2
+
+_RUN = re.compile(rb'\x01+')
+
+
+def _gray(color):
+    if color is None:
+        return 255
+    if isinstance(color, int):
+        return max(0, min(255, color))
+    r, g, b = color[:3]
+    return (r * 38 + g * 75 + b * 15) >> 7
+
+
+def _threshold_table(threshold, invert):
+    lo, hi = threshold[0], threshold[1]
+    if lo > hi:
+        lo, hi = hi, lo
+    return bytes(1 if (lo <= v <= hi) != invert else 0 for v in range(256))
+
+
+class Statistics:
+    def __init__(self, hist):
+        count = sum(hist)
+        self._count = count
+        self._mean = sum(v * n for v, n in enumerate(hist)) // count if count else 0
+        self._min = next((v for v in range(256) if hist[v]), 0)
+        self._max = next((v for v in range(255, -1, -1) if hist[v]), 0)
+        self._mode = max(range(256), key=hist.__getitem__)
+        var = sum(n * (v - self._mean) ** 2 for v, n in enumerate(hist)) // count if count else 0
+        self._stdev = int(var ** 0.5)
+        self._lq = self._percentile(hist, count // 4)
+        self._median = self._percentile(hist, count // 2)
+        self._uq = self._percentile(hist, (count * 3) // 4)
+
+    @staticmethod
+    def _percentile(hist, rank):
+        acc = 0
+        for v in range(256):
+            acc += hist[v]
+            if acc > rank:
+                return v
+        return 255
+
+    def l_mean(self): return self._mean
+    def l_median(self): return self._median
+    def l_mode(self): return self._mode
+    def l_stdev(self): return self._stdev
+    def l_min(self): return self._min
+    def l_max(self): return self._max
+    def l_lq(self): return self._lq
+    def l_uq(self): return self._uq
+
+    mean = l_mean
+    median = l_median
+    mode = l_mode
+    stdev = l_stdev
+    min = l_min
+    max = l_max
+    lq = l_lq
+    uq = l_uq
+
+
+class Threshold:
+    def __init__(self, value):
+        self._value = value
+
+    def value(self): return self._value
+    def l_value(self): return self._value
+
+
+class Histogram:
+    def __init__(self, hist):
+        self._hist = hist
+        total = sum(hist) or 1
+        self._bins = [n / total for n in hist]
+
+    def bins(self): return self._bins
+    def l_bins(self): return self._bins
+
+    def get_statistics(self):
+        return Statistics(self._hist)
+
+    def get_threshold(self):
+        # Otsu: the split maximising the between-class variance
+        hist = self._hist
+        total = sum(hist)
+        sum_all = sum(v * n for v, n in enumerate(hist))
+        best, best_var = 0, -1.0
+        w0 = sum0 = 0
+        for t in range(256):
+            w0 += hist[t]
+            if w0 == 0:
+                continue
+            w1 = total - w0
+            if w1 == 0:
+                break
+            sum0 += t * hist[t]
+            m0 = sum0 / w0
+            m1 = (sum_all - sum0) / w1
+            var = w0 * w1 * (m0 - m1) ** 2
+            if var > best_var:
+                best, best_var = t, var
+        return Threshold(best)
+
+
+class Blob:
+    __slots__ = ('_x', '_y', '_w', '_h', '_pixels', '_sx', '_sy', '_code', '_count')
+
+    def __init__(self, x, y, w, h, pixels, sx, sy, code=1, count=1):
+        self._x = x
+        self._y = y
+        self._w = w
+        self._h = h
+        self._pixels = pixels
+        self._sx = sx  # sum of x over all pixels, for the centroid
+        self._sy = sy
+        self._code = code
+        self._count = count
+
+    def x(self): return self._x
+    def y(self): return self._y
+    def w(self): return self._w
+    def h(self): return self._h
+    def pixels(self): return self._pixels
+    def code(self): return self._code
+    def count(self): return self._count
+    def area(self): return self._w * self._h
+    def rect(self): return (self._x, self._y, self._w, self._h)
+    def cxf(self): return self._sx / self._pixels
+    def cyf(self): return self._sy / self._pixels
+    def cx(self): return int(self._sx / self._pixels + 0.5)
+    def cy(self): return int(self._sy / self._pixels + 0.5)
+
+    def __repr__(self):
+        return '{"x":%d, "y":%d, "w":%d, "h":%d, "pixels":%d, "cx":%d, "cy":%d}' % (
+            self._x, self._y, self._w, self._h, self._pixels, self.cx(), self.cy())
+
+    def _overlaps(self, other, margin):
+        return (self._x - margin <= other._x + other._w - 1 and
+                other._x <= self._x + self._w - 1 + margin and
+                self._y - margin <= other._y + other._h - 1 and
+                other._y <= self._y + self._h - 1 + margin)
+
+    def _merge(self, other):
+        x0 = min(self._x, other._x)
+        y0 = min(self._y, other._y)
+        x1 = max(self._x + self._w, other._x + other._w)
+        y1 = max(self._y + self._h, other._y + other._h)
+        self._x, self._y, self._w, self._h = x0, y0, x1 - x0, y1 - y0
+        self._pixels += other._pixels
+        self._sx += other._sx
+        self._sy += other._sy
+        self._code |= other._code
+        self._count += other._count
+
+
+def _label_runs(rows, x0, y0):
+    # rows: list of per-row run lists [(xa, xb), ...] with xb inclusive.
+    # Returns one Blob per component, in scanline order of its first pixel.
+    parent = []
+    runs = []
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    prev = []
+    for ry, row in enumerate(rows):
+        cur = []
+        j = 0
+        for xa, xb in row:
+            idx = len(runs)
+            runs.append((ry, xa, xb))
+            parent.append(idx)
+            # 4-connected: runs in the row above sharing at least one column
+            while j < len(prev) and prev[j][2] < xa:
+                j += 1
+            k = j
+            while k < len(prev) and prev[k][1] <= xb:
+                a = find(prev[k][0])
+                b = find(idx)
+                if a != b:
+                    if a < b:
+                        parent[b] = a
+                    else:
+                        parent[a] = b
+                k += 1
+            cur.append((idx, xa, xb))
+        prev = cur
+
+    comps = {}
+    for idx, (ry, xa, xb) in enumerate(runs):
+        root = find(idx)
+        n = xb - xa + 1
+        sx = (xa + xb) * n // 2
+        c = comps.get(root)
+        if c is None:
+            comps[root] = [idx, xa, ry, xb, ry, n, sx, ry * n]
+        else:
+            if xa < c[1]:
+                c[1] = xa
+            if xb > c[3]:
+                c[3] = xb
+            c[4] = ry
+            c[5] += n
+            c[6] += sx
+            c[7] += ry * n
+    out = []
+    for c in sorted(comps.values()):
+        _, minx, miny, maxx, maxy, pixels, sx, sy = c
+        out.append(Blob(minx + x0, miny + y0, maxx - minx + 1, maxy - miny + 1,
+                        pixels, sx + x0 * pixels, sy + y0 * pixels))
+    return out
+
+
+class JpegImage(bytes):
+    # Stand-in for a compressed frame. Subclassing bytes gives it the buffer
+    # protocol, so socket.sendall(cframe) works like on the camera.
+
+    def size(self):
+        return len(self)
+
+    def bytearray(self):
+        return bytearray(self)
+
+
+class Image:
+    def __init__(self, width, height, data=None, **kwargs):
+        if isinstance(data, int):
+            data = None  # image.Image(w, h, sensor.GRAYSCALE): a blank image of that format
+        self._width = width
+        self._height = height
+        self._data = bytearray(data) if data is not None else bytearray(width * height)
+
+    def width(self): return self._width
+    def height(self): return self._height
+    def size(self): return len(self._data)
+    def format(self): return 2  # sensor.GRAYSCALE
+    def bytearray(self): return self._data
+
+    def copy(self, roi=None, x_scale=1.0, y_scale=None, **kwargs):
+        if y_scale is None:
+            y_scale = x_scale
+        rx, ry, rw, rh = self._roi(roi)
+        step_x = max(1, int(round(1 / x_scale))) if x_scale < 1 else 1
+        step_y = max(1, int(round(1 / y_scale))) if y_scale < 1 else 1
+        w = self._width
+        rows = [self._data[(ry + y) * w + rx:(ry + y) * w + rx + rw:step_x]
+                for y in range(0, rh, step_y)]
+        return Image(len(rows[0]) if rows else 0, len(rows), b''.join(rows))
+
+    def _cells(self, x_div, y_div):
+        # numpy array of the mean of every x_div * y_div cell
+        w = self._width
+        ow, oh = self._width // x_div, self._height // y_div
+        n = x_div * y_div
+        pixels = np.frombuffer(self._data, dtype=np.uint8).reshape(self._height, w)[:oh * y_div, :ow * x_div]
+        if n <= 16:
+            # Small cells (a pyramid level): sum of the strided views, much faster than a reshape-sum
+            cells = np.zeros((oh, ow), dtype=np.int32)
+            for r in range(y_div):
+                for c in range(x_div):
+                    cells += pixels[r::y_div, c::x_div]
+        else:
+            cells = pixels.reshape(oh, y_div, ow, x_div).sum(axis=(1, 3), dtype=np.int32)
+        return (cells // n).astype(np.uint8)
+
+    def mean_pooled(self, x_div, y_div):
+        # Mean of every x_div * y_div cell, as a new (width/x_div, height/y_div) image
+        w, d = self._width, self._data
+        ow, oh = self._width // x_div, self._height // y_div
+        n = x_div * y_div
+        if np is not None:
+            return Image(ow, oh, self._cells(x_div, y_div).tobytes())
+        out = bytearray()
+        for cy in range(oh):
+            base = cy * y_div * w
+            cols = list(map(sum, zip(*[d[base + r * w:base + r * w + ow * x_div] for r in range(y_div)])))
+            out.extend(sum(cols[a:a + x_div]) // n for a in range(0, ow * x_div, x_div))
+        return Image(ow, oh, out)
+
+    def draw_image(self, image, x=0, y=0, x_scale=1.0, y_scale=None, hint=0, **kwargs):
+        # Blit `image` scaled into this one; an integer downscale with AREA is
+        # the mean of each cell, any other scale samples the nearest pixel
+        if y_scale is None:
+            y_scale = x_scale
+        x_div = int(round(1 / x_scale)) if 0 < x_scale < 1 else 1
+        y_div = int(round(1 / y_scale)) if 0 < y_scale < 1 else 1
+        area = hint & AREA and (x_div > 1 or y_div > 1)
+        if area and np is not None and x == 0 and y == 0 and \
+                (image._width // x_div, image._height // y_div) == (self._width, self._height):
+            # Pooled straight into this image, no intermediate copy
+            dst = np.frombuffer(self._data, dtype=np.uint8).reshape(self._height, self._width)
+            dst[:, :] = image._cells(x_div, y_div)
+            return self
+        if area:
+            src = image.mean_pooled(x_div, y_div)
+        else:
+            src = image.copy(x_scale=x_scale, y_scale=y_scale)
+        sw, d, w = src._width, src._data, self._width
+        x0, y0 = max(0, x), max(0, y)
+        n = min(w, x + sw) - x0
+        y1 = min(self._height, y + src._height)
+        if n <= 0 or y1 <= y0:
+            return self
+        if np is not None:
+            dst = np.frombuffer(self._data, dtype=np.uint8).reshape(self._height, w)
+            pixels = np.frombuffer(d, dtype=np.uint8).reshape(src._height, sw)
+            dst[y0:y1, x0:x0 + n] = pixels[y0 - y:y1 - y, x0 - x:x0 - x + n]
+            return self
+        for row in range(y0, y1):
+            base = (row - y) * sw + x0 - x
+            self._data[row * w + x0:row * w + x0 + n] = d[base:base + n]
+        return self
+
+    def get_pixel(self, x, y):
+        return self._data[y * self._width + x]
+
+    def set_pixel(self, x, y, color):
+        if 0 <= x < self._width and 0 <= y < self._height:
+            self._data[y * self._width + x] = _gray(color)
+
+    def _roi(self, roi):
+        if roi is None:
+            return 0, 0, self._width, self._height
+        x, y, w, h = roi
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self._width, x + w), min(self._height, y + h)
+        return x0, y0, max(0, x1 - x0), max(0, y1 - y0)
+
+    def _rows(self, roi):
+        rx, ry, rw, rh = self._roi(roi)
+        w = self._width
+        d = self._data
+        return [d[(ry + y) * w + rx:(ry + y) * w + rx + rw] for y in range(rh)], rx, ry
+
+    def _histogram(self, roi):
+        if np is not None:
+            rx, ry, rw, rh = self._roi(roi)
+            pixels = np.frombuffer(self._data, dtype=np.uint8).reshape(self._height, self._width)
+            return np.bincount(pixels[ry:ry + rh, rx:rx + rw].ravel(), minlength=256).tolist()
+        rows, _, _ = self._rows(roi)
+        counts = Counter()
+        for row in rows:
+            counts.update(row)
+        return [counts.get(v, 0) for v in range(256)]
+
+    def get_statistics(self, roi=None, **kwargs):
+        return Statistics(self._histogram(roi))
+
+    def get_histogram(self, roi=None, **kwargs):
+        return Histogram(self._histogram(roi))
+
+    def find_blobs(self, thresholds, invert=False, roi=None, x_stride=2, y_stride=1,
+                   area_threshold=10, pixels_threshold=10, merge=False, margin=0,
+                   threshold_cb=None, merge_cb=None, **kwargs):
+        rows, x0, y0 = self._rows(roi)
+        blobs = []
+        for i, threshold in enumerate(thresholds):
+            table = _threshold_table(threshold, invert)
+            runs = [[(m.start(), m.end() - 1) for m in _RUN.finditer(row.translate(table))]
+                    for row in rows]
+            for b in _label_runs(runs, x0, y0):
+                if b._pixels < pixels_threshold or b._w * b._h < area_threshold:
+                    continue
+                if threshold_cb is not None and not threshold_cb(b):
+                    continue
+                b._code = 1 << i
+                blobs.append(b)
+        if merge:
+            blobs = _merge_blobs(blobs, margin, merge_cb)
+        return blobs
+
+    def draw_rectangle(self, x, y=None, w=None, h=None, color=None, thickness=1, fill=False, **kwargs):
+        if y is None:
+            x, y, w, h = x
+        c = _gray(color)
+        if fill:
+            for yy in range(y, y + h):
+                for xx in range(x, x + w):
+                    self.set_pixel(xx, yy, c)
+            return self
+        for t in range(thickness):
+            for xx in range(x + t, x + w - t):
+                self.set_pixel(xx, y + t, c)
+                self.set_pixel(xx, y + h - 1 - t, c)
+            for yy in range(y + t, y + h - t):
+                self.set_pixel(x + t, yy, c)
+                self.set_pixel(x + w - 1 - t, yy, c)
+        return self
+
+    def draw_cross(self, x, y=None, color=None, size=5, thickness=1, **kwargs):
+        if y is None:
+            x, y = x
+        c = _gray(color)
+        for d in range(-size, size + 1):
+            self.set_pixel(x + d, y, c)
+            self.set_pixel(x, y + d, c)
+        return self
+
+    def draw_line(self, x0, y0=None, x1=None, y1=None, color=None, thickness=1, **kwargs):
+        if y0 is None:
+            x0, y0, x1, y1 = x0
+        c = _gray(color)
+        n = max(abs(x1 - x0), abs(y1 - y0), 1)
+        for i in range(n + 1):
+            self.set_pixel(x0 + (x1 - x0) * i // n, y0 + (y1 - y0) * i // n, c)
+        return self
+
+    def draw_string(self, x, y, text, color=None, scale=1, **kwargs):
+        # No font rendering on the host; the text itself is still built by the script
+        return self
+
+    def draw_circle(self, x, y=None, radius=None, color=None, **kwargs):
+        return self
+
+    def to_jpeg(self, quality=90, copy=False, **kwargs):
+        # Size scales with quality like a real encoder; content is a subsample
+        step = max(1, 12 - quality // 10)
+        return JpegImage(b'\xff\xd8' + bytes(self._data[::step * step]) + b'\xff\xd9')
+
+    compress = to_jpeg
+
+
+def _merge_blobs(blobs, margin, merge_cb):
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for b in blobs:
+            for m in out:
+                if m._overlaps(b, margin) and (merge_cb is None or merge_cb(m, b)):
+                    m._merge(b)
+                    merged = True
+                    break
+            else:
+                out.append(b)
+        blobs = out
+    return blobs
@@ -0,0 +1,47 @@
+# Host stand-in for the MicroPython machine module.
+
+from pyb import UART  # noqa: F401
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, id, mode=IN, value=0):
+        self.id = id
+        self.mode = mode
+        self._value = value
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+
+class I2C:
+    def __init__(self, id, freq=400000, **kwargs):
+        self.id = id
+        self.freq = freq
+        self.regs = {}     # (address, register) -> last written bytes
+        self.devices = {}  # address -> simulated device with read_mem/write_mem
+
+    def scan(self):
+        return [0x29]  # VL53L1X default address
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        device = self.devices.get(addr)
+        if device is not None:
+            device.write_mem(memaddr, bytes(buf))
+        else:
+            self.regs[(addr, memaddr)] = bytes(buf)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        device = self.devices.get(addr)
+        if device is not None:
+            data = device.read_mem(memaddr, nbytes)
+        else:
+            data = self.regs.get((addr, memaddr), b'')
+        return (data + bytes(nbytes))[:nbytes]
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf), addrsize)
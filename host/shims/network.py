@@ -0,0 +1,114 @@
+# Host stand-in for the MicroPython network module: a station WLAN that joins
+# a modelled access point.
+#
+# connect() returns at once, as on the camera; the join completes assoc_ms
+# later, plus dhcp_ms when no static config was given with ifconfig(). The
+# access point can be switched off for a while with drop(ms): connected
+# stations lose the link (status() falls back to idle, like a lost beacon)
+# and joins that overlap the outage fail with STAT_NO_AP_FOUND. There is no
+# automatic rejoin, the script has to connect() again. Addresses are on the
+# loopback interface so servers stay reachable from host benchmarks.
+
+import time
+
+STA_IF = 0
+AP_IF = 1
+
+# CYW43 status codes
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_CONNECT_FAIL = -1
+STAT_NO_AP_FOUND = -2
+STAT_WRONG_PASSWORD = -3
+STAT_GOT_IP = 3
+
+
+class AccessPoint:
+    def __init__(self):
+        self.ssid = None      # None = any name joins
+        self.key = None
+        self.assoc_ms = 800   # scan, authentication and association
+        self.dhcp_ms = 1500   # DHCP lease
+        self.lease = ('127.0.0.1', '255.0.0.0', '127.0.0.1', '127.0.0.1')
+        self.down_from = None
+        self.down_until = None
+
+    def down(self, start, end):
+        # True when the access point was off at any time in [start, end]
+        if self.down_from is None:
+            return False
+        return start <= self.down_until and self.down_from <= end
+
+
+ap = AccessPoint()
+
+
+def _now():
+    return time.perf_counter() * 1000.0
+
+
+def drop(ms):
+    # Switch the access point off for `ms` from now
+    now = _now()
+    ap.down_from = now
+    ap.down_until = now + ms
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._joined = None    # when the current join started
+        self._static = None    # ifconfig() tuple, None = DHCP
+        self._ssid = None
+        self.connects = 0
+
+    def active(self, on=None):
+        if on is None:
+            return self._active
+        self._active = bool(on)
+        if not on:
+            self._joined = None
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        self._ssid = ssid
+        self._joined = _now()
+        self._wrong_key = ap.key is not None and key != ap.key
+        self.connects += 1
+
+    def disconnect(self):
+        self._joined = None
+
+    def status(self, param=None):
+        if param is not None:
+            return -60 if param == 'rssi' else None
+        if not self._active or self._joined is None:
+            return STAT_IDLE
+        now = _now()
+        start = self._joined
+        assoc = start + ap.assoc_ms
+        if ap.down(start, min(now, assoc)) or (ap.ssid is not None and self._ssid != ap.ssid):
+            return STAT_NO_AP_FOUND if now >= assoc else STAT_CONNECTING
+        if now < assoc:
+            return STAT_CONNECTING
+        if self._wrong_key:
+            return STAT_WRONG_PASSWORD
+        if ap.down(assoc, now):
+            self._joined = None  # link lost after the join, no automatic rejoin
+            return STAT_IDLE
+        if self._static is None and now < assoc + ap.dhcp_ms:
+            return STAT_CONNECTING
+        return STAT_GOT_IP
+
+    def isconnected(self):
+        return self.status() == STAT_GOT_IP
+
+    def ifconfig(self, config=None):
+        if config is None:
+            if not self.isconnected():
+                return ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+            return self._static or ap.lease
+        self._static = None if config == 'dhcp' else tuple(config)
+
+    def scan(self):
+        return []
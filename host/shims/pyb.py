@@ -0,0 +1,146 @@
+# Host stand-in for the OpenMV pyb module: LEDs, UART and timing helpers.
+
+import os
+import select
+import threading
+
+import utime
+
+
+class LED:
+    def __init__(self, id):
+        self.id = id
+        self.state = False
+
+    def on(self):
+        self.state = True
+
+    def off(self):
+        self.state = False
+
+    def toggle(self):
+        self.state = not self.state
+
+
+class UART:
+    # In-memory UART: the host side feeds bytes with inject() and collects
+    # everything the script wrote from `tx`. A bus listed in UART.ports
+    # (bus -> file descriptor, e.g. a pty) talks to that descriptor instead.
+    #
+    # irq() handlers run on a background thread (an RX-idle interrupt on the
+    # camera is a soft IRQ that also runs between the loop's bytecodes).
+    #
+    # UART.wire, if set, is called as wire(uart, data) on every write and
+    # returns the bytes that arrive at the other end: a model of the line
+    # (transmit time at uart.baudrate, rate mismatch, bit errors).
+
+    IRQ_RXIDLE = 1
+    ports = {}
+    wire = None
+
+    def __init__(self, bus, baudrate=115200, **kwargs):
+        self.bus = bus
+        self.baudrate = baudrate
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.fd = UART.ports.get(bus)
+        self.handler = None
+        self._lock = threading.RLock()
+
+    def init(self, baudrate=115200, **kwargs):
+        self.baudrate = baudrate
+
+    def deinit(self):
+        pass
+
+    def inject(self, data):
+        with self._lock:
+            self.rx.extend(data)
+        if self.handler is not None and self.fd is None:
+            self.handler(self)
+
+    def _pull(self, timeout=0):
+        # Move whatever the descriptor has into rx
+        if self.fd is None:
+            return
+        try:
+            if not select.select([self.fd], [], [], timeout)[0]:
+                return
+            data = os.read(self.fd, 4096)
+        except (OSError, ValueError):
+            return  # descriptor closed
+        with self._lock:
+            self.rx.extend(data)
+
+    def irq(self, handler=None, trigger=IRQ_RXIDLE, hard=False):
+        self.handler = handler
+        if handler is not None and self.fd is not None:
+            threading.Thread(target=self._irq_loop, daemon=True).start()
+
+    def _irq_loop(self):
+        while True:
+            self._pull(0.5)
+            handler = self.handler
+            if handler is None:
+                return
+            if self.rx:
+                with self._lock:
+                    handler(self)
+
+    def any(self):
+        self._pull()
+        return len(self.rx)
+
+    def read(self, nbytes=None):
+        self._pull()
+        with self._lock:
+            if not self.rx:
+                return None
+            if nbytes is None:
+                nbytes = len(self.rx)
+            data = bytes(self.rx[:nbytes])
+            del self.rx[:nbytes]
+        return data
+
+    def readinto(self, buf, nbytes=None):
+        data = self.read(len(buf) if nbytes is None else nbytes)
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode()  # MicroPython writes a str's bytes
+        n = len(data)
+        if UART.wire is not None:
+            data = UART.wire(self, bytes(data))
+        if self.fd is not None:
+            os.write(self.fd, data)
+        else:
+            self.tx.extend(data)
+        return n
+
+
+def millis():
+    return utime.ticks_ms()
+
+
+def micros():
+    return utime.ticks_us()
+
+
+def elapsed_millis(start):
+    return utime.ticks_diff(utime.ticks_ms(), start)
+
+
+def elapsed_micros(start):
+    return utime.ticks_diff(utime.ticks_us(), start)
+
+
+def delay(ms):
+    utime.sleep_ms(ms)
+
+
+def udelay(us):
+    utime.sleep_us(us)
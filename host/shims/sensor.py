@@ -0,0 +1,149 @@
+# Host stand-in for the OpenMV sensor module, serving recorded frames.
+#
+# Frames come from the source attached through hostio. Recordings are
+# grayscale; a smaller frame size than the recording is produced by
+# integer decimation so QQVGA profiles can be replayed from QVGA data.
+#
+# Sensor timing model, off by default (recordings are already exposed and
+# replay as fast as they can be processed); host/bench_boot.py turns it on.
+# snapshot() delivers at most one frame per FRAME_MS and skip_frames(time=)
+# waits that long. After reset() auto exposure starts at AE_START of the
+# final EXPOSURE_US, holds it for AE_DELAY_MS (the first auto exposure
+# periods) and then closes the gap with a time constant of AE_TAU_MS;
+# frames are darkened to match until it has settled.
+
+import math
+
+import image
+import hostio
+import utime
+
+FRAME_MS = 0
+AE_TAU_MS = 0
+AE_DELAY_MS = 0
+AE_START = 0.25
+EXPOSURE_US = 10000
+
+GRAYSCALE = 2
+RGB565 = 1
+BAYER = 3
+JPEG = 4
+
+QQQVGA = 'QQQVGA'
+QQVGA = 'QQVGA'
+QVGA = 'QVGA'
+VGA = 'VGA'
+
+_FRAMESIZES = {
+    QQQVGA: (80, 60),
+    QQVGA: (160, 120),
+    QVGA: (320, 240),
+    VGA: (640, 480),
+}
+
+_pixformat = GRAYSCALE
+_framesize = QVGA
+_auto_gain = True
+_auto_exposure = True
+_auto_whitebal = True
+_reset_ms = utime.ticks_ms()
+_frame_ms = None  # when the last frame was delivered
+
+
+def reset():
+    global _pixformat, _framesize, _reset_ms
+    _pixformat = GRAYSCALE
+    _framesize = QVGA
+    _reset_ms = utime.ticks_ms()
+
+
+def _exposure():
+    # Fraction of the final exposure reached since reset()
+    if not AE_TAU_MS or not _auto_exposure:
+        return 1.0
+    t = utime.ticks_diff(utime.ticks_ms(), _reset_ms) - AE_DELAY_MS
+    if t <= 0:
+        return AE_START
+    return 1.0 - (1.0 - AE_START) * math.exp(-t / AE_TAU_MS)
+
+
+def get_exposure_us():
+    return int(EXPOSURE_US * _exposure())
+
+
+def get_gain_db():
+    return 0.0
+
+
+def set_pixformat(fmt):
+    global _pixformat
+    _pixformat = fmt
+
+
+def get_pixformat():
+    return _pixformat
+
+
+def set_framesize(size):
+    global _framesize
+    if size not in _FRAMESIZES:
+        raise ValueError("unsupported frame size: %r" % (size,))
+    _framesize = size
+
+
+def get_framesize():
+    return _framesize
+
+
+def width():
+    return _FRAMESIZES[_framesize][0]
+
+
+def height():
+    return _FRAMESIZES[_framesize][1]
+
+
+def set_auto_gain(enable, **kwargs):
+    global _auto_gain
+    _auto_gain = enable
+
+
+def set_auto_exposure(enable, **kwargs):
+    global _auto_exposure
+    _auto_exposure = enable
+
+
+def set_auto_whitebal(enable, **kwargs):
+    global _auto_whitebal
+    _auto_whitebal = enable
+
+
+def skip_frames(n=None, time=None):
+    src = hostio.source
+    if src is None:
+        return
+    if n is not None:
+        for _ in range(n):
+            src.next_frame()
+    elif time:
+        utime.sleep_ms(time if FRAME_MS or AE_TAU_MS else 0)  # recordings are already warmed up
+
+
+def snapshot():
+    global _frame_ms
+    if FRAME_MS:
+        if _frame_ms is not None:
+            utime.sleep_ms(FRAME_MS - utime.ticks_diff(utime.ticks_ms(), _frame_ms))
+        _frame_ms = utime.ticks_ms()
+    src = hostio.require()
+    data, w, h = src.next_frame()
+    level = _exposure()
+    if level < 0.995:
+        data = bytes(data).translate(bytes(min(255, int(i * level)) for i in range(256)))
+    tw, th = width(), height()
+    if (w, h) != (tw, th):
+        sx, sy = w // tw, h // th
+        if sx < 1 or sy < 1 or w != tw * sx or h != th * sy:
+            raise ValueError("cannot produce %dx%d frames from %dx%d recording" % (tw, th, w, h))
+        data = b''.join(data[y * w:(y + 1) * w:sx] for y in range(0, h, sy))
+    return image.Image(tw, th, data)
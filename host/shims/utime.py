@@ -0,0 +1,67 @@
+# Host stand-in for the MicroPython/OpenMV time module.
+#
+# The replay harness installs this module as `time`, so it re-exports the
+# CPython time functions and adds the MicroPython ticks API and the OpenMV
+# clock object used by the scripts.
+
+from time import *  # noqa: F401,F403
+from time import perf_counter_ns as _perf_counter_ns, sleep as _sleep
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+
+def ticks_us():
+    return (_perf_counter_ns() // 1000) & _TICKS_MAX
+
+
+def ticks_ms():
+    return (_perf_counter_ns() // 1000000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    return ticks_us()
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+
+
+def sleep_ms(ms):
+    if ms > 0:
+        _sleep(ms / 1000)
+
+
+def sleep_us(us):
+    if us > 0:
+        _sleep(us / 1000000)
+
+
+class clock:
+    # OpenMV time.clock(): fps over the time between tick() and fps()
+
+    def __init__(self):
+        self._start = _perf_counter_ns()
+        self._ms = 0.0
+
+    def tick(self):
+        self._start = _perf_counter_ns()
+
+    def _elapsed(self):
+        self._ms = (_perf_counter_ns() - self._start) / 1000000
+        return self._ms
+
+    def avg(self):
+        return self._elapsed()
+
+    def fps(self):
+        ms = self._elapsed()
+        return 1000.0 / ms if ms > 0 else 0.0
+
+    def reset(self):
+        self.tick()
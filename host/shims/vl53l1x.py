@@ -0,0 +1,87 @@
+# Host stand-in for the OpenMV VL53L1X driver, reading the recorded ToF trace.
+#
+# The shim is also a register-level device on the I2C shim, enough for
+# lib/tof_zones.py and lib/tof_ranging.py:
+#
+# - ROI writes (register 0x007F) select the zone that is measured: the ROI
+#   programmed at one read() is returned by the next read(), like the
+#   pipelined ranging on the sensor. Recordings with per-zone traces
+#   (left,center,right per line in tof.txt) give every zone its own
+#   distance; otherwise every zone returns the single recorded distance.
+# - Continuous ranging completes one measurement per recorded frame, or one
+#   every `period_ms` of wall time when that is set (to model the ranging
+#   period against real processing time). Data-ready (0x0031) stays set until
+#   the interrupt is cleared (0x0086) and the range register (0x0096) holds
+#   the recorded distance.
+
+import time
+
+import hostio
+
+REG_GPIO_TIO_HV_STATUS = 0x0031
+REG_ROI_CENTER_SPAD = 0x007F
+REG_SYSTEM_INTERRUPT_CLEAR = 0x0086
+REG_SYSTEM_MODE_START = 0x0087
+REG_RESULT_RANGE_MM = 0x0096
+DEFAULT_SPAD = 199  # full-array ROI center
+
+
+def zone_of(spad):
+    # SPAD number -> column of the 16x16 array -> left / center / right zone
+    if spad >= 128:
+        col = (spad - 128) >> 3
+    else:
+        col = 15 - (spad >> 3)
+    if col < 6:
+        return 0
+    if col > 10:
+        return 2
+    return 1
+
+
+class VL53L1X:
+    def __init__(self, i2c, address=0x29):
+        self.i2c = i2c
+        self.address = address
+        self.regs = {}
+        self.measuring = 1  # zone of the ranging in progress
+        self.period_ms = None  # None = one measurement per recorded frame
+        self.start_ms = time.ticks_ms()
+        self.cleared = -1      # last measurement consumed by an interrupt clear
+        if hasattr(i2c, 'devices'):
+            i2c.devices[address] = self
+
+    def _roi_zone(self):
+        data = self.regs.get(REG_ROI_CENTER_SPAD)
+        return zone_of(data[0] if data else DEFAULT_SPAD)
+
+    def _completed(self):
+        # Number of the latest finished measurement
+        if self.period_ms is None:
+            return hostio.require().index
+        return time.ticks_diff(time.ticks_ms(), self.start_ms) // self.period_ms
+
+    def write_mem(self, reg, data):
+        if reg == REG_SYSTEM_INTERRUPT_CLEAR:
+            self.cleared = self._completed()
+        elif reg == REG_SYSTEM_MODE_START:
+            self.start_ms = time.ticks_ms()
+            self.cleared = -1 if self.period_ms is None else 0
+        else:
+            self.regs[reg] = data
+
+    def read_mem(self, reg, nbytes):
+        if reg == REG_GPIO_TIO_HV_STATUS:
+            return bytes([1 if self._completed() > self.cleared else 0])
+        if reg == REG_RESULT_RANGE_MM:
+            d = hostio.require().distance()
+            return bytes([(d >> 8) & 0xFF, d & 0xFF])
+        return self.regs.get(reg, b'')
+
+    def read(self):
+        src = hostio.require()
+        zone = self.measuring
+        self.measuring = self._roi_zone()
+        if hasattr(src, 'zone_distance'):
+            return src.zone_distance(zone)
+        return src.distance()
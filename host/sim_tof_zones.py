@@ -0,0 +1,137 @@
+# Simulated multi-zone ToF: zone scheduling, cache staleness and distances.
+#
+# Runs lib/tof_zones.py against the VL53L1X shim (which models the pipelined
+# ROI switching) over a synthetic scene whose objects each have their own
+# depth, with a simulated frame clock:
+#
+#   1. schedule - every cached zone value must be the recorded distance of
+#      the zone that was programmed one poll earlier, and the refresh
+#      interval per zone is shown
+#   2. staleness - after a stall longer than max_age_ms every zone reads 0
+#   3. replay   - obstacle_detection.py with one full-field reading vs
+#      MULTI_ZONE_TOF, distance error of the reported target against the
+#      depth of the zone it lies in
+#
+#   python3 host/sim_tof_zones.py --synthetic 300 --objects 3 --frame-ms 50
+
+import argparse
+import os
+
+import replay
+
+
+class FrameClock:
+    # Simulated ticks_ms, advanced by the driver of the simulation
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def make_zones(tof, width, clock, max_age_ms):
+    from tof_zones import ToFZones
+    return ToFZones(tof, width, max_age_ms=max_age_ms, clock=clock)
+
+
+def check_schedule(recording, frame_ms, max_age_ms):
+    import hostio
+    from machine import I2C
+    from vl53l1x import VL53L1X
+    from tof_zones import ZONE_NAMES
+
+    recording.rewind()
+    hostio.attach(recording)
+    clock = FrameClock()
+    zones = make_zones(VL53L1X(I2C(2)), recording.width, clock, max_age_ms)
+    wrong = 0
+    refreshed = [[], [], []]
+    last = [None, None, None]
+    for i in range(len(recording)):
+        recording.next_frame()
+        clock.now = i * frame_ms
+        zone = zones.pending
+        zones.poll()
+        if zone is None:
+            continue
+        if zones.dist[zone] != recording.zone_distance(zone):
+            wrong += 1
+        if last[zone] is not None:
+            refreshed[zone].append(clock.now - last[zone])
+        last[zone] = clock.now
+    print("schedule %s, %d frames at %d ms" % (
+        '-'.join(ZONE_NAMES[z][0].upper() for z in zones.schedule), len(recording), frame_ms))
+    for zone in range(3):
+        gaps = refreshed[zone] or [0]
+        print("  %-6s refreshed every %d-%d ms" % (ZONE_NAMES[zone], min(gaps), max(gaps)))
+    print("  cached values not matching the recorded zone distance: %d" % wrong)
+
+    # Stall the loop for longer than max_age_ms: every zone must turn stale
+    clock.now += max_age_ms + frame_ms
+    stale = [zones.distance(z) for z in range(3)]
+    print("staleness: after a %d ms stall the zones read %s (expect all 0), nearest %d" % (
+        max_age_ms + frame_ms, stale, zones.nearest()))
+    return wrong == 0 and stale == [0, 0, 0]
+
+
+def replay_errors(script, recording, geometry, frame_ms, max_age_ms, multi_zone):
+    # Mean |reported distance - depth of the target's zone| over frames with a target
+    clock = FrameClock()
+    errors = []
+
+    def setup(ns):
+        core = ns['core']
+        core.motion_gate = None
+        if multi_zone:
+            core.tof_zones = make_zones(ns['tof'], recording.width, clock, max_age_ms)
+        measure = core.measure
+
+        def recorded(target, dist):
+            zone = geometry.zone_for(target.x(), target.w())
+            errors.append(abs(dist - recording.zone_distance(zone)))
+            return measure(target, dist)
+        core.measure = recorded
+
+        detect = core.detect
+
+        def timed():
+            clock.now += frame_ms
+            return detect()
+        core.detect = timed
+
+    return errors, replay.run(script, recording, setup=setup)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate multi-zone ToF scheduling, staleness and distance errors.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    parser.add_argument('--synthetic', type=int, default=300, metavar='N', help="synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--objects', type=int, default=3)
+    parser.add_argument('--frame-ms', type=int, default=50, help="simulated frame period")
+    parser.add_argument('--max-age', type=int, default=300, help="zone cache max age in ms")
+    args = parser.parse_args(argv)
+
+    replay.install_shims()
+    from machine import I2C
+    from vl53l1x import VL53L1X
+    from recording import Recording
+
+    width = 320
+    geometry = make_zones(VL53L1X(I2C(2)), width, FrameClock(), args.max_age)  # zone_for() only
+    spans = list(zip(geometry.x0, geometry.x1))
+    recording = Recording.synthetic(args.synthetic, width=width, seed=args.seed, objects=args.objects,
+                                    zone_spans=spans)
+    print("zone image spans at %dx%d: %s" % (width, recording.height, spans))
+    ok = check_schedule(recording, args.frame_ms, args.max_age)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    for name, multi in (('single reading', False), ('multi-zone', True)):
+        errors, report = replay_errors(script, recording, geometry, args.frame_ms, args.max_age, multi)
+        mean = sum(errors) / len(errors) if errors else 0.0
+        print("%-14s: %d targets, mean distance error %.0f mm, fps %.1f" % (name, len(errors), mean, report.fps()))
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Request-to-response latency of the camera's UART over a pseudo-terminal.
+#
+# The detection script runs against the shims with UART(4) bound to one end
+# of a pty; a robot thread on the other end sends b'r' at --interval-ms (with
+# jitter, like the nRF client) and times the 6-byte answer. Three main loops
+# are compared:
+#
+#   old     check for a request after every detection + sleep(100) (polled mode)
+#   polled  UartResponder, service() while idling between passes
+#   irq     UartResponder on the RX-idle interrupt (a thread on the host)
+#
+#   python3 host/uart_latency.py --synthetic 50 --requests 100
+
+import argparse
+import os
+import random
+import select
+import struct
+import threading
+import time
+import tty
+
+import replay
+
+RESULT_SIZE = struct.calcsize('<hhh')
+
+
+def robot(fd, requests, interval_ms, latencies, seed):
+    rng = random.Random(seed)
+    for _ in range(requests):
+        time.sleep(interval_ms * rng.uniform(0.5, 1.5) / 1000.0)
+        t0 = time.perf_counter()
+        os.write(fd, b'r')
+        got = b''
+        while len(got) < RESULT_SIZE:
+            if not select.select([fd], [], [], 1.0)[0]:
+                break
+            got += os.read(fd, RESULT_SIZE - len(got))
+        latencies.append((time.perf_counter() - t0) * 1000.0 if len(got) == RESULT_SIZE else None)
+
+
+def run_mode(mode, script, recording, args):
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    replay.install_shims()
+    import pyb
+    import utime
+    pyb.UART.ports[4] = slave
+    recording.rewind()
+    try:
+        ns = replay.load_script(script, recording)
+    finally:
+        del pyb.UART.ports[4]
+    ns['print'] = lambda *a, **k: None
+    output = ns['output']
+    responder = output.responder
+    if mode != 'irq' and responder is not None and responder.irq:
+        ns['uart'].irq(handler=None)
+        responder.irq = False
+
+    latencies = []
+    worker = threading.Thread(target=robot, args=(master, args.requests, args.interval_ms, latencies, args.seed))
+    worker.start()
+    detect = ns['core'].detect
+    sleep_ms = utime.sleep_ms
+    passes = 0
+    while worker.is_alive():
+        if mode == 'old':
+            data = struct.pack('<hhh', *detect())
+            if output.poll_request():
+                ns['uart'].write(data)
+            sleep_ms(args.sleep_ms)
+        else:
+            responder.update(detect())
+            responder.idle(args.sleep_ms)
+        passes += 1
+    ns['uart'].irq(handler=None)
+    os.close(master)
+    os.close(slave)
+    return latencies, passes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure UART request-to-response latency over a pty.")
+    parser.add_argument('--script', default='obstacle_detection.py')
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument('--frames', help="recording directory (PGM frames + tof.txt)")
+    src.add_argument('--synthetic', type=int, metavar='N', help="generate N synthetic frames")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--interval-ms', type=float, default=50, help="mean time between requests")
+    parser.add_argument('--timeout-ms', type=float, default=100, help="robot side timeout (uarte1_receive_data)")
+    parser.add_argument('--sleep-ms', type=int, default=100, help="main loop sleep, as in the script")
+    parser.add_argument('--modes', default='old,polled,irq')
+    args = parser.parse_args(argv)
+
+    script = os.path.join(replay.REPO_DIR, args.script)
+    recording = replay.load_recording(args)
+    recording.loop = True
+    print("%-7s %8s %8s %8s %8s %8s %9s %7s" % ('mode', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'lost', 'timeouts', 'passes'))
+    for mode in args.modes.split(','):
+        latencies, passes = run_mode(mode, script, recording, args)
+        ok = [x for x in latencies if x is not None]
+        late = sum(1 for x in ok if x > args.timeout_ms)
+        print("%-7s %8.2f %8.2f %8.2f %8.2f %8d %9d %7d" % (
+            mode, replay.percentile(ok, 50), replay.percentile(ok, 90), replay.percentile(ok, 99),
+            max(ok) if ok else 0.0, len(latencies) - len(ok), late, passes))
+
+
+if __name__ == '__main__':
+    main()
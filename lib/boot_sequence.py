@@ -0,0 +1,113 @@
+# Boot sequence - sensor warm-up while the Wi-Fi link joins, and boot timings
+#
+# The scripts used to wait a fixed sensor.skip_frames(time=500) (2000 ms in
+# the old scripts) for auto exposure to settle, and only then start joining
+# the access point. Here the join is started first (WifiLink.start() only
+# issues wlan.connect()) and warm_up() takes frames until auto exposure has
+# converged, servicing the link after every frame, so association, DHCP and
+# the server start run next to the warm-up and the join is polled at the
+# frame rate.
+#
+# Converged = stable_frames frames in a row in which the exposure time moved
+# less than exposure_pct percent and the frame mean less than mean_delta grey
+# levels (gain steps show in the mean). The sensor's auto exposure needs a
+# frame or two before it starts to move, and frames before that look steady,
+# so only frames taken after min_ms count as stable. The sensor keeps
+# exposing while the script sets up the ToF and the rest, so often only
+# stable_frames frames after the floor are needed. After max_ms the warm-up
+# gives up and detection starts anyway.
+#
+# update() runs after every frame until it has seen the first valid result
+# (a distance for the robot: the first valid packet) and, with `stream`, the
+# first frame streamed to a browser; the times count from start_ms, taken
+# at the top of the script before the imports.
+
+import time
+
+
+class BootSequence:
+    def __init__(self, sensor, start_ms, stream=False, stable_frames=3, exposure_pct=5, mean_delta=3,
+                 min_ms=0, max_ms=2000):
+        self.sensor = sensor
+        self.start_ms = start_ms
+        self.stream = stream
+        self.stable_frames = stable_frames
+        self.exposure_pct = exposure_pct
+        self.mean_delta = mean_delta
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self.warm_ms = -1      # warm-up time
+        self.warm_frames = 0
+        self.converged = False
+        self.exposure_us = 0   # exposure the warm-up settled on
+        self.ready_ms = -1     # warm-up done, detection starts
+        self.packet_ms = -1    # first valid result
+        self.frame_ms = -1     # first frame streamed
+        self.pending = True
+
+    def elapsed(self):
+        return time.ticks_diff(time.ticks_ms(), self.start_ms)
+
+    def warm_up(self, link=None):
+        # Take frames until auto exposure has converged, servicing the link meanwhile
+        sensor = self.sensor
+        start = time.ticks_ms()
+        last_exposure = -1
+        last_mean = -1
+        stable = 0
+        frames = 0
+        while True:
+            img = sensor.snapshot()
+            frames += 1
+            if link is not None:
+                link.service()  # join polled every frame
+            exposure = sensor.get_exposure_us()
+            mean = img.get_statistics().mean()
+            waited = time.ticks_diff(time.ticks_ms(), start)
+            if (waited >= self.min_ms and last_exposure >= 0
+                    and abs(exposure - last_exposure) * 100 <= self.exposure_pct * last_exposure
+                    and abs(mean - last_mean) <= self.mean_delta):
+                stable += 1
+            else:
+                stable = 0  # before the floor auto exposure may not have started yet
+            last_exposure = exposure
+            last_mean = mean
+            if stable >= self.stable_frames:
+                self.converged = True
+                break
+            if waited >= self.max_ms:
+                break
+        self.warm_ms = waited
+        self.warm_frames = frames
+        self.exposure_us = exposure
+        self.ready_ms = self.elapsed()
+        return self.converged
+
+    def skip(self, ms):
+        # The fixed warm-up it replaces
+        start = time.ticks_ms()
+        self.sensor.skip_frames(time=ms)
+        self.warm_ms = time.ticks_diff(time.ticks_ms(), start)
+        self.ready_ms = self.elapsed()
+
+    def update(self, result, streaming=False):
+        # After every frame while pending; True once the last expected mark is seen
+        if self.packet_ms < 0 and result[2]:
+            self.packet_ms = self.elapsed()
+        if self.frame_ms < 0 and streaming:
+            self.frame_ms = self.elapsed()
+        if self.packet_ms < 0 or (self.stream and self.frame_ms < 0):
+            return False
+        self.pending = False
+        return True
+
+    def summary(self):
+        if self.warm_frames:
+            warm = "warm-up %d ms (%d frames, %s, exposure %d us)" % (
+                self.warm_ms, self.warm_frames, "converged" if self.converged else "timed out", self.exposure_us)
+        else:
+            warm = "fixed warm-up %d ms" % self.warm_ms
+        text = "boot: %s, detecting at %d ms, first valid packet %d ms" % (warm, self.ready_ms, self.packet_ms)
+        if self.stream:
+            text += ", first streamed frame %d ms" % self.frame_ms
+        return text
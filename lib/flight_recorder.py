@@ -0,0 +1,231 @@
+# Flight recorder - compact binary log of every frame, written between frames
+#
+# record() packs one record per frame into a preallocated buffer with
+# struct.pack_into(): ticks_ms, the ToF distance, the threshold limit, the
+# blobs find_blobs() returned, the chosen target and the '<hhh' result sent to
+# the robot. idle(), called in the loop's sleep, writes the buffer to the file
+# in one write() once it holds `batch` bytes or flush_ms have passed, so flash
+# and SD writes never land inside a frame and a crash loses at most that
+# much. When idle() falls behind and the buffer is full, records are dropped
+# and counted; the frame loop never waits.
+#
+# With frame_every = N the raw grayscale frame of every Nth record is copied
+# into a second preallocated buffer (record() is called before the overlay
+# is drawn) and idle() writes it as `chunk`-sized image records, one per call,
+# so a 76.8 KB QVGA frame is spread over several sleeps. The next frame is
+# only taken once the previous one is out. The frame buffer is allocated once
+# up front (76.8 KB of heap for QVGA).
+#
+# Every boot starts a new file, prefix + 4 digit index + '.bin', after the
+# highest one found. A new file is also started once one holds max_bytes,
+# between records and never inside a raw frame, so a file may run over by a
+# frame. Only the last `files` are kept. host/flight_log.py parses the logs.
+#
+# File layout, little-endian: b'OBFR', version u8, then records of
+#   type u8, body length u16, body
+#   'D' detection: seq u32, ticks_ms u32, dist u16, limit u8, flags u8,
+#       result 3 x i16, target id u8 (0xFF = none), target x, y, w, h u16,
+#       blob count u8, then per blob x, y, w, h u16, pixels u32, cx, cy u16
+#   'I' image chunk: seq u32, width u16, height u16, offset u32, pixels
+
+import os
+import struct
+import time
+
+MAGIC = b'OBFR'
+VERSION = 1
+PREFIX = '<BH'
+DETECTION = '<IIHBBhhhBHHHHB'
+BLOB = '<HHHHIHH'
+IMAGE = '<IHHI'
+PREFIX_SIZE = struct.calcsize(PREFIX)
+DETECTION_SIZE = struct.calcsize(DETECTION)
+BLOB_SIZE = struct.calcsize(BLOB)
+IMAGE_SIZE = struct.calcsize(IMAGE)
+TYPE_DETECTION = b'D'[0]
+TYPE_IMAGE = b'I'[0]
+
+# Detection flags
+GATED = 0x01      # result reused by the motion gate, no detection ran
+IMAGE_NEXT = 0x02  # the raw frame of this record follows in image records
+TRUNCATED = 0x04  # more blobs than max_blobs, the rest were not logged
+PARTIAL = 0x08    # the blobs come from a search window, not the full frame
+
+
+class FlightRecorder:
+    def __init__(self, prefix='flight', width=320, height=240, frame_every=0, max_blobs=16,
+                 buffer_size=4096, batch=2048, flush_ms=1000, chunk=4096, max_bytes=4 * 1024 * 1024,
+                 files=4):
+        self.prefix = prefix
+        self.frame_every = frame_every
+        self.max_blobs = max_blobs
+        self.batch = batch
+        self.flush_ms = flush_ms
+        self.chunk = chunk
+        self.max_bytes = max_bytes
+        self.files = files
+        self.buf = bytearray(buffer_size)
+        self._mv = memoryview(self.buf)
+        self.n = 0
+        self.width = width
+        self.height = height
+        self.frame = bytearray(width * height) if frame_every else None
+        # Views of the frame chunks, made once: slicing in idle() would allocate
+        view = memoryview(self.frame) if frame_every else None
+        self._chunks = [view[off:off + chunk] for off in range(0, len(self.frame), chunk)] if frame_every else None
+        self._image_head = bytearray(PREFIX_SIZE + IMAGE_SIZE)
+        self._image_seq = 0
+        self._image_chunk = -1  # next chunk to write, -1 = no frame pending
+        self._blobs = None
+        self._partial = False
+        self.seq = 0
+        self.records = 0
+        self.images = 0
+        self.dropped = 0
+        self.skipped_images = 0  # frames not taken because the previous one was still being written
+        self.written = 0
+        self.writes = 0
+        self.write_us_max = 0
+        self._flushed = time.ticks_ms()
+        self._file = None
+        self._size = 0
+        self.index = self._next_index()
+        self._open()
+
+    def _names(self):
+        # (directory, name prefix) of the log files
+        cut = self.prefix.rfind('/')
+        if cut < 0:
+            return '', self.prefix
+        return self.prefix[:cut] or '/', self.prefix[cut + 1:]
+
+    def _next_index(self):
+        folder, stem = self._names()
+        last = -1
+        try:
+            names = os.listdir(folder) if folder else os.listdir()
+        except OSError:
+            names = ()
+        for name in names:
+            digits = name[len(stem):-4]
+            if name.startswith(stem) and name.endswith('.bin') and len(digits) == 4 and digits.isdigit():
+                last = max(last, int(digits))
+        return last + 1
+
+    def path(self, index):
+        return '%s%04d.bin' % (self.prefix, index)
+
+    def _open(self):
+        if self._file is not None:
+            self._file.close()
+        old = self.index - self.files
+        if old >= 0:
+            try:
+                os.remove(self.path(old))
+            except OSError:
+                pass
+        self._file = open(self.path(self.index), 'wb')
+        self._file.write(MAGIC + bytes((VERSION,)))
+        self._size = len(MAGIC) + 1
+
+    def _write(self, data):
+        self._file.write(data)
+        self._size += len(data)
+        self.written += len(data)
+
+    def set_blobs(self, blobs, partial=False):
+        # The blobs of the current frame (the last find_blobs() call wins)
+        self._blobs = blobs
+        self._partial = partial
+
+    def record(self, img, dist, limit, target, target_id, result, gated=False):
+        self.seq += 1
+        blobs = self._blobs
+        self._blobs = None
+        count = len(blobs) if blobs else 0
+        flags = GATED if gated else 0
+        if count > self.max_blobs:
+            count = self.max_blobs
+            flags |= TRUNCATED
+        if self._partial and count:
+            flags |= PARTIAL
+        if self.frame_every and self.seq % self.frame_every == 0:
+            if self._image_chunk >= 0 or img.size() != len(self.frame):
+                self.skipped_images += 1
+            else:
+                self.frame[:] = img.bytearray()  # before the overlay is drawn
+                self._image_seq = self.seq
+                self._image_chunk = 0
+                flags |= IMAGE_NEXT
+        size = PREFIX_SIZE + DETECTION_SIZE + count * BLOB_SIZE
+        pos = self.n
+        if pos + size > len(self.buf):
+            self.dropped += 1
+            return False
+        buf = self.buf
+        struct.pack_into(PREFIX, buf, pos, TYPE_DETECTION, size - PREFIX_SIZE)
+        if target is None:
+            struct.pack_into(DETECTION, buf, pos + PREFIX_SIZE, self.seq, time.ticks_ms(), dist, limit, flags,
+                             result[0], result[1], result[2], 0xFF, 0, 0, 0, 0, count)
+        else:
+            struct.pack_into(DETECTION, buf, pos + PREFIX_SIZE, self.seq, time.ticks_ms(), dist, limit, flags,
+                             result[0], result[1], result[2], target_id & 0xFF,
+                             target.x(), target.y(), target.w(), target.h(), count)
+        pos += PREFIX_SIZE + DETECTION_SIZE
+        for i in range(count):
+            b = blobs[i]
+            struct.pack_into(BLOB, buf, pos, b.x(), b.y(), b.w(), b.h(), b.pixels(), b.cx(), b.cy())
+            pos += BLOB_SIZE
+        self.n = pos
+        self.records += 1
+        return True
+
+    def idle(self, force=False):
+        # Write what is due: the buffered records, then one chunk of a pending frame
+        now = time.ticks_ms()
+        start = time.ticks_us()
+        wrote = False
+        if self._size >= self.max_bytes and self._image_chunk < 0:
+            self.index += 1  # a record or raw frame never spans two files
+            self._open()
+        # The records go out before the first chunk of a frame, the reader
+        # pairs the frame with the record flagged IMAGE_NEXT ahead of it
+        if self.n and (force or self.n >= self.batch or self._image_chunk == 0
+                       or time.ticks_diff(now, self._flushed) >= self.flush_ms):
+            self._write(self._mv[:self.n])
+            self.n = 0
+            self._flushed = now
+            wrote = True
+        if self._image_chunk >= 0:
+            i = self._image_chunk
+            data = self._chunks[i]
+            struct.pack_into(PREFIX, self._image_head, 0, TYPE_IMAGE, IMAGE_SIZE + len(data))
+            struct.pack_into(IMAGE, self._image_head, PREFIX_SIZE, self._image_seq, self.width, self.height,
+                             i * self.chunk)
+            self._write(self._image_head)
+            self._write(data)
+            i += 1
+            if i == len(self._chunks):
+                i = -1
+                self.images += 1
+            self._image_chunk = i
+            wrote = True
+        if wrote:
+            self._file.flush()
+            us = time.ticks_diff(time.ticks_us(), start)
+            self.writes += 1
+            if us > self.write_us_max:
+                self.write_us_max = us
+        return wrote
+
+    def close(self):
+        while self._image_chunk >= 0:
+            self.idle(True)
+        self.idle(True)
+        self._file.close()
+        self._file = None
+
+    def summary(self):
+        return ("recorder %s: %d records, %d dropped, %d frames (%d skipped), %d bytes in %d writes (max %d us)" % (
+            self.path(self.index), self.records, self.dropped, self.images, self.skipped_images,
+            self.written, self.writes, self.write_us_max))
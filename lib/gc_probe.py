@@ -0,0 +1,89 @@
+# GC probe - heap allocation and collection pauses per frame
+#
+# begin() and end() around a frame record the gc.mem_alloc() delta (bytes
+# the frame allocated on the MicroPython heap) and the frame time in us. A
+# delta below zero means an automatic collection ran inside the frame: those
+# frames are counted and timed apart from the others, they are the latency
+# spikes. idle() runs gc.collect() between frames (in the loop's sleep, or
+# once the heap holds more than collect_above bytes) and times the pause, so
+# collections happen where they do not delay a result.
+#
+# Only running counters are kept (no lists), so the probe does not allocate
+# itself; summary() reports and starts a new window. CPython has no
+# gc.mem_alloc(), deltas read 0 there (host/bench_gc.py counts allocations
+# on the host instead).
+
+import gc
+import time
+
+_mem_alloc = getattr(gc, 'mem_alloc', None)
+
+
+def mem_alloc():
+    return _mem_alloc() if _mem_alloc else 0
+
+
+class GcProbe:
+    def __init__(self, collect_above=0):
+        self.collect_above = collect_above  # idle() collects above this many bytes (0 = always)
+        self._start = 0
+        self._alloc = 0
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.alloc_sum = 0
+        self.alloc_max = 0
+        self.clean_us_sum = 0  # frames without a collection
+        self.clean_us_max = 0
+        self.auto = 0          # frames with an automatic collection
+        self.auto_us_max = 0
+        self.collects = 0      # idle() collections
+        self.pause_us_sum = 0
+        self.pause_us_max = 0
+
+    def begin(self):
+        self._alloc = mem_alloc()
+        self._start = time.ticks_us()
+
+    def end(self):
+        us = time.ticks_diff(time.ticks_us(), self._start)
+        delta = mem_alloc() - self._alloc
+        self.frames += 1
+        if delta < 0:
+            # Collected inside the frame, its allocation is unknown
+            self.auto += 1
+            if us > self.auto_us_max:
+                self.auto_us_max = us
+            return
+        self.alloc_sum += delta
+        if delta > self.alloc_max:
+            self.alloc_max = delta
+        self.clean_us_sum += us
+        if us > self.clean_us_max:
+            self.clean_us_max = us
+
+    def idle(self):
+        # Collect between frames; True when a collection ran
+        if self.collect_above and mem_alloc() < self.collect_above:
+            return False
+        start = time.ticks_us()
+        gc.collect()
+        us = time.ticks_diff(time.ticks_us(), start)
+        self.collects += 1
+        self.pause_us_sum += us
+        if us > self.pause_us_max:
+            self.pause_us_max = us
+        return True
+
+    def summary(self):
+        clean = self.frames - self.auto
+        text = ("gc: %d frames, %d B/frame (max %d); frame %d us mean, %d max; "
+                "%d automatic collections (frame max %d us); %d idle collections (%d us mean, %d max)" % (
+                    self.frames, self.alloc_sum // clean if clean else 0, self.alloc_max,
+                    self.clean_us_sum // clean if clean else 0, self.clean_us_max,
+                    self.auto, self.auto_us_max,
+                    self.collects, self.pause_us_sum // self.collects if self.collects else 0,
+                    self.pause_us_max))
+        self.reset()
+        return text
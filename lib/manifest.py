@@ -0,0 +1,35 @@
+# Freeze manifest - lib/ compiled into the OpenMV firmware
+#
+# Frozen modules run their bytecode straight from flash: no compile at import
+# and no heap for the code, which is the most a boot can save. Include this
+# file from the board manifest of an OpenMV firmware build
+# (boards/ARDUINO_NICLA_VISION/manifest.py):
+#
+#   include("/path/to/arduino_camera/lib/manifest.py")
+#
+# then remove lib/ from the camera drive: with both, sys.path order decides
+# which copy is imported. Without a firmware build, host/build_mpy.py
+# precompiles the same modules to .mpy files for the drive. Not a module the
+# camera imports (host/build_mpy.py skips it).
+
+package("vision")
+
+module("boot_sequence.py")
+module("flight_recorder.py")
+module("gc_probe.py")
+module("mjpeg_server.py")
+module("motion_gate.py")
+module("obstacle_batch.py")
+module("roi_search.py")
+module("smoother.py")
+module("stage_profiler.py")
+module("stream_rate.py")
+module("stream_stage.py")
+module("threshold.py")
+module("tof_ranging.py")
+module("tof_zones.py")
+module("tracker.py")
+module("uart_baud.py")
+module("uart_frame.py")
+module("uart_responder.py")
+module("wifi_link.py")
@@ -0,0 +1,324 @@
+# MJPEG server - streams the latest frame to several browsers without blocking
+#
+# Every socket is non-blocking and serviced from poll() between frames, so
+# detection never waits for the network. A client only holds the frame it is
+# sending: when that is done it takes the newest published frame, and frames
+# produced while it was busy are counted as dropped, never queued. A slow
+# browser gets a lower frame rate instead of a slower camera. offer() only
+# encodes a JPEG when some client is ready for one.
+#
+# A client that takes no data for stall_ms is disconnected (the old blocking
+# sendall had a 5 s socket timeout for the same purpose).
+#
+# With a rate controller (lib/stream_rate.py) the JPEG quality, preview scale
+# and decimation follow the measured send time of every frame.
+#
+# route(path, handler) serves a text page next to the stream (e.g. /metrics):
+# the handler returns the body when the request comes in, it is sent like a
+# frame and the connection is closed. profile(profiler, stage) adds the JPEG
+# encode time of every offered frame to a lib/stage_profiler.py stage.
+
+import errno
+import select
+import socket
+import time
+
+RESPONSE = (b"HTTP/1.1 200 OK\r\n"
+            b"Server: OpenMV\r\n"
+            b"Content-Type: multipart/x-mixed-replace;boundary=openmv\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Pragma: no-cache\r\n\r\n")
+BUSY = b"HTTP/1.1 503 Service Unavailable\r\nConnection: close\r\n\r\n"
+TEXT = ("HTTP/1.1 200 OK\r\n"
+        "Server: OpenMV\r\n"
+        "Content-Type: text/plain; version=0.0.4\r\n"
+        "Content-Length:%d\r\n"
+        "Connection: close\r\n\r\n")
+PART = "\r\n--openmv\r\nContent-Type: image/jpeg\r\nContent-Length:%d\r\n\r\n"
+MAX_REQUEST = 1024
+
+
+class _Client:
+    def __init__(self, sock, addr, now):
+        self.sock = sock
+        self.addr = addr
+        self.request = b''
+        self.path = None      # set once the request has been read
+        self.parts = None     # buffers being sent, None = waiting for a frame
+        self.part = 0
+        self.offset = 0
+        self.in_frame = False
+        self.page = False     # a route's page: closed once sent
+        self.seq = 0          # last frame taken
+        self.since = now      # last progress
+        self.taken = now      # when the frame being sent was taken
+        self.missed = 0       # frames skipped before it
+        self.frames = 0
+        self.dropped = 0
+        self.bytes = 0
+        self.window_start = now
+        self.window_frames = 0
+        self.window_dropped = 0
+
+    def name(self):
+        return '%s:%d' % (self.addr[0], self.addr[1])
+
+
+class MjpegServer:
+    def __init__(self, port=8080, max_clients=4, stall_ms=5000, rate=None):
+        self.port = port
+        self.rate = rate
+        self.max_clients = max_clients
+        self.stall_ms = stall_ms
+        self.clients = []
+        self.seq = 0            # frames offered
+        self.frame_seq = 0      # frame held in self.frame
+        self.frame = None       # (part header, jpeg)
+        self.encoded = 0
+        self.refused = 0
+        self.stalled = 0
+        self.routes = {}
+        self.profiler = None
+        self.profile_stage = 0
+        self._listener = None
+        self._poller = select.poll()
+        self._lookup = {}
+
+    def route(self, path, handler):
+        # Serve handler() (str or bytes) as text/plain at `path` (bytes)
+        self.routes[path] = handler
+        return self
+
+    def profile(self, profiler, stage):
+        self.profiler = profiler
+        self.profile_stage = stage
+        return self
+
+    def start(self, host='0.0.0.0'):
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((host, self.port))
+        s.listen(2)
+        s.setblocking(False)
+        self._listener = s
+        self._register(s, self, select.POLLIN)
+        return self
+
+    def close(self):
+        for client in list(self.clients):
+            self._close(client)
+        if self._listener is not None:
+            self._poller.unregister(self._listener)
+            self._listener.close()
+            self._listener = None
+
+    def _register(self, sock, owner, mask):
+        self._poller.register(sock, mask)
+        # MicroPython's poll() returns the socket, CPython's the descriptor
+        self._lookup[sock] = owner
+        if hasattr(sock, 'fileno'):
+            self._lookup[sock.fileno()] = owner
+
+    def _close(self, client):
+        self.clients.remove(client)
+        self._lookup.pop(client.sock, None)
+        if hasattr(client.sock, 'fileno'):
+            self._lookup.pop(client.sock.fileno(), None)
+        self._poller.unregister(client.sock)
+        client.sock.close()
+        if self.rate is not None:
+            self.rate.forget(client)
+
+    def ready(self):
+        # True when a streaming client would take a new frame right now
+        for client in self.clients:
+            if client.path is not None and client.parts is None:
+                return True
+        return False
+
+    def poll(self):
+        # Accept, read requests and push pending data; never blocks
+        now = time.ticks_ms()
+        for entry in self._poller.poll(0):
+            owner = self._lookup.get(entry[0])
+            if owner is None:
+                continue
+            if owner is self:
+                self._accept(now)
+            elif entry[1] & (select.POLLERR | select.POLLHUP):
+                self._close(owner)
+            elif owner.path is None:
+                self._read_request(owner, now)
+            else:
+                self._send(owner, now)
+        for client in list(self.clients):
+            busy = client.path is None or client.parts is not None
+            if busy and time.ticks_diff(now, client.since) > self.stall_ms:
+                self.stalled += 1
+                self._close(client)
+
+    def offer(self, img, quality=35, scale=1.0):
+        # One camera frame: encoded only if a client is ready to take it, as a
+        # downscaled copy when scale < 1 (quality is ignored with a rate controller)
+        self.poll()
+        if self.rate is not None and not self.rate.want():
+            return False  # decimated, not counted as dropped
+        self.seq += 1
+        if not self.ready():
+            return False
+        start = time.ticks_us()
+        if self.rate is not None:
+            jpeg = self.rate.encode(img, scale)
+        elif scale != 1.0:
+            jpeg = img.copy(x_scale=scale, y_scale=scale).to_jpeg(quality=quality, copy=True)
+        else:
+            jpeg = img.to_jpeg(quality=quality, copy=True)
+        if self.profiler is not None:
+            self.profiler.add(self.profile_stage, time.ticks_diff(time.ticks_us(), start))
+        self._set_frame(jpeg)
+        return True
+
+    def publish(self, jpeg):
+        # Make `jpeg` (any buffer) the latest frame; it must not be modified afterwards
+        self.seq += 1
+        self._set_frame(jpeg)
+
+    def _set_frame(self, jpeg):
+        data = memoryview(jpeg)
+        self.frame = ((PART % len(data)).encode(), data)
+        self.frame_seq = self.seq
+        self.encoded += 1
+        now = time.ticks_ms()
+        for client in list(self.clients):
+            if client.path is not None and client.parts is None:
+                self._take_frame(client, now)
+                self._send(client, now)
+
+    def _accept(self, now):
+        try:
+            sock, addr = self._listener.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        if len(self.clients) >= self.max_clients:
+            self.refused += 1
+            try:
+                sock.send(BUSY)
+            except OSError:
+                pass
+            sock.close()
+            return
+        client = _Client(sock, addr, now)
+        self.clients.append(client)
+        self._register(sock, client, select.POLLIN)
+
+    def _read_request(self, client, now):
+        try:
+            data = client.sock.recv(MAX_REQUEST - len(client.request))
+        except OSError as e:
+            if e.args[0] != errno.EAGAIN:
+                self._close(client)
+            return
+        if not data:
+            self._close(client)
+            return
+        client.request += data
+        client.since = now
+        end = client.request.find(b'\r\n\r\n')
+        if end < 0:
+            if len(client.request) >= MAX_REQUEST:
+                self._close(client)
+            return
+        line = client.request[:client.request.find(b'\r\n')].split()
+        client.path = line[1] if len(line) > 1 else b'/'
+        client.request = b''
+        handler = self.routes.get(client.path.split(b'?')[0])
+        if handler is not None:
+            body = handler()
+            if isinstance(body, str):
+                body = body.encode()
+            client.parts = ((TEXT % len(body)).encode(), body)
+            client.page = True
+        else:
+            client.parts = (RESPONSE,)
+        client.part = 0
+        client.offset = 0
+        client.in_frame = False
+        # Start with the current frame if there is one
+        client.seq = self.frame_seq - 1 if self.frame else self.seq
+        self._poller.modify(client.sock, select.POLLOUT)
+
+    def _take_frame(self, client, now):
+        client.parts = None
+        if self.frame is None or self.frame_seq == client.seq:
+            self._poller.modify(client.sock, 0)
+            return
+        missed = self.frame_seq - client.seq - 1
+        client.dropped += missed
+        client.window_dropped += missed
+        client.missed = missed
+        client.seq = self.frame_seq
+        client.parts = self.frame
+        client.part = 0
+        client.offset = 0
+        client.in_frame = True
+        client.since = now
+        client.taken = now
+        self._poller.modify(client.sock, select.POLLOUT)
+
+    def _send(self, client, now):
+        # Write until the socket buffer is full or the client waits for a frame
+        while client.parts is not None:
+            buf = client.parts[client.part]
+            try:
+                n = client.sock.send(buf[client.offset:] if client.offset else buf)
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    self._close(client)
+                return
+            if not n:
+                return
+            client.offset += n
+            client.bytes += n
+            client.since = now
+            if client.offset < len(buf):
+                continue
+            client.part += 1
+            client.offset = 0
+            if client.part < len(client.parts):
+                continue
+            if client.page:
+                self._close(client)
+                return
+            if client.in_frame:
+                client.frames += 1
+                client.window_frames += 1
+                if self.rate is not None:
+                    size = len(client.parts[0]) + len(client.parts[1])
+                    self.rate.sent(client, size, time.ticks_diff(now, client.taken), client.missed)
+            self._take_frame(client, now)
+
+    def stats(self):
+        # Per client (name, fps, dropped) since the last call, plus totals
+        now = time.ticks_ms()
+        out = []
+        for client in self.clients:
+            if client.path is None:
+                continue
+            dt = time.ticks_diff(now, client.window_start)
+            fps = client.window_frames * 1000.0 / dt if dt > 0 else 0.0
+            out.append((client.name(), fps, client.window_dropped, client.frames, client.dropped))
+            client.window_start = now
+            client.window_frames = 0
+            client.window_dropped = 0
+        return out
+
+    def summary(self):
+        lines = ["mjpeg: %d clients, %d offered, %d encoded, %d refused, %d stalled" % (
+            len(self.clients), self.seq, self.encoded, self.refused, self.stalled)]
+        if self.rate is not None:
+            lines.append(self.rate.summary())
+        for name, fps, dropped, frames, total_dropped in self.stats():
+            lines.append("  %s: %.1f fps, %d dropped (total %d sent, %d dropped)" % (
+                name, fps, dropped, frames, total_dropped))
+        return '\n'.join(lines)
@@ -0,0 +1,107 @@
+# Motion gate - skip blob detection while nothing changes
+#
+# Each frame is area-averaged into a small signature (e.g. 16x12 cells for
+# QVGA) held in an image allocated on the first frame, and compared in place
+# with the signature of the last frame that was actually processed. If only a
+# few cells changed by more than `cell_delta` grey levels and the ToF reading
+# moved less than `tof_delta` mm, the previous target and result are reused.
+# After `max_skip` reused frames a detection is forced.
+# An empty result (0, 0, 0) is reused like any other, e.g. an empty corridor,
+# unless the detection marked it pending: blobs the tracker has not confirmed
+# yet, or a target without a zone distance. Those change over the next
+# frames of an unchanged scene, so the gate keeps detecting until they do.
+
+import image
+import time
+
+
+class MotionGate:
+    def __init__(self, pool=20, cell_delta=12, max_cells=2, tof_delta=30, max_skip=15):
+        self.pool = pool
+        self.cell_delta = cell_delta
+        self.max_cells = max_cells
+        self.tof_delta = tof_delta
+        self.max_skip = max_skip
+        self.scale = 1 / pool
+        self._all = slice(None)  # ref[:] = sig without a new slice object every frame
+        self.reset()
+        self.reset_stats()
+
+    def reset(self):
+        # Forget the reference frame, the next check() always runs detection
+        self.small = None    # rebuilt from the next frame, e.g. after a frame size change
+        self.sig = None
+        self.ref = None
+        self.ref_dist = 0
+        self.skipped = 0
+        self.target = None
+        self.result = None
+        self.pending = False
+        self.t_detect = 0
+
+    def reset_stats(self):
+        self.frames = 0
+        self.skips = 0
+        self.detect_us = 0   # running average cost of one detection
+        self.gate_us = 0     # total time spent in check()
+        self.saved_us = 0    # estimated detection time avoided
+
+    def skip_ratio(self):
+        return self.skips / self.frames if self.frames else 0.0
+
+    def summary(self):
+        return "motion gate skipped %d of %d frames (%.0f%%), saved ~%d ms, gate cost %d ms" % (
+            self.skips, self.frames, 100 * self.skip_ratio(), self.saved_us // 1000, self.gate_us // 1000)
+
+    def _changed(self, sig, dist):
+        ref = self.ref
+        if ref is None or self.skipped >= self.max_skip:
+            return True
+        if self.pending:
+            return True  # the last result was not final
+        if abs(dist - self.ref_dist) > self.tof_delta:
+            return True
+        cd = self.cell_delta
+        limit = self.max_cells
+        changed = 0
+        for i in range(len(sig)):
+            d = sig[i] - ref[i]
+            if d > cd or d < -cd:
+                changed += 1
+                if changed > limit:
+                    return True
+        return False
+
+    def check(self, img, dist):
+        # True: scene unchanged, use self.target / self.result instead of detecting
+        t0 = time.ticks_us()
+        self.frames += 1
+        small = self.small
+        if small is None:
+            small = self.small = image.Image(img.width() // self.pool, img.height() // self.pool, img.format())
+            self.sig = small.bytearray()
+        small.draw_image(img, 0, 0, x_scale=self.scale, y_scale=self.scale, hint=image.AREA)
+        sig = self.sig
+        if self._changed(sig, dist):
+            if self.ref is None:
+                self.ref = bytearray(sig)
+            else:
+                self.ref[self._all] = sig
+            self.ref_dist = dist
+            self.skipped = 0
+            self.t_detect = time.ticks_us()
+            self.gate_us += time.ticks_diff(self.t_detect, t0)
+            return False
+        self.skipped += 1
+        self.skips += 1
+        self.saved_us += self.detect_us
+        self.gate_us += time.ticks_diff(time.ticks_us(), t0)
+        return True
+
+    def store(self, target, result, pending=False):
+        # Call after a detection that check() allowed, with its outcome
+        self.target = target
+        self.result = result
+        self.pending = pending
+        cost = time.ticks_diff(time.ticks_us(), self.t_detect)
+        self.detect_us = cost if self.detect_us == 0 else (self.detect_us * 7 + cost) // 8
@@ -0,0 +1,126 @@
+# Multi-obstacle batch packet
+#
+#   version | count | count x obstacle
+#   obstacle = track_id, x_offset, width, distance, area     (all varints)
+#
+# Varints are LEB128 (7 bits per byte, low bits first); signed fields are
+# zigzag coded. x_offset and distance are deltas from the previous obstacle
+# (the first one from 0), so neighbouring obstacles at similar depths cost a
+# byte or two per field. Units: mm, area in blob pixels / 16.
+#
+# The first obstacle is the primary target (the smoothed single result of
+# the old '<hhh' packet), the others follow. The payload is sent in a frame
+# of lib/uart_frame.py; the robot decoder is uart_robot/obstacle_batch.c.
+#
+# BatchEncoder writes into a preallocated buffer (no allocation per frame);
+# encode() / decode() are the convenience codec for host tools.
+
+import struct
+
+VERSION = 1
+MAX_OBSTACLES = 6
+MAX_OBSTACLE_SIZE = 3 + 3 + 3 + 3 + 3   # five 16-bit varints
+MAX_SIZE = 2 + MAX_OBSTACLES * MAX_OBSTACLE_SIZE
+
+
+def _zigzag(v):
+    return (v << 1) if v >= 0 else ((-v << 1) - 1)
+
+
+def _unzigzag(u):
+    return (u >> 1) if not u & 1 else -((u + 1) >> 1)
+
+
+def _clamp(v, lo, hi):
+    return lo if v < lo else hi if v > hi else v
+
+
+class BatchEncoder:
+    def __init__(self, buf=None, offset=0, max_obstacles=MAX_OBSTACLES):
+        self.buf = buf if buf is not None else bytearray(2 + max_obstacles * MAX_OBSTACLE_SIZE)
+        self.offset = offset
+        self.max_obstacles = max_obstacles
+        self.begin()
+
+    def begin(self):
+        self.pos = self.offset + 2
+        self.count = 0
+        self.prev_x = 0
+        self.prev_d = 0
+
+    def _put(self, u):
+        buf = self.buf
+        pos = self.pos
+        while u > 0x7F:
+            buf[pos] = (u & 0x7F) | 0x80
+            u >>= 7
+            pos += 1
+        buf[pos] = u
+        self.pos = pos + 1
+
+    def add(self, track_id, x_offset, width, distance, area):
+        # Append one obstacle; False when the batch is full
+        if self.count >= self.max_obstacles:
+            return False
+        x_offset = _clamp(int(x_offset), -32768, 32767)
+        distance = _clamp(int(distance), -32768, 32767)
+        self._put(_clamp(int(track_id), 0, 65535))
+        self._put(_zigzag(x_offset - self.prev_x))
+        self._put(_clamp(int(width), 0, 65535))
+        self._put(_zigzag(distance - self.prev_d))
+        self._put(_clamp(int(area), 0, 65535))
+        self.prev_x = x_offset
+        self.prev_d = distance
+        self.count += 1
+        return True
+
+    def end(self):
+        # Write the header; returns the payload length
+        struct.pack_into('<BB', self.buf, self.offset, VERSION, self.count)
+        return self.pos - self.offset
+
+
+def encode(obstacles):
+    # [(track_id, x_offset, width, distance, area), ...] -> bytes
+    enc = BatchEncoder(max_obstacles=len(obstacles))
+    for ob in obstacles:
+        enc.add(*ob)
+    return bytes(enc.buf[:enc.end()])
+
+
+def decode(payload):
+    # bytes -> [(track_id, x_offset, width, distance, area), ...]; ValueError if malformed
+    if len(payload) < 2:
+        raise ValueError("batch too short")
+    version, count = payload[0], payload[1]
+    if version != VERSION:
+        raise ValueError("unsupported batch version %d" % version)
+    if count > MAX_OBSTACLES:
+        raise ValueError("%d obstacles, at most %d" % (count, MAX_OBSTACLES))
+    pos = 2
+    n = len(payload)
+    out = []
+    x = d = 0
+    for _ in range(count):
+        fields = []
+        for _ in range(5):
+            u = 0
+            shift = 0
+            while True:
+                if pos >= n or shift > 14:
+                    raise ValueError("truncated or oversized varint")
+                b = payload[pos]
+                pos += 1
+                u |= (b & 0x7F) << shift
+                shift += 7
+                if not b & 0x80:
+                    break
+            fields.append(u)
+        x += _unzigzag(fields[1])
+        d += _unzigzag(fields[3])
+        if max(fields[0], fields[2], fields[4]) > 65535 or not (-32768 <= x <= 32767 and -32768 <= d <= 32767):
+            raise ValueError("value out of range")
+        out.append((fields[0], x, fields[2], d, fields[4]))
+    if pos != n:
+        raise ValueError("%d trailing bytes" % (n - pos))
+    return out
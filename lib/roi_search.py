@@ -0,0 +1,107 @@
+# Coarse-to-wide search for the target around the ToF line of sight
+#
+# The ToF sensor measures at the image center, so the blob it sees must cover
+# the center. The target is first searched in a small window around the
+# center; the last level is always the full frame (the old behaviour).
+#
+# A target found in a window is only accepted when it covers the center and
+# does not touch the window border. A blob cut by the ROI has wrong edges, so
+# the search widens to the next window. When no blob in the window covers the
+# center, a wider window would not find one either (it is the same pixels),
+# so the search goes straight to one full-frame pass for the nearest blob.
+# The threshold limit is the caller's, taken once per frame from the full
+# frame, so a near obstacle filling a window does not skew it.
+#
+# Each frame starts at the smallest window that held the last target, so a
+# target larger than the windows, one off the line of sight or an empty scene
+# costs one full-frame pass instead of a pass per window. After a miss the
+# next frame starts at the full frame too; a target found there brings the
+# start back down.
+
+
+class RoiSearch:
+    def __init__(self, width, height, levels=((96, 72), (192, 144))):
+        self.levels = levels
+        self.set_frame(width, height)
+
+    def set_frame(self, width, height):
+        # (Re)build the ROIs for a frame size, e.g. after a frame size change
+        self.width = width
+        self.height = height
+        self.center_x = width // 2
+        self.center_y = height // 2
+        self.rois = []
+        for w, h in self.levels:
+            if w < width or h < height:
+                self.rois.append(self.centered(min(w, width), min(h, height)))
+        self.rois.append((0, 0, width, height))
+        self.start = 0
+        self.reset_stats()
+
+    def centered(self, w, h):
+        x = max(0, min(self.width - w, self.center_x - w // 2))
+        y = max(0, min(self.height - h, self.center_y - h // 2))
+        return (x, y, w, h)
+
+    def reset_stats(self):
+        self.frames = 0
+        self.misses = 0
+        self.hits = [0] * len(self.rois)
+
+    def covers(self, blob):
+        # On the ToF line of sight
+        bx = blob.x()
+        by = blob.y()
+        return bx <= self.center_x <= bx + blob.w() and by <= self.center_y <= by + blob.h()
+
+    def inside(self, blob, roi):
+        # Lies fully inside the ROI (edges shared with the frame border are fine)
+        x, y, w, h = roi
+        bx = blob.x()
+        by = blob.y()
+        if bx <= x and x > 0 or by <= y and y > 0:
+            return False
+        if bx + blob.w() >= x + w and x + w < self.width or by + blob.h() >= y + h and y + h < self.height:
+            return False
+        return True
+
+    def search(self, find, img):
+        # find(img, roi) returns the selected blob inside roi, or None
+        self.frames += 1
+        last = len(self.rois) - 1
+        level = self.start
+        while level < last:
+            roi = self.rois[level]
+            target = find(img, roi)
+            if target is None or not self.covers(target):
+                break  # nothing on the line of sight, one full-frame pass
+            if self.inside(target, roi):
+                self.hits[level] += 1
+                self.start = self.fit(target)
+                return target
+            level += 1  # cut by the window, widen
+        target = find(img, self.rois[last])
+        if target is None:
+            self.misses += 1
+            self.start = last
+        else:
+            self.hits[last] += 1
+            self.start = self.fit(target)
+        return target
+
+    def fit(self, target):
+        # Smallest level whose window holds the target, the full frame if none
+        last = len(self.rois) - 1
+        if not self.covers(target):
+            return last
+        level = 0
+        while level < last and not self.inside(target, self.rois[level]):
+            level += 1
+        return level
+
+    def fast_path_ratio(self):
+        return self.hits[0] / self.frames if self.frames else 0.0
+
+    def summary(self):
+        return "roi hits %s misses %d of %d frames (fast path %.0f%%)" % (
+            self.hits, self.misses, self.frames, 100 * self.fast_path_ratio())
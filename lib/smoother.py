@@ -0,0 +1,61 @@
+# Moving average of obstacle readings - ring buffer with running sums
+#
+# Keeps the last `window` (x_min, x_max, distance) readings in a preallocated
+# array('h') and updates running sums on every add, so the cost per frame is
+# constant. add() returns a new tuple, or fills the caller's list `out` so the
+# frame loop allocates nothing.
+
+from array import array
+
+
+class RingSmoother:
+    def __init__(self, window=10):
+        self.resize(window)
+
+    def resize(self, window):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = window
+        self.buf = array('h', bytes(2 * 3 * window))  # x_min, x_max, dist interleaved
+        self.reset()
+
+    def reset(self):
+        # Forget all readings, e.g. when the target is lost or the profile changes
+        self.count = 0
+        self.index = 0
+        self.sum_x_min = 0
+        self.sum_x_max = 0
+        self.sum_dist = 0
+
+    def add(self, x_min, x_max, dist, out=None):
+        # Store a reading and return the average of the last `window` readings.
+        # Until the window is full the raw reading is returned, as before.
+        buf = self.buf
+        i = self.index * 3
+        if self.count == self.window:
+            self.sum_x_min -= buf[i]
+            self.sum_x_max -= buf[i + 1]
+            self.sum_dist -= buf[i + 2]
+        else:
+            self.count += 1
+        buf[i] = x_min
+        buf[i + 1] = x_max
+        buf[i + 2] = dist
+        self.sum_x_min += x_min
+        self.sum_x_max += x_max
+        self.sum_dist += dist
+        self.index += 1
+        if self.index == self.window:
+            self.index = 0
+
+        if self.count == self.window:
+            n = self.window
+            x_min = self.sum_x_min // n
+            x_max = self.sum_x_max // n
+            dist = self.sum_dist // n
+        if out is None:
+            return x_min, x_max, dist
+        out[0] = x_min
+        out[1] = x_max
+        out[2] = dist
+        return out
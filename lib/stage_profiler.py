@@ -0,0 +1,172 @@
+# Stage profiler - time per pipeline stage, as histograms read over UART or HTTP
+#
+# The frame loop marks stage boundaries with ticks_us(): begin() at the start
+# of a frame, lap(stage) after each stage adds the time since the previous
+# mark to that stage, end() closes the frame. Time a component measures
+# inside a stage (the MJPEG server's JPEG encode) is added with add(stage, us)
+# and taken out of the enclosing lap. A stage that runs several times in a
+# frame (ROI search) is summed over the frame; a stage that did not run in a
+# frame is not counted for it.
+#
+# Per stage and for the whole frame: frames, total time, a recent mean (1/16
+# decay), max and a histogram of power-of-two bins (below 64 us, 64-128 us,
+# ... 262 ms and above). Everything lives in arrays allocated up front, so the
+# frame loop does not allocate; report() (one line per stage, for the UART)
+# and metrics() (Prometheus text format, for /metrics) build text only when
+# asked. Percentiles are interpolated inside a bin.
+
+from array import array
+import time
+
+# Stage IDs, shared by the scripts
+SNAPSHOT = 0
+TOF = 1
+GATE = 2        # motion gate check
+STATISTICS = 3  # threshold limit (get_statistics(), cached)
+FIND_BLOBS = 4
+SELECT = 5      # target selection / tracking and the mm result
+DRAW = 6
+JPEG = 7        # to_jpeg() of the stream frame
+SEND = 8        # stream sockets (sendall of the old server)
+UART_TX = 9     # result to the robot
+STAGES = ('snapshot', 'tof', 'gate', 'statistics', 'find_blobs', 'select', 'draw', 'jpeg', 'send', 'uart')
+
+BINS = 14
+BIN0_SHIFT = 6  # first bin edge 64 us
+
+
+def _zeros(typecode, n):
+    return array(typecode, [0] * n)
+
+
+class StageProfiler:
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.total = len(stages)  # index of the whole frame
+        n = self.total + 1
+        self.cur = _zeros('l', n)        # this frame
+        self.count = _zeros('L', n)      # frames the stage ran in
+        self.sum_ms = _zeros('L', n)     # total time, ms + us remainder
+        self.rem_us = _zeros('L', n)
+        self.mean = _zeros('l', n)
+        self.max = _zeros('l', n)
+        self.hist = _zeros('L', n * BINS)
+        self._start = 0
+        self._mark = 0
+        self._claimed = 0
+
+    def reset(self):
+        for table in (self.count, self.sum_ms, self.rem_us, self.mean, self.max, self.hist):
+            for i in range(len(table)):
+                table[i] = 0
+
+    def begin(self):
+        now = time.ticks_us()
+        self._start = now
+        self._mark = now
+        self._claimed = 0
+        cur = self.cur
+        for i in range(len(cur)):
+            cur[i] = 0
+
+    def lap(self, stage):
+        now = time.ticks_us()
+        us = time.ticks_diff(now, self._mark) - self._claimed
+        self._mark = now
+        self._claimed = 0
+        if us > 0:
+            self.cur[stage] += us
+
+    def add(self, stage, us):
+        self.cur[stage] += us
+        self._claimed += us
+
+    def end(self):
+        cur = self.cur
+        cur[self.total] = time.ticks_diff(time.ticks_us(), self._start)
+        for i in range(len(cur)):
+            us = cur[i]
+            if us <= 0:
+                continue
+            n = self.count[i] + 1
+            self.count[i] = n
+            rem = self.rem_us[i] + us
+            self.sum_ms[i] += rem // 1000
+            self.rem_us[i] = rem % 1000
+            if n == 1:
+                self.mean[i] = us
+            else:
+                self.mean[i] += (us - self.mean[i]) >> 4
+            if us > self.max[i]:
+                self.max[i] = us
+            b = 0
+            v = us >> BIN0_SHIFT
+            while v and b < BINS - 1:
+                v >>= 1
+                b += 1
+            self.hist[i * BINS + b] += 1
+
+    def percentile(self, stage, p):
+        # p in percent, in us
+        n = self.count[stage]
+        if not n:
+            return 0
+        want = (n * p + 99) // 100
+        seen = 0
+        base = stage * BINS
+        for b in range(BINS):
+            c = self.hist[base + b]
+            if seen + c >= want:
+                lo = (1 << (BIN0_SHIFT + b - 1)) if b else 0
+                hi = (1 << (BIN0_SHIFT + b)) if b < BINS - 1 else self.max[stage]
+                hi = min(hi, self.max[stage])
+                return lo + (hi - lo) * (want - seen) // c
+            seen += c
+        return self.max[stage]
+
+    def mean_us(self, stage):
+        n = self.count[stage]
+        return (self.sum_ms[stage] * 1000 + self.rem_us[stage]) // n if n else 0
+
+    def _rows(self):
+        for i in range(self.total + 1):
+            if self.count[i]:
+                yield i, self.stages[i] if i < self.total else 'total'
+
+    def report(self):
+        # One line per stage that ran, times in us; ends with an empty line
+        frames = self.count[self.total]
+        mean = self.mean_us(self.total)
+        lines = ["stages: %d frames, %.1f fps" % (frames, 1e6 / mean if mean else 0.0),
+                 "%-10s %7s %7s %7s %7s %7s %7s %7s" % ('stage', 'frames', 'mean', 'recent', 'p50', 'p90', 'p99', 'max')]
+        for i, name in self._rows():
+            lines.append("%-10s %7d %7d %7d %7d %7d %7d %7d" % (
+                name, self.count[i], self.mean_us(i), self.mean[i], self.percentile(i, 50),
+                self.percentile(i, 90), self.percentile(i, 99), self.max[i]))
+        lines.append('\n')
+        return '\n'.join(lines)
+
+    def metrics(self):
+        # Prometheus text exposition format, times in seconds
+        out = ["# HELP openmv_stage_seconds Time per frame spent in a pipeline stage.",
+               "# TYPE openmv_stage_seconds histogram"]
+        for i, name in self._rows():
+            seen = 0
+            base = i * BINS
+            for b in range(BINS - 1):
+                seen += self.hist[base + b]
+                out.append('openmv_stage_seconds_bucket{stage="%s",le="%g"} %d' % (
+                    name, (1 << (BIN0_SHIFT + b)) / 1e6, seen))
+            out.append('openmv_stage_seconds_bucket{stage="%s",le="+Inf"} %d' % (name, self.count[i]))
+            out.append('openmv_stage_seconds_sum{stage="%s"} %d.%06d' % (
+                name, self.sum_ms[i] // 1000, self.sum_ms[i] % 1000 * 1000 + self.rem_us[i]))
+            out.append('openmv_stage_seconds_count{stage="%s"} %d' % (name, self.count[i]))
+        for metric, table, text in (('recent', self.mean, "Recent mean time per frame (1/16 decay)."),
+                                    ('max', self.max, "Longest time per frame.")):
+            out.append("# HELP openmv_stage_%s_seconds %s" % (metric, text))
+            out.append("# TYPE openmv_stage_%s_seconds gauge" % metric)
+            for i, name in self._rows():
+                out.append('openmv_stage_%s_seconds{stage="%s"} %d.%06d' % (
+                    metric, name, table[i] // 1000000, table[i] % 1000000))
+        out.append('')
+        return '\n'.join(out)
@@ -0,0 +1,142 @@
+# Stream rate controller - JPEG quality, preview scale and frame decimation
+# chosen from how long the frames take to send
+#
+# The MJPEG server reports every frame a browser has received in full: its
+# size and the time from taking the frame to handing over its last byte.
+# Socket buffers make single frames bursty (several go out at once, then one
+# waits for the buffer to drain), so the throughput of each browser is the
+# decayed sum of bytes over the decayed sum of send time, and the expected
+# send time is the current frame size over the slowest throughput. The
+# controller moves along a ladder of settings, best first:
+#
+#   full scale, quality high -> low; preview scale, quality -> low;
+#   then only every 2nd, 3rd, ... frame offered
+#
+# When the expected send time is over target_ms it steps down right away (two
+# steps when over twice target_ms). It steps back up after hold frames in a
+# row that were sent without skipping a camera frame and below headroom times
+# target_ms or the camera's frame interval, whichever is shorter. Above the
+# starting quality it also steps down after hold frames in a row that skipped
+# camera frames: better frames must not cost frame rate. Each step waits for
+# hold frames at the new setting before the next one.
+
+import time
+
+QUALITIES = (75, 60, 45, 35, 25, 15)
+
+
+class StreamRate:
+    def __init__(self, target_ms=150, quality=35, qualities=QUALITIES, scales=(1.0, 0.5),
+                 max_decimation=3, headroom=0.5, hold=2, alpha=0.2):
+        self.target_ms = target_ms
+        self.headroom = headroom
+        self.hold = hold
+        self.alpha = alpha
+        # (quality, scale, decimation), best first
+        ladder = [(q, scales[0], 1) for q in qualities]
+        for scale in scales[1:]:
+            ladder += [(q, scale, 1) for q in qualities if q <= quality]
+        low = ladder[-1]
+        ladder += [(low[0], low[1], d) for d in range(2, max_decimation + 1)]
+        self.ladder = ladder
+        self.level = ladder.index((quality, scales[0], 1)) if quality in qualities else 0
+        self.start_level = self.level
+        self.quality, self.scale, self.decimation = ladder[self.level]
+        self._links = {}     # client -> [bytes, send ms] (decayed sums)
+        self.size = 0.0      # smoothed frame size
+        self.frame_ms = 0.0  # smoothed camera frame interval
+        self._last = None
+        self._settled = 0    # frames received since the last step
+        self._good = 0       # frames in a row below the step-up threshold
+        self._behind = 0     # frames in a row that skipped camera frames
+        self._offered = 0
+        self.steps_down = 0
+        self.steps_up = 0
+        self.frames = 0
+        self.bytes = 0
+
+    def want(self):
+        # Called once per camera frame: False = skip it (decimation)
+        now = time.ticks_ms()
+        if self._last is not None:
+            dt = time.ticks_diff(now, self._last)
+            self.frame_ms += self.alpha * (dt - self.frame_ms) if self.frame_ms else dt
+        self._last = now
+        self._offered += 1
+        return self._offered % self.decimation == 0
+
+    def encode(self, img, scale=1.0):
+        scale *= self.scale
+        if scale != 1.0:
+            img = img.copy(x_scale=scale, y_scale=scale)
+        return img.to_jpeg(quality=self.quality, copy=True)
+
+    def sent(self, client, size, ms, missed=0):
+        # A frame of `size` bytes reached `client` `ms` after it was taken,
+        # `missed` frames were skipped for it before this one
+        ms = max(ms, 1)
+        self.frames += 1
+        self.bytes += size
+        a = self.alpha
+        link = self._links.get(client)
+        if link is None:
+            self._links[client] = [size, ms]
+            self.size = self.size or size
+        else:
+            link[0] += size - a * link[0]
+            link[1] += ms - a * link[1]
+        self.size += a * (size - self.size)
+        self._settled += 1
+        self._behind = self._behind + 1 if missed else 0
+        if self._settled < self.hold:
+            return
+        expected = self.send_ms()
+        up = self.target_ms
+        if 0 < self.frame_ms * self.decimation < up:
+            up = self.frame_ms * self.decimation
+        if expected > self.target_ms:
+            self._good = 0
+            self._step(2 if expected > 2 * self.target_ms else 1)
+        elif self.level < self.start_level and self._behind >= self.hold:
+            self._good = 0
+            self._step(1)
+        elif expected < up * self.headroom and not missed:
+            self._good += 1
+            if self._good >= self.hold:
+                self._good = 0
+                self._step(-1)
+        else:
+            self._good = 0
+
+    def forget(self, client):
+        self._links.pop(client, None)
+
+    def _step(self, direction):
+        level = min(max(self.level + direction, 0), len(self.ladder) - 1)
+        if level == self.level:
+            return
+        self.level = level
+        self.quality, self.scale, self.decimation = self.ladder[level]
+        self._settled = 0
+        if direction > 0:
+            self.steps_down += 1
+        else:
+            self.steps_up += 1
+
+    def throughput(self):
+        # Bytes/s of the slowest browser
+        slowest = 0.0
+        for link in self._links.values():
+            rate = link[0] / link[1]
+            if slowest == 0.0 or rate < slowest:
+                slowest = rate
+        return slowest * 1000.0
+
+    def send_ms(self):
+        # Expected send time of the next frame to the slowest browser
+        rate = self.throughput()
+        return self.size * 1000.0 / rate if rate else 0.0
+
+    def summary(self):
+        return "stream: quality %d, scale %.2f, every %d frame(s); expected %.0f ms/frame (target %d), %.1f kB/s" % (
+            self.quality, self.scale, self.decimation, self.send_ms(), self.target_ms, self.throughput() / 1000.0)
@@ -0,0 +1,71 @@
+# Stream stage - decides which detection frames are encoded for the stream
+#
+# Detection runs on every frame; run() is called after it with the annotated
+# image and only hands the frame to the MJPEG server when the stream is due:
+#
+#   every      at most every Nth detection frame
+#   interval   at least interval_ms between encoded frames (max stream fps)
+#   budget     encoding may take at most this share of the time (0.2 = 20 %):
+#              an encode of t ms starts the next one t / b ms later at the earliest
+#   scale      encode a downscaled copy (preview), 1.0 = full size
+#
+# Frames that are not due only poll() the server, so frames already being
+# sent keep going. Detection and stream rates are counted separately.
+
+import time
+
+
+class StreamStage:
+    def __init__(self, server, every=1, interval_ms=0, budget=0.0, scale=1.0, quality=35):
+        self.server = server
+        self.every = every
+        self.interval_ms = interval_ms
+        self.budget = budget
+        self.scale = scale
+        self.quality = quality
+        self.detected = 0
+        self.streamed = 0
+        self.encode_ms = 0.0    # smoothed time per encoded frame (offer included)
+        self._count = 0
+        self._next = time.ticks_ms()
+        self._window = (time.ticks_ms(), 0, 0)
+
+    def poll(self):
+        self.server.poll()
+
+    def run(self, img):
+        # Call once per detection frame; returns True when the frame was streamed
+        self.detected += 1
+        self._count += 1
+        now = time.ticks_ms()
+        if self._count < self.every or time.ticks_diff(now, self._next) < 0:
+            self.server.poll()
+            return False
+        start = time.ticks_us()
+        sent = self.server.offer(img, self.quality, self.scale)
+        if not sent:
+            return False  # no browser ready, try again next frame
+        self._count = 0
+        self.streamed += 1
+        ms = time.ticks_diff(time.ticks_us(), start) / 1000.0
+        self.encode_ms += 0.2 * (ms - self.encode_ms) if self.streamed > 1 else ms
+        wait = self.interval_ms
+        if self.budget > 0:
+            wait = max(wait, int(ms / self.budget))
+        self._next = time.ticks_add(now, wait)
+        return True
+
+    def rates(self):
+        # (detection fps, stream fps) since the last call
+        now = time.ticks_ms()
+        start, detected, streamed = self._window
+        self._window = (now, self.detected, self.streamed)
+        dt = time.ticks_diff(now, start)
+        if dt <= 0:
+            return 0.0, 0.0
+        return (self.detected - detected) * 1000.0 / dt, (self.streamed - streamed) * 1000.0 / dt
+
+    def summary(self):
+        detect_fps, stream_fps = self.rates()
+        return "detection %.1f fps, stream %.1f fps (%.1f ms per encode)\n%s" % (
+            detect_fps, stream_fps, self.encode_ms, self.server.summary())
@@ -0,0 +1,112 @@
+# Adaptive dark-blob threshold with caching
+#
+# The threshold is `mean brightness - offset` (or Otsu's threshold from the
+# histogram). Scene brightness changes slowly, so the limit is reused for up
+# to `max_age` frames; a cheap drift check on a sparse grid of pixels forces
+# a refresh as soon as the brightness moves by more than `drift`.
+#
+# With bands > 1 a refresh only measures one horizontal band of the ROI
+# (rolling through the bands) and the mean is the average of the latest
+# per-band means, so each refresh costs 1/bands of a full get_statistics.
+# A drift refresh always measures the whole ROI.
+
+
+class _Entry:
+    __slots__ = ('limit', 'age', 'probe', 'band', 'band_means', 'mean')
+
+    def __init__(self, bands):
+        self.limit = 0
+        self.age = -1  # never measured
+        self.probe = 0
+        self.band = 0
+        self.band_means = [0] * bands
+        self.mean = 0
+
+
+class ThresholdEngine:
+    def __init__(self, offset=30, max_age=10, drift=8, bands=1, otsu=False, probe=(8, 6)):
+        self.offset = offset
+        self.max_age = max_age  # frames a limit is reused, 1 = measure every frame
+        self.drift = drift      # probe brightness change that forces a refresh
+        self.bands = bands
+        self.otsu = otsu
+        self.probe_x, self.probe_y = probe
+        self.entries = {}       # one cached limit per ROI
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.refreshes = 0
+        self.drift_refreshes = 0
+
+    def invalidate(self):
+        # Drop all cached limits, e.g. after a frame size or profile change
+        self.entries = {}
+
+    def hit_rate(self):
+        total = self.hits + self.refreshes
+        return self.hits / total if total else 0.0
+
+    def summary(self):
+        return "threshold cache hits %d refreshes %d (drift %d), hit rate %.0f%%" % (
+            self.hits, self.refreshes, self.drift_refreshes, 100 * self.hit_rate())
+
+    def _probe(self, img, roi):
+        # Mean of a sparse pixel grid - a few dozen get_pixel calls
+        x, y, w, h = roi
+        nx, ny = self.probe_x, self.probe_y
+        sx = w // nx
+        sy = h // ny
+        total = 0
+        for j in range(ny):
+            py = y + sy // 2 + j * sy
+            for i in range(nx):
+                total += img.get_pixel(x + sx // 2 + i * sx, py)
+        return total // (nx * ny)
+
+    def limit(self, img, roi):
+        entry = self.entries.get(roi)
+        if entry is None:
+            entry = _Entry(self.bands)
+            self.entries[roi] = entry
+
+        if self.max_age <= 1:
+            self._measure(img, roi, entry, full=True)
+            self.refreshes += 1
+            return entry.limit
+
+        probe = self._probe(img, roi)
+        if entry.age < 0 or abs(probe - entry.probe) > self.drift:
+            if entry.age >= 0:
+                self.drift_refreshes += 1
+            self._measure(img, roi, entry, full=True)
+        elif entry.age + 1 >= self.max_age:
+            self._measure(img, roi, entry, full=False)
+        else:
+            entry.age += 1
+            self.hits += 1
+            return entry.limit
+        entry.probe = probe
+        self.refreshes += 1
+        return entry.limit
+
+    def _measure(self, img, roi, entry, full):
+        entry.age = 0
+        if self.otsu:
+            # Otsu's threshold separates dark objects from the background
+            entry.limit = img.get_histogram(roi=roi).get_threshold().value()
+            return
+        bands = self.bands
+        if full or bands == 1:
+            entry.mean = img.get_statistics(roi=roi).l_mean()
+            for i in range(bands):
+                entry.band_means[i] = entry.mean
+        else:
+            x, y, w, h = roi
+            bh = h // bands
+            i = entry.band
+            by = y + i * bh
+            entry.band_means[i] = img.get_statistics(roi=(x, by, w, bh if i < bands - 1 else y + h - by)).l_mean()
+            entry.band = i + 1 if i + 1 < bands else 0
+            entry.mean = sum(entry.band_means) // bands
+        entry.limit = max(0, entry.mean - self.offset)
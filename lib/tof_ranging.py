@@ -0,0 +1,99 @@
+# Non-blocking continuous ToF ranging
+#
+# The VL53L1X ranges continuously in the background; poll() checks the
+# data-ready flag (one register read) and only fetches the distance when a new
+# measurement has finished, so the frame loop never waits for the ranging
+# period. Poll once before and once after blob detection: the measurement that
+# completes while the blobs are computed is collected at the second poll.
+#
+# Every sample keeps the ticks_ms it was collected at; sample() returns the
+# distance with its age and reports 0 (= invalid) once it is older than
+# max_age_ms. read() is the blocking version (wait for the next measurement),
+# kept to compare against the serial snapshot -> read -> detect ordering.
+#
+# Registers as in ST's VL53L1X ULD driver (UM2510).
+
+import time
+
+REG_GPIO_HV_MUX_CTRL = 0x0030
+REG_GPIO_TIO_HV_STATUS = 0x0031
+REG_SYSTEM_INTERRUPT_CLEAR = 0x0086
+REG_SYSTEM_MODE_START = 0x0087
+REG_RESULT_RANGE_MM = 0x0096  # final crosstalk corrected range, 16 bit
+
+
+class ContinuousRanging:
+    def __init__(self, tof, max_age_ms=200, clock=time.ticks_ms):
+        self.i2c = tof.i2c
+        self.address = tof.address
+        self.max_age_ms = max_age_ms
+        self.clock = clock
+        self._one = bytearray(1)
+        self._two = bytearray(2)
+        self.distance = 0
+        self.stamp = 0
+        self.reset_stats()
+
+        # Data-ready level depends on the interrupt polarity (bit 4, 1 = active low)
+        self.i2c.readfrom_mem_into(self.address, REG_GPIO_HV_MUX_CTRL, self._one, addrsize=16)
+        self.ready_level = 0 if self._one[0] & 0x10 else 1
+        self._write(REG_SYSTEM_INTERRUPT_CLEAR, 0x01)
+        self._write(REG_SYSTEM_MODE_START, 0x40)  # continuous (back-to-back) ranging
+
+    def reset_stats(self):
+        self.samples = 0
+        self.polls = 0
+        self.wait_us = 0  # time spent blocking in read()
+
+    def _write(self, reg, value):
+        self._one[0] = value
+        self.i2c.writeto_mem(self.address, reg, self._one, addrsize=16)
+
+    def ready(self):
+        self.i2c.readfrom_mem_into(self.address, REG_GPIO_TIO_HV_STATUS, self._one, addrsize=16)
+        return (self._one[0] & 0x01) == self.ready_level
+
+    def poll(self):
+        # Collect a finished measurement if there is one; True when a new sample arrived
+        self.polls += 1
+        if not self.ready():
+            return False
+        self.i2c.readfrom_mem_into(self.address, REG_RESULT_RANGE_MM, self._two, addrsize=16)
+        self._write(REG_SYSTEM_INTERRUPT_CLEAR, 0x01)
+        self.distance = (self._two[0] << 8) | self._two[1]
+        self.stamp = self.clock()
+        self.samples += 1
+        return True
+
+    def age_ms(self):
+        if not self.samples:
+            return -1
+        return time.ticks_diff(self.clock(), self.stamp)
+
+    def sample(self):
+        # (distance, age in ms) of the latest sample, distance 0 if none or too old
+        age = self.age_ms()
+        if age < 0 or age > self.max_age_ms:
+            return 0, age
+        return self.distance, age
+
+    def current(self):
+        # Distance of the latest sample, 0 if none or too old (sample() without the tuple)
+        age = self.age_ms()
+        if age < 0 or age > self.max_age_ms:
+            return 0
+        return self.distance
+
+    def read(self, timeout_ms=200):
+        # Blocking: wait for the next measurement (serial ordering)
+        t0 = time.ticks_us()
+        start = time.ticks_ms()
+        while not self.poll():
+            if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
+                break
+        self.wait_us += time.ticks_diff(time.ticks_us(), t0)
+        return self.distance
+
+    def summary(self):
+        return "tof samples %d from %d polls (%.0f%% ready), age %d ms" % (
+            self.samples, self.polls, 100.0 * self.samples / self.polls if self.polls else 0.0, self.age_ms())
@@ -0,0 +1,156 @@
+# Multi-zone ToF ranging - left / center / right distances from one VL53L1X
+#
+# The VL53L1X measures over a programmable ROI of its 16x16 SPAD array. The
+# zones are cycled by moving the ROI center (register 0x007F) between
+# measurements, and every result is kept in a per-zone cache with the time
+# it was taken. A blob is given the distance of the zone that overlaps it
+# most in the image (or the nearest zone when it lies outside the ToF field
+# of view), and stale zones are reported as 0 (= invalid).
+#
+# Pipelining: a ROI written after read() applies to the next measurement, so
+# the result returned by read() belongs to the zone programmed one poll()
+# earlier. This holds as long as the ranging period is shorter than the frame
+# period; the timestamps let consumers see when it does not.
+#
+# The ToF field of view (27 degrees) only spans the middle of the camera
+# image: `fov_px` is its width in image pixels at the current frame size.
+# Check `flip` by holding an object in front of the left half of the lens.
+
+import time
+
+REG_ROI_CENTER_SPAD = 0x007F
+REG_ROI_XY_SIZE = 0x0080
+
+LEFT = 0
+CENTER = 1
+RIGHT = 2
+ZONE_NAMES = ('left', 'center', 'right')
+
+
+def spad_center(col, row):
+    # SPAD number of (col, row) in the 16x16 array (ST UM2555 numbering)
+    if row > 7:
+        return 128 + (col << 3) + (15 - row)
+    return ((15 - col) << 3) + row
+
+
+class ToFZones:
+    def __init__(self, tof, image_width, fov_px=92, zone_cols=(4, 8, 12), zone_size=(6, 16),
+                 schedule=(CENTER, LEFT, CENTER, RIGHT), max_age_ms=300,
+                 min_valid=40, max_valid=2000, flip=False, clock=time.ticks_ms):
+        self.tof = tof
+        self.fov_px = fov_px
+        self.zone_cols = zone_cols
+        self.zone_w = zone_size[0]
+        self.schedule = schedule        # zone order, the center is measured twice as often
+        self.max_age_ms = max_age_ms    # older cache entries count as stale
+        self.min_valid = min_valid
+        self.max_valid = max_valid
+        self.flip = flip
+        self.clock = clock
+        self.dist = [0, 0, 0]
+        self.stamp = [0, 0, 0]
+        self.seen = [False, False, False]
+        self.stale_reads = 0
+        self._reg = bytearray(1)
+        self.set_frame(image_width)
+
+        # ROI size is the same for every zone: ((height - 1) << 4) | (width - 1)
+        self._write(REG_ROI_XY_SIZE, ((zone_size[1] - 1) << 4) | (zone_size[0] - 1))
+        self.step = 0
+        self.pending = None             # zone of the measurement in progress
+        self.configured = schedule[0]
+        self._write(REG_ROI_CENTER_SPAD, self._spad(self.configured))
+
+    def set_frame(self, image_width, fov_px=None):
+        # Image x range [x0, x1) covered by every zone, for the current frame size
+        if fov_px is not None:
+            self.fov_px = fov_px
+        left = image_width // 2 - self.fov_px // 2
+        half = self.zone_w // 2
+        self.x0 = []
+        self.x1 = []
+        for col in self.zone_cols:
+            self.x0.append(left + (col - half) * self.fov_px // 16)
+            self.x1.append(left + (col - half + self.zone_w) * self.fov_px // 16)
+
+    def _spad(self, zone):
+        col = self.zone_cols[zone]
+        if self.flip:
+            col = 15 - col
+        return spad_center(col, 8)
+
+    def _write(self, reg, value):
+        self._reg[0] = value
+        self.tof.i2c.writeto_mem(self.tof.address, reg, self._reg, addrsize=16)
+
+    def poll(self):
+        # Read the finished measurement into its zone and program the next zone.
+        # Returns the nearest fresh valid distance over all zones (0 if none).
+        d = self.tof.read()
+        now = self.clock()
+        zone = self.pending
+        if zone is not None:
+            self.dist[zone] = d
+            self.stamp[zone] = now
+            self.seen[zone] = True
+        self.pending = self.configured
+        self.step += 1
+        if self.step == len(self.schedule):
+            self.step = 0
+        nxt = self.schedule[self.step]
+        if nxt != self.configured:
+            self._write(REG_ROI_CENTER_SPAD, self._spad(nxt))
+            self.configured = nxt
+        return self.nearest(now)
+
+    def age_ms(self, zone, now=None):
+        if not self.seen[zone]:
+            return -1
+        if now is None:
+            now = self.clock()
+        return time.ticks_diff(now, self.stamp[zone])
+
+    def distance(self, zone, now=None):
+        # Cached distance of a zone, 0 when never measured, stale or out of range
+        age = self.age_ms(zone, now)
+        if age < 0 or age > self.max_age_ms:
+            self.stale_reads += 1
+            return 0
+        d = self.dist[zone]
+        return d if self.min_valid < d < self.max_valid else 0
+
+    def nearest(self, now=None):
+        best = 0
+        for zone in range(3):
+            d = self.distance(zone, now)
+            if d and (best == 0 or d < best):
+                best = d
+        return best
+
+    def zone_for(self, x, w):
+        # Zone with the largest horizontal overlap, else the nearest one
+        best = CENTER
+        best_overlap = 0
+        for zone in range(3):
+            overlap = min(x + w, self.x1[zone]) - max(x, self.x0[zone])
+            if overlap > best_overlap:
+                best = zone
+                best_overlap = overlap
+        if best_overlap == 0:
+            cx = x + w // 2
+            if cx < self.x0[LEFT]:
+                best = LEFT
+            elif cx >= self.x1[RIGHT]:
+                best = RIGHT
+        return best
+
+    def distance_for(self, blob):
+        return self.distance(self.zone_for(blob.x(), blob.w()))
+
+    def summary(self):
+        now = self.clock()
+        parts = []
+        for zone in range(3):
+            parts.append("%s %d mm (%d ms)" % (ZONE_NAMES[zone], self.dist[zone], self.age_ms(zone, now)))
+        return "tof zones: " + ", ".join(parts) + ", stale reads %d" % self.stale_reads
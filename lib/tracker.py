@@ -0,0 +1,204 @@
+# Multi-object tracker with stable IDs and a hysteresis on the primary target
+#
+# Blobs are associated with the tracks of the previous frame by bounding box
+# overlap (IoU) and centroid distance. Every track keeps its ID while it is
+# seen, survives `max_misses` frames without a match and needs `min_hits`
+# matches before it can become the primary target.
+#
+# The primary target follows the old selection rule (the blob covering the
+# ToF line of sight, else the one nearest to the center), but it only moves
+# to another track after that track has been preferred for `switch_frames`
+# consecutive frames - this stops the target flickering between objects.
+#
+# The track table is preallocated (max_tracks Track objects, reused), so the
+# cost per frame is bounded by max_tracks x number of blobs. Overlaps are
+# integers in 1/1024 (floats are heap objects on MicroPython), so update()
+# allocates nothing.
+
+
+class Track:
+    __slots__ = ('id', '_x', '_y', '_w', '_h', '_cx', '_cy', '_pixels', 'hits', 'misses', 'matched')
+
+    def __init__(self):
+        self.id = 0  # 0 = free slot
+        self.hits = 0
+        self.misses = 0
+        self.matched = False
+        self._x = self._y = self._w = self._h = self._cx = self._cy = self._pixels = 0
+
+    # Same accessors as an OpenMV blob, so a track can be used as the target
+    def x(self): return self._x
+    def y(self): return self._y
+    def w(self): return self._w
+    def h(self): return self._h
+    def cx(self): return self._cx
+    def cy(self): return self._cy
+    def pixels(self): return self._pixels
+    def rect(self): return (self._x, self._y, self._w, self._h)
+
+    def assign(self, blob):
+        self._x = blob.x()
+        self._y = blob.y()
+        self._w = blob.w()
+        self._h = blob.h()
+        self._cx = blob.cx()
+        self._cy = blob.cy()
+        self._pixels = blob.pixels()
+
+
+IOU_ONE = 1024
+
+
+def _iou(t, b):
+    # Intersection over union in 1/IOU_ONE
+    x0 = max(t._x, b.x())
+    y0 = max(t._y, b.y())
+    x1 = min(t._x + t._w, b.x() + b.w())
+    y1 = min(t._y + t._h, b.y() + b.h())
+    if x1 <= x0 or y1 <= y0:
+        return 0
+    inter = (x1 - x0) * (y1 - y0)
+    return inter * IOU_ONE // (t._w * t._h + b.w() * b.h() - inter)
+
+
+class Tracker:
+    def __init__(self, max_tracks=8, iou_min=0.2, max_jump=40, max_misses=5, min_hits=2,
+                 switch_frames=3, max_pixels=None):
+        self.tracks = [Track() for _ in range(max_tracks)]
+        self.iou_min = int(iou_min * IOU_ONE)
+        self.max_jump = max_jump          # px, centroid distance still counted as the same object
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.switch_frames = switch_frames
+        self.max_pixels = max_pixels      # tracks larger than this never become primary
+        self.used = bytearray(16)         # per-blob "already matched" flags
+        self.reset()
+
+    def reset(self):
+        for t in self.tracks:
+            t.id = 0
+        self.next_id = 1
+        self.primary = None
+        self.primary_id = 0
+        self.candidate = None
+        self.candidate_id = 0
+        self.candidate_frames = 0
+        self.switches = 0
+
+    def active(self):
+        return [t for t in self.tracks if t.id]
+
+    def update(self, blobs, center_x, center_y):
+        # Associate this frame's blobs with the tracks; returns the primary track or None
+        n = len(blobs)
+        if n > len(self.used):
+            self.used = bytearray(n)
+        used = self.used
+        for i in range(n):
+            used[i] = 0
+
+        max_jump2 = self.max_jump * self.max_jump
+        for t in self.tracks:
+            t.matched = False
+            if not t.id:
+                continue
+            best = -1
+            best_iou = 0
+            best_d2 = max_jump2 + 1
+            for i in range(n):
+                if used[i]:
+                    continue
+                b = blobs[i]
+                iou = _iou(t, b)
+                if iou >= self.iou_min:
+                    if iou > best_iou:
+                        best = i
+                        best_iou = iou
+                elif not best_iou:
+                    # Nearest centroid, weaker than any IoU match
+                    dx = b.cx() - t._cx
+                    dy = b.cy() - t._cy
+                    d2 = dx * dx + dy * dy
+                    if d2 < best_d2:
+                        best = i
+                        best_d2 = d2
+            if best >= 0:
+                used[best] = 1
+                t.assign(blobs[best])
+                t.hits += 1
+                t.misses = 0
+                t.matched = True
+            else:
+                t.misses += 1
+                if t.misses > self.max_misses:
+                    t.id = 0
+
+        # Unmatched blobs start new tracks while there are free slots
+        for i in range(n):
+            if used[i]:
+                continue
+            slot = None
+            for t in self.tracks:
+                if not t.id:
+                    slot = t
+                    break
+            if slot is None:
+                break
+            slot.id = self.next_id
+            self.next_id += 1
+            slot.assign(blobs[i])
+            slot.hits = 1
+            slot.misses = 0
+            slot.matched = True
+
+        return self._select(center_x, center_y)
+
+    def _preferred(self, center_x, center_y):
+        # Old selection rule over confirmed tracks seen this frame
+        nearest = None
+        nearest_d2 = 0
+        for t in self.tracks:
+            if not t.id or not t.matched or t.hits < self.min_hits:
+                continue
+            if self.max_pixels is None or t._pixels < self.max_pixels:
+                if t._x <= center_x <= t._x + t._w and t._y <= center_y <= t._y + t._h:
+                    return t
+            dx = t._cx - center_x
+            dy = t._cy - center_y
+            d2 = dx * dx + dy * dy
+            if nearest is None or d2 < nearest_d2:
+                nearest = t
+                nearest_d2 = d2
+        return nearest
+
+    def _select(self, center_x, center_y):
+        want = self._preferred(center_x, center_y)
+        primary = self.primary
+        if primary is not None and (primary.id != self.primary_id or not primary.matched):
+            primary = None  # lost (or its slot was reused), no hysteresis needed
+
+        if primary is None or want is None or want is primary:
+            self.candidate = None
+            self.candidate_frames = 0
+            if primary is None:
+                self._set_primary(want)
+            return self.primary
+
+        # Another track is preferred: switch only after switch_frames in a row
+        if want is self.candidate and want.id == self.candidate_id:
+            self.candidate_frames += 1
+        else:
+            self.candidate = want
+            self.candidate_id = want.id
+            self.candidate_frames = 1
+        if self.candidate_frames >= self.switch_frames:
+            self._set_primary(want)
+            self.candidate = None
+            self.candidate_frames = 0
+        return self.primary
+
+    def _set_primary(self, track):
+        if track is not None and track is not self.primary:
+            self.switches += 1
+        self.primary = track
+        self.primary_id = track.id if track is not None else 0
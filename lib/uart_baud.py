@@ -0,0 +1,159 @@
+# Baud rate negotiation for push mode (camera side)
+#
+# Both ends start at BASE_BAUD. The robot (uart_robot/baud_link.c) leads,
+# every message is a frame of lib/uart_frame.py whose payload starts with a
+# command byte (control payloads are never 6 bytes long, so they cannot be
+# mistaken for a '<hhh' result, and batch packets start with version 1):
+#
+#   robot -> camera                 camera -> robot
+#   'P' <I baud>  propose           'A' <I baud>  accept (0 = refused), then
+#                                                 both switch to `baud`
+#   'T' <B n> pattern(n)  test      't' <B n> ... echo, byte for byte
+#   'C' <I baud>  commit            'c' <I baud>  committed
+#   'H' <H frames> <H errors>       receive stats of the robot since the
+#                 heartbeat         last heartbeat (about once a second)
+#
+# The camera falls back to BASE_BAUD on its own when a switched rate is
+# not committed within commit_timeout_ms, when a heartbeat reports an error
+# rate above max_error_rate, or when no heartbeat arrives for
+# heartbeat_timeout_ms. The robot falls back on its own error rate (and
+# tells the camera with a last heartbeat first), then tries the next lower
+# rate. A reply is followed by PAD idle bytes so it leaves a receiver that
+# DMAs in fixed chunks (one '<hhh' frame on the robot) straight away.
+#
+# service() is called from the push loop; it costs one uart.any() when
+# nothing was received.
+
+import struct
+import time
+
+from uart_frame import HEADER, FrameReader, FrameWriter
+
+BASE_BAUD = 115200
+RATES = (115200, 460800, 1000000)
+TEST_SIZE = 32
+CONTROL_SIZE = 2 + TEST_SIZE
+PAD = 12
+SWITCH_GUARD_MS = 2   # let the last reply byte leave before re-clocking the UART
+
+
+def test_pattern(n, buf=None, offset=0):
+    # Bit pattern worst cases first, then a sequence that differs per round
+    if buf is None:
+        buf = bytearray(TEST_SIZE)
+    buf[offset] = 0x55
+    buf[offset + 1] = 0xAA
+    buf[offset + 2] = 0x00
+    buf[offset + 3] = 0xFF
+    for i in range(4, TEST_SIZE):
+        buf[offset + i] = (n * 31 + i * 37) & 0xFF
+    return buf
+
+
+class BaudFollower:
+    def __init__(self, uart, framer, rates=RATES, base=BASE_BAUD, timeout_char=200,
+                 commit_timeout_ms=1000, heartbeat_timeout_ms=2500, max_error_rate=0.05, min_frames=5,
+                 clock=time.ticks_ms):
+        self.uart = uart
+        self.framer = framer            # data FrameWriter, replies continue its sequence numbers
+        self.rates = rates
+        self.base = base
+        self.timeout_char = timeout_char
+        self.commit_timeout_ms = commit_timeout_ms
+        self.heartbeat_timeout_ms = heartbeat_timeout_ms
+        self.max_error_rate = max_error_rate
+        self.min_frames = min_frames
+        self.clock = clock
+        self.reader = FrameReader(CONTROL_SIZE)
+        self.reply = FrameWriter(uart, None, CONTROL_SIZE)
+        self.pad = bytes(PAD)
+        self.baud = base
+        self.pending = False            # switched, waiting for the commit
+        self.deadline = 0
+        self.last_heartbeat = 0
+        self.upgrades = 0
+        self.fallbacks = 0
+        self.heartbeats = 0
+        self.robot_frames = 0
+        self.robot_errors = 0
+        self.test_errors = 0            # test frames that did not match the pattern
+        self._switch(base)
+
+    def _switch(self, baud):
+        self.uart.init(baud, timeout_char=self.timeout_char, read_buf_len=256)
+        self.baud = baud
+        self.reader.buf[:] = b''
+
+    def _send(self, length):
+        # The reply payload is already at reply.frame[HEADER:]
+        reply = self.reply
+        reply.seq = self.framer.seq if self.framer else reply.seq
+        reply.send_payload(length)
+        if self.framer:
+            self.framer.seq = reply.seq
+        self.uart.write(self.pad)
+
+    def _send_baud(self, cmd, baud):
+        struct.pack_into('<BI', self.reply.frame, HEADER, cmd, baud)
+        self._send(5)
+
+    def fallback(self):
+        self.pending = False
+        if self.baud != self.base:
+            self.fallbacks += 1
+            self._switch(self.base)
+
+    def service(self):
+        # Handle received control frames and the fallback timeouts
+        n = self.uart.any()
+        if n:
+            for _, payload in self.reader.feed(self.uart.read(n)):
+                self._handle(payload)
+        if self.baud != self.base:
+            now = self.clock()
+            if self.pending and time.ticks_diff(now, self.deadline) > 0:
+                self.fallback()  # never committed
+            elif not self.pending and time.ticks_diff(now, self.last_heartbeat) > self.heartbeat_timeout_ms:
+                self.fallback()  # robot gone or on another rate
+
+    def _handle(self, p):
+        cmd = p[0]
+        if cmd == 0x50 and len(p) == 5:      # 'P'
+            baud = struct.unpack_from('<I', p, 1)[0]
+            if baud not in self.rates:
+                self._send_baud(0x41, 0)
+                return
+            self._send_baud(0x41, baud)      # 'A', still at the old rate
+            time.sleep_ms(SWITCH_GUARD_MS)
+            self._switch(baud)
+            self.pending = baud != self.base
+            self.deadline = time.ticks_add(self.clock(), self.commit_timeout_ms)
+        elif cmd == 0x54 and len(p) == CONTROL_SIZE:   # 'T'
+            if p[2:] != test_pattern(p[1]):
+                self.test_errors += 1
+            f = self.reply.frame
+            f[HEADER:HEADER + CONTROL_SIZE] = p
+            f[HEADER] = 0x74                     # 't'
+            self._send(CONTROL_SIZE)
+        elif cmd == 0x43 and len(p) == 5:    # 'C'
+            if self.baud != self.base and struct.unpack_from('<I', p, 1)[0] == self.baud:
+                if self.pending:
+                    self.pending = False
+                    self.upgrades += 1
+                    self.last_heartbeat = self.clock()
+                self._send_baud(0x63, self.baud)   # 'c', again if the first one was lost
+        elif cmd == 0x48 and len(p) == 5:    # 'H'
+            frames, errors = struct.unpack_from('<HH', p, 1)
+            self.heartbeats += 1
+            self.last_heartbeat = self.clock()
+            self.robot_frames += frames
+            self.robot_errors += errors
+            if frames + errors >= self.min_frames and errors > self.max_error_rate * (frames + errors):
+                self.fallback()
+            elif frames == 0 and self.baud != self.base and not self.pending:
+                self.fallback()
+
+    def summary(self):
+        return "baud %d%s, upgrades %d, fallbacks %d, heartbeats %d, robot frames %d / errors %d" % (
+            self.baud, " (pending)" if self.pending else "", self.upgrades, self.fallbacks, self.heartbeats,
+            self.robot_frames, self.robot_errors)
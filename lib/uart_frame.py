@@ -0,0 +1,157 @@
+# Framed UART messages for push mode
+#
+#   0xA5 0x5A | length | sequence | payload[length] | CRC16 (little endian)
+#
+# The CRC is CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over length,
+# sequence and payload. The sequence number counts frames modulo 256 so the
+# receiver can tell lost frames from repeated ones. The robot side decoder is
+# uart_robot/camera_frame.c; both resync by dropping one byte and hunting for
+# the next sync pair after a bad length or CRC.
+#
+# FrameWriter packs into one preallocated frame buffer, either a fixed
+# struct format (pack/send) or a variable payload written in place at
+# frame[HEADER:] (send_payload, e.g. lib/obstacle_batch.py). FrameReader is
+# the same decoder in Python, for host tools and for testing the C version.
+
+import struct
+from array import array
+
+SYNC0 = 0xA5
+SYNC1 = 0x5A
+HEADER = 4     # sync x2, length, sequence
+CRC_SIZE = 2
+MAX_PAYLOAD = 96
+
+
+def _crc_table():
+    table = array('H', bytes(512))
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table[i] = crc & 0xFFFF
+    return table
+
+
+_TABLE = _crc_table()
+
+
+def crc16(buf, start=0, end=None, crc=0xFFFF):
+    table = _TABLE
+    if end is None:
+        end = len(buf)
+    for i in range(start, end):
+        crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ buf[i]]
+    return crc
+
+
+class FrameWriter:
+    def __init__(self, uart, fmt='<hhh', size=None):
+        # fmt=None: variable payloads of up to `size` bytes
+        self.uart = uart
+        self.fmt = fmt
+        self.size = struct.calcsize(fmt) if fmt else size
+        if self.size > MAX_PAYLOAD:
+            raise ValueError("payload of %d bytes exceeds %d" % (self.size, MAX_PAYLOAD))
+        self.frame = bytearray(HEADER + self.size + CRC_SIZE)
+        self.frame[0] = SYNC0
+        self.frame[1] = SYNC1
+        self.frame[2] = self.size
+        self.fields = len(struct.unpack(fmt, self.frame[HEADER:HEADER + self.size])) if fmt else 0
+        self.seq = 0
+        self.sent = 0
+        self.views = None
+        if not fmt:
+            # One view per frame length, so send_payload() does not allocate
+            mv = memoryview(self.frame)
+            self.views = [mv[:HEADER + n + CRC_SIZE] for n in range(self.size + 1)]
+
+    def pack(self, result):
+        # Fill the frame buffer for `result` and return it (no allocation)
+        f = self.frame
+        f[3] = self.seq
+        if self.fields == 3:
+            struct.pack_into(self.fmt, f, HEADER, result[0], result[1], result[2])  # *result allocates
+        else:
+            struct.pack_into(self.fmt, f, HEADER, *result)
+        end = HEADER + self.size
+        crc = crc16(f, 2, end)
+        f[end] = crc & 0xFF
+        f[end + 1] = crc >> 8
+        self.seq = (self.seq + 1) & 0xFF
+        return f
+
+    def send(self, result):
+        self.uart.write(self.pack(result))
+        self.sent += 1
+
+    def send_payload(self, length):
+        # Send the `length` payload bytes already written at frame[HEADER:]
+        f = self.frame
+        f[2] = length
+        f[3] = self.seq
+        end = HEADER + length
+        crc = crc16(f, 2, end)
+        f[end] = crc & 0xFF
+        f[end + 1] = crc >> 8
+        self.seq = (self.seq + 1) & 0xFF
+        self.uart.write(self.views[length])
+        self.sent += 1
+
+
+class FrameReader:
+    def __init__(self, max_payload=MAX_PAYLOAD):
+        self.max_payload = max_payload
+        self.buf = bytearray()
+        self.last_seq = -1
+        self.frames = 0
+        self.crc_errors = 0
+        self.length_errors = 0
+        self.skipped = 0  # bytes dropped outside valid frames
+        self.lost = 0     # frames missing according to the sequence numbers
+
+    def feed(self, data):
+        # Returns the list of (seq, payload) of the frames completed by `data`
+        buf = self.buf
+        buf.extend(data)
+        out = []
+        while buf:
+            if buf[0] != SYNC0 or (len(buf) > 1 and buf[1] != SYNC1):
+                self._drop(buf)
+                continue
+            if len(buf) < 3:
+                break
+            length = buf[2]
+            if length > self.max_payload:
+                self.length_errors += 1
+                self._drop(buf)
+                continue
+            total = HEADER + length + CRC_SIZE
+            if len(buf) < total:
+                break
+            if crc16(buf, 2, HEADER + length) != buf[total - 2] | (buf[total - 1] << 8):
+                self.crc_errors += 1
+                self._drop(buf)
+                continue
+            seq = buf[3]
+            if self.last_seq >= 0:
+                self.lost += (seq - self.last_seq - 1) & 0xFF
+            self.last_seq = seq
+            self.frames += 1
+            out.append((seq, bytes(buf[HEADER:HEADER + length])))
+            del buf[:total]
+        return out
+
+    def _drop(self, buf):
+        # Resync: drop everything up to the next SYNC0 after the first byte
+        n = len(buf)
+        for i in range(1, n):
+            if buf[i] == SYNC0:
+                n = i
+                break
+        self.skipped += n
+        del buf[:n]
+
+    def summary(self):
+        return "frames %d, crc errors %d, length errors %d, skipped bytes %d, lost %d" % (
+            self.frames, self.crc_errors, self.length_errors, self.skipped, self.lost)
@@ -0,0 +1,85 @@
+# UART responder - answers result requests as soon as they arrive
+#
+# The latest result is packed into one preallocated buffer with pack_into()
+# (a single C call, so a reply never sees half an update). A UART RX-idle
+# interrupt replies to every request byte straight from that buffer, so the
+# answer does not wait for the vision loop or its sleep.
+#
+# pyb.UART IRQ handlers are soft IRQs: they run between bytecodes, not in
+# the middle of a long C call such as find_blobs(), which bounds the latency
+# by the longest single call instead of the whole loop. Without UART IRQs
+# (older firmware, use_irq=False) call service() or idle() from the loop.
+#
+# `commands` maps other request bytes to handlers that return the reply
+# (e.g. b's' -> the stage profiler report); they may allocate, they only run
+# when asked.
+
+import struct
+import time
+
+
+class UartResponder:
+    def __init__(self, uart, fmt='<hhh', request=b'r', use_irq=True, commands=None):
+        self.uart = uart
+        self.fmt = fmt
+        self.request = request[0]
+        self.commands = dict((key[0], handler) for key, handler in commands.items()) if commands else {}
+        self.buf = bytearray(struct.calcsize(fmt))  # latest packed result
+        self.fields = len(struct.unpack(fmt, self.buf))
+        self._rx = bytearray(16)
+        self.irq = False
+        self.reset_stats()
+        if use_irq and hasattr(uart, 'irq') and hasattr(uart, 'IRQ_RXIDLE'):
+            uart.irq(handler=self._on_rx, trigger=uart.IRQ_RXIDLE)
+            self.irq = True
+
+    def reset_stats(self):
+        self.requests = 0
+        self.ignored = 0  # bytes that were not a request
+        self.commands_served = 0
+        self.updates = 0
+
+    def update(self, result):
+        if self.fields == 3:
+            struct.pack_into(self.fmt, self.buf, 0, result[0], result[1], result[2])  # *result allocates
+        else:
+            struct.pack_into(self.fmt, self.buf, 0, *result)
+        self.updates += 1
+
+    def _on_rx(self, uart):
+        self.service()
+
+    def service(self):
+        # Answer every pending request; returns the number of requests served
+        served = 0
+        n = self.uart.any()
+        while n:
+            n = self.uart.readinto(self._rx, min(n, len(self._rx))) or 0
+            for i in range(n):
+                byte = self._rx[i]
+                if byte == self.request:
+                    self.uart.write(self.buf)
+                    served += 1
+                elif byte in self.commands:
+                    self.uart.write(self.commands[byte]())
+                    self.commands_served += 1
+                else:
+                    self.ignored += 1
+            n = self.uart.any()
+        self.requests += served
+        return served
+
+    def idle(self, ms):
+        # Sleep for `ms`, answering requests meanwhile when there is no IRQ
+        if self.irq:
+            time.sleep_ms(ms)
+            return
+        start = time.ticks_ms()
+        self.service()  # also with ms = 0
+        while time.ticks_diff(time.ticks_ms(), start) < ms:
+            time.sleep_ms(1)
+            self.service()
+
+    def summary(self):
+        return "uart %s: %d requests served, %d commands, %d other bytes, %d updates" % (
+            'irq' if self.irq else 'polled', self.requests, self.commands_served, self.ignored, self.updates)
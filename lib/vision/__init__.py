@@ -0,0 +1,10 @@
+# Vision core - the detection pipeline shared by the camera scripts
+#
+#   vision.core          capture, ToF distance, threshold, blobs, target
+#                        selection, mm result and overlay (VisionCore)
+#   vision.uart_output   the result to the robot: polled, responder or push
+#   vision.mjpeg_output  the annotated frame to browsers over Wi-Fi
+#
+# Nothing is imported here, a script imports the core and the outputs it
+# uses, so a UART-only camera never loads the stream server. See
+# lib/manifest.py and host/build_mpy.py to ship lib/ precompiled or frozen.
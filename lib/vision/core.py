@@ -0,0 +1,306 @@
+# Vision core - capture, threshold, blobs and target selection, once per frame
+#
+# detect() runs the pipeline that obstacle_detection.py and ttk8/ttk8.py used
+# to carry each in their own copy:
+#
+#   snapshot -> ToF distance -> motion gate -> threshold limit -> find_blobs
+#   -> target (tracker, ROI search, coarse-to-fine pyramid, or the blob on the
+#   ToF line of sight / nearest to it) -> fresher ToF sample -> smoothed mm
+#   result -> overlay
+#
+# The optional stages are the lib/ objects the scripts build from their
+# settings, None = off: RoiSearch, PyramidSearch (vision/pyramid.py),
+# MotionGate, Tracker, ToFZones, ContinuousRanging, StageProfiler and
+# FlightRecorder. They can be swapped on a running core (the host benches
+# do). Without tof_zones or ranging the distance is a blocking tof.read().
+#
+# detect() returns [x offset, width, distance] in mm, a preallocated list
+# refilled every detection, or the (0, 0, 0) tuple; the UART output sends it
+# (vision/uart_output.py). `stream` is an output that needs the frame
+# (vision/mjpeg_output.py): it is polled right after the snapshot to keep
+# sending the previous frame, and gets the annotated frame at the end.
+# img, target, dist and unchanged keep the last frame's state for the
+# outputs. Like the scripts before, a frame allocates nothing itself.
+
+import time
+from stage_profiler import SNAPSHOT, TOF, GATE, STATISTICS, FIND_BLOBS, SELECT, DRAW
+
+NO_RESULT = (0, 0, 0)
+
+# "Distance: 1234 mm" from constant strings, one draw_string() per digit,
+# since formatting a new string every frame would allocate
+LABEL_SCALE = 1.5
+LABEL_CHAR_PX = int(8 * LABEL_SCALE)  # glyphs are 8 px wide
+DIGITS = ('0', '1', '2', '3', '4', '5', '6', '7', '8', '9')
+
+
+def focal_length_px(f_mm=2.2, pixel_size_mm=1.75e-3, sensor_px_width=1616, image_px_width=320, tuned_mm=100):
+    # Focal length in image pixels (Nicla Vision at QVGA by default), an int:
+    # the mm conversion per frame is integer math, floats are heap objects
+    return int(tuned_mm + int((f_mm * image_px_width) / (pixel_size_mm * sensor_px_width)))
+
+
+def div_mm(n, focal_px):
+    # n / focal_px truncated towards zero like int() of the float division
+    return n // focal_px if n >= 0 else -(-n // focal_px)
+
+
+class VisionCore:
+    def __init__(self, sensor, tof, threshold_engine, smoother, focal_px, min_pixels=300, min_area=300,
+                 max_pixels=None, min_valid=40, max_valid=2000, roi_search=None, motion_gate=None,
+                 tracker=None, tof_zones=None, ranging=None, profiler=None, recorder=None, stream=None,
+                 pyramid=None):
+        self.sensor = sensor
+        self.tof = tof
+        self.threshold_engine = threshold_engine
+        self.smoother = smoother
+        self.focal_px = focal_px
+        self.min_pixels = min_pixels
+        self.min_area = min_area
+        self.min_valid = min_valid
+        self.max_valid = max_valid
+        self.roi_search = roi_search
+        self.motion_gate = motion_gate
+        self.tracker = tracker
+        self.tof_zones = tof_zones
+        self.ranging = ranging
+        self.profiler = profiler
+        self.recorder = recorder
+        self.stream = stream
+        self.pyramid = pyramid
+        # Built once instead of every frame
+        width = sensor.width()
+        height = sensor.height()
+        self.full_roi = (0, 0, width, height)
+        self.center_x = width // 2
+        self.center_y = height // 2
+        self.max_pixels = width * height if max_pixels is None else max_pixels
+        # Pixel settings at this frame size, set_frame() scales from them
+        self.base_width = width
+        self.base_height = height
+        self.base_focal_px = focal_px
+        self.base_max_pixels = self.max_pixels
+        self.base_max_jump = tracker.max_jump if tracker is not None else None
+        self.base_fov_px = tof_zones.fov_px if tof_zones is not None else None
+        self.thresholds = [(0, 255)]  # find_blobs() thresholds, replaced only when the limit changes
+        self.smoothed = [0, 0, 0]     # x_min, x_max, dist, filled by smoother.add()
+        self.result = [0, 0, 0]       # x offset, width, distance in mm, filled every detection
+        self._find_window = self.find_window  # bound once, for roi_search.search()
+        self.clock = time.clock()
+        self.img = None
+        self.target = None
+        self.dist = 0
+        self.unchanged = False
+
+    def set_frame(self, width, height):
+        # After a frame size change (vision/profiles.py): the settings in
+        # pixels are scaled from their values at the construction size, so
+        # any sequence of sizes gives the same result as going there directly,
+        # and the state holding old pixel coordinates is dropped
+        old_width = self.full_roi[2]
+        base_width = self.base_width
+        self.full_roi = (0, 0, width, height)
+        self.center_x = width // 2
+        self.center_y = height // 2
+        self.focal_px = self.base_focal_px * width // base_width
+        self.max_pixels = self.base_max_pixels * width * height // (base_width * self.base_height)
+        self.threshold_engine.invalidate()
+        self.smoother.reset()
+        if self.roi_search is not None:
+            self.roi_search.set_frame(width, height)
+        if self.pyramid is not None:
+            self.pyramid.set_frame(width, height)
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.tracker is not None:
+            self.tracker.reset()
+            self.tracker.max_pixels = self.max_pixels
+            if self.base_max_jump is None:  # attached after construction
+                self.base_max_jump = self.tracker.max_jump * base_width // old_width
+            self.tracker.max_jump = self.base_max_jump * width // base_width
+        if self.tof_zones is not None:
+            if self.base_fov_px is None:
+                self.base_fov_px = self.tof_zones.fov_px * base_width // old_width
+            self.tof_zones.set_frame(width, self.base_fov_px * width // base_width)
+        self.target = None
+
+    def update_limit(self, img):
+        # Dynamic background brightness of the full frame (cached, see ThresholdEngine)
+        thresholds = self.thresholds
+        limit = self.threshold_engine.limit(img, self.full_roi)
+        if limit != thresholds[0][1]:
+            thresholds[0] = (0, limit)
+        if self.profiler is not None:
+            self.profiler.lap(STATISTICS)
+
+    def find_blobs_in(self, img, roi):
+        # Find dark blobs with the current limit
+        blobs = img.find_blobs(self.thresholds, pixels_threshold=self.min_pixels, area_threshold=self.min_area,
+                               roi=roi)
+        if self.profiler is not None:
+            self.profiler.lap(FIND_BLOBS)
+        if self.recorder is not None:
+            self.recorder.set_blobs(blobs, roi is not self.full_roi)
+        return blobs
+
+    def find_dark_blobs(self, img, roi):
+        self.update_limit(img)
+        return self.find_blobs_in(img, roi)
+
+    def find_target(self, img, roi):
+        blobs = self.find_dark_blobs(img, roi)
+        if not blobs:
+            return None
+        # Center of the image (where ToF points)
+        return self.select_target(blobs, self.center_x, self.center_y, self.max_pixels)
+
+    def find_window(self, img, roi):
+        # find_target() with the limit already taken this frame (ROI search levels)
+        blobs = self.find_blobs_in(img, roi)
+        if not blobs:
+            return None
+        return self.select_target(blobs, self.center_x, self.center_y, self.max_pixels)
+
+    def select_target(self, blobs, center_x, center_y, max_pixels):
+        # Find the blob covering the distance sensor's line-of-sight (center),
+        # ignoring very large ones
+        for b in blobs:
+            if b.pixels() < max_pixels and b.x() <= center_x <= b.x()+b.w() and b.y() <= center_y <= b.y()+b.h():
+                return b
+
+        # If no blob covers the center, find the nearest blob
+        nearest = None
+        nearest_d2 = 0
+        for b in blobs:
+            # Squared distance from blob center to image center (same order, no float)
+            dx = b.cx() - center_x
+            dy = b.cy() - center_y
+            d2 = dx*dx + dy*dy
+            if nearest is None or d2 < nearest_d2:
+                nearest = b
+                nearest_d2 = d2
+        return nearest
+
+    def measure(self, target, dist):
+        # Get x-range of the blob, NB: pixels 0-320
+        x_min = target.x()
+        x_max = target.x() + target.w()
+
+        # Average of the last readings (raw values until the smoother is full)
+        x_min, x_max, dist = self.smoother.add(x_min, x_max, dist, self.smoothed)
+
+        # Convert from pixel to mm
+        focal_px = self.focal_px
+        result = self.result
+        result[0] = div_mm((x_min - self.center_x) * dist, focal_px)  # offset of x_start, negative = left
+        result[1] = div_mm((x_max - x_min) * dist, focal_px)          # object width
+        result[2] = dist
+        return result
+
+    def draw_distance(self, img, dist):
+        img.draw_string(10, 10, "Distance:", color=(255, 255, 255), scale=LABEL_SCALE)
+        x = 10 + 10 * LABEL_CHAR_PX
+        div = 1
+        while div * 10 <= dist:
+            div *= 10
+        while div:
+            img.draw_string(x, 10, DIGITS[dist // div % 10], color=(255, 255, 255), scale=LABEL_SCALE)
+            x += LABEL_CHAR_PX
+            div //= 10
+        img.draw_string(x + LABEL_CHAR_PX, 10, "mm", color=(255, 255, 255), scale=LABEL_SCALE)
+
+    def read_distance(self):
+        # Latest distance in mm
+        if self.tof_zones is not None:
+            return self.tof_zones.poll()  # nearest fresh zone distance
+        if self.ranging is not None:
+            self.ranging.poll()
+            return self.ranging.current()  # latest sample, 0 if too old
+        return self.tof.read()
+
+    def detect(self):
+        self.clock.tick()
+        profiler = self.profiler
+        img = self.sensor.snapshot()
+        if profiler is not None:
+            profiler.lap(SNAPSHOT)
+        stream = self.stream
+        if stream is not None:
+            stream.poll()  # keep sending the previous frame
+
+        ## DISTANCE SENSOR
+        dist = self.read_distance()
+        if profiler is not None:
+            profiler.lap(TOF)
+
+        target = None
+        result = NO_RESULT
+        gate = self.motion_gate
+        unchanged = gate is not None and gate.check(img, dist)
+        if profiler is not None and gate is not None:
+            profiler.lap(GATE)
+        if unchanged:
+            # Scene and distance unchanged since the last detection, reuse it
+            target = gate.target
+            result = gate.result
+        else:
+            pending = False  # an empty result that the next frames may still change
+            # Blob detection is only needed when the distance is usable
+            if dist > self.min_valid and dist < self.max_valid:
+                tracker = self.tracker
+                if tracker is not None:
+                    # Tracks need every blob in the frame, so no ROI search here
+                    blobs = self.find_dark_blobs(img, self.full_roi)
+                    target = tracker.update(blobs, self.center_x, self.center_y)
+                    pending = target is None and len(blobs) > 0  # not confirmed yet
+                elif self.roi_search is not None:
+                    self.update_limit(img)  # once for every level
+                    target = self.roi_search.search(self._find_window, img)
+                elif self.pyramid is not None:
+                    target = self.pyramid.search(self, img)
+                else:
+                    target = self.find_target(img, self.full_roi)
+                if profiler is not None:
+                    profiler.lap(SELECT)
+
+                if target and self.tof_zones is not None:
+                    # Distance of the zone covering the target (0 = stale or out of range)
+                    dist = self.tof_zones.distance_for(target)
+                elif target and self.ranging is not None and self.ranging.poll():
+                    # A measurement finished while the blobs were computed, use the fresher one
+                    fresh = self.ranging.current()
+                    if fresh > self.min_valid and fresh < self.max_valid:
+                        dist = fresh
+                if profiler is not None:
+                    profiler.lap(TOF)
+
+                if target and dist:
+                    # Calculate average object offset, width and distance
+                    result = self.measure(target, dist)
+                    if profiler is not None:
+                        profiler.lap(SELECT)
+                elif target:
+                    pending = True  # no zone distance yet
+            if gate is not None:
+                gate.store(target, result, pending)
+        self.img = img
+        self.target = target
+        self.dist = dist
+        self.unchanged = unchanged
+
+        if self.recorder is not None:
+            # Before the overlay is drawn, a raw frame may be taken
+            self.recorder.record(img, dist, self.thresholds[0][1], target,
+                                 target.id if target and self.tracker is not None else 0, result, unchanged)
+
+        if target:
+            # Draw target square and distance
+            img.draw_cross(target.cx(), target.cy(), color=(0, 255, 0))
+            img.draw_rectangle(target.x(), target.y(), target.w(), target.h(), color=(0, 0, 0), thickness=3)
+            self.draw_distance(img, dist)
+            if profiler is not None:
+                profiler.lap(DRAW)
+
+        if stream is not None:
+            stream.send(img)
+        return result
@@ -0,0 +1,39 @@
+# MJPEG output - the annotated frame to browsers, next to detection
+#
+# Wraps the stream stage (lib/stream_stage.py over lib/mjpeg_server.py) or
+# the Wi-Fi link standing in for it (lib/wifi_link.py). Set as the core's
+# `stream`: poll() runs right after the snapshot and keeps sending the
+# previous frame, send() offers the frame once the overlay is drawn; the
+# stage decides whether it is encoded (see STREAM_EVERY / STREAM_BUDGET in
+# ttk8/ttk8.py). Both are timed as the profiler's SEND stage, the JPEG
+# encode itself is timed by the server. Every report_ms the stream summary
+# is printed (0 = never).
+
+import time
+from stage_profiler import SEND
+
+
+class MjpegOutput:
+    def __init__(self, stream, profiler=None, report_ms=0):
+        self.stream = stream
+        self.profiler = profiler
+        self.report_ms = report_ms
+        self._reported = time.ticks_ms()
+
+    def poll(self):
+        self.stream.poll()
+        if self.profiler is not None:
+            self.profiler.lap(SEND)
+
+    def send(self, img):
+        # Encoded when due and sent only to the browsers ready for a new frame
+        sent = self.stream.run(img)
+        if self.profiler is not None:
+            self.profiler.lap(SEND)
+        if self.report_ms and time.ticks_diff(time.ticks_ms(), self._reported) >= self.report_ms:
+            self._reported = time.ticks_ms()
+            print(self.stream.summary())
+        return sent
+
+    def summary(self):
+        return self.stream.summary()
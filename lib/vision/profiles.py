@@ -0,0 +1,126 @@
+# Runtime profiles - detection settings the robot switches over UART
+#
+# A Profile is a named set of what used to be module constants: frame size,
+# threshold offset, min_area / min_pixels, the moving average length, the
+# loop sleep and optionally the pixel format; e.g. QQVGA without a sleep for
+# fast driving and QVGA for precision. The thresholds are one (min, max)
+# pair, which find_blobs applies to the grey level on GRAYSCALE and to L
+# (0-100) on RGB565, so an RGB565 profile needs its offset in L units. ProfileSwitch adds request bytes to the UART output's
+# `commands` (polled and responder modes, not push):
+#
+#   b'0' + index  select profile `index`, answered with the status
+#   b'?'          status: '<hhh' active profile index, requested index and
+#                 the measured loop fps x 10, the size of a result so the
+#                 robot reads it with the same reception; it has one request
+#                 in flight and tells the two apart by the request it sent
+#                 (uart_robot/main.c, CAMERA_PROFILE / CAMERA_STATUS_EVERY)
+#
+# A request may arrive in the UART interrupt, in the middle of a frame, so
+# the handler only records it; poll(), once per loop pass, applies it
+# between frames and measures the fps of the active profile every
+# fps_window_ms. The new frame size goes to the sensor and to the core's
+# set_frame() (pixel settings scaled, pixel state dropped), and the
+# smoother is restarted with the profile's length. A new pixel format
+# restarts the motion gate; the threshold is measured again at every switch.
+# No restart, nothing is allocated except at a switch. The flight recorder
+# keeps logging, raw frames only at the size and format it was built for.
+
+import struct
+import time
+
+STATUS = b'?'[0]
+SELECT = b'0'[0]
+
+
+class Profile:
+    def __init__(self, name, framesize, offset=30, min_area=300, min_pixels=300, readings=10, sleep_ms=100,
+                 pixformat=None):
+        self.name = name
+        self.framesize = framesize
+        self.offset = offset
+        self.min_area = min_area
+        self.min_pixels = min_pixels
+        self.readings = readings  # moving average length
+        self.sleep_ms = sleep_ms  # the loop's sleep, the responder answers meanwhile
+        self.pixformat = pixformat  # None: keep the sensor's
+
+
+class ProfileSwitch:
+    def __init__(self, sensor, core, profiles, active=0, fps_window_ms=1000):
+        self.sensor = sensor
+        self.core = core
+        self.profiles = profiles
+        self.fps_window_ms = fps_window_ms
+        self.reply = bytearray(6)
+        self.active = None
+        self.index = -1
+        self.apply(active)
+        self.requested = active
+        self.switches = 0         # switches requested by the robot
+        self.frames = 0
+        self.fps10 = 0            # loop fps x 10 over the last window
+        self.start = time.ticks_ms()
+
+    def commands(self, commands=None):
+        # UartOutput `commands` with the profile requests added
+        commands = dict(commands) if commands else {}
+        for i in range(len(self.profiles)):
+            commands[bytes((SELECT + i,))] = self._selector(i)
+        commands[bytes((STATUS,))] = self.status
+        return commands
+
+    def _selector(self, index):
+        def select():
+            self.requested = index
+            return self.status()
+        return select
+
+    def status(self):
+        struct.pack_into('<hhh', self.reply, 0, self.index, self.requested, self.fps10)
+        return self.reply
+
+    def poll(self):
+        # Once per loop pass: apply a requested profile (True), measure the fps
+        now = time.ticks_ms()
+        if self.requested != self.index:
+            self.apply(self.requested)
+            self.switches += 1
+            self.start = now
+            self.frames = 0
+            self.fps10 = 0
+            return True
+        self.frames += 1
+        elapsed = time.ticks_diff(now, self.start)
+        if elapsed >= self.fps_window_ms:
+            self.fps10 = min(self.frames * 10000 // elapsed, 32767)  # fits the '<hhh' reply
+            self.start = now
+            self.frames = 0
+        return False
+
+    def apply(self, index):
+        profile = self.profiles[index]
+        sensor = self.sensor
+        core = self.core
+        if profile.pixformat is not None and profile.pixformat != sensor.get_pixformat():
+            sensor.set_pixformat(profile.pixformat)
+            if core.motion_gate is not None:
+                core.motion_gate.reset()  # its signature image has the old format
+        if profile.framesize != sensor.get_framesize():
+            sensor.set_framesize(profile.framesize)
+            core.set_frame(sensor.width(), sensor.height())
+        core.threshold_engine.offset = profile.offset
+        core.threshold_engine.invalidate()
+        core.min_area = profile.min_area
+        core.min_pixels = profile.min_pixels
+        if profile.readings != core.smoother.window:
+            core.smoother.resize(profile.readings)
+        else:
+            core.smoother.reset()
+        self.active = profile
+        self.index = index
+
+    def summary(self):
+        profile = self.active
+        return "profile %d %s: %dx%d, offset %d, min area %d px, %d readings, sleep %d ms, %d.%d fps" % (
+            self.index, profile.name, self.sensor.width(), self.sensor.height(), profile.offset,
+            profile.min_area, profile.readings, profile.sleep_ms, self.fps10 // 10, self.fps10 % 10)
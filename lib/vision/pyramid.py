@@ -0,0 +1,118 @@
+# Coarse-to-fine target search - find on a downscaled copy, refine at full size
+#
+# find_blobs over the whole QVGA frame is the largest cost of a frame, yet
+# only the target's edges are needed at full resolution. search() therefore
+# works on two levels:
+#
+#   coarse  the frame is area-averaged by `factor` (QVGA -> QQVGA at 2, 80x60
+#           at 4) into an image allocated once, the threshold limit is taken
+#           from it (cached per ROI like before, 1/factor^2 of the pixels) and
+#           the target is chosen there by the core's rule: the blob on the
+#           ToF line of sight, else the nearest one, with the pixel limits
+#           scaled down
+#   fine    find_blobs at full size in the coarse target's box grown by
+#           `margin` pixels on every side, with the same limit; the blob
+#           chosen there is the result
+#
+# Edges in the coarse image are off by up to `factor` pixels, the margin
+# covers that. A refined blob that touches the ROI border (except at the frame
+# border) was cut by it, and one that is not found at all was a coarse
+# artefact: both fall back to a full frame search, as does a coarse level
+# that finds nothing (counted as misses). Not used with the tracker, which
+# needs every blob in the frame.
+#
+# The ROI is a list refilled in place, so apart from a frame size change
+# nothing is allocated.
+
+import image
+
+from stage_profiler import STATISTICS, FIND_BLOBS
+
+
+class PyramidSearch:
+    def __init__(self, sensor, factor=2, margin=8):
+        self.pixformat = sensor.GRAYSCALE
+        self.factor = factor
+        self.margin = margin
+        self.scale = 1 / factor
+        self.roi = [0, 0, 0, 0]
+        self.set_frame(sensor.width(), sensor.height())
+
+    def set_frame(self, width, height):
+        # (Re)build the coarse image for a frame size
+        factor = self.factor
+        self.width = width
+        self.height = height
+        self.small = None
+        self.small = image.Image(width // factor, height // factor, self.pixformat)
+        self.small_roi = (0, 0, width // factor, height // factor)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.refined = 0
+        self.fallbacks = 0   # cut by the ROI or not found at full size
+        self.misses = 0      # nothing at the coarse level, searched at full size
+
+    def search(self, core, img):
+        self.frames += 1
+        profiler = core.profiler
+        factor = self.factor
+        small = self.small
+        small.draw_image(img, 0, 0, x_scale=self.scale, y_scale=self.scale, hint=image.AREA)
+        thresholds = core.thresholds
+        limit = core.threshold_engine.limit(small, self.small_roi)
+        if limit != thresholds[0][1]:
+            thresholds[0] = (0, limit)
+        if profiler is not None:
+            profiler.lap(STATISTICS)
+
+        area = factor * factor
+        blobs = small.find_blobs(thresholds, pixels_threshold=core.min_pixels // area,
+                                 area_threshold=core.min_area // area, roi=self.small_roi)
+        coarse = core.select_target(blobs, core.center_x // factor, core.center_y // factor,
+                                    core.max_pixels // area) if blobs else None
+        if coarse is None:
+            if profiler is not None:
+                profiler.lap(FIND_BLOBS)
+            self.misses += 1
+            return core.find_target(img, core.full_roi)
+
+        # Coarse box in full-size pixels, grown by the margin and clamped to the frame
+        margin = self.margin
+        roi = self.roi
+        x = max(0, coarse.x() * factor - margin)
+        y = max(0, coarse.y() * factor - margin)
+        roi[0] = x
+        roi[1] = y
+        roi[2] = min(self.width, (coarse.x() + coarse.w()) * factor + margin) - x
+        roi[3] = min(self.height, (coarse.y() + coarse.h()) * factor + margin) - y
+        blobs = img.find_blobs(thresholds, pixels_threshold=core.min_pixels, area_threshold=core.min_area, roi=roi)
+        if profiler is not None:
+            profiler.lap(FIND_BLOBS)
+        target = core.select_target(blobs, core.center_x, core.center_y, core.max_pixels) if blobs else None
+        if target is not None and self.inside(target, roi):
+            if core.recorder is not None:
+                core.recorder.set_blobs(blobs, True)
+            self.refined += 1
+            return target
+        self.fallbacks += 1
+        return core.find_target(img, core.full_roi)
+
+    def inside(self, blob, roi):
+        # Not touching the ROI border (edges shared with the frame border are fine)
+        x, y, w, h = roi
+        bx = blob.x()
+        by = blob.y()
+        if bx <= x and x > 0 or by <= y and y > 0:
+            return False
+        if bx + blob.w() >= x + w and x + w < self.width or by + blob.h() >= y + h and y + h < self.height:
+            return False
+        return True
+
+    def refined_ratio(self):
+        return self.refined / self.frames if self.frames else 0.0
+
+    def summary(self):
+        return "pyramid 1/%d: refined %d, fallbacks %d, misses %d of %d frames (refined %.0f%%)" % (
+            self.factor, self.refined, self.fallbacks, self.misses, self.frames, 100 * self.refined_ratio())
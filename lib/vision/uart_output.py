@@ -0,0 +1,128 @@
+# UART output - the '<hhh' result to the robot in one of three modes
+#
+#   'polled'     the old loop: a b'r' request is checked once per pass and
+#                answered with the result of that pass
+#   'responder'  lib/uart_responder.py answers every request from the RX
+#                interrupt with the latest result, idle() sleeps
+#   'push'       every result is sent unrequested as a frame with sync bytes,
+#                sequence number and CRC16 (lib/uart_frame.py, CAMERA_PUSH_MODE
+#                on the robot); with `batch` the confirmed tracker tracks go
+#                as a varint batch packet (lib/obstacle_batch.py) and with
+#                `baud` the robot may step the baud rate up (lib/uart_baud.py)
+#
+# `commands` maps other request bytes to handlers returning the reply (e.g.
+# b's' -> the stage profiler report), in the polled and responder modes.
+# send() takes detect()'s result after every frame; the batch also reads the
+# core's target and tracks. Nothing here allocates per frame.
+
+import struct
+import time
+from uart_responder import UartResponder
+from uart_frame import FrameWriter
+import uart_frame, obstacle_batch
+from obstacle_batch import BatchEncoder
+from uart_baud import BaudFollower
+from vision.core import div_mm
+
+MODES = ('polled', 'responder', 'push')
+REQUEST = b'r'[0]
+
+
+class UartOutput:
+    def __init__(self, uart, core, mode='responder', batch=False, baud=False, commands=None, use_irq=True,
+                 debug=False, timeout_char=200):
+        if mode not in MODES:
+            raise ValueError("UART mode %r, expected one of %r" % (mode, MODES))
+        self.uart = uart
+        self.core = core
+        self.mode = mode
+        self.debug = debug  # print requests and sent values (polled mode)
+        self.commands = dict((key[0], handler) for key, handler in commands.items()) if commands else {}
+        self.responder = None
+        self.framer = None
+        self.batch = None
+        self.baud_follower = None
+        if mode == 'responder':
+            self.responder = UartResponder(uart, '<hhh', use_irq=use_irq, commands=commands)
+        elif mode == 'push' and batch:
+            self.framer = FrameWriter(uart, None, obstacle_batch.MAX_SIZE)
+            self.batch = BatchEncoder(self.framer.frame, uart_frame.HEADER)  # encodes straight into the frame
+        elif mode == 'push':
+            self.framer = FrameWriter(uart, '<hhh')
+        if mode == 'push' and baud:
+            self.baud_follower = BaudFollower(uart, self.framer, timeout_char=timeout_char)
+        self.request = bytearray(1)
+        self.data = bytearray(6)  # polled mode reply, '<hhh' 2 bytes each
+
+    def poll_request(self):
+        # readinto() the preallocated byte, read(1) would allocate a bytes object
+        uart = self.uart
+        if uart.any():
+            uart.readinto(self.request, 1)
+            byte = self.request[0]
+            if self.debug:
+                print('Request:', self.request)
+            if byte == REQUEST:
+                return True
+            if byte in self.commands:
+                uart.write(self.commands[byte]())
+        return False
+
+    def fill_batch(self, result):
+        # Primary target first (smoothed result), then the other confirmed tracks
+        core = self.core
+        batch = self.batch
+        target = core.target
+        tracker = core.tracker
+        x_offset, width, d = result
+        batch.add(target.id if tracker is not None else 0, x_offset, width, d, target.pixels() // 16)
+        if tracker is None:
+            return
+        focal_px = core.focal_px
+        for t in tracker.tracks:
+            if not t.id or not t.matched or t.hits < tracker.min_hits or t is target:
+                continue
+            d = core.tof_zones.distance_for(t) if core.tof_zones is not None else core.dist
+            if not d:
+                continue
+            if not batch.add(t.id, div_mm((t.x() - core.center_x) * d, focal_px), div_mm(t.w() * d, focal_px),
+                             d, t.pixels() // 16):
+                break
+
+    def send(self, result):
+        if self.mode == 'responder':
+            self.responder.update(result)  # replies are sent by the responder
+        elif self.mode == 'push':
+            if self.batch is not None:
+                core = self.core
+                if not core.unchanged:
+                    # A reused result keeps the last batch
+                    self.batch.begin()
+                    if core.target and core.dist:
+                        self.fill_batch(result)
+                self.framer.send_payload(self.batch.end())
+            else:
+                self.framer.send(result)
+            if self.baud_follower is not None:
+                self.baud_follower.service()
+        else:
+            struct.pack_into('<hhh', self.data, 0, result[0], result[1], result[2])
+            if self.poll_request():
+                self.uart.write(self.data)
+                if self.debug:
+                    print(result[0], result[1], result[2])  # print values, for testing
+
+    def idle(self, ms):
+        # The loop's sleep; the polled responder answers requests meanwhile
+        if self.responder is not None:
+            self.responder.idle(ms)
+        else:
+            time.sleep_ms(ms)
+
+    def summary(self):
+        if self.responder is not None:
+            return self.responder.summary()
+        if self.baud_follower is not None:
+            return self.baud_follower.summary()
+        return "uart %s" % self.mode
+
@@ -0,0 +1,193 @@
+# Wi-Fi link supervisor - reconnects in the background, detection keeps running
+#
+# The link is a small state machine advanced by service() once per frame;
+# nothing in it waits:
+#
+#   down      a join was issued with wlan.connect() and is polled every call;
+#             it is issued again after join_ms, or retry_ms after the driver
+#             reported a failure (negative CYW43 status, e.g. no AP found)
+#   joined    associated with an IP address, the MJPEG server is (re)started;
+#             a failed start is retried after retry_ms
+#   up        streaming; the link is checked every check_ms, a lost link or
+#             an OSError from the server closes the stream and starts a join
+#
+# The IP config of the first DHCP lease (or `static`) is kept and handed to
+# wlan.ifconfig() before every join, so a reconnect skips DHCP. After
+# static_tries joins in a row fail with a cached config while the access
+# point is there (any failure but no AP found, or no answer in join_ms) it
+# is forgotten and the next join uses DHCP again (the network may have
+# changed). With cache_path the lease is also kept on flash for the next boot.
+#
+# The camera, the detection loop, the MjpegServer object (its statistics and
+# rate controller) and the stream stage all survive an outage; browsers
+# reconnect on their own. poll(), run() and summary() stand in for the stream
+# stage, so the link is passed where the stage was and the stream is skipped
+# while the link is down.
+#
+# resume_ms is the time from losing the link to listening again, stream_ms
+# to the first frame streamed after that (last and max over the outages).
+
+import time
+
+DOWN = 0
+JOINED = 1
+UP = 2
+STATES = ('down', 'joined', 'up')
+NO_AP_FOUND = -2  # CYW43 status: the access point is not there, not a config problem
+
+
+class WifiLink:
+    def __init__(self, wlan, ssid, key, stage, host='0.0.0.0', static=None, cache_path=None,
+                 check_ms=500, join_ms=8000, retry_ms=250, static_tries=2):
+        self.wlan = wlan
+        self.ssid = ssid
+        self.key = key
+        self.stage = stage
+        self.server = stage.server
+        self.host = host
+        self.static = static
+        self.cache_path = cache_path
+        self.check_ms = check_ms
+        self.join_ms = join_ms
+        self.retry_ms = retry_ms
+        self.static_tries = static_tries
+        self.config = static or self._load()
+        self._fixed = False     # a fixed config was given to the interface
+        self.state = DOWN
+        now = time.ticks_ms()
+        self.down_at = now      # when the link was lost (or first joined)
+        self.join_at = now
+        self.checked = now
+        self.streaming = False  # a frame was streamed since the link came back
+        self.joins = 0
+        self.failed = 0         # joins in a row that failed with the access point there
+        self.outages = 0
+        self.resume_ms = self.resume_max_ms = -1
+        self.stream_ms = self.stream_max_ms = -1
+
+    def start(self):
+        self.wlan.active(True)
+        self._join(time.ticks_ms())
+        return self
+
+    def _load(self):
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path) as f:
+                config = tuple(f.read().split())
+        except OSError:
+            return None
+        return config if len(config) == 4 else None
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'w') as f:
+                f.write(' '.join(self.config))
+        except OSError:
+            pass
+
+    def _join(self, now):
+        wlan = self.wlan
+        if self.failed >= self.static_tries and self.config is not None and self.config is not self.static:
+            self.config = None  # cached lease does not work here, back to DHCP
+        if self.config is not None:
+            wlan.ifconfig(self.config)
+            self._fixed = True
+        elif self._fixed:
+            wlan.ifconfig('dhcp')
+            self._fixed = False
+        wlan.connect(self.ssid, self.key)
+        self.join_at = now
+        self.joins += 1
+
+    def _lost(self, now):
+        # Close the stream; only rejoin when the link itself is gone
+        self.server.close()
+        self.state = JOINED if self.wlan.isconnected() else DOWN
+        self.down_at = now
+        self.streaming = False
+        self.outages += 1
+        if self.state == DOWN:
+            self.failed = 0
+            self._join(now)
+
+    def service(self):
+        # Advance the state machine; returns True while streaming is up
+        now = time.ticks_ms()
+        if self.state == UP:
+            if time.ticks_diff(now, self.checked) < self.check_ms:
+                return True
+            self.checked = now
+            if self.wlan.isconnected():
+                return True
+            self._lost(now)
+            return False
+        if self.state == DOWN:
+            if not self.wlan.isconnected():
+                waited = time.ticks_diff(now, self.join_at)
+                status = self.wlan.status() if waited >= self.retry_ms else 0
+                if waited >= self.join_ms or status < 0:
+                    if status != NO_AP_FOUND:
+                        self.failed += 1
+                    self._join(now)
+                return False
+            self.failed = 0
+            if self.config is None:
+                self.config = tuple(self.wlan.ifconfig())
+                self._save()
+            self.state = JOINED
+            self.join_at = time.ticks_add(now, -self.retry_ms)  # start listening right away
+        if time.ticks_diff(now, self.join_at) < self.retry_ms:
+            return False
+        self.join_at = now
+        try:
+            self.server.start(self.host)
+        except OSError:
+            self.server.close()
+            return False
+        self.state = UP
+        self.checked = now
+        self.resume_ms = time.ticks_diff(now, self.down_at)
+        if self.outages and self.resume_ms > self.resume_max_ms:
+            self.resume_max_ms = self.resume_ms
+        return True
+
+    def address(self):
+        return self.config[0] if self.config else '0.0.0.0'
+
+    def poll(self):
+        if self.state != UP:
+            return
+        try:
+            self.stage.poll()
+        except OSError:
+            self._lost(time.ticks_ms())
+
+    def run(self, img):
+        if self.state != UP:
+            return False
+        try:
+            sent = self.stage.run(img)
+        except OSError:
+            self._lost(time.ticks_ms())
+            return False
+        if sent and not self.streaming:
+            self.streaming = True
+            self.stream_ms = time.ticks_diff(time.ticks_ms(), self.down_at)
+            if self.outages and self.stream_ms > self.stream_max_ms:
+                self.stream_max_ms = self.stream_ms
+        return sent
+
+    def rates(self):
+        return self.stage.rates()
+
+    def summary(self):
+        text = "wifi %s (%s), %d joins, %d outages, resume %d ms (max %d), first frame %d ms (max %d)" % (
+            STATES[self.state], self.address(), self.joins, self.outages,
+            self.resume_ms, self.resume_max_ms, self.stream_ms, self.stream_max_ms)
+        if self.state == UP:
+            text += '\n' + self.stage.summary()
+        return text
@@ -1,12 +1,65 @@
 # Obstacle Detection - By: Rebekka Alve - Tue Nov 4 2025
 
-import sensor, time, struct
+# Import time and heap of the modules below: compiled on the camera from .py,
+# loaded from precompiled .mpy or frozen (host/build_mpy.py, lib/manifest.py)
+import gc, time
+from gc_probe import mem_alloc
+gc.collect()
+boot_ms = time.ticks_ms()
+import_heap = mem_alloc()
+
+import sensor
 from pyb import UART, LED
 from machine import I2C
 from vl53l1x import VL53L1X
+from smoother import RingSmoother
+from roi_search import RoiSearch
+from threshold import ThresholdEngine
+from motion_gate import MotionGate
+from tracker import Tracker
+from tof_zones import ToFZones
+from tof_ranging import ContinuousRanging
+from gc_probe import GcProbe
+from flight_recorder import FlightRecorder
+from boot_sequence import BootSequence
+from stage_profiler import StageProfiler, UART_TX
+from vision.core import VisionCore, focal_length_px
+from vision.pyramid import PyramidSearch
+from vision.uart_output import UartOutput
+from vision.profiles import Profile, ProfileSwitch
+
+gc.collect()
+import_ms = time.ticks_diff(time.ticks_ms(), boot_ms)
+import_heap = mem_alloc() - import_heap
 
 # Enable UART4, Tx = pin1 (SDA i2c), Rx = pin2 (SCL i2c)
 uart = UART(4, 115200, timeout_char=200)
+UART_DEBUG = False  # print requests and sent values (polled mode)
+
+# Stage profiler: time snapshot, ToF, threshold statistics, find_blobs, target
+# selection, drawing and the UART reply of every frame (lib/stage_profiler.py).
+# A b's' request answers with the per-stage report, about 700 bytes of text
+# (60 ms at 115200 baud; not in push mode).
+PROFILE = True
+profiler = StageProfiler() if PROFILE else None
+
+# How results reach the robot (lib/vision/uart_output.py):
+#   'responder'  answer b'r' requests from a UART interrupt with the latest result
+#   'polled'     check for a request once per loop pass
+#   'push'       send every result unrequested as a frame with sync bytes,
+#                sequence number and CRC16 (CAMERA_PUSH_MODE on the robot,
+#                see lib/uart_frame.py)
+UART_MODE = 'responder'
+
+# Push mode only: send every confirmed tracker track (primary target first) as
+# a varint batch packet instead of the single '<hhh' result (lib/obstacle_batch.py,
+# decoded by uart_robot/obstacle_batch.c)
+UART_BATCH = False
+
+# Push mode only: let the robot step the link up to 460800 or 1 Mbaud after a
+# test pattern exchange, back to 115200 when its error rate rises
+# (CAMERA_BAUD_NEGOTIATION on the robot, see lib/uart_baud.py)
+BAUD_NEGOTIATION = False
 
 # Parameters BLOB DETECTION
 OFFSET = 30  # threshold offset around mean background brightness
@@ -14,11 +67,82 @@ min_area = 300       # ignore tiny blobs
 min_pixels = 300     # ignore tiny blobs
 max_fraction = 0.95   # ignore blobs covering more than 90% of image (not working?)
 
+# Search for the target in windows around the ToF line of sight first and
+# only fall back to the full frame when nothing is found (False = full frame)
+ROI_SEARCH = False
+ROI_LEVELS = ((96, 72), (192, 144)) # window sizes tried before the full frame
+
+# Coarse-to-fine search: choose the target on a 1/PYRAMID_FACTOR copy of the
+# frame and only run find_blobs at full size in its box grown by PYRAMID_MARGIN
+# pixels (lib/vision/pyramid.py). Not with TRACKER or ROI_SEARCH.
+PYRAMID = False
+PYRAMID_FACTOR = 2
+PYRAMID_MARGIN = 8
+
+# Threshold cache: reuse the limit for up to THRESHOLD_MAX_AGE frames unless the
+# brightness drifts more than THRESHOLD_DRIFT (THRESHOLD_MAX_AGE = 1 measures every frame)
+THRESHOLD_MAX_AGE = 10
+THRESHOLD_DRIFT = 8     # grey levels
+THRESHOLD_BANDS = 4     # refresh one of N row bands at a time
+THRESHOLD_OTSU = False  # Otsu threshold on the histogram instead of mean - OFFSET
+threshold_engine = ThresholdEngine(OFFSET, THRESHOLD_MAX_AGE, THRESHOLD_DRIFT, THRESHOLD_BANDS, THRESHOLD_OTSU)
+
+# Motion gate: skip blob detection and reuse the last result while the scene
+# (16x12 mean-pooled cells) and the ToF reading stay unchanged
+MOTION_GATE = True
+motion_gate = MotionGate(pool=20, cell_delta=12, max_cells=2, tof_delta=30, max_skip=15)
+
+# GC probe: record the heap allocated per frame and the frame time, and
+# collect in the loop's idle time instead of whenever the heap runs full
+# (False = automatic collections only). Printed every GC_REPORT_FRAMES frames.
+GC_PROBE = False
+GC_REPORT_FRAMES = 100
+gc_probe = GcProbe() if GC_PROBE else None
+
+# Flight recorder: log the ToF distance, threshold, blobs, target and result
+# of every frame to RECORDER_PREFIX0000.bin, ... (a new file per boot and every
+# 4 MB, the last 4 kept), plus the raw frame of every RECORDER_FRAME_EVERY-th
+# frame (0 = none, needs 76.8 KB of heap). Written in the loop's sleep;
+# read with host/flight_log.py.
+RECORDER = False
+RECORDER_PREFIX = '/sd/flight'  # or 'flight' on the internal flash
+RECORDER_FRAME_EVERY = 50
+
+# Fast boot: start detecting once auto exposure has converged instead of
+# after a fixed SENSOR_SKIP_MS warm-up (lib/boot_sequence.py). The boot
+# timings are printed once the first valid result is out.
+FAST_BOOT = True
+BOOT_MIN_MS = 100 # frames before this never count as converged (two auto exposure periods)
+SENSOR_SKIP_MS = 500
+
 # Camera setup
 sensor.reset()
 sensor.set_pixformat(sensor.GRAYSCALE)  # grayscale for detection
 sensor.set_framesize(sensor.QVGA) # smaller frame size for speed
-sensor.skip_frames(time=500)
+boot = BootSequence(sensor, boot_ms, min_ms=BOOT_MIN_MS)
+roi_search = RoiSearch(sensor.width(), sensor.height(), ROI_LEVELS)
+pyramid = PyramidSearch(sensor, PYRAMID_FACTOR, PYRAMID_MARGIN) if PYRAMID else None
+recorder = (FlightRecorder(RECORDER_PREFIX, sensor.width(), sensor.height(), RECORDER_FRAME_EVERY)
+            if RECORDER else None)
+MAX_PIXELS = int(sensor.width() * sensor.height() * max_fraction)
+
+# Tracker: keep IDs for blobs across frames and only change the target after
+# another object has been preferred for TRACKER_SWITCH_FRAMES frames in a row
+# (False = the blob on the ToF line of sight, else the nearest one). A target
+# is only confirmed on its second frame; host/bench_tracker.py counts the
+# switches it saves on a recording.
+TRACKER = False
+TRACKER_SWITCH_FRAMES = 3
+tracker = Tracker(max_tracks=8, switch_frames=TRACKER_SWITCH_FRAMES,
+                  max_pixels=MAX_PIXELS)
+# The tracker needs every blob in the frame: with it the core runs neither
+# the ROI search nor the pyramid, and the ROI search goes before the pyramid
+if TRACKER and ROI_SEARCH:
+    print("warning: ROI_SEARCH is not used while TRACKER is on")
+if TRACKER and PYRAMID:
+    print("warning: PYRAMID is not used while TRACKER is on")
+if ROI_SEARCH and PYRAMID and not TRACKER:
+    print("warning: PYRAMID is not used while ROI_SEARCH is on")
 
 # Camera specifications and focal length
 pixel_size_mm = 1.75e-3
@@ -27,8 +151,7 @@ image_px_width  = 320       # QVGA capture width
 f_mm = 2.2                  # focal length in mm
 f_tuned_mm = 100.0            # tuned focal length, increase value to decrease object width estimates
 
-sensor_width_mm = pixel_size_mm * sensor_px_width
-focal_length_px = f_tuned_mm + int((f_mm * image_px_width) / sensor_width_mm) # approx 248 + tuned value
+focal_px = focal_length_px(f_mm, pixel_size_mm, sensor_px_width, image_px_width, f_tuned_mm) # approx 248 + tuned value
 
 # Distance sensor setup (ToF = time of flight)
 i2c = I2C(2)
@@ -36,9 +159,46 @@ tof = VL53L1X(i2c)
 MIN_VALID_DISTANCE = 40  # mm
 MAX_VALID_DISTANCE = 2000 # mm
 
-# Buffer (last 10 readings) for smoothing noisy detections
-readings = []
+# Multi-zone ToF: cycle the sensor ROI over left / center / right zones and
+# give each target the distance of the zone covering it (False = one reading
+# over the full field of view). TOF_FOV_PX = ToF field of view in image pixels.
+MULTI_ZONE_TOF = False
+TOF_FOV_PX = 92
+tof_zones = (ToFZones(tof, sensor.width(), fov_px=TOF_FOV_PX, max_age_ms=300,
+                      min_valid=MIN_VALID_DISTANCE, max_valid=MAX_VALID_DISTANCE)
+             if MULTI_ZONE_TOF else None)
+
+# Continuous ranging: the ToF measures in the background and finished samples
+# are collected without waiting, before and after blob detection (False =
+# blocking tof.read(); not used with MULTI_ZONE_TOF). Older samples are invalid.
+TOF_CONTINUOUS = True
+TOF_MAX_AGE_MS = 200
+ranging = ContinuousRanging(tof, TOF_MAX_AGE_MS) if TOF_CONTINUOUS and not MULTI_ZONE_TOF else None
+
+# Moving average (last 10 readings) for smoothing noisy detections
 MAX_READINGS = 10
+smoother = RingSmoother(MAX_READINGS)
+
+# The detection pipeline (lib/vision/core.py) and the UART output it feeds
+core = VisionCore(sensor, tof, threshold_engine, smoother, focal_px, min_pixels, min_area, MAX_PIXELS,
+                  MIN_VALID_DISTANCE, MAX_VALID_DISTANCE,
+                  roi_search=roi_search if ROI_SEARCH else None, pyramid=pyramid,
+                  motion_gate=motion_gate if MOTION_GATE else None,
+                  tracker=tracker if TRACKER else None,
+                  tof_zones=tof_zones, ranging=ranging, profiler=profiler, recorder=recorder)
+
+# Profiles the robot switches at runtime (lib/vision/profiles.py): it sends
+# b'0' + index to select one and b'?' for the active profile and the measured
+# fps (not in push mode). Frame size, threshold offset, min area / pixels,
+# moving average length, loop sleep in ms; the first one is used at start.
+PROFILES = (
+    Profile('precision', sensor.QVGA, OFFSET, min_area, min_pixels, MAX_READINGS, 100),
+    Profile('fast', sensor.QQVGA, OFFSET, min_area // 4, min_pixels // 4, 4, 0),
+)
+profiles = ProfileSwitch(sensor, core, PROFILES)
+
+output = UartOutput(uart, core, UART_MODE, UART_BATCH, BAUD_NEGOTIATION,
+                    commands=profiles.commands({b's': profiler.report} if PROFILE else None), debug=UART_DEBUG)
 
 # LEDs
 red = LED(1)
@@ -50,112 +210,43 @@ def leds_off():
     green.off()
     blue.off()
 
-clock = time.clock()
-
-def uart_request():
-    if uart.any():
-        request = uart.read(1)
-        print('Request:', request)
-        if request == b'r':
-            return True
-    return False
-
-def average_offset_width_distance_mm(target,center_x,dist):
-
-    # Get x-range of the blob, NB: pixels 0-320
-    x_min = target.x()
-    x_max = target.x() + target.w()
-
-    # Store in buffer
-    readings.append((x_min,x_max,dist))
-
-    # Find average of the last N readings
-    if len(readings) == MAX_READINGS:
-        x_min = sum(r[0] for r in readings) // MAX_READINGS
-        x_max = sum(r[1] for r in readings) // MAX_READINGS
-        dist = sum(r[2] for r in readings) // MAX_READINGS
-        readings.pop(0)  # remove oldest reading
-
-    # Convert from pixel to mm
-    width_px = x_max - x_min
-    object_width_mm = (width_px * dist) / focal_length_px
-
-    # offset from image center to x_start in mm (negative = left)
-    x_offset_mm = ((x_min - center_x) * dist) / focal_length_px
-
-    return int(x_offset_mm),int(object_width_mm),int(dist)
-
-
-def detect_obstacles():
-    clock.tick()
-    img = sensor.snapshot()
-
-    ## DISTANCE SENSOR
-    dist = tof.read()  # Read distance in mm
-
-    # Dynamic background brightness
-    stats = img.get_statistics()
-    mean_val = stats.l_mean()
-    limit = max(0, mean_val - OFFSET)
-    color_thresholds = [(0, limit)]
-
-    # Find dark blobs
-    blobs = img.find_blobs(color_thresholds, pixels_threshold=min_pixels, area_threshold=min_area)
-
-    if blobs and dist > MIN_VALID_DISTANCE and dist < MAX_VALID_DISTANCE:
-        # Center of the image (where ToF points)
-        center_x = img.width() // 2
-        center_y = img.height() // 2
-
-        # Filter blobs to ignore very large ones
-        max_pixels = int(img.width() * img.height() * max_fraction)
-        valid_blobs = [b for b in blobs if b.pixels() < max_pixels]
-
-        # Find the blob covering the distance sensor's line-of-sight (center)
-        target = None
-        for b in valid_blobs:
-            if b.pixels() < (img.width() * img.height() * max_fraction):
-                if b.x() <= center_x <= b.x()+b.w() and b.y() <= center_y <= b.y()+b.h():
-                    target = b
-                    break
-        if not target:
-            # If no blob covers the center, find the nearest blob
-            nearest = None
-            nearest_dist = float('inf')
-            for b in blobs:
-                # Calculate distance from blob center to image center
-                dx = b.cx() - center_x
-                dy = b.cy() - center_y
-                distance = (dx*dx + dy*dy)**0.5
-                if distance < nearest_dist:
-                    nearest = b
-                    nearest_dist = distance
-            target = nearest
-
-        if target:
-            # Draw target square and distance
-            img.draw_cross(target.cx(), target.cy(), color=(0, 255, 0))
-            img.draw_rectangle(target.rect(), color=(0, 0, 0), thickness=3)
-            img.draw_string(10, 10, f"Distance: {dist} mm", color=(255, 255, 255),scale=1.5)
-
-            # Calculate average object offset, width and distance
-            return average_offset_width_distance_mm(target,center_x,dist)
-    return 0,0,0
-
 try:
     green.on()
-    print("focal length px:", focal_length_px)
+    if FAST_BOOT:
+        boot.warm_up()
+    else:
+        boot.skip(SENSOR_SKIP_MS)
+    print("imports: %d ms, %d bytes heap" % (import_ms, import_heap))
+    print("focal length px:", focal_px)
+    print(profiles.summary())
     print("x offset mm, width mm, distance mm")
     while True:
-        data = struct.pack('<hhh', *detect_obstacles()) # 2 bytes each
-        #print(*struct.unpack('<hhh', data)) # print values, for testing
-        if(uart_request()):
-            uart.write(data)
-            #print('Data sent')
-            print(*struct.unpack('<hhh', data)) # print values, for testing
-        time.sleep_ms(100)
+        if GC_PROBE:
+            gc_probe.begin()
+        if PROFILE:
+            profiler.begin()
+        result = core.detect()
+        output.send(result)
+        if PROFILE:
+            profiler.lap(UART_TX)
+            profiler.end()
+        if boot.pending and boot.update(result):
+            print(boot.summary())
+        if GC_PROBE:
+            gc_probe.end()
+            gc_probe.idle() # collect in the sleep below
+            if gc_probe.frames == GC_REPORT_FRAMES:
+                print(gc_probe.summary())
+        if RECORDER:
+            recorder.idle() # batched log writes in the sleep below
+        if profiles.poll(): # a profile the robot asked for takes effect here
+            print(profiles.summary())
+        output.idle(profiles.active.sleep_ms) # the responder answers requests meanwhile
 
 except:
     leds_off()
+    if RECORDER:
+        recorder.close()
+        print(recorder.summary())
     print("\nProgram finished\n")
 
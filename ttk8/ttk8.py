@@ -1,11 +1,74 @@
-import sensor, time, pyb
+# Import time and heap of the modules below: compiled on the camera from .py,
+# loaded from precompiled .mpy or frozen (host/build_mpy.py, lib/manifest.py)
+import gc, time
+from gc_probe import mem_alloc
+gc.collect()
+boot_ms = time.ticks_ms()
+import_heap = mem_alloc()
+
+import sensor, pyb
 from machine import I2C
 from vl53l1x import VL53L1X
+from roi_search import RoiSearch
+from threshold import ThresholdEngine
+from motion_gate import MotionGate
+from tracker import Tracker
+from tof_zones import ToFZones
+from tof_ranging import ContinuousRanging
+from smoother import RingSmoother
+from mjpeg_server import MjpegServer
+from stream_rate import StreamRate
+from stream_stage import StreamStage
+from gc_probe import GcProbe
+from wifi_link import WifiLink
+from boot_sequence import BootSequence
+from stage_profiler import StageProfiler, JPEG, UART_TX
+from vision.core import VisionCore, focal_length_px
+from vision.pyramid import PyramidSearch
+from vision.mjpeg_output import MjpegOutput
+
+gc.collect()
+import_ms = time.ticks_diff(time.ticks_ms(), boot_ms)
+import_heap = mem_alloc() - import_heap
 
 # Enable wifi
 WIFI_STREAMING = True # Set to False to disable wifi streaming
 WIFI_NAME = "Volvevegen_2G"
 WIFI_KEY = "Volvevegen"
+WIFI_PORT = 8080
+# The link is joined in the background and checked every WIFI_CHECK_MS; after
+# a drop, detection keeps running while it rejoins with the IP config of the
+# first DHCP lease (or WIFI_STATIC_IP), which skips DHCP, and listens again.
+# WIFI_IP_CACHE keeps the lease on flash for the next boot (None = RAM only).
+WIFI_STATIC_IP = None # e.g. ('192.168.2.30', '255.255.255.0', '192.168.2.1', '8.8.8.8')
+WIFI_IP_CACHE = None  # e.g. 'wifi_ip.txt'
+WIFI_CHECK_MS = 500
+# Any number of browsers (up to STREAM_MAX_CLIENTS) can watch; a slow one
+# skips frames instead of slowing detection down
+STREAM_MAX_CLIENTS = 4
+STREAM_QUALITY = 35
+STREAM_REPORT_MS = 5000 # print detection/stream fps and per-client stats (0 = off)
+# Detection runs every frame; the stream only encodes every STREAM_EVERY-th
+# frame, at most one per STREAM_INTERVAL_MS and with encoding kept under
+# STREAM_BUDGET of the time (0 = no limit), as a STREAM_SCALE preview
+STREAM_EVERY = 1
+STREAM_INTERVAL_MS = 0
+STREAM_BUDGET = 0.25
+STREAM_SCALE = 1.0
+# Adaptive stream: lower the JPEG quality, then send a half-size preview, then
+# skip frames while the slowest browser needs more than STREAM_TARGET_MS per
+# frame, and go back up when the link recovers (False = fixed STREAM_QUALITY)
+STREAM_ADAPTIVE = True
+STREAM_TARGET_MS = 100
+# Stage profiler: time snapshot, ToF, threshold statistics, find_blobs, target
+# selection, drawing, JPEG encode and stream sends of every frame
+# (lib/stage_profiler.py), served as Prometheus text at http://<camera>:8080/metrics
+PROFILE = True
+profiler = StageProfiler() if PROFILE else None
+
+# Also answer the robot's b'r' requests on UART4 with the latest result, as
+# obstacle_detection.py does (lib/vision/uart_output.py, responder mode)
+UART_OUTPUT = False
 
 # Parameters BLOB DETECTION
 OFFSET = 30  # threshold offset around mean background brightness
@@ -13,11 +76,74 @@ min_area = 300       # ignore tiny blobs
 min_pixels = 300     # ignore tiny blobs
 max_fraction = 0.95   # ignore blobs covering more than 90% of image (not working?)
 
+# Search for the target in windows around the ToF line of sight first and
+# only fall back to the full frame when nothing is found (False = full frame)
+ROI_SEARCH = False
+ROI_LEVELS = ((96, 72), (192, 144)) # window sizes tried before the full frame
+
+# Coarse-to-fine search: choose the target on a 1/PYRAMID_FACTOR copy of the
+# frame and only run find_blobs at full size in its box grown by PYRAMID_MARGIN
+# pixels (lib/vision/pyramid.py). Not with TRACKER or ROI_SEARCH.
+PYRAMID = False
+PYRAMID_FACTOR = 2
+PYRAMID_MARGIN = 8
+
+# Threshold cache: reuse the limit for up to THRESHOLD_MAX_AGE frames unless the
+# brightness drifts more than THRESHOLD_DRIFT (THRESHOLD_MAX_AGE = 1 measures every frame)
+THRESHOLD_MAX_AGE = 10
+THRESHOLD_DRIFT = 8     # grey levels
+THRESHOLD_BANDS = 4     # refresh one of N row bands at a time
+THRESHOLD_OTSU = False  # Otsu threshold on the histogram instead of mean - OFFSET
+threshold_engine = ThresholdEngine(OFFSET, THRESHOLD_MAX_AGE, THRESHOLD_DRIFT, THRESHOLD_BANDS, THRESHOLD_OTSU)
+
+# Motion gate: skip blob detection and reuse the last result while the scene
+# (16x12 mean-pooled cells) and the ToF reading stay unchanged
+MOTION_GATE = True
+motion_gate = MotionGate(pool=20, cell_delta=12, max_cells=2, tof_delta=30, max_skip=15)
+
+# GC probe: record the heap allocated per frame and the frame time, and
+# collect between frames once the heap holds GC_COLLECT_ABOVE bytes instead of
+# whenever it runs full (False = automatic collections only). Printed every
+# GC_REPORT_FRAMES frames.
+GC_PROBE = False
+GC_COLLECT_ABOVE = 64 * 1024
+GC_REPORT_FRAMES = 300
+gc_probe = GcProbe(GC_COLLECT_ABOVE) if GC_PROBE else None
+
+# Fast boot: start detecting once auto exposure has converged instead of
+# after a fixed SENSOR_SKIP_MS warm-up (lib/boot_sequence.py). The boot
+# timings are printed once the first valid result is out and the first
+# frame is streamed; the Wi-Fi join runs during the warm-up.
+FAST_BOOT = True
+BOOT_MIN_MS = 100 # frames before this never count as converged (two auto exposure periods)
+SENSOR_SKIP_MS = 500
+
 # Camera setup
 sensor.reset()
 sensor.set_pixformat(sensor.GRAYSCALE)  # grayscale for detection
 sensor.set_framesize(sensor.QVGA) # smaller frame size for speed
-sensor.skip_frames(time=500)
+boot = BootSequence(sensor, boot_ms, stream=WIFI_STREAMING, min_ms=BOOT_MIN_MS)
+roi_search = RoiSearch(sensor.width(), sensor.height(), ROI_LEVELS)
+pyramid = PyramidSearch(sensor, PYRAMID_FACTOR, PYRAMID_MARGIN) if PYRAMID else None
+MAX_PIXELS = int(sensor.width() * sensor.height() * max_fraction)
+
+# Tracker: keep IDs for blobs across frames and only change the target after
+# another object has been preferred for TRACKER_SWITCH_FRAMES frames in a row
+# (False = the blob on the ToF line of sight, else the nearest one). A target
+# is only confirmed on its second frame; host/bench_tracker.py counts the
+# switches it saves on a recording.
+TRACKER = False
+TRACKER_SWITCH_FRAMES = 3
+tracker = Tracker(max_tracks=8, switch_frames=TRACKER_SWITCH_FRAMES,
+                  max_pixels=MAX_PIXELS)
+# The tracker needs every blob in the frame: with it the core runs neither
+# the ROI search nor the pyramid, and the ROI search goes before the pyramid
+if TRACKER and ROI_SEARCH:
+    print("warning: ROI_SEARCH is not used while TRACKER is on")
+if TRACKER and PYRAMID:
+    print("warning: PYRAMID is not used while TRACKER is on")
+if ROI_SEARCH and PYRAMID and not TRACKER:
+    print("warning: PYRAMID is not used while ROI_SEARCH is on")
 
 # Distance sensor setup (ToF = time of flight)
 i2c = I2C(2)
@@ -25,6 +151,40 @@ tof = VL53L1X(i2c)
 MIN_VALID_DISTANCE = 40  # mm
 MAX_VALID_DISTANCE = 2000 # mm
 
+# Multi-zone ToF: cycle the sensor ROI over left / center / right zones and
+# give each target the distance of the zone covering it (False = one reading
+# over the full field of view). TOF_FOV_PX = ToF field of view in image pixels.
+MULTI_ZONE_TOF = False
+TOF_FOV_PX = 92
+tof_zones = (ToFZones(tof, sensor.width(), fov_px=TOF_FOV_PX, max_age_ms=300,
+                      min_valid=MIN_VALID_DISTANCE, max_valid=MAX_VALID_DISTANCE)
+             if MULTI_ZONE_TOF else None)
+
+# Continuous ranging: the ToF measures in the background and finished samples
+# are collected without waiting, before and after blob detection (False =
+# blocking tof.read(); not used with MULTI_ZONE_TOF). Older samples are invalid.
+TOF_CONTINUOUS = True
+TOF_MAX_AGE_MS = 200
+ranging = ContinuousRanging(tof, TOF_MAX_AGE_MS) if TOF_CONTINUOUS and not MULTI_ZONE_TOF else None
+
+# Focal length for the mm result, Nicla Vision at QVGA (tuned in obstacle_detection.py)
+focal_px = focal_length_px()
+MAX_READINGS = 10  # moving average of the result
+
+# The detection pipeline (lib/vision/core.py); the stream is plugged in once
+# the link is set up
+core = VisionCore(sensor, tof, threshold_engine, RingSmoother(MAX_READINGS), focal_px, min_pixels, min_area,
+                  MAX_PIXELS, MIN_VALID_DISTANCE, MAX_VALID_DISTANCE,
+                  roi_search=roi_search if ROI_SEARCH else None, pyramid=pyramid,
+                  motion_gate=motion_gate if MOTION_GATE else None,
+                  tracker=tracker if TRACKER else None,
+                  tof_zones=tof_zones, ranging=ranging, profiler=profiler)
+if UART_OUTPUT:
+    from pyb import UART
+    from vision.uart_output import UartOutput
+    uart = UART(4, 115200, timeout_char=200)
+    uart_output = UartOutput(uart, core, 'responder', commands={b's': profiler.report} if PROFILE else None)
+
 # LEDs
 red = pyb.LED(1)
 green = pyb.LED(2) # streaming video
@@ -35,137 +195,83 @@ def leds_off():
     green.off()
     blue.off()
 
-clock = time.clock()
-
-def wifi_setup(name, key): # returns wifi client
-    import network, socket
+def wifi_setup(name, key): # returns the link, which stands in for the stream stage
+    import network
 
     # User instructions
     print('\n1. Activate a mobile hotspot or use wifi router')
     print('2. If not activated: Set the band to be 2.4 GHz')
     print('3. Change the wifi name and passkey parameters to match the wifi\n')
 
-    # WiFi connection parameters
-    HOST = ""
-    PORT = 8080
+    # Non-blocking server, browsers are accepted while detection runs; it
+    # listens once the link is up (see wifi_service)
+    rate = StreamRate(STREAM_TARGET_MS, STREAM_QUALITY) if STREAM_ADAPTIVE else None
+    server = MjpegServer(WIFI_PORT, max_clients=STREAM_MAX_CLIENTS, rate=rate)
+    if PROFILE:
+        server.profile(profiler, JPEG).route(b'/metrics', profiler.metrics)
+    stage = StreamStage(server, STREAM_EVERY, STREAM_INTERVAL_MS, STREAM_BUDGET, STREAM_SCALE, STREAM_QUALITY)
 
-    # Init wlan module and connect to network
+    # Init wlan module and connect to network without waiting for it
     wlan = network.WLAN(network.STA_IF)
-    wlan.active(True)
-    wlan.connect(name, key)
-    # Set statisk IP: (IP, netmask, gateway, DNS)
-    #wlan.ifconfig(('192.168.2.30', '255.255.255.0', '192.168.2.1', '8.8.8.8'))
-
     print('Trying to connect to network "{:s}"'.format(name))
     print('with passkey "{:s}"\n'.format(key))
+    return WifiLink(wlan, name, key, stage, static=WIFI_STATIC_IP, cache_path=WIFI_IP_CACHE,
+                    check_ms=WIFI_CHECK_MS).start()
 
-    while not wlan.isconnected():
-        time.sleep(1)
-        print("Status:", wlan.status())
-
-    print("WiFi Connected\n")
-    print("Open a browser and enter http://{:s}:{:d}/ \n".format(wlan.ifconfig()[0], PORT))
-
-    # Create server socket
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, True)
-    s.bind([HOST, PORT])
-    s.listen(5)
-    s.setblocking(True)
-
-    print("Waiting for user connection...")
-    client, addr = s.accept()
-    client.settimeout(5.0)
-    print("Connected to " + addr[0] + ":" + str(addr[1]))
-
-    # Read request from client
-    data = client.recv(1024)
-
-    # Send multipart header
-    client.sendall(
-        "HTTP/1.1 200 OK\r\n"
-        "Server: OpenMV\r\n"
-        "Content-Type: multipart/x-mixed-replace;boundary=openmv\r\n"
-        "Cache-Control: no-cache\r\n"
-        "Pragma: no-cache\r\n\r\n"
-    )
-    return client
-
-def wifi_stream_frame(client, img):
-    # Convert to JPEG for streaming
-    cframe = img.to_jpeg(quality=35, copy=True)
-    header = (
-        "\r\n--openmv\r\n"
-        "Content-Type: image/jpeg\r\n"
-        "Content-Length:" + str(cframe.size()) + "\r\n\r\n"
-    )
-    client.sendall(header)
-    client.sendall(cframe)
-
-def detect_obstacles(wifi_client=None):
-    clock.tick()
-    img = sensor.snapshot()
-
-    ## DISTANCE SENSOR
-    dist = tof.read()  # Read distance in mm
-
-    # Dynamic background brightness
-    stats = img.get_statistics()
-    mean_val = stats.l_mean()
-    limit = max(0, mean_val - OFFSET)
-    color_thresholds = [(0, limit)]
-
-    # Find dark blobs
-    blobs = img.find_blobs(color_thresholds, pixels_threshold=min_pixels, area_threshold=min_area)
-
-    if blobs and dist > MIN_VALID_DISTANCE and dist < MAX_VALID_DISTANCE:
-        # Center of the image (where ToF points)
-        center_x = img.width() // 2
-        center_y = img.height() // 2
-
-        # Filter blobs to ignore very large ones
-        max_pixels = int(img.width() * img.height() * max_fraction)
-        valid_blobs = [b for b in blobs if b.pixels() < max_pixels]
-
-        # Find the blob covering the distance sensor's line-of-sight (center)
-        target = None
-        for b in valid_blobs:
-            if b.pixels() < (img.width() * img.height() * max_fraction):
-                if b.x() <= center_x <= b.x()+b.w() and b.y() <= center_y <= b.y()+b.h():
-                    target = b
-                    break
-        if not target:
-            # If no blob covers the center, find the nearest blob
-            nearest = None
-            nearest_dist = float('inf')
-            for b in blobs:
-                # Calculate distance from blob center to image center
-                dx = b.cx() - center_x
-                dy = b.cy() - center_y
-                distance = (dx*dx + dy*dy)**0.5
-                if distance < nearest_dist:
-                    nearest = b
-                    nearest_dist = distance
-            target = nearest
-
-        if target:
-            # Draw target square and distance
-            img.draw_cross(target.cx(), target.cy(), color=(0, 255, 0))
-            img.draw_rectangle(target.rect(), color=(0, 0, 0), thickness=3)
-            img.draw_string(10, 10, f"Distance: {dist} mm", color=(255, 255, 255),scale=1.5)
-
-    ## WIFI STREAMING
-    if WIFI_STREAMING and wifi_client:
-        wifi_stream_frame(wifi_client, img)
+wifi_up = False
+
+def wifi_service(link):
+    # Join / rejoin in the background; blue LED while the stream is down
+    global wifi_up
+    up = link.service()
+    if up == wifi_up:
+        return
+    wifi_up = up
+    if up:
+        blue.off()
+        green.on()
+        print("WiFi Connected\n")
+        print("Open a browser and enter http://{:s}:{:d}/ \n".format(link.address(), WIFI_PORT))
+    else:
+        green.off()
+        blue.on()
+        print("WiFi link lost, reconnecting\n")
 
 try:
     blue.on()
-    wifi_client = (wifi_setup(WIFI_NAME, WIFI_KEY) if WIFI_STREAMING else None)
-    blue.off()
-    green.on()
+    if not FAST_BOOT:
+        boot.skip(SENSOR_SKIP_MS) # then the join
+    wifi_stream = (wifi_setup(WIFI_NAME, WIFI_KEY) if WIFI_STREAMING else None)
+    if FAST_BOOT:
+        boot.warm_up(wifi_stream) # while the link joins
+    if WIFI_STREAMING:
+        core.stream = MjpegOutput(wifi_stream, profiler, STREAM_REPORT_MS)
+    else:
+        blue.off()
+        green.on()
+    print("imports: %d ms, %d bytes heap" % (import_ms, import_heap))
     print("Offset mm, Object width mm, Distance mm")
     while True:
-        detect_obstacles(wifi_client)
+        if GC_PROBE:
+            gc_probe.begin()
+        if PROFILE:
+            profiler.begin()
+        result = core.detect()
+        if UART_OUTPUT:
+            uart_output.send(result)
+            if PROFILE:
+                profiler.lap(UART_TX)
+        if WIFI_STREAMING:
+            wifi_service(wifi_stream)
+        if boot.pending and boot.update(result, WIFI_STREAMING and wifi_stream.streaming):
+            print(boot.summary())
+        if PROFILE:
+            profiler.end()
+        if GC_PROBE:
+            gc_probe.end()
+            gc_probe.idle() # between frames, once the heap holds GC_COLLECT_ABOVE bytes
+            if gc_probe.frames == GC_REPORT_FRAMES:
+                print(gc_probe.summary())
 except:
     leds_off()
     print("\nProgram finished\n")
@@ -0,0 +1,257 @@
+#include "baud_link.h"
+
+#include <string.h>
+
+#define CMD_PROPOSE   'P'
+#define CMD_ACCEPT    'A'
+#define CMD_TEST      'T'
+#define CMD_ECHO      't'
+#define CMD_COMMIT    'C'
+#define CMD_COMMITTED 'c'
+#define CMD_HEARTBEAT 'H'
+
+static bool expired(uint32_t now_ms, uint32_t deadline_ms)
+{
+    return (int32_t)(now_ms - deadline_ms) >= 0;
+}
+
+static uint32_t get_u32(uint8_t const * p)
+{
+    return p[0] | (p[1] << 8) | ((uint32_t)p[2] << 16) | ((uint32_t)p[3] << 24);
+}
+
+static void send_baud(baud_link_t * p_link, uint8_t cmd, uint32_t baud)
+{
+    uint8_t payload[5] = {cmd, (uint8_t)baud, (uint8_t)(baud >> 8), (uint8_t)(baud >> 16), (uint8_t)(baud >> 24)};
+    p_link->send(payload, sizeof(payload), p_link->p_context);
+}
+
+static void send_heartbeat(baud_link_t * p_link, uint32_t frames, uint32_t errors)
+{
+    frames = frames > 0xFFFF ? 0xFFFF : frames;
+    errors = errors > 0xFFFF ? 0xFFFF : errors;
+    uint8_t payload[5] = {CMD_HEARTBEAT, (uint8_t)frames, (uint8_t)(frames >> 8),
+                          (uint8_t)errors, (uint8_t)(errors >> 8)};
+    p_link->send(payload, sizeof(payload), p_link->p_context);
+}
+
+// Back to the base rate, next attempt one rate lower
+static void drop_to_base(baud_link_t * p_link, uint32_t now_ms)
+{
+    uint8_t tried = p_link->state == BAUD_LINK_UP ? p_link->rate : p_link->target;
+    if (p_link->rate != 0)
+    {
+        p_link->rate = 0;
+        p_link->set_baud(p_link->p_rates[0], p_link->p_context);
+    }
+    p_link->state = BAUD_LINK_IDLE;
+    p_link->awaiting = false;
+    if (tried > 1)
+    {
+        p_link->target = tried - 1;
+        p_link->deadline_ms = now_ms + BAUD_LINK_RETRY_MS;
+    }
+    else
+    {
+        p_link->target = p_link->rate_count - 1;
+        p_link->deadline_ms = now_ms + BAUD_LINK_RESTART_MS;
+    }
+}
+
+void baud_link_test_pattern(uint8_t n, uint8_t * p_out)
+{
+    p_out[0] = 0x55;
+    p_out[1] = 0xAA;
+    p_out[2] = 0x00;
+    p_out[3] = 0xFF;
+    for (int i = 4; i < BAUD_LINK_TEST_SIZE; i++)
+    {
+        p_out[i] = (uint8_t)(n * 31 + i * 37);
+    }
+}
+
+void baud_link_init(baud_link_t *        p_link,
+                    uint32_t const *     p_rates,
+                    uint8_t              rate_count,
+                    baud_link_send_t     send,
+                    baud_link_set_baud_t set_baud,
+                    void *               p_context,
+                    uint32_t             now_ms)
+{
+    memset(p_link, 0, sizeof(*p_link));
+    p_link->p_rates = p_rates;
+    p_link->rate_count = rate_count;
+    p_link->target = rate_count - 1;
+    p_link->state = BAUD_LINK_IDLE;
+    p_link->deadline_ms = now_ms;
+    p_link->send = send;
+    p_link->set_baud = set_baud;
+    p_link->p_context = p_context;
+}
+
+bool baud_link_is_control(uint8_t const * p_payload, uint8_t length)
+{
+    return (length == 5 && (p_payload[0] == CMD_ACCEPT || p_payload[0] == CMD_COMMITTED)) ||
+           (length == BAUD_LINK_CONTROL_SIZE && p_payload[0] == CMD_ECHO);
+}
+
+void baud_link_on_control(baud_link_t * p_link, uint8_t const * p_payload, uint8_t length, uint32_t now_ms)
+{
+    if (!baud_link_is_control(p_payload, length))
+    {
+        return;
+    }
+    switch (p_link->state)
+    {
+        case BAUD_LINK_PROPOSED:
+            if (p_payload[0] != CMD_ACCEPT)
+            {
+                break;
+            }
+            if (get_u32(&p_payload[1]) != p_link->p_rates[p_link->target])
+            {
+                p_link->failures++;  // refused
+                drop_to_base(p_link, now_ms);
+                break;
+            }
+            p_link->rate = p_link->target;
+            p_link->set_baud(p_link->p_rates[p_link->rate], p_link->p_context);
+            p_link->state = BAUD_LINK_TESTING;
+            p_link->test_round = 0;
+            p_link->awaiting = false;
+            p_link->deadline_ms = now_ms + BAUD_LINK_SWITCH_GUARD_MS;
+            break;
+
+        case BAUD_LINK_TESTING:
+        {
+            if (p_payload[0] != CMD_ECHO || !p_link->awaiting)
+            {
+                break;
+            }
+            uint8_t expected[BAUD_LINK_TEST_SIZE];
+            baud_link_test_pattern(p_link->test_round, expected);
+            if (p_payload[1] != p_link->test_round || memcmp(&p_payload[2], expected, sizeof(expected)) != 0)
+            {
+                p_link->failures++;
+                drop_to_base(p_link, now_ms);
+                break;
+            }
+            p_link->awaiting = false;
+            if (++p_link->test_round == BAUD_LINK_TEST_ROUNDS)
+            {
+                send_baud(p_link, CMD_COMMIT, p_link->p_rates[p_link->rate]);
+                p_link->state = BAUD_LINK_COMMITTING;
+                p_link->deadline_ms = now_ms + BAUD_LINK_REPLY_TIMEOUT_MS;
+            }
+            else
+            {
+                p_link->deadline_ms = now_ms;  // next round at the next poll
+            }
+            break;
+        }
+
+        case BAUD_LINK_COMMITTING:
+            if (p_payload[0] == CMD_COMMITTED && get_u32(&p_payload[1]) == p_link->p_rates[p_link->rate])
+            {
+                p_link->state = BAUD_LINK_UP;
+                p_link->upgrades++;
+                p_link->window_open = false;  // the counters are taken at the next poll
+            }
+            break;
+
+        default:
+            break;
+    }
+}
+
+void baud_link_poll(baud_link_t * p_link, uint32_t frames, uint32_t errors, uint32_t now_ms)
+{
+    switch (p_link->state)
+    {
+        case BAUD_LINK_IDLE:
+            if (p_link->target > 0 && expired(now_ms, p_link->deadline_ms))
+            {
+                send_baud(p_link, CMD_PROPOSE, p_link->p_rates[p_link->target]);
+                p_link->state = BAUD_LINK_PROPOSED;
+                p_link->deadline_ms = now_ms + BAUD_LINK_REPLY_TIMEOUT_MS;
+            }
+            break;
+
+        case BAUD_LINK_PROPOSED:
+            if (expired(now_ms, p_link->deadline_ms))
+            {
+                // No answer, the camera is busy or still on another rate: same rate again later
+                p_link->failures++;
+                p_link->state = BAUD_LINK_IDLE;
+                p_link->deadline_ms = now_ms + BAUD_LINK_RETRY_MS;
+            }
+            break;
+
+        case BAUD_LINK_COMMITTING:
+            if (expired(now_ms, p_link->deadline_ms))
+            {
+                p_link->failures++;
+                drop_to_base(p_link, now_ms);
+            }
+            break;
+
+        case BAUD_LINK_TESTING:
+            if (!expired(now_ms, p_link->deadline_ms))
+            {
+                break;
+            }
+            if (p_link->awaiting)
+            {
+                p_link->failures++;  // echo lost or garbled beyond the CRC
+                drop_to_base(p_link, now_ms);
+                break;
+            }
+            {
+                uint8_t payload[BAUD_LINK_CONTROL_SIZE];
+                payload[0] = CMD_TEST;
+                payload[1] = p_link->test_round;
+                baud_link_test_pattern(p_link->test_round, &payload[2]);
+                p_link->send(payload, sizeof(payload), p_link->p_context);
+            }
+            p_link->awaiting = true;
+            p_link->deadline_ms = now_ms + BAUD_LINK_REPLY_TIMEOUT_MS;
+            break;
+
+        case BAUD_LINK_UP:
+        {
+            if (!p_link->window_open)
+            {
+                // First poll after the commit
+                p_link->window_open = true;
+                p_link->window_frames = frames;
+                p_link->window_errors = errors;
+                p_link->deadline_ms = now_ms + BAUD_LINK_WINDOW_MS;
+                break;
+            }
+            if (!expired(now_ms, p_link->deadline_ms))
+            {
+                break;
+            }
+            uint32_t window_frames = frames - p_link->window_frames;
+            uint32_t window_errors = errors - p_link->window_errors;
+            uint32_t total = window_frames + window_errors;
+            send_heartbeat(p_link, window_frames, window_errors);
+            if (window_frames == 0 ||
+                (total >= BAUD_LINK_MIN_FRAMES && window_errors * 1000 > BAUD_LINK_MAX_ERROR_PERMILLE * total))
+            {
+                p_link->fallbacks++;
+                drop_to_base(p_link, now_ms);
+                break;
+            }
+            p_link->window_frames = frames;
+            p_link->window_errors = errors;
+            p_link->deadline_ms = now_ms + BAUD_LINK_WINDOW_MS;
+            break;
+        }
+    }
+}
+
+uint32_t baud_link_baud(baud_link_t const * p_link)
+{
+    return p_link->p_rates[p_link->rate];
+}
@@ -0,0 +1,94 @@
+#ifndef BAUD_LINK_H__
+#define BAUD_LINK_H__
+
+// Baud rate negotiation with the camera, robot side (the camera side and the
+// message table are in lib/uart_baud.py). Control messages are camera frames
+// (camera_frame.h) whose payload starts with a command byte:
+//
+//   robot -> camera                 camera -> robot
+//   'P' <u32 baud>  propose         'A' <u32 baud>  accept (0 = refused)
+//   'T' <u8 n> pattern(n)           't' <u8 n> pattern(n)  echo
+//   'C' <u32 baud>  commit          'c' <u32 baud>  committed
+//   'H' <u16 frames> <u16 errors>   heartbeat with the receive stats
+//
+// The link starts at p_rates[0] and tries the highest rate first: propose,
+// switch on the accept, exchange BAUD_LINK_TEST_ROUNDS test patterns, commit.
+// An unanswered proposal is repeated after BAUD_LINK_RETRY_MS; a failed test
+// or commit goes back to the base rate and tries the next lower rate. Once up, a heartbeat is sent every
+// BAUD_LINK_WINDOW_MS; if the frame error rate in a window is above
+// BAUD_LINK_MAX_ERROR_PERMILLE, or no frame arrived at all, the link falls
+// back to the base rate and steps down one rate.
+//
+// No SDK headers: the UART is reached through the send/set_baud hooks, time
+// is passed in as milliseconds, so it also builds on the host with gcc.
+
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+#define BAUD_LINK_TEST_SIZE           32
+#define BAUD_LINK_CONTROL_SIZE        (2 + BAUD_LINK_TEST_SIZE)
+#define BAUD_LINK_TEST_ROUNDS         3
+#define BAUD_LINK_REPLY_TIMEOUT_MS    500   // the camera answers from its frame loop
+#define BAUD_LINK_SWITCH_GUARD_MS     20    // until the camera has switched as well
+#define BAUD_LINK_RETRY_MS            3000  // longer than the camera's fallback timeouts
+#define BAUD_LINK_RESTART_MS          30000 // before trying the highest rate again
+#define BAUD_LINK_WINDOW_MS           1000
+#define BAUD_LINK_MIN_FRAMES          5
+#define BAUD_LINK_MAX_ERROR_PERMILLE  50
+
+typedef enum
+{
+    BAUD_LINK_IDLE,         // at the base rate
+    BAUD_LINK_PROPOSED,     // waiting for 'A'
+    BAUD_LINK_TESTING,      // switched, exchanging test patterns
+    BAUD_LINK_COMMITTING,   // waiting for 'c'
+    BAUD_LINK_UP            // running at a higher rate
+} baud_link_state_t;
+
+typedef void (*baud_link_send_t)(uint8_t const * p_payload, uint8_t length, void * p_context);
+typedef void (*baud_link_set_baud_t)(uint32_t baud, void * p_context);
+
+typedef struct
+{
+    uint32_t const *     p_rates;        // ascending, p_rates[0] is the base rate
+    uint8_t              rate_count;
+    uint8_t              rate;           // index of the current rate
+    uint8_t              target;         // index of the rate to try next, 0 = none
+    baud_link_state_t    state;
+    uint8_t              test_round;
+    bool                 awaiting;       // a test frame is out
+    bool                 window_open;    // the window counters are set
+    uint32_t             deadline_ms;    // next send, reply timeout or retry
+    uint32_t             window_frames;  // decoder counters at the window start
+    uint32_t             window_errors;
+    uint32_t             upgrades;
+    uint32_t             fallbacks;      // error rate too high while up
+    uint32_t             failures;       // negotiations that did not complete
+    baud_link_send_t     send;
+    baud_link_set_baud_t set_baud;
+    void *               p_context;
+} baud_link_t;
+
+void baud_link_init(baud_link_t *        p_link,
+                    uint32_t const *     p_rates,
+                    uint8_t              rate_count,
+                    baud_link_send_t     send,
+                    baud_link_set_baud_t set_baud,
+                    void *               p_context,
+                    uint32_t             now_ms);
+
+// True for the payloads of camera replies ('A', 't', 'c'), to be passed to baud_link_on_control()
+bool baud_link_is_control(uint8_t const * p_payload, uint8_t length);
+
+void baud_link_on_control(baud_link_t * p_link, uint8_t const * p_payload, uint8_t length, uint32_t now_ms);
+
+// Timeouts, test frames and heartbeats; frames/errors are the decoder's running totals
+void baud_link_poll(baud_link_t * p_link, uint32_t frames, uint32_t errors, uint32_t now_ms);
+
+uint32_t baud_link_baud(baud_link_t const * p_link);
+
+// Test pattern of round n (BAUD_LINK_TEST_SIZE bytes)
+void baud_link_test_pattern(uint8_t n, uint8_t * p_out);
+
+#endif // BAUD_LINK_H__
@@ -0,0 +1,135 @@
+#include "camera_frame.h"
+
+#include <string.h>
+
+uint16_t camera_frame_crc16(uint16_t crc, uint8_t const * p_data, size_t length)
+{
+    for (size_t i = 0; i < length; i++)
+    {
+        crc ^= (uint16_t)(p_data[i] << 8);
+        for (int bit = 0; bit < 8; bit++)
+        {
+            crc = (crc & 0x8000) ? (uint16_t)((crc << 1) ^ 0x1021) : (uint16_t)(crc << 1);
+        }
+    }
+    return crc;
+}
+
+size_t camera_frame_encode(uint8_t * p_out, uint8_t seq, uint8_t const * p_payload, uint8_t length)
+{
+    p_out[0] = CAMERA_FRAME_SYNC0;
+    p_out[1] = CAMERA_FRAME_SYNC1;
+    p_out[2] = length;
+    p_out[3] = seq;
+    memcpy(&p_out[CAMERA_FRAME_HEADER], p_payload, length);
+    uint16_t crc = camera_frame_crc16(0xFFFF, &p_out[2], 2 + (size_t)length);
+    p_out[CAMERA_FRAME_HEADER + length] = (uint8_t)(crc & 0xFF);
+    p_out[CAMERA_FRAME_HEADER + length + 1] = (uint8_t)(crc >> 8);
+    return CAMERA_FRAME_HEADER + length + CAMERA_FRAME_CRC_SIZE;
+}
+
+void camera_frame_decoder_init(camera_frame_decoder_t * p_decoder)
+{
+    memset(p_decoder, 0, sizeof(*p_decoder));
+    p_decoder->last_seq = -1;
+}
+
+// Bytes to drop: up to the next SYNC0 after the first byte
+static size_t resync(camera_frame_decoder_t const * p_decoder)
+{
+    for (size_t i = 1; i < p_decoder->used; i++)
+    {
+        if (p_decoder->buf[i] == CAMERA_FRAME_SYNC0)
+        {
+            return i;
+        }
+    }
+    return p_decoder->used;
+}
+
+static void drop(camera_frame_decoder_t * p_decoder, size_t count)
+{
+    p_decoder->used -= count;
+    memmove(p_decoder->buf, &p_decoder->buf[count], p_decoder->used);
+}
+
+// Decode every complete frame in the buffer
+static size_t decode(camera_frame_decoder_t * p_decoder, camera_frame_handler_t handler, void * p_context)
+{
+    uint8_t * buf = p_decoder->buf;
+    size_t frames = 0;
+
+    while (p_decoder->used > 0)
+    {
+        if (buf[0] != CAMERA_FRAME_SYNC0 || (p_decoder->used > 1 && buf[1] != CAMERA_FRAME_SYNC1))
+        {
+            size_t count = resync(p_decoder);
+            p_decoder->skipped += count;
+            drop(p_decoder, count);
+            continue;
+        }
+        if (p_decoder->used < 3)
+        {
+            break;
+        }
+        uint8_t length = buf[2];
+        if (length > CAMERA_FRAME_MAX_PAYLOAD)
+        {
+            p_decoder->length_errors++;
+            size_t count = resync(p_decoder);
+            p_decoder->skipped += count;
+            drop(p_decoder, count);
+            continue;
+        }
+        size_t total = CAMERA_FRAME_HEADER + length + CAMERA_FRAME_CRC_SIZE;
+        if (p_decoder->used < total)
+        {
+            break;
+        }
+        uint16_t crc = camera_frame_crc16(0xFFFF, &buf[2], 2 + (size_t)length);
+        if (crc != (uint16_t)(buf[total - 2] | (buf[total - 1] << 8)))
+        {
+            p_decoder->crc_errors++;
+            size_t count = resync(p_decoder);
+            p_decoder->skipped += count;
+            drop(p_decoder, count);
+            continue;
+        }
+
+        uint8_t seq = buf[3];
+        if (p_decoder->last_seq >= 0)
+        {
+            p_decoder->lost += (uint8_t)(seq - p_decoder->last_seq - 1);
+        }
+        p_decoder->last_seq = seq;
+        p_decoder->frames++;
+        frames++;
+        if (handler)
+        {
+            handler(seq, &buf[CAMERA_FRAME_HEADER], length, p_context);
+        }
+        drop(p_decoder, total);
+    }
+    return frames;
+}
+
+size_t camera_frame_feed(camera_frame_decoder_t * p_decoder,
+                         uint8_t const *          p_data,
+                         size_t                   length,
+                         camera_frame_handler_t   handler,
+                         void *                   p_context)
+{
+    size_t frames = 0;
+    while (length > 0)
+    {
+        // The buffer holds at most one frame, decode() frees it before it can fill up
+        size_t space = sizeof(p_decoder->buf) - p_decoder->used;
+        size_t count = length < space ? length : space;
+        memcpy(&p_decoder->buf[p_decoder->used], p_data, count);
+        p_decoder->used += count;
+        p_data += count;
+        length -= count;
+        frames += decode(p_decoder, handler, p_context);
+    }
+    return frames;
+}
@@ -0,0 +1,53 @@
+#ifndef CAMERA_FRAME_H__
+#define CAMERA_FRAME_H__
+
+// Decoder for the framed camera messages (push mode, see lib/uart_frame.py):
+//
+//   0xA5 0x5A | length | sequence | payload[length] | CRC16 (little endian)
+//
+// CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF) over length, sequence and
+// payload. Bytes can be fed in chunks of any size (e.g. straight from the
+// UARTE DMA buffers); after a bad length or CRC the decoder drops one byte and
+// resyncs on the next 0xA5 0x5A pair. Plain C99 without SDK headers, so it
+// also builds on the host with gcc.
+
+#include <stdbool.h>
+#include <stddef.h>
+#include <stdint.h>
+
+#define CAMERA_FRAME_SYNC0       0xA5
+#define CAMERA_FRAME_SYNC1       0x5A
+#define CAMERA_FRAME_HEADER      4  // sync x2, length, sequence
+#define CAMERA_FRAME_CRC_SIZE    2
+#define CAMERA_FRAME_MAX_PAYLOAD 96
+#define CAMERA_FRAME_MAX_SIZE    (CAMERA_FRAME_HEADER + CAMERA_FRAME_MAX_PAYLOAD + CAMERA_FRAME_CRC_SIZE)
+
+typedef void (*camera_frame_handler_t)(uint8_t seq, uint8_t const * p_payload, uint8_t length, void * p_context);
+
+typedef struct
+{
+    uint8_t  buf[CAMERA_FRAME_MAX_SIZE];
+    size_t   used;
+    int16_t  last_seq;      // -1 before the first frame
+    uint32_t frames;        // valid frames
+    uint32_t crc_errors;
+    uint32_t length_errors;
+    uint32_t skipped;       // bytes dropped outside valid frames
+    uint32_t lost;          // frames missing according to the sequence numbers
+} camera_frame_decoder_t;
+
+void camera_frame_decoder_init(camera_frame_decoder_t * p_decoder);
+
+// Feed received bytes, calls handler for every valid frame. Returns the number of frames.
+size_t camera_frame_feed(camera_frame_decoder_t * p_decoder,
+                         uint8_t const *          p_data,
+                         size_t                   length,
+                         camera_frame_handler_t   handler,
+                         void *                   p_context);
+
+uint16_t camera_frame_crc16(uint16_t crc, uint8_t const * p_data, size_t length);
+
+// Build a frame in p_out (CAMERA_FRAME_HEADER + length + CAMERA_FRAME_CRC_SIZE bytes), returns its size
+size_t camera_frame_encode(uint8_t * p_out, uint8_t seq, uint8_t const * p_payload, uint8_t length);
+
+#endif // CAMERA_FRAME_H__
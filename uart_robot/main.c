@@ -1,10 +1,15 @@
 #include <sdk_config.h>
+#include <string.h>
 #include "nrfx.h"     
 #include "nrfx_uarte.h"
-#include "nrf_delay.h"
 #include "nrf_log.h"
 #include "nrf_log_ctrl.h"
 #include "nrf_log_default_backends.h"
+#include "app_util_platform.h"
+#include "camera_frame.h"
+#include "obstacle_batch.h"
+#include "baud_link.h"
+#include "rtc_clock.h"
 
 // UARTE
 #define P1 32
@@ -14,40 +19,359 @@
 #define RX_DATA_LENGTH 6
 #define UARTE_TIMEOUT_MS 100 // 5 for debugging, else 100
 
+// Request/response mode: one 'r' request in flight, the next one sent every
+// CAMERA_REQUEST_PERIOD_MS (faster than the camera's frame rate, so every new
+// result is picked up) while the main loop consumes the previous result
+#define CAMERA_REQUEST_PERIOD_MS 20
+#define CAMERA_STATS_EVERY 250 // log the client counters every N requests
+
+// Request/response mode only: runtime profiles (PROFILES in obstacle_detection.py,
+// lib/vision/profiles.py). '0' + index selects one, '?' asks for the status;
+// both are answered with active index, requested index and fps x 10 as
+// '<hhh'. One request is in flight at a time, so a reply is told apart from a
+// result by the request it answers. CAMERA_PROFILE = profile selected at
+// start (-1 = keep the camera's), the status is requested instead of a result
+// every CAMERA_STATUS_EVERY requests (0 = never). ttk8/ttk8.py has no
+// profiles and does not answer '?', so both are off by default.
+#define CAMERA_PROFILE -1
+#define CAMERA_STATUS_EVERY 0
+
+// After a timeout the rest of a late reply may still arrive; it is discarded
+// until the line has been idle for CAMERA_DRAIN_MS, so it is not decoded as the
+// answer to the next request
+#define CAMERA_DRAIN_MS 5
+#define CAMERA_DRAIN_LENGTH 8
+
+// Push mode: the camera sends a framed estimate every frame (UART_MODE = 'push' in
+// obstacle_detection.py) and they are decoded from double-buffered EasyDMA
+// reception instead of being requested. 0 = request/response with 'r'.
+// Frames of another length are decoded as obstacle batches (UART_BATCH);
+// with chunks of one '<hhh' frame, the tail of a batch is decoded when the
+// next frame fills the chunk.
+#define CAMERA_PUSH_MODE 0
+#define RX_CHUNK_LENGTH (CAMERA_FRAME_HEADER + RX_DATA_LENGTH + CAMERA_FRAME_CRC_SIZE) // one frame
+
+// Push mode only: negotiate a higher baud rate with the camera (BAUD_NEGOTIATION
+// in obstacle_detection.py, see baud_link.h), checked with a test pattern and
+// dropped back to 115200 when the frame error rate rises. 0 = always 115200.
+#define CAMERA_BAUD_NEGOTIATION 0
+
 typedef struct {
     int16_t x_start_mm;
     int16_t x_width_mm;
     int16_t distance_mm;
 } CameraLineEstimate;
 
+typedef struct {
+    int16_t active;     // profile in use
+    int16_t requested;  // last one selected, applied after the camera's current frame
+    int16_t fps_x10;    // camera loop fps x 10 over the last second
+} CameraProfileStatus;
+
+typedef enum {
+    CLIENT_IDLE,
+    CLIENT_WAITING,  // request sent, response not complete
+    CLIENT_ABORTING, // timed out, waiting for the aborted reception to end
+    CLIENT_DRAINING  // discarding bytes until the line is idle
+} CameraClientState;
+
+typedef struct {
+    uint32_t requests;
+    uint32_t responses;
+    uint32_t timeouts;
+    uint32_t late;        // responses completed after their deadline
+    uint32_t drained;     // bytes discarded after timeouts
+    uint32_t rtt_last_us;
+    uint32_t rtt_min_us;
+    uint32_t rtt_max_us;
+    uint64_t rtt_sum_us;  // over all responses
+} CameraClientStats;
+
 static const nrfx_uarte_t uarte1 = NRFX_UARTE_INSTANCE(1);
 static uint8_t rx_buffer[RX_DATA_LENGTH];
-static bool rx_done = false;
-static bool tx_done = false;
+static uint8_t drain_buffer[CAMERA_DRAIN_LENGTH];
+static uint8_t request_byte = 'r'; // EasyDMA reads it after nrfx_uarte_tx() returns
+static volatile CameraClientState client_state = CLIENT_IDLE;
+static volatile CameraClientStats client_stats = {.rtt_min_us = UINT32_MAX};
+static uint32_t request_us;
+static volatile uint32_t client_deadline_ms;
+static CameraLineEstimate latest_estimate;
+static volatile uint32_t latest_count = 0;
+static uint8_t next_request = 0; // queued profile request, sent instead of the next 'r' (0 = none)
+static CameraProfileStatus latest_status;
+static volatile uint32_t status_count = 0;
+
+#if CAMERA_PUSH_MODE
+static uint8_t rx_chunks[2][RX_CHUNK_LENGTH];
+static camera_frame_decoder_t frame_decoder;
+static ObstacleBatch latest_batch;
+static uint32_t batch_errors = 0;
+static volatile bool rx_restart = false;
+static uint32_t rx_errors = 0;
+
+#if CAMERA_BAUD_NEGOTIATION
+static const uint32_t baud_rates[] = {115200, 460800, 1000000};
+static baud_link_t baud_link;
+static uint8_t tx_frame[CAMERA_FRAME_MAX_SIZE];
+static uint8_t tx_seq = 0;
+static uint32_t tx_dropped = 0;
+static uint8_t control_payload[BAUD_LINK_CONTROL_SIZE];
+static volatile uint8_t control_length = 0; // a camera reply waiting for the main loop
+#endif
+
+// Called from the UARTE interrupt for every valid frame
+static void camera_frame_received(uint8_t seq, uint8_t const * p_payload, uint8_t length, void * p_context)
+{
+#if CAMERA_BAUD_NEGOTIATION
+    if (baud_link_is_control(p_payload, length))
+    {
+        // Handled in the main loop, a baud switch restarts the UARTE
+        if (control_length == 0)
+        {
+            memcpy(control_payload, p_payload, length);
+            control_length = length;
+        }
+        return;
+    }
+#endif
+    if (length != RX_DATA_LENGTH)
+    {
+        // Batch packet: the primary target (first obstacle) is the estimate
+        if (obstacle_batch_decode(p_payload, length, &latest_batch) != OBSTACLE_BATCH_OK)
+        {
+            batch_errors++;
+            return;
+        }
+        Obstacle const * p_primary = &latest_batch.obstacles[0];
+        bool found = latest_batch.count > 0;
+        latest_estimate.x_start_mm = found ? p_primary->x_offset_mm : 0;
+        latest_estimate.x_width_mm = found ? (int16_t)p_primary->width_mm : 0;
+        latest_estimate.distance_mm = found ? p_primary->distance_mm : 0;
+        latest_count++;
+        return;
+    }
+    latest_batch.count = 0;
+    latest_estimate.x_start_mm = p_payload[0] | (p_payload[1] << 8);
+    latest_estimate.x_width_mm = p_payload[2] | (p_payload[3] << 8);
+    latest_estimate.distance_mm = p_payload[4] | (p_payload[5] << 8);
+    latest_count++;
+}
+#endif
+
+#if !CAMERA_PUSH_MODE
+// Receive into the drain buffer until CAMERA_DRAIN_MS pass without a byte
+static void camera_client_drain(uint32_t now_ms)
+{
+    client_state = CLIENT_DRAINING;
+    client_deadline_ms = now_ms + CAMERA_DRAIN_MS;
+    if (nrfx_uarte_rx(&uarte1, drain_buffer, CAMERA_DRAIN_LENGTH) != NRFX_SUCCESS)
+    {
+        client_state = CLIENT_IDLE;
+    }
+}
+
+// Send the next request; the response is received by EasyDMA in the background
+static void camera_client_send(uint32_t now_ms)
+{
+    client_state = CLIENT_WAITING;
+    client_deadline_ms = now_ms + UARTE_TIMEOUT_MS;
+    // Reception first, a fast answer must not arrive before it is armed
+    APP_ERROR_CHECK(nrfx_uarte_rx(&uarte1, rx_buffer, RX_DATA_LENGTH));
+    request_byte = next_request ? next_request : 'r';
+    next_request = 0;
+    request_us = rtc_clock_us();
+    APP_ERROR_CHECK(nrfx_uarte_tx(&uarte1, &request_byte, 1));
+    client_stats.requests++;
+}
+
+// Timeouts and the request schedule; returns the time the client needs the CPU again
+static uint32_t camera_client_poll(uint32_t now_ms, uint32_t * p_next_request_ms)
+{
+    bool abort = false;
+    bool drain = false;
+    CRITICAL_REGION_ENTER();
+    if (rtc_clock_expired(now_ms, client_deadline_ms))
+    {
+        if (client_state == CLIENT_WAITING)
+        {
+            client_state = CLIENT_ABORTING;
+            client_stats.timeouts++;
+            abort = true;
+        }
+        else if (client_state == CLIENT_DRAINING)
+        {
+            abort = true; // idle for CAMERA_DRAIN_MS, an RX_DONE without bytes ends the drain
+        }
+        else if (client_state == CLIENT_ABORTING)
+        {
+            drain = true; // nothing was being received any more
+        }
+    }
+    if (abort)
+    {
+        client_deadline_ms = now_ms + UARTE_TIMEOUT_MS;
+    }
+    CRITICAL_REGION_EXIT();
+    if (abort)
+    {
+        nrfx_uarte_rx_abort(&uarte1); // ends with an RX_DONE of the partial bytes
+    }
+    else if (drain)
+    {
+        camera_client_drain(now_ms);
+    }
+
+    if (client_state == CLIENT_IDLE && rtc_clock_expired(now_ms, *p_next_request_ms))
+    {
+        camera_client_send(now_ms);
+        // Keep the period, but do not try to catch up after a stall
+        *p_next_request_ms += CAMERA_REQUEST_PERIOD_MS;
+        if (rtc_clock_expired(now_ms, *p_next_request_ms))
+        {
+            *p_next_request_ms = now_ms + CAMERA_REQUEST_PERIOD_MS;
+        }
+    }
+    return client_state == CLIENT_IDLE ? *p_next_request_ms : client_deadline_ms;
+}
+
+// Queue a profile request ('0' + index or '?'), sent with the next request slot
+static void camera_client_request(uint8_t request)
+{
+    next_request = request;
+}
+
+// Copy the latest profile status if a new one arrived since *p_seen
+static bool camera_client_status(CameraProfileStatus * p_status, uint32_t * p_seen)
+{
+    bool fresh = false;
+    CRITICAL_REGION_ENTER();
+    if (status_count != *p_seen)
+    {
+        *p_status = latest_status;
+        *p_seen = status_count;
+        fresh = true;
+    }
+    CRITICAL_REGION_EXIT();
+    return fresh;
+}
+
+// Copy the latest estimate if a new one arrived since *p_seen
+static bool camera_client_latest(CameraLineEstimate * p_estimate, uint32_t * p_seen)
+{
+    bool fresh = false;
+    CRITICAL_REGION_ENTER();
+    if (latest_count != *p_seen)
+    {
+        *p_estimate = latest_estimate;
+        *p_seen = latest_count;
+        fresh = true;
+    }
+    CRITICAL_REGION_EXIT();
+    return fresh;
+}
+
+static void camera_client_stats(CameraClientStats * p_stats)
+{
+    CRITICAL_REGION_ENTER();
+    *p_stats = *(CameraClientStats const *)&client_stats;
+    CRITICAL_REGION_EXIT();
+}
+
+// Called from the UARTE interrupt when a reception ends (complete or aborted)
+static void camera_client_rx_done(size_t bytes)
+{
+    if (client_state == CLIENT_DRAINING)
+    {
+        client_stats.drained += bytes;
+        if (bytes == 0)
+        {
+            client_state = CLIENT_IDLE; // aborted after an idle CAMERA_DRAIN_MS
+        }
+        else
+        {
+            camera_client_drain(rtc_clock_ms()); // still receiving, keep discarding
+        }
+        return;
+    }
+    if (bytes == RX_DATA_LENGTH)
+    {
+        uint32_t rtt = rtc_clock_us() - request_us;
+        if (request_byte == 'r')
+        {
+            latest_estimate.x_start_mm = rx_buffer[0] | (rx_buffer[1] << 8);
+            latest_estimate.x_width_mm = rx_buffer[2] | (rx_buffer[3] << 8);
+            latest_estimate.distance_mm = rx_buffer[4] | (rx_buffer[5] << 8);
+            latest_count++;
+        }
+        else
+        {
+            // A profile request, answered with the status
+            latest_status.active = rx_buffer[0] | (rx_buffer[1] << 8);
+            latest_status.requested = rx_buffer[2] | (rx_buffer[3] << 8);
+            latest_status.fps_x10 = rx_buffer[4] | (rx_buffer[5] << 8);
+            status_count++;
+        }
+        client_stats.responses++;
+        client_stats.late += client_state == CLIENT_ABORTING;
+        client_stats.rtt_last_us = rtt;
+        client_stats.rtt_sum_us += rtt;
+        if (rtt < client_stats.rtt_min_us)
+        {
+            client_stats.rtt_min_us = rtt;
+        }
+        if (rtt > client_stats.rtt_max_us)
+        {
+            client_stats.rtt_max_us = rtt;
+        }
+    }
+    if (client_state == CLIENT_ABORTING)
+    {
+        camera_client_drain(rtc_clock_ms());
+    }
+    else
+    {
+        client_state = CLIENT_IDLE;
+    }
+}
+#endif
 
 void uarte1_event_handler(nrfx_uarte_event_t const * p_event, void * p_context)
 {
     switch (p_event->type)
     {
         case NRFX_UARTE_EVT_TX_DONE:
-            tx_done = true;
-            NRF_LOG_INFO("Sent request");
-            NRF_LOG_FLUSH();
             break;
         case NRFX_UARTE_EVT_RX_DONE:
-            rx_done = true;
+#if CAMERA_PUSH_MODE
+            // Decode the filled chunk and queue it again behind the one now receiving
+            camera_frame_feed(&frame_decoder, p_event->data.rxtx.p_data, p_event->data.rxtx.bytes,
+                              camera_frame_received, NULL);
+            if (nrfx_uarte_rx(&uarte1, p_event->data.rxtx.p_data, RX_CHUNK_LENGTH) != NRFX_SUCCESS)
+            {
+                rx_restart = true;
+            }
+#else
+            camera_client_rx_done(p_event->data.rxtx.bytes);
+#endif
             break;
+#if CAMERA_PUSH_MODE
+        case NRFX_UARTE_EVT_ERROR:
+            // Framing/overrun error, the driver dropped both buffers
+            rx_errors++;
+            rx_restart = true;
+            break;
+#endif
         default:
             break;
     }
 }
 
-void uarte1_init(void)
+void uarte1_init(nrf_uarte_baudrate_t baudrate)
 {
     nrfx_uarte_config_t  config = NRFX_UARTE_DEFAULT_CONFIG;
     config.pseltxd = UARTE_TX_PIN;
     config.pselrxd = UARTE_RX_PIN;
-    config.baudrate = UARTE_BAUDRATE;
+    config.baudrate = baudrate;
     config.hwfc = NRF_UARTE_HWFC_DISABLED;
 
     APP_ERROR_CHECK(nrfx_uarte_init(&uarte1, &config, uarte1_event_handler));
@@ -56,66 +380,201 @@ void uarte1_init(void)
     NRF_LOG_FLUSH();
 }
 
-void uarte1_request_data(void)
+#if CAMERA_PUSH_MODE
+void camera_push_start(void)
 {
-    // Send request
-    tx_done = false;
-    uint8_t request_byte = 'r';
-    APP_ERROR_CHECK(nrfx_uarte_tx(&uarte1, &request_byte, 1));
+    APP_ERROR_CHECK(nrfx_uarte_rx(&uarte1, rx_chunks[0], RX_CHUNK_LENGTH));
+    APP_ERROR_CHECK(nrfx_uarte_rx(&uarte1, rx_chunks[1], RX_CHUNK_LENGTH));
 }
 
-bool uarte1_receive_data(void)
+// Copy the latest estimate (and batch, if p_batch is not NULL) if a new one arrived since *p_seen
+bool camera_push_latest(CameraLineEstimate * p_estimate, ObstacleBatch * p_batch, uint32_t * p_seen)
 {
-    rx_done = false;
-    APP_ERROR_CHECK(nrfx_uarte_rx(&uarte1, rx_buffer, RX_DATA_LENGTH));
-
-    // Wait for RX with timeout
-    uint32_t start_ms = 0;
-    while (!rx_done)
+    bool fresh = false;
+    CRITICAL_REGION_ENTER();
+    if (latest_count != *p_seen)
     {
-        __WFE(); // wait for events
-        start_ms += 1; // approximate 1 ms per loop
-        if (start_ms >= UARTE_TIMEOUT_MS)
+        *p_estimate = latest_estimate;
+        if (p_batch)
         {
-            nrfx_uarte_rx_abort(&uarte1);
-            nrfx_uarte_tx_abort(&uarte1);
-            NRF_LOG_WARNING("RX timeout, no response from camera");
-            NRF_LOG_FLUSH();
-            return false;
+            *p_batch = latest_batch;
         }
+        *p_seen = latest_count;
+        fresh = true;
+    }
+    CRITICAL_REGION_EXIT();
+    return fresh;
+}
+
+#if CAMERA_BAUD_NEGOTIATION
+static nrf_uarte_baudrate_t uarte_baudrate(uint32_t baud)
+{
+    switch (baud)
+    {
+        case 460800:
+            return NRF_UARTE_BAUDRATE_460800;
+        case 1000000:
+            return NRF_UARTE_BAUDRATE_1000000;
+        default:
+            return NRF_UARTE_BAUDRATE_115200;
     }
-    return true;
 }
 
-CameraLineEstimate uarte1_get_line_estimate(void) {
-    CameraLineEstimate result = {0};
-    uarte1_request_data();
+// baud_link hooks, called from the main loop
+static void link_send(uint8_t const * p_payload, uint8_t length, void * p_context)
+{
+    if (nrfx_uarte_tx_in_progress(&uarte1))
+    {
+        tx_dropped++; // the link repeats or times out
+        return;
+    }
+    size_t size = camera_frame_encode(tx_frame, tx_seq++, p_payload, length);
+    if (nrfx_uarte_tx(&uarte1, tx_frame, size) != NRFX_SUCCESS)
+    {
+        tx_dropped++;
+    }
+}
 
-    if (uarte1_receive_data()) {
-        result.x_start_mm = rx_buffer[0] | (rx_buffer[1] << 8);
-        result.x_width_mm = rx_buffer[2] | (rx_buffer[3] << 8);
-        result.distance_mm = rx_buffer[4] | (rx_buffer[5] << 8);
+static void link_set_baud(uint32_t baud, void * p_context)
+{
+    while (nrfx_uarte_tx_in_progress(&uarte1))
+    {
+        // the last heartbeat leaves at the old rate
     }
-    return result;
+    nrfx_uarte_uninit(&uarte1);
+    uarte1_init(uarte_baudrate(baud));
+    frame_decoder.used = 0; // partial frame received at the old rate
+    camera_push_start();
+    NRF_LOG_INFO("baud rate %d", baud);
 }
+#endif
+#endif
 
 int main(void)
 {
     APP_ERROR_CHECK(NRF_LOG_INIT(NULL));
     NRF_LOG_DEFAULT_BACKENDS_INIT();
 
-    uarte1_init();
+    rtc_clock_init();
+    uarte1_init(UARTE_BAUDRATE);
+
+#if CAMERA_PUSH_MODE
+    camera_frame_decoder_init(&frame_decoder);
+    camera_push_start();
+#if CAMERA_BAUD_NEGOTIATION
+    baud_link_init(&baud_link, baud_rates, sizeof(baud_rates) / sizeof(baud_rates[0]), link_send, link_set_baud,
+                   NULL, rtc_clock_ms());
+#endif
+    uint32_t seen = 0;
+    while (true)
+    {
+        __WFE();
+        if (rx_restart)
+        {
+            rx_restart = false;
+            camera_push_start();
+        }
+
+#if CAMERA_BAUD_NEGOTIATION
+        uint32_t now = rtc_clock_ms();
+        if (control_length)
+        {
+            uint8_t control[BAUD_LINK_CONTROL_SIZE];
+            uint8_t length;
+            CRITICAL_REGION_ENTER();
+            length = control_length;
+            memcpy(control, control_payload, length);
+            control_length = 0;
+            CRITICAL_REGION_EXIT();
+            baud_link_on_control(&baud_link, control, length, now);
+        }
+        baud_link_poll(&baud_link, frame_decoder.frames, frame_decoder.crc_errors + frame_decoder.length_errors, now);
+        rtc_clock_wake_at_ms(now + 10); // link timeouts also run when no frames arrive
+#endif
 
+        CameraLineEstimate estimate;
+        ObstacleBatch batch;
+        if (camera_push_latest(&estimate, &batch, &seen))
+        {
+            NRF_LOG_INFO("x_start_mm: %d, x_width_mm: %d, distance_mm: %d",
+                          estimate.x_start_mm, estimate.x_width_mm, estimate.distance_mm);
+            for (uint8_t i = 1; i < batch.count; i++)
+            {
+                NRF_LOG_INFO("  track %d: x %d, width %d, distance %d", batch.obstacles[i].track_id,
+                              batch.obstacles[i].x_offset_mm, batch.obstacles[i].width_mm,
+                              batch.obstacles[i].distance_mm);
+            }
+            if (seen % 100 == 0)
+            {
+                NRF_LOG_INFO("frames: %d, crc errors: %d, lost: %d, rx errors: %d, batch errors: %d",
+                              frame_decoder.frames, frame_decoder.crc_errors, frame_decoder.lost, rx_errors,
+                              batch_errors);
+#if CAMERA_BAUD_NEGOTIATION
+                NRF_LOG_INFO("baud: %d, upgrades: %d, fallbacks: %d, failures: %d",
+                              baud_link_baud(&baud_link), baud_link.upgrades, baud_link.fallbacks,
+                              baud_link.failures);
+#endif
+            }
+            NRF_LOG_FLUSH();
+        }
+    }
+#else
+    uint32_t next_request_ms = rtc_clock_ms();
+    uint32_t seen = 0;
+    uint32_t logged_requests = 0;
+    uint32_t status_seen = 0;
+#if CAMERA_STATUS_EVERY
+    uint32_t status_requests = 0;
+#endif
+    CameraLineEstimate last = {0};
+#if CAMERA_PROFILE >= 0
+    camera_client_request('0' + CAMERA_PROFILE);
+#endif
     while (true)
     {
-    
-        CameraLineEstimate estimate = uarte1_get_line_estimate();
+        // The next request goes out while the previous result is used here
+        uint32_t now = rtc_clock_ms();
+        rtc_clock_wake_at_ms(camera_client_poll(now, &next_request_ms));
+
+        CameraLineEstimate estimate;
+        if (camera_client_latest(&estimate, &seen))
+        {
+            if (estimate.x_start_mm != last.x_start_mm || estimate.x_width_mm != last.x_width_mm ||
+                estimate.distance_mm != last.distance_mm)
+            {
+                NRF_LOG_INFO("x_start_mm: %d, x_width_mm: %d, distance_mm: %d",
+                              estimate.x_start_mm, estimate.x_width_mm, estimate.distance_mm);
+                last = estimate;
+            }
+        }
 
-        // For debugging:
-        NRF_LOG_INFO("x_start_mm: %d, x_width_mm: %d, distance_mm: %d", 
-                      estimate.x_start_mm, estimate.x_width_mm, estimate.distance_mm);
+        CameraProfileStatus status;
+        if (camera_client_status(&status, &status_seen))
+        {
+            NRF_LOG_INFO("camera profile: active %d, requested %d, %d.%d fps",
+                          status.active, status.requested, status.fps_x10 / 10, status.fps_x10 % 10);
+        }
+
+        CameraClientStats stats;
+        camera_client_stats(&stats);
+#if CAMERA_STATUS_EVERY
+        if (stats.requests - status_requests >= CAMERA_STATUS_EVERY)
+        {
+            status_requests = stats.requests;
+            camera_client_request('?');
+        }
+#endif
+        if (stats.requests - logged_requests >= CAMERA_STATS_EVERY)
+        {
+            logged_requests = stats.requests;
+            NRF_LOG_INFO("requests: %d, responses: %d, timeouts: %d, late: %d, drained: %d",
+                          stats.requests, stats.responses, stats.timeouts, stats.late, stats.drained);
+            NRF_LOG_INFO("rtt us: last %d, min %d, max %d, mean %d", stats.rtt_last_us,
+                          stats.responses ? stats.rtt_min_us : 0, stats.rtt_max_us,
+                          stats.responses ? (uint32_t)(stats.rtt_sum_us / stats.responses) : 0);
+        }
         NRF_LOG_FLUSH();
-        nrf_delay_ms(1000); // delay between requests
+        __WFE();
     }
+#endif
 }
-
@@ -0,0 +1,81 @@
+#include "obstacle_batch.h"
+
+// Read one varint of up to 3 bytes (21 bits) at *p_pos
+static int read_varint(uint8_t const * p_data, size_t length, size_t * p_pos, uint32_t * p_value)
+{
+    uint32_t value = 0;
+    for (unsigned shift = 0; shift <= 14; shift += 7)
+    {
+        if (*p_pos >= length)
+        {
+            return OBSTACLE_BATCH_ERR_TRUNCATED;
+        }
+        uint8_t b = p_data[(*p_pos)++];
+        value |= (uint32_t)(b & 0x7F) << shift;
+        if (!(b & 0x80))
+        {
+            *p_value = value;
+            return OBSTACLE_BATCH_OK;
+        }
+    }
+    return OBSTACLE_BATCH_ERR_TRUNCATED;
+}
+
+static int32_t unzigzag(uint32_t u)
+{
+    return (u & 1) ? -(int32_t)((u + 1) >> 1) : (int32_t)(u >> 1);
+}
+
+int obstacle_batch_decode(uint8_t const * p_data, size_t length, ObstacleBatch * p_batch)
+{
+    if (length < 2)
+    {
+        return OBSTACLE_BATCH_ERR_SHORT;
+    }
+    p_batch->version = p_data[0];
+    p_batch->count = 0;
+    if (p_data[0] != OBSTACLE_BATCH_VERSION)
+    {
+        return OBSTACLE_BATCH_ERR_VERSION;
+    }
+    uint8_t count = p_data[1];
+    if (count > OBSTACLE_BATCH_MAX)
+    {
+        return OBSTACLE_BATCH_ERR_COUNT;
+    }
+
+    size_t pos = 2;
+    int32_t x = 0;
+    int32_t d = 0;
+    for (uint8_t i = 0; i < count; i++)
+    {
+        uint32_t f[5];
+        for (int k = 0; k < 5; k++)
+        {
+            int err = read_varint(p_data, length, &pos, &f[k]);
+            if (err != OBSTACLE_BATCH_OK)
+            {
+                return err;
+            }
+        }
+        x += unzigzag(f[1]);
+        d += unzigzag(f[3]);
+        if (f[0] > UINT16_MAX || f[2] > UINT16_MAX || f[4] > UINT16_MAX ||
+            x < INT16_MIN || x > INT16_MAX || d < INT16_MIN || d > INT16_MAX)
+        {
+            return OBSTACLE_BATCH_ERR_RANGE;
+        }
+        Obstacle * p_ob = &p_batch->obstacles[i];
+        p_ob->track_id = (uint16_t)f[0];
+        p_ob->x_offset_mm = (int16_t)x;
+        p_ob->width_mm = (uint16_t)f[2];
+        p_ob->distance_mm = (int16_t)d;
+        p_ob->area = (uint16_t)f[4];
+        p_batch->count = (uint8_t)(i + 1);
+    }
+    if (pos != length)
+    {
+        return OBSTACLE_BATCH_ERR_TRAILING;
+    }
+    return OBSTACLE_BATCH_OK;
+}
@@ -0,0 +1,44 @@
+#ifndef OBSTACLE_BATCH_H__
+#define OBSTACLE_BATCH_H__
+
+// Decoder for the multi-obstacle batch packet (see lib/obstacle_batch.py),
+// sent as the payload of a camera frame (camera_frame.h):
+//
+//   version | count | count x (track_id, x_offset, width, distance, area)
+//
+// All obstacle fields are LEB128 varints, x_offset and distance are zigzag
+// coded deltas from the previous obstacle. The first obstacle is the primary
+// target. Plain C99, builds on the host with gcc.
+
+#include <stddef.h>
+#include <stdint.h>
+
+#define OBSTACLE_BATCH_VERSION 1
+#define OBSTACLE_BATCH_MAX     6
+
+#define OBSTACLE_BATCH_OK              0
+#define OBSTACLE_BATCH_ERR_SHORT      -1 // shorter than the header
+#define OBSTACLE_BATCH_ERR_VERSION    -2
+#define OBSTACLE_BATCH_ERR_COUNT      -3 // more than OBSTACLE_BATCH_MAX obstacles
+#define OBSTACLE_BATCH_ERR_TRUNCATED  -4 // varint runs past the end or is too long
+#define OBSTACLE_BATCH_ERR_RANGE      -5 // value does not fit its field
+#define OBSTACLE_BATCH_ERR_TRAILING   -6 // bytes left after the last obstacle
+
+typedef struct {
+    uint16_t track_id;
+    int16_t  x_offset_mm;
+    uint16_t width_mm;
+    int16_t  distance_mm;
+    uint16_t area;          // blob pixels / 16
+} Obstacle;
+
+typedef struct {
+    uint8_t  version;
+    uint8_t  count;
+    Obstacle obstacles[OBSTACLE_BATCH_MAX];
+} ObstacleBatch;
+
+// Returns OBSTACLE_BATCH_OK or one of the negative errors above
+int obstacle_batch_decode(uint8_t const * p_data, size_t length, ObstacleBatch * p_batch);
+
+#endif // OBSTACLE_BATCH_H__
@@ -0,0 +1,85 @@
+#include "nrf.h"
+#include "rtc_clock.h"
+
+#define RTC_FREQUENCY   32768
+#define COUNTER_MASK    RTC_COUNTER_COUNTER_Msk  // 24 bits
+#define HALF_RANGE      (COUNTER_MASK >> 1)
+#define MAX_WAKE_TICKS  HALF_RANGE
+
+static volatile uint32_t overflows = 0;
+
+void RTC2_IRQHandler(void)
+{
+    if (NRF_RTC2->EVENTS_OVRFLW)
+    {
+        NRF_RTC2->EVENTS_OVRFLW = 0;
+        overflows++;
+    }
+    if (NRF_RTC2->EVENTS_COMPARE[0])
+    {
+        // Deadline reached, the interrupt itself was the wake-up
+        NRF_RTC2->EVENTS_COMPARE[0] = 0;
+        NRF_RTC2->INTENCLR = RTC_INTENCLR_COMPARE0_Msk;
+    }
+}
+
+void rtc_clock_init(void)
+{
+    NRF_CLOCK->LFCLKSRC = CLOCK_LFCLKSRC_SRC_RC << CLOCK_LFCLKSRC_SRC_Pos;
+    NRF_CLOCK->EVENTS_LFCLKSTARTED = 0;
+    NRF_CLOCK->TASKS_LFCLKSTART = 1;
+    while (NRF_CLOCK->EVENTS_LFCLKSTARTED == 0)
+    {
+    }
+
+    NRF_RTC2->PRESCALER = 0;
+    NRF_RTC2->EVENTS_OVRFLW = 0;
+    NRF_RTC2->INTENSET = RTC_INTENSET_OVRFLW_Msk;
+    NVIC_EnableIRQ(RTC2_IRQn);
+    NRF_RTC2->TASKS_START = 1;
+}
+
+static uint64_t ticks(void)
+{
+    uint32_t count;
+    uint32_t counter;
+    bool pending;
+    do
+    {
+        count = overflows;
+        counter = NRF_RTC2->COUNTER;
+        pending = NRF_RTC2->EVENTS_OVRFLW;
+    } while (count != overflows);
+    if (pending && counter < HALF_RANGE)
+    {
+        count++;  // wrapped, the interrupt has not run yet
+    }
+    return ((uint64_t)count << 24) | counter;
+}
+
+uint32_t rtc_clock_ms(void)
+{
+    return (uint32_t)((ticks() * 1000) / RTC_FREQUENCY);
+}
+
+uint32_t rtc_clock_us(void)
+{
+    return (uint32_t)((ticks() * 1000000) / RTC_FREQUENCY);
+}
+
+void rtc_clock_wake_at_ms(uint32_t deadline_ms)
+{
+    int32_t delta_ms = (int32_t)(deadline_ms - rtc_clock_ms());
+    uint32_t delta = delta_ms <= 0 ? 0 : (uint32_t)(((uint64_t)delta_ms * RTC_FREQUENCY + 999) / 1000);
+    if (delta < 2)
+    {
+        delta = 2;  // the nearest compare value that is guaranteed to fire
+    }
+    if (delta > MAX_WAKE_TICKS)
+    {
+        delta = MAX_WAKE_TICKS;
+    }
+    NRF_RTC2->EVENTS_COMPARE[0] = 0;
+    NRF_RTC2->CC[0] = (NRF_RTC2->COUNTER + delta) & COUNTER_MASK;
+    NRF_RTC2->INTENSET = RTC_INTENSET_COMPARE0_Msk;
+}
@@ -0,0 +1,29 @@
+#ifndef RTC_CLOCK_H__
+#define RTC_CLOCK_H__
+
+// Free-running clock on RTC2: 32768 Hz from the LFCLK (RC oscillator, good
+// to about 2 % uncalibrated, enough for timeouts and round-trip times), with
+// the 24-bit counter extended by counting overflows in the interrupt. A
+// compare interrupt wakes a __WFE() loop at a deadline, so waits take real
+// time instead of a count of wake-ups.
+
+#include <stdbool.h>
+#include <stdint.h>
+
+void rtc_clock_init(void);
+
+uint32_t rtc_clock_ms(void);
+
+// Microseconds in 30.5 us steps; wraps after about 71 minutes, use differences
+uint32_t rtc_clock_us(void);
+
+// Make sure the CPU wakes up at deadline_ms (at most about 256 s ahead);
+// a deadline in the past wakes it right away
+void rtc_clock_wake_at_ms(uint32_t deadline_ms);
+
+static inline bool rtc_clock_expired(uint32_t now_ms, uint32_t deadline_ms)
+{
+    return (int32_t)(now_ms - deadline_ms) >= 0;
+}
+
+#endif // RTC_CLOCK_H__